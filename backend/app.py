@@ -27,16 +27,41 @@ def create_app(env_name='development'):
     # Enable CORS
     CORS(app)
     
-    # Initialize database
+    # Initialize database: пул, режим PgBouncer, репліка, тайм-аути запитів ендпоінтів
+    from services.database import configure_database, init_database
+    configure_database(app)
     db.init_app(app)
+    init_database(app)
     
     # Register blueprints
     from routes.events_routes import events_bp
-    from routes.config_routes import config_bp
+    from routes.configuration_routes import configuration_bp
+    from routes.api_config_routes import api_config_bp
+    from routes.siem_routes import siem_bp
+    from routes.mitre_routes import mitre_bp
     from routes.auth import auth_bp
+    from routes.batch_processing import batch_bp
+    from routes.ml_routes import ml_bp
+    from routes.dashboard_routes import dashboard_bp
+    from routes.data_labeling_routes import data_labeling_bp
     
     app.register_blueprint(events_bp)
-    app.register_blueprint(config_bp)
+    app.register_blueprint(configuration_bp)
+    app.register_blueprint(api_config_bp)
+    app.register_blueprint(siem_bp)
+    app.register_blueprint(mitre_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(ml_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(data_labeling_bp)
+    
+    # Час запиту, SQL, ML і серіалізації: Server-Timing, Prometheus, профайлер
+    from services.instrumentation import init_instrumentation
+    init_instrumentation(app)
+    
+    # /metrics: конектори, ML, експорт, пул з'єднань (агрегація по воркерах gunicorn)
+    from services.metrics import init_metrics
+    init_metrics(app)
     
     return app
@@ -0,0 +1,3 @@
+"""
+Інструменти вимірювання продуктивності: локальні mock-сервери SIEM та бенчмарки.
+"""
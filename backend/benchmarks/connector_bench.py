@@ -0,0 +1,140 @@
+"""
+Бенчмарк конекторів SIEM проти локальних mock-серверів (або реального API).
+
+Для кожного конектора виконується задана кількість fetch_logs; сесія requests конектора
+обгортається лічильником, тож окрім латентності fetch (p50/p99) видно кількість HTTP-запитів,
+повторів _request_with_retry після помилок з'єднання/тайм-аутів і помилок за типом
+(429 -> SIEMRateLimitError, 5xx -> SIEMResponseError).
+"""
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.connectors import ElasticConnector, SplunkConnector, WazuhConnector
+
+from .mock_siem import FaultInjector, MockSIEMServer, create_mock_siem_app
+
+logger = logging.getLogger(__name__)
+
+CONNECTORS = {
+    'wazuh': (WazuhConnector, 'bench:bench'),
+    'splunk': (SplunkConnector, 'bench'),
+    'elastic': (ElasticConnector, 'bench'),
+}
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p99": None, "max": None}
+    p50, p99 = np.percentile(values, [50, 99])
+    return {"p50": round(float(p50), 2), "p99": round(float(p99), 2), "max": round(max(values), 2)}
+
+
+class _CountingSession:
+    """Обгортка session.request: латентність і результат кожного HTTP-запиту"""
+
+    def __init__(self, session):
+        self._request = session.request
+        self.latencies_ms: List[float] = []
+        self.statuses: Counter = Counter()
+        self.transport_errors = 0
+        session.request = self.request
+
+    def request(self, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self._request(method, url, **kwargs)
+        except Exception:
+            self.transport_errors += 1
+            raise
+        finally:
+            self.latencies_ms.append((time.perf_counter() - started) * 1000)
+        self.statuses[response.status_code] += 1
+        return response
+
+
+def run_connector_benchmark(siem_type: str, api_url: str, fetches: int = 50, page_size: int = 500,
+                            retry_delay: float = 0.05, timeout: float = 30, api_key: Optional[str] = None,
+                            fetch_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Виміряти пропускну здатність і латентність fetch_logs конектора
+
+    Args:
+        siem_type: wazuh, splunk або elastic
+        api_url: Адреса API (mock-сервера)
+        fetches: Кількість викликів fetch_logs
+        page_size: Розмір сторінки (limit/count/size)
+        retry_delay: Базова затримка повторів конектора (в продакшені 2 с)
+        timeout: Тайм-аут HTTP-запиту конектора
+
+    Returns:
+        Звіт: events_per_second, латентність fetch і HTTP, повтори та помилки за типом
+    """
+    connector_class, default_key = CONNECTORS[siem_type]
+    connector = connector_class(api_url, api_key or default_key)
+    connector.retry_delay = retry_delay
+    connector.timeout = timeout
+    session = _CountingSession(connector.session)
+
+    params = dict(fetch_params or {}, limit=page_size)
+    fetch_latencies: List[float] = []
+    errors: Counter = Counter()
+    events = 0
+    started = time.perf_counter()
+    for _ in range(fetches):
+        fetch_started = time.perf_counter()
+        try:
+            events += len(connector.fetch_logs(params))
+        except Exception as e:
+            errors[type(e).__name__] += 1
+            logger.debug(f"{siem_type} fetch failed: {str(e)}")
+        fetch_latencies.append((time.perf_counter() - fetch_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "siem": siem_type,
+        "fetches": fetches,
+        "successful_fetches": fetches - sum(errors.values()),
+        "events": events,
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(events / elapsed, 1) if elapsed else 0.0,
+        "fetch_latency_ms": _percentiles(fetch_latencies),
+        "http_latency_ms": _percentiles(session.latencies_ms),
+        "http_requests": len(session.latencies_ms),
+        "http_statuses": {str(status): count for status, count in sorted(session.statuses.items())},
+        # Повтори робить лише _request_with_retry після помилок з'єднання та тайм-аутів
+        "retries": session.transport_errors,
+        "errors": dict(errors),
+    }
+
+
+def run_mock_benchmarks(siem_types=('wazuh', 'splunk', 'elastic'), total_events: int = 10000,
+                        fetches: int = 50, page_size: int = 500, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                        rate_limit: float = 0.0, failure_rate: float = 0.0, job_seconds: float = 0.0,
+                        retry_delay: float = 0.05, timeout: float = 30, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Підняти mock-сервер для кожного типу SIEM і прогнати бенчмарк конектора
+
+    Returns:
+        Звіти run_connector_benchmark зі статистикою сервера (server)
+    """
+    reports = []
+    for siem_type in siem_types:
+        faults = FaultInjector(latency_ms=latency_ms, jitter_ms=jitter_ms, rate_limit=rate_limit,
+                               failure_rate=failure_rate, seed=seed)
+        app = create_mock_siem_app(siem_type, total_events=total_events, seed=seed, faults=faults,
+                                   job_seconds=job_seconds)
+        with MockSIEMServer(app) as server:
+            report = run_connector_benchmark(siem_type, server.url, fetches=fetches, page_size=page_size,
+                                             retry_delay=retry_delay, timeout=timeout)
+            report["server"] = server.stats
+        logger.info(
+            f"{siem_type}: {report['events_per_second']} events/s, "
+            f"fetch p50={report['fetch_latency_ms']['p50']}ms p99={report['fetch_latency_ms']['p99']}ms, "
+            f"retries={report['retries']}, errors={report['errors']}"
+        )
+        reports.append(report)
+    return reports
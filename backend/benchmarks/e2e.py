@@ -0,0 +1,382 @@
+"""
+Наскрізні бенчмарки продуктивності проти локального PostgreSQL із засіяними даними.
+
+Набір у стилі asv: кожен бенчмарк - функція, що виконує одну операцію й повертає кількість
+оброблених елементів; раннер робить розігрів і кілька вимірюваних раундів та рахує
+латентність (min/median/p95/mean/stddev) і пропускну здатність (елементів/с). HTTP-шляхи
+вимірюються через test client застосунку - з маршрутизацією, запитами до БД і серіалізацією.
+
+Результати зберігаються в JSON разом з комітом і середовищем, а compare_results порівнює
+два прогони: CI позначає регресію, якщо медіана латентності зросла або пропускна здатність
+впала більше ніж на поріг.
+"""
+import json
+import logging
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+RESULTS_SCHEMA = 1
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchmarkError(Exception):
+    """Операція бенчмарку завершилась помилкою"""
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[['BenchContext'], int]
+    description: str
+
+
+class BenchContext:
+    """Спільний стан прогону: застосунок, test client, вибірка подій"""
+
+    def __init__(self, app, batch_size: int = 1000, seed: int = 42):
+        self.app = app
+        self.client = app.test_client()
+        self.batch_size = batch_size
+        self.seed = seed
+        self.round = 0
+        self.event_ids: List[int] = []
+        self.source_ip: Optional[str] = None
+        self.model_path: Optional[str] = None
+
+    def request(self, method: str, url: str, **kwargs):
+        """HTTP-запит до застосунку; статус >= 400 - помилка бенчмарку"""
+        response = self.client.open(url, method=method, **kwargs)
+        if response.status_code >= 400:
+            raise BenchmarkError(f"{method} {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def sample_ids(self) -> List[int]:
+        """Окремий пакет ID для кожного раунду, щоб раунди не вимірювали гарячий кеш"""
+        if not self.event_ids:
+            return []
+        start = (self.round * self.batch_size) % len(self.event_ids)
+        ids = self.event_ids[start:start + self.batch_size]
+        return ids + self.event_ids[:self.batch_size - len(ids)]
+
+
+def seed_database(num_events: int, seed: int = 42, chunk_size: int = 10000) -> int:
+    """
+    Засіяти базу синтетичними подіями, якщо їх менше за num_events
+
+    Returns:
+        Кількість подій у базі
+    """
+    from models import db
+    from services.load_generator import SyntheticWorkload, load_into_db
+
+    db.create_all()
+    existing = db.session.execute(text("SELECT count(*) FROM events")).scalar()
+    if existing < num_events:
+        # Інший seed для дозасівання, щоб не повторювати вже завантажені event_id
+        workload = SyntheticWorkload(num_events - existing, siem_type='mixed', seed=seed + existing,
+                                     chunk_size=chunk_size)
+        result = load_into_db(workload)
+        logger.info(f"Seeded {result['events']} events ({result['events_per_second']:.0f} events/s)")
+    return max(existing, num_events)
+
+
+# Засіяні події ще не класифіковані, а масова верифікація пропускає події без ML-обробки
+_SEED_ML_LABELS_SQL = """
+UPDATE events SET labels_data = (COALESCE(labels_data::jsonb, '{}'::jsonb) || jsonb_build_object(
+    'ml_processed', true,
+    'ml_model_version', 'benchmark',
+    'ml_confidence', 0.5 + (id % 50) / 100.0,
+    'ml_prediction', jsonb_build_object('attack_type', 'Brute Force', 'true_positive', id % 2 = 0)
+))::json
+WHERE id = ANY(:ids) AND labels_data->>'ml_processed' IS NULL
+"""
+
+
+def prepare_context(ctx: BenchContext, sample_size: int = 50000):
+    """Вибірка ID подій з ML-мітками, найчастіша IP-адреса джерела та файл локальної моделі"""
+    from models import db
+
+    ctx.event_ids = db.session.execute(text(
+        "SELECT id FROM events ORDER BY id DESC LIMIT :limit"
+    ), {"limit": sample_size}).scalars().all()
+    db.session.execute(text(_SEED_ML_LABELS_SQL), {"ids": ctx.event_ids})
+    ctx.source_ip = db.session.execute(text(
+        "SELECT source_ip FROM events GROUP BY source_ip ORDER BY count(*) DESC LIMIT 1"
+    )).scalar()
+    fd, ctx.model_path = tempfile.mkstemp(prefix='bench_model_', suffix='.pkl')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump({"type": "benchmark", "weights": np.zeros(1024).tolist()}, f)
+    db.session.commit()
+
+
+def bench_ingest(ctx: BenchContext) -> int:
+    """Нормалізація алертів конекторами та вставка через COPY з хуками інгестії"""
+    from models import db
+    from services.bulk_loader import copy_events
+    from services.load_generator import SyntheticWorkload
+
+    workload = SyntheticWorkload(ctx.batch_size, siem_type='mixed', seed=ctx.seed * 1000 + ctx.round,
+                                 chunk_size=ctx.batch_size, start=datetime.utcnow())
+    inserted = 0
+    for events in workload.normalized_chunks():
+        inserted += len(copy_events(events))
+    db.session.commit()
+    return inserted
+
+
+def bench_bulk_load(ctx: BenchContext) -> int:
+    """Backfill через staging-таблицю: COPY і злиття з дедуплікацією за event_id (кожна подія двічі)"""
+    from services.bulk_loader import load_events
+    from services.load_generator import SyntheticWorkload
+
+    workload = SyntheticWorkload(ctx.batch_size, siem_type='mixed', seed=ctx.seed * 1000 + ctx.round + 500,
+                                 chunk_size=ctx.batch_size, start=datetime.utcnow())
+    events = [event for chunk in workload.normalized_chunks() for event in chunk]
+    return load_events(events * 2, batch_size=len(events) * 2)["read"]
+
+
+def bench_batch_label(ctx: BenchContext) -> int:
+    """POST /api/events/batch-label за найчастішою IP-адресою джерела"""
+    response = ctx.request('POST', '/api/events/batch-label', json={
+        "filters": {"source_ip": ctx.source_ip},
+        "labels": {"attack_type": f"benchmark-{ctx.round}", "manual_tags": ["benchmark"]},
+    })
+    return response.get_json()["updated_count"]
+
+
+def bench_bulk_verify(ctx: BenchContext) -> int:
+    """POST /api/ml/verify-labels для пакета подій"""
+    ids = ctx.sample_ids()
+    response = ctx.request('POST', '/api/ml/verify-labels', json={
+        "event_ids": ids, "true_positive": ctx.round % 2 == 0, "user_id": "benchmark",
+    })
+    verified = response.get_json()["verified_events"]
+    if not verified:
+        raise BenchmarkError("No events were verified")
+    return verified
+
+
+def bench_event_list(ctx: BenchContext) -> int:
+    """GET /api/events: перша та глибока сторінки, зі згортанням дублікатів"""
+    listed = 0
+    for page in (1, 50):
+        for collapse in ('false', 'true'):
+            response = ctx.request('GET', f'/api/events?page={page}&page_size=100&collapse_duplicates={collapse}')
+            listed += len(response.get_json()["events"])
+    return listed
+
+
+def bench_dashboard_stats(ctx: BenchContext) -> int:
+    """GET /api/dashboard/stats та розподіли для графіків дашборду"""
+    for url in ('/api/dashboard/stats', '/api/dashboard/severity', '/api/dashboard/top-attacks',
+                '/api/dashboard/timeline'):
+        ctx.request('GET', url)
+    return 4
+
+
+def _bench_ml(ctx: BenchContext, provider) -> int:
+    from services.ml_service import MLService
+
+    service = MLService()
+    service.config = {"min_confidence_threshold": 0.7, "auto_apply_labels": True}
+    service.provider = provider
+    service._config_loaded = True
+    result = service.batch_classify_events(ctx.sample_ids())
+    if not result.get("success"):
+        raise BenchmarkError(f"Batch classification failed: {result.get('error')}")
+    return result["processed_events"]
+
+
+def bench_ml_dummy(ctx: BenchContext) -> int:
+    """MLService.batch_classify_events з DummyMLProvider"""
+    from services.ml_providers import DummyMLProvider
+
+    return _bench_ml(ctx, DummyMLProvider())
+
+
+def bench_ml_local(ctx: BenchContext) -> int:
+    """MLService.batch_classify_events з LocalMLProvider (модель з файлу)"""
+    from services.ml_providers import LocalMLProvider
+
+    return _bench_ml(ctx, LocalMLProvider(ctx.model_path, 'private'))
+
+
+def bench_dataset_export(ctx: BenchContext) -> int:
+    """GET /api/dataset/export (CSV) з обмеженням розміру вибірки"""
+    limit = ctx.batch_size * 10
+    response = ctx.request('GET', f'/api/dataset/export?limit={limit}')
+    return max(response.get_data().count(b'\n') - 1, 0)
+
+
+BENCHMARKS = (
+    Benchmark('ingest', bench_ingest, "normalize + COPY insert"),
+    Benchmark('bulk_load', bench_bulk_load, "staged COPY + dedup merge"),
+    Benchmark('batch_label', bench_batch_label, "filter-based batch labeling"),
+    Benchmark('bulk_verify', bench_bulk_verify, "bulk label verification"),
+    Benchmark('event_list', bench_event_list, "event listing"),
+    Benchmark('dashboard_stats', bench_dashboard_stats, "dashboard statistics"),
+    Benchmark('ml_classify_dummy', bench_ml_dummy, "ML batch classification, dummy provider"),
+    Benchmark('ml_classify_local', bench_ml_local, "ML batch classification, local provider"),
+    Benchmark('dataset_export', bench_dataset_export, "dataset CSV export"),
+)
+
+
+def summarize(durations: Sequence[float], items: Sequence[int]) -> Dict[str, Any]:
+    """Статистика раундів: латентність у мс та пропускна здатність у елементах/с"""
+    ms = np.asarray(durations, dtype=float) * 1000
+    total_seconds = float(np.sum(durations))
+    return {
+        "rounds": len(durations),
+        "min_ms": round(float(ms.min()), 3),
+        "median_ms": round(float(np.median(ms)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "stddev_ms": round(float(ms.std()), 3),
+        "items": int(sum(items)),
+        "items_per_second": round(sum(items) / total_seconds, 1) if total_seconds else 0.0,
+    }
+
+
+def run_benchmark(benchmark: Benchmark, ctx: BenchContext, rounds: int = 5, warmup: int = 1) -> Dict[str, Any]:
+    """Розігрів і вимірювані раунди одного бенчмарку; помилка записується в результат"""
+    from models import db
+
+    durations, items = [], []
+    try:
+        for index in range(warmup + rounds):
+            ctx.round = index
+            started = time.perf_counter()
+            processed = benchmark.func(ctx)
+            elapsed = time.perf_counter() - started
+            if index >= warmup:
+                durations.append(elapsed)
+                items.append(processed)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Benchmark {benchmark.name} failed: {str(e)}")
+        return {"description": benchmark.description, "error": str(e)}
+    return dict(summarize(durations, items), description=benchmark.description)
+
+
+def environment_info() -> Dict[str, Any]:
+    """Коміт, версії Python і PostgreSQL - щоб порівнювати лише порівнянні прогони"""
+    from models import db
+
+    commit = os.getenv('GITHUB_SHA') or os.getenv('CI_COMMIT_SHA')
+    if not commit:
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                    timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+    try:
+        postgres = db.session.execute(text("SHOW server_version")).scalar()
+    except Exception:
+        db.session.rollback()
+        postgres = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "postgres": postgres,
+    }
+
+
+def run_suite(app, names: Optional[Sequence[str]] = None, num_events: int = 100000, rounds: int = 5,
+              warmup: int = 1, batch_size: int = 1000, seed: int = 42) -> Dict[str, Any]:
+    """
+    Засіяти базу й прогнати бенчмарки
+
+    Args:
+        app: Flask-застосунок, налаштований на базу для бенчмарків
+        names: Назви бенчмарків (за замовчуванням усі BENCHMARKS)
+        num_events: Мінімальна кількість подій у базі перед вимірюванням
+        batch_size: Розмір пакета для інгестії, верифікації та ML-класифікації
+
+    Returns:
+        Результати у форматі для save_results / compare_results
+    """
+    selected = [benchmark for benchmark in BENCHMARKS if not names or benchmark.name in names]
+    unknown = set(names or ()) - {benchmark.name for benchmark in BENCHMARKS}
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    with app.app_context():
+        seeded = seed_database(num_events, seed=seed)
+        ctx = BenchContext(app, batch_size=batch_size, seed=seed)
+        prepare_context(ctx)
+        try:
+            results = {}
+            for benchmark in selected:
+                results[benchmark.name] = run_benchmark(benchmark, ctx, rounds=rounds, warmup=warmup)
+                logger.info(f"{benchmark.name}: {json.dumps(results[benchmark.name])}")
+        finally:
+            os.unlink(ctx.model_path)
+        environment = environment_info()
+
+    return {
+        "schema": RESULTS_SCHEMA,
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": environment,
+        "parameters": {"events": seeded, "rounds": rounds, "warmup": warmup, "batch_size": batch_size, "seed": seed},
+        "benchmarks": results,
+    }
+
+
+def failed_benchmarks(results: Dict[str, Any]) -> List[str]:
+    """Бенчмарки прогону, що завершились помилкою"""
+    return sorted(name for name, result in results.get("benchmarks", {}).items() if "error" in result)
+
+
+def save_results(results: Dict[str, Any], path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Регресії поточного прогону відносно базового
+
+    Регресія - медіана латентності зросла або пропускна здатність впала більше ніж на threshold,
+    а також бенчмарк, що був успішним у базовому прогоні й завершився помилкою зараз.
+
+    Returns:
+        Список {"benchmark", "metric", "baseline", "current", "change"}
+    """
+    regressions = []
+    for name, base in baseline.get("benchmarks", {}).items():
+        result = current.get("benchmarks", {}).get(name)
+        if result is None or "error" in base:
+            continue
+        if "error" in result:
+            regressions.append({"benchmark": name, "metric": "error", "baseline": None,
+                                "current": result["error"], "change": None})
+            continue
+        if base.get("median_ms"):
+            change = result["median_ms"] / base["median_ms"] - 1
+            if change > threshold:
+                regressions.append({"benchmark": name, "metric": "median_ms", "baseline": base["median_ms"],
+                                    "current": result["median_ms"], "change": round(change, 3)})
+        if base.get("items_per_second"):
+            change = result["items_per_second"] / base["items_per_second"] - 1
+            if change < -threshold:
+                regressions.append({"benchmark": name, "metric": "items_per_second",
+                                    "baseline": base["items_per_second"], "current": result["items_per_second"],
+                                    "change": round(change, 3)})
+    return regressions
@@ -0,0 +1,248 @@
+"""
+Локальні замінники API Wazuh, Splunk та Elastic для відтворюваних бенчмарків інгестії.
+
+Сервери реалізують саме ті ендпоінти, які викликають конектори services/connectors:
+  - Wazuh:   POST /security/user/authenticate, GET /alerts, GET /manager/info
+  - Splunk:  POST /services/auth/login, POST /services/search/jobs,
+             GET /services/search/jobs/<sid> (isDone після job_seconds),
+             GET /services/search/jobs/<sid>/results, GET /services/server/info
+  - Elastic: POST /<index>/_search, GET /
+
+Алерти генеруються один раз (services/load_generator.py, фіксований seed) і віддаються
+сторінками. Конектори не передають зміщення, тож без явного offset/from сервер веде власний
+курсор і кожен наступний запит отримує наступну сторінку (по колу). Для перевірки стійкості конекторів можна ввімкнути затримку відповіді з
+випадковим розкидом, обмеження частоти запитів (429 за token bucket) та частку збоїв (503).
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from services.load_generator import SIEM_TYPES, SyntheticWorkload, api_response
+
+logger = logging.getLogger(__name__)
+
+
+class FaultInjector:
+    """Затримка, обмеження частоти та збої для кожного запиту mock-сервера"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit)
+        self._refilled = time.monotonic()
+        self.stats = {"requests": 0, "rate_limited": 0, "failed": 0}
+
+    def _take_token(self) -> bool:
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def before_request(self):
+        """None - обробити запит; інакше відповідь зі статусом помилки"""
+        with self._lock:
+            self.stats["requests"] += 1
+            allowed = self._take_token()
+            failed = allowed and self._random.random() < self.failure_rate
+            delay = self.latency_ms + (self._random.expovariate(1.0 / self.jitter_ms) if self.jitter_ms else 0.0)
+            if not allowed:
+                self.stats["rate_limited"] += 1
+            elif failed:
+                self.stats["failed"] += 1
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if not allowed:
+            return jsonify({"error": "Too many requests"}), 429
+        if failed:
+            return jsonify({"error": "Service temporarily unavailable"}), 503
+        return None
+
+
+class AlertPool:
+    """Згенеровані алерти з посторінковою видачею"""
+
+    def __init__(self, alerts: List[Dict[str, Any]]):
+        self.alerts = alerts
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def page(self, limit: int, offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Сторінка з offset або з поточного курсора, який після цього зсувається"""
+        limit = max(0, min(int(limit), len(self.alerts)))
+        if offset is not None:
+            return self.alerts[max(0, int(offset)):max(0, int(offset)) + limit]
+        with self._lock:
+            start = self._cursor
+            self._cursor = (start + limit) % len(self.alerts) if self.alerts else 0
+        items = self.alerts[start:start + limit]
+        return items + self.alerts[:limit - len(items)]
+
+
+def create_mock_siem_app(siem_type: str, total_events: int = 10000, seed: int = 42,
+                         faults: Optional[FaultInjector] = None, job_seconds: float = 0.0) -> Flask:
+    """
+    Flask-застосунок, що імітує API SIEM
+
+    Args:
+        siem_type: wazuh, splunk або elastic
+        total_events: Кількість алертів, доступних для вибірки
+        faults: Ін'єкція затримки, 429 та 503
+        job_seconds: Через скільки секунд пошукова задача Splunk стає isDone
+    """
+    if siem_type not in SIEM_TYPES:
+        raise ValueError(f"Unsupported SIEM type: {siem_type}")
+
+    alerts = AlertPool([
+        alert for chunk in SyntheticWorkload(total_events, siem_type=siem_type, seed=seed, chunk_size=10000).chunks()
+        for _, _, alert in chunk
+    ])
+    faults = faults or FaultInjector()
+    jobs: Dict[str, Dict[str, Any]] = {}
+    jobs_lock = threading.Lock()
+
+    app = Flask(f"mock_{siem_type}")
+    app.config["MOCK_FAULTS"] = faults
+
+    @app.before_request
+    def inject_faults():
+        return faults.before_request()
+
+    def _authorized(prefix: str) -> bool:
+        return request.headers.get("Authorization", "").startswith(prefix)
+
+    def _unauthorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if siem_type == 'wazuh':
+        @app.route('/security/user/authenticate', methods=['POST'])
+        def wazuh_authenticate():
+            if not _authorized("Basic "):
+                return _unauthorized()
+            return jsonify({"data": {"token": uuid.uuid4().hex}, "error": 0})
+
+        @app.route('/alerts', methods=['GET'])
+        def wazuh_alerts():
+            if not _authorized("Bearer "):
+                return _unauthorized()
+            items = alerts.page(request.args.get("limit", 100), request.args.get("offset"))
+            return jsonify(api_response('wazuh', items, total=len(alerts)))
+
+        @app.route('/manager/info', methods=['GET'])
+        def wazuh_info():
+            return jsonify({"data": {"version": "v4.7.0-mock"}, "error": 0})
+
+    elif siem_type == 'splunk':
+        @app.route('/services/auth/login', methods=['POST'])
+        def splunk_login():
+            if not request.form.get("password"):
+                return _unauthorized()
+            return jsonify({"sessionKey": uuid.uuid4().hex})
+
+        @app.route('/services/search/jobs', methods=['POST'])
+        def splunk_create_job():
+            if not _authorized("Splunk "):
+                return _unauthorized()
+            sid = uuid.uuid4().hex
+            with jobs_lock:
+                jobs[sid] = {"created": time.monotonic(), "search": request.form.get("search", "")}
+            return jsonify({"sid": sid}), 201
+
+        @app.route('/services/search/jobs/<sid>', methods=['GET'])
+        def splunk_job_status(sid):
+            job = jobs.get(sid)
+            if job is None:
+                return jsonify({"messages": [{"type": "FATAL", "text": "Unknown sid"}]}), 404
+            done = time.monotonic() - job["created"] >= job_seconds
+            return jsonify({"entry": [{"name": sid, "content": {
+                "sid": sid, "isDone": done, "dispatchState": "DONE" if done else "RUNNING",
+                "resultCount": len(alerts) if done else 0,
+            }}]})
+
+        @app.route('/services/search/jobs/<sid>/results', methods=['GET'])
+        def splunk_job_results(sid):
+            if sid not in jobs:
+                return jsonify({"messages": [{"type": "FATAL", "text": "Unknown sid"}]}), 404
+            with jobs_lock:
+                jobs.pop(sid, None)
+            items = alerts.page(request.args.get("count", 100), request.args.get("offset"))
+            return jsonify(api_response('splunk', items))
+
+        @app.route('/services/server/info', methods=['GET'])
+        def splunk_info():
+            return jsonify({"entry": [{"content": {"version": "9.1.0-mock"}}]})
+
+    else:
+        @app.route('/<index>/_search', methods=['POST'])
+        def elastic_search(index):
+            if not _authorized("ApiKey "):
+                return _unauthorized()
+            body = request.get_json(silent=True) or {}
+            items = alerts.page(body.get("size", 10), body.get("from"))
+            return jsonify(api_response('elastic', items, total=len(alerts)))
+
+        @app.route('/', methods=['GET'])
+        def elastic_info():
+            return jsonify({"cluster_name": "mock", "version": {"number": "8.11.0-mock"}})
+
+    return app
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Без журналу доступу на кожен запит - він спотворює вимірювання"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class MockSIEMServer:
+    """Mock-сервер SIEM у фоновому потоці (для бенчмарків і тестів)"""
+
+    def __init__(self, app: Flask, host: str = '127.0.0.1', port: int = 0):
+        self.app = app
+        self._server = make_server(host, port, app, threaded=True, request_handler=_QuietRequestHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self._server.host}:{self._server.server_port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.app.config["MOCK_FAULTS"].stats)
+
+    def start(self) -> 'MockSIEMServer':
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Обслуговувати запити в поточному потоці (manage.py mock-siem)"""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'MockSIEMServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -15,6 +15,49 @@ class Config:
     LOG_FILE = os.getenv('LOG_FILE', 'logtagger.log')
     DATABASE_RETRY_LIMIT = 3
     DATABASE_RETRY_DELAY = 5  # seconds
+    # Range partitioning of events/raw_logs by timestamp
+    PARTITIONING_ENABLED = os.getenv('PARTITIONING_ENABLED', 'false').lower() == 'true'
+    PARTITION_INTERVAL = os.getenv('PARTITION_INTERVAL', 'day')  # day, week
+    PARTITION_PREMAKE = int(os.getenv('PARTITION_PREMAKE', '7'))  # partitions created ahead
+    # In-process configuration snapshot, invalidated via LISTEN/NOTIFY
+    CONFIG_LISTEN_ENABLED = os.getenv('CONFIG_LISTEN_ENABLED', 'true').lower() == 'true'
+    CONFIG_VERSION_CHECK_INTERVAL = int(os.getenv('CONFIG_VERSION_CHECK_INTERVAL', '30'))  # seconds, fallback polling
+    # Corpus re-classification job throttling
+    RECLASSIFY_BATCH_SIZE = int(os.getenv('RECLASSIFY_BATCH_SIZE', '1000'))
+    RECLASSIFY_MAX_EVENTS_PER_SECOND = float(os.getenv('RECLASSIFY_MAX_EVENTS_PER_SECOND', '500'))  # 0 - unlimited
+    RECLASSIFY_BATCH_PAUSE = float(os.getenv('RECLASSIFY_BATCH_PAUSE', '0.2'))  # seconds between DB batches
+    RECLASSIFY_STATEMENT_TIMEOUT_MS = int(os.getenv('RECLASSIFY_STATEMENT_TIMEOUT_MS', '30000'))
+    RECLASSIFY_MAX_FAILURE_RATIO = float(os.getenv('RECLASSIFY_MAX_FAILURE_RATIO', '0.5'))  # share of failed events that stops a batch
+    BULK_VERIFY_MAX_EVENTS = int(os.getenv('BULK_VERIFY_MAX_EVENTS', '10000'))  # verdicts per request
+    LABEL_COMPACTION_BATCH_SIZE = int(os.getenv('LABEL_COMPACTION_BATCH_SIZE', '2000'))  # events per snapshot batch
+    LABEL_COMPACTION_LAG_SECONDS = int(os.getenv('LABEL_COMPACTION_LAG_SECONDS', '300'))  # >= longest labeling transaction
+    # Request instrumentation: Server-Timing, Prometheus histograms, sampling profiler
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    INSTRUMENTATION_REPEATED_QUERY_THRESHOLD = int(os.getenv('INSTRUMENTATION_REPEATED_QUERY_THRESHOLD', '20'))  # N+1 warning
+    INSTRUMENTATION_PROFILER_ENABLED = os.getenv('INSTRUMENTATION_PROFILER_ENABLED', 'false').lower() == 'true'
+    INSTRUMENTATION_PROFILE_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_PROFILE_SAMPLE_RATE', '0.01'))  # share of requests
+    INSTRUMENTATION_PROFILE_SLOW_MS = int(os.getenv('INSTRUMENTATION_PROFILE_SLOW_MS', '1000'))  # keep slower profiles only
+    INSTRUMENTATION_PROFILE_INTERVAL_MS = float(os.getenv('INSTRUMENTATION_PROFILE_INTERVAL_MS', '5'))
+    INSTRUMENTATION_PROFILE_DIR = os.getenv('INSTRUMENTATION_PROFILE_DIR', 'profiles')
+    # Connection pool per worker (total connections = workers * (size + overflow))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))  # seconds waiting for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))  # seconds
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '60000'))  # 0 - no limit
+    # Per-endpoint overrides: "blueprint=ms" or "blueprint.view=ms", comma-separated
+    DB_ENDPOINT_STATEMENT_TIMEOUTS = os.getenv(
+        'DB_ENDPOINT_STATEMENT_TIMEOUTS', 'dashboard_bp=10000,events=15000,data_labeling_bp.export_dataset=600000'
+    )
+    # PgBouncer transaction pooling: NullPool, no startup parameters, SET LOCAL timeouts
+    DB_PGBOUNCER_MODE = os.getenv('DB_PGBOUNCER_MODE', 'false').lower() == 'true'
+    DB_DIRECT_URL = os.getenv('DB_DIRECT_URL')  # bypasses PgBouncer for LISTEN/NOTIFY
+    DB_READ_REPLICA_URL = os.getenv('DB_READ_REPLICA_URL')  # comma-separated replicas for analytical reads
+    DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '30'))  # staler replicas fall back to primary
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))  # seconds between lag checks per replica
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,42 @@
+"""
+Конфігурація gunicorn для LogTagger.
+
+Якщо задано ML_PRELOAD_MODEL_PATH, модель завантажується в master-процесі до fork
+і спільна для воркерів (copy-on-write). Після завантаження застосунку кожен воркер
+прогріває ML-сервіс (провайдер і модель), щоб перший запит не платив за ініціалізацію.
+
+З PROMETHEUS_MULTIPROC_DIR метрики воркерів агрегуються на /metrics (services/metrics.py):
+каталог очищається на старті master-процесу, а завершені воркери позначаються як мертві.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+
+def post_worker_init(worker):
+    """Викликається у воркері після fork та завантаження WSGI-застосунку"""
+    if os.getenv('ML_PRELOAD_ON_BOOT', 'true').lower() != 'true':
+        return
+    from services.ml_registry import preload_ml_service
+    preload_ml_service(worker.wsgi)
+
+
+def on_starting(server):
+    """Викликається в master-процесі до fork: модель стає спільною для воркерів (copy-on-write)"""
+    from services.metrics import reset_multiprocess_dir
+    reset_multiprocess_dir()
+    model_path = os.getenv('ML_PRELOAD_MODEL_PATH')
+    if not model_path:
+        return
+    from services.model_store import default_load_mode, preload_shared_model
+    # Воркери беруть режим з ml.model_load_mode; розбіжність вони повідомляють у журналі
+    if preload_shared_model(model_path, default_load_mode()):
+        server.log.info(f"Model preloaded in master: {model_path} (mode: {default_load_mode()})")
+
+
+def child_exit(server, worker):
+    """Викликається в master-процесі після завершення воркера: його live-gauge більше не враховуються"""
+    from services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
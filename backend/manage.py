@@ -63,6 +63,402 @@ def check_db(mode):
             logger.error(f"Error checking database: {str(e)}")
             sys.exit(1)
 
+@cli.command('partitions-init')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--interval', default=None, help='Partition interval: day, week')
+def partitions_init(mode, interval):
+    """Перетворити таблиці events, raw_logs та label_revisions на секціоновані за timestamp."""
+    from services.label_history import ensure_append_only
+    from services.partition_service import PartitionManager
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            result = PartitionManager(interval=interval).convert_all()
+            for table, converted in result.items():
+                logger.info(f"{table}: {'converted' if converted else 'already partitioned'}")
+            ensure_append_only()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error converting tables to partitions: {str(e)}")
+            sys.exit(1)
+
+@cli.command('partitions-maintain')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--retention-days', default=None, type=int, help='Override general.data_retention_days')
+@click.option('--dry-run', is_flag=True, help='Only show partitions that would be dropped')
+def partitions_maintain(mode, retention_days, dry_run):
+    """Створити секції наперед та видалити секції, старші за термін зберігання (для cron)."""
+    from services.partition_service import PartitionManager
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            manager = PartitionManager()
+            created = manager.ensure_partitions()
+            db.session.commit()
+            logger.info(f"Partitions ensured: {created}")
+
+            dropped = manager.prune(retention_days=retention_days, dry_run=dry_run)
+            action = "Would drop" if dry_run else "Dropped"
+            for table, partitions in dropped.items():
+                logger.info(f"{action} {len(partitions)} partitions of {table}: {', '.join(partitions)}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error maintaining partitions: {str(e)}")
+            sys.exit(1)
+
+@cli.command('db-indexes')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+def db_indexes(mode):
+    """Створити колонки, індекси та тригери, яких немає в наявній базі."""
+    from services.label_history import ensure_append_only, ensure_ingested_at
+    from services.labeling_service import ensure_chain_index
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            ensure_ingested_at()
+            logger.info("Column events.ingested_at is present")
+            ensure_chain_index()
+            logger.info("Index ix_events_event_chain_id is present")
+            ensure_append_only()
+            logger.info("Trigger label_revisions_append_only is present")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error creating indexes: {str(e)}")
+            sys.exit(1)
+
+@cli.command('inference-server')
+@click.option('--socket', 'socket_path', default=None, help='Unix socket path (default: ML_INFERENCE_SOCKET)')
+@click.option('--model-path', default=None, help='Local model file; dummy provider if omitted')
+@click.option('--load-mode', default=None, help='Model load mode: private, mmap')
+@click.option('--batch-size', default=64, type=int, help='Maximum events per model call')
+@click.option('--max-wait-ms', default=5.0, type=float, help='Maximum wait for a batch to fill')
+@click.option('--workers', default=1, type=int, help='Number of model threads')
+def inference_server(socket_path, model_path, load_mode, batch_size, max_wait_ms, workers):
+    """Запустити окремий процес інференсу з динамічним пакетуванням."""
+    from services.inference_server import DEFAULT_SOCKET_PATH, InferenceServer
+    server = InferenceServer(
+        socket_path or DEFAULT_SOCKET_PATH,
+        model_path=model_path,
+        load_mode=load_mode,
+        max_batch_size=batch_size,
+        max_wait_ms=max_wait_ms,
+        workers=workers
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Inference server stopped")
+
+@cli.command('features-backfill')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--batch-size', default=1000, type=int, help='Events per batch')
+@click.option('--limit', default=None, type=int, help='Maximum number of events to process')
+def features_backfill(mode, batch_size, limit):
+    """Обчислити вектори ознак для подій, що їх ще не мають."""
+    from services.feature_store import backfill_features
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            processed = backfill_features(batch_size=batch_size, limit=limit)
+            logger.info(f"Feature vectors computed for {processed} events")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error computing feature vectors: {str(e)}")
+            sys.exit(1)
+
+@cli.command('ml-reclassify')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--job-id', default=None, type=int, help='Resume a specific job')
+@click.option('--model-version', default=None, help='Version key for new predictions (default: provider model version)')
+@click.option('--date-from', default=None, help='Only events with timestamp >= date (ISO)')
+@click.option('--date-to', default=None, help='Only events with timestamp < date (ISO)')
+@click.option('--siem-source', default=None, help='Only events from this SIEM source')
+@click.option('--include-unprocessed', is_flag=True, help='Also classify events never processed by ML')
+@click.option('--include-verified', is_flag=True, help='Also re-label human-verified events')
+@click.option('--include-duplicates', is_flag=True, help='Classify every near-duplicate instead of cluster representatives')
+@click.option('--batch-size', default=None, type=int, help='Events per DB transaction')
+@click.option('--rate', default=None, type=float, help='Maximum events per second sent to the ML provider')
+@click.option('--new', 'new_job', is_flag=True, help='Start a new job instead of resuming an unfinished one')
+def ml_reclassify(mode, job_id, model_version, date_from, date_to, siem_source, include_unprocessed,
+                  include_verified, include_duplicates, batch_size, rate, new_job):
+    """Повторно класифікувати корпус подій поточною моделлю (з контрольною точкою)."""
+    from services.ml_registry import get_ml_service
+    from services.reclassification_service import create_job, model_version_of, run_job
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            ml_service = get_ml_service()
+            if job_id is None:
+                filters = {k: v for k, v in {
+                    "date_from": date_from, "date_to": date_to, "siem_source": siem_source,
+                    "include_unprocessed": include_unprocessed or None, "include_verified": include_verified or None,
+                    "include_duplicates": include_duplicates or None,
+                }.items() if v}
+                job = create_job(model_version or model_version_of(ml_service), filters, resume=not new_job)
+                job_id = job.id
+            job = run_job(job_id, ml_service, batch_size=batch_size, max_events_per_second=rate)
+            logger.info(f"Job {job_id}: {job.status}, processed {job.processed}, "
+                        f"updated {job.updated}, failed {job.failed}")
+            if job.status == 'failed':
+                sys.exit(1)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error re-classifying events: {str(e)}")
+            sys.exit(1)
+
+@cli.command('verification-queue-rebuild')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+def verification_queue_rebuild(mode):
+    """Перерахувати пріоритети черги верифікації (для cron)."""
+    from services.active_learning import rebuild_queue
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            size = rebuild_queue()
+            logger.info(f"Verification queue contains {size} events")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error rebuilding verification queue: {str(e)}")
+            sys.exit(1)
+
+@cli.command('duplicates-backfill')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--batch-size', default=1000, type=int, help='Events per batch')
+@click.option('--limit', default=None, type=int, help='Maximum number of events to process')
+def duplicates_backfill(mode, batch_size, limit):
+    """Об'єднати наявні майже однакові події в кластери."""
+    from services.near_duplicates import backfill_clusters
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            processed = backfill_clusters(batch_size=batch_size, limit=limit)
+            logger.info(f"Near-duplicate clusters assigned for {processed} events")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error clustering events: {str(e)}")
+            sys.exit(1)
+
+@cli.command('chains-replay')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--date-from', default=None, help='Only events with timestamp >= date (ISO)')
+@click.option('--date-to', default=None, help='Only events with timestamp < date (ISO)')
+@click.option('--batch-size', default=20000, type=int, help='Events per DB transaction')
+@click.option('--max-open-chains', default=None, type=int, help='Override correlation.max_open_chains')
+@click.option('--overwrite-manual', is_flag=True, help='Also re-correlate events with manually assigned chains')
+def chains_replay(mode, date_from, date_to, batch_size, max_open_chains, overwrite_manual):
+    """Програти історію подій через корелятор ланцюжків та оновити event_chain_id."""
+    from datetime import datetime
+    from services.chain_correlation import replay_chains
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            result = replay_chains(
+                date_from=datetime.fromisoformat(date_from) if date_from else None,
+                date_to=datetime.fromisoformat(date_to) if date_to else None,
+                batch_size=batch_size,
+                overwrite_manual=overwrite_manual,
+                max_open_chains=max_open_chains
+            )
+            logger.info(f"Chain replay: {result['processed']} events processed, {result['updated']} updated, "
+                        f"{result['chains']} chains, {result['evicted']} evicted early")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error replaying event chains: {str(e)}")
+            sys.exit(1)
+
+@cli.command('labels-compact')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--cutoff', default=None, help='Snapshot time (ISO, default and upper bound: stable horizon of the label journal)')
+@click.option('--batch-size', default=None, type=int, help='Events per snapshot batch')
+def labels_compact(mode, cutoff, batch_size):
+    """Ущільнити журнал змін міток у знімки (для cron)."""
+    from datetime import datetime
+    from services.label_history import compact_revisions
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            run = compact_revisions(
+                cutoff=datetime.fromisoformat(cutoff) if cutoff else None,
+                batch_size=batch_size
+            )
+            logger.info(f"Label compaction to {run.cutoff.isoformat()}: {run.events} snapshots, "
+                        f"{run.revisions} revisions folded")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error compacting label revisions: {str(e)}")
+            sys.exit(1)
+
+@cli.command('loadgen')
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--events', 'num_events', default=1000000, type=int, help='Number of events to generate')
+@click.option('--siem', default='mixed', help='Alert format: wazuh, splunk, elastic, mixed')
+@click.option('--rate', default=100.0, type=float, help='Mean events per second in event time')
+@click.option('--skew', default=1.1, type=float, help='Zipf exponent for source IPs, agents and users (0 - uniform)')
+@click.option('--duplicate-ratio', default=0.2, type=float, help='Share of repeated events')
+@click.option('--seed', default=42, type=int, help='Random seed')
+@click.option('--chunk-size', default=10000, type=int, help='Events per chunk (DB transaction or API page)')
+@click.option('--output', default=None, help='Write SIEM API responses as JSON lines to this file instead of the DB')
+@click.option('--no-enrich', is_flag=True, help='Skip chain correlation, feature vectors and duplicate clustering')
+@click.option('--realtime', is_flag=True, help='Emit events no faster than --rate')
+def loadgen(mode, num_events, siem, rate, skew, duplicate_ratio, seed, chunk_size, output, no_enrich, realtime):
+    """Згенерувати синтетичне навантаження та завантажити його в БД (COPY) або у файл відповідей API."""
+    import json
+    from services.load_generator import SyntheticWorkload, api_response, load_into_db
+    workload = SyntheticWorkload(num_events, siem_type=siem, rate=rate, skew=skew, duplicate_ratio=duplicate_ratio,
+                                 seed=seed, chunk_size=chunk_size)
+    if output:
+        with open(output, 'w') as f:
+            for chunk in workload.chunks(realtime=realtime):
+                pages = {}
+                for siem_type, _, alert in chunk:
+                    pages.setdefault(siem_type, []).append(alert)
+                for siem_type, alerts in pages.items():
+                    f.write(json.dumps({"siem": siem_type, "response": api_response(siem_type, alerts)}) + "\n")
+        logger.info(f"Wrote {num_events} synthetic events to {output}")
+        return
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            result = load_into_db(workload, enrich=not no_enrich, realtime=realtime)
+            logger.info(f"Loaded {result['events']} events in {result['seconds']:.1f}s "
+                        f"({result['events_per_second']:.0f} events/s)")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error loading synthetic events: {str(e)}")
+            sys.exit(1)
+
+@cli.command('bulk-load')
+@click.argument('source', type=click.File('r'))
+@click.option('--mode', default='development', help='Mode: development, production, testing')
+@click.option('--siem', default=None, help='Alert format of plain lines: wazuh, splunk, elastic (default: normalized events)')
+@click.option('--batch-size', default=50000, type=int, help='Events per COPY batch (DB transaction)')
+@click.option('--limit', default=None, type=int, help='Maximum number of events to load')
+@click.option('--enrich', is_flag=True, help='Also compute feature vectors and duplicate clusters')
+def bulk_load(source, mode, siem, batch_size, limit, enrich):
+    """Завантажити історичні події з JSON Lines (або - для stdin) через COPY з дедуплікацією за event_id."""
+    from services.bulk_loader import load_file
+    app = create_app(mode)
+    with app.app_context():
+        try:
+            result = load_file(source, siem_type=siem, batch_size=batch_size, enrich=enrich, limit=limit)
+            logger.info(f"Read {result['read']} events, inserted {result['inserted']}, skipped "
+                        f"{result['duplicates']} duplicates in {result['seconds']:.1f}s "
+                        f"({result['events_per_second']:.0f} events/s)")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error bulk loading events: {str(e)}")
+            sys.exit(1)
+
+@cli.command('mock-siem')
+@click.option('--siem', default='wazuh', help='API to emulate: wazuh, splunk, elastic')
+@click.option('--host', default='127.0.0.1', help='Host to bind to')
+@click.option('--port', default=55000, type=int, help='Port to bind to')
+@click.option('--events', 'num_events', default=10000, type=int, help='Number of alerts to serve')
+@click.option('--latency-ms', default=0.0, type=float, help='Fixed response latency')
+@click.option('--jitter-ms', default=0.0, type=float, help='Mean of extra exponential latency')
+@click.option('--rate-limit', default=0.0, type=float, help='Requests per second before 429 (0 - unlimited)')
+@click.option('--failure-rate', default=0.0, type=float, help='Share of requests answered with 503')
+@click.option('--job-seconds', default=0.0, type=float, help='Splunk search job duration')
+@click.option('--seed', default=42, type=int, help='Random seed')
+def mock_siem(siem, host, port, num_events, latency_ms, jitter_ms, rate_limit, failure_rate, job_seconds, seed):
+    """Запустити локальний mock-сервер API SIEM для бенчмарків інгестії."""
+    from benchmarks.mock_siem import FaultInjector, MockSIEMServer, create_mock_siem_app
+    faults = FaultInjector(latency_ms=latency_ms, jitter_ms=jitter_ms, rate_limit=rate_limit,
+                           failure_rate=failure_rate, seed=seed)
+    app = create_mock_siem_app(siem, total_events=num_events, seed=seed, faults=faults, job_seconds=job_seconds)
+    server = MockSIEMServer(app, host=host, port=port)
+    logger.info(f"Mock {siem} API with {num_events} alerts on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Mock {siem} API stopped: {server.stats}")
+
+@cli.command('bench-connectors')
+@click.option('--siem', default='wazuh,splunk,elastic', help='Comma-separated connectors to benchmark')
+@click.option('--url', default=None, help='Benchmark an existing API instead of a local mock (single --siem)')
+@click.option('--api-key', default=None, help='API key for --url')
+@click.option('--events', 'num_events', default=10000, type=int, help='Number of alerts served by each mock')
+@click.option('--fetches', default=50, type=int, help='fetch_logs calls per connector')
+@click.option('--page-size', default=500, type=int, help='Alerts per fetch')
+@click.option('--latency-ms', default=0.0, type=float, help='Fixed mock response latency')
+@click.option('--jitter-ms', default=0.0, type=float, help='Mean of extra exponential mock latency')
+@click.option('--rate-limit', default=0.0, type=float, help='Mock requests per second before 429 (0 - unlimited)')
+@click.option('--failure-rate', default=0.0, type=float, help='Share of mock requests answered with 503')
+@click.option('--job-seconds', default=0.0, type=float, help='Mock Splunk search job duration')
+@click.option('--retry-delay', default=0.05, type=float, help='Connector retry base delay')
+@click.option('--timeout', default=30.0, type=float, help='Connector HTTP timeout')
+@click.option('--seed', default=42, type=int, help='Random seed')
+@click.option('--output', default=None, help='Write the JSON report to this file')
+def bench_connectors(siem, url, api_key, num_events, fetches, page_size, latency_ms, jitter_ms, rate_limit,
+                     failure_rate, job_seconds, retry_delay, timeout, seed, output):
+    """Виміряти events/s, латентність fetch (p50/p99) та повтори конекторів SIEM."""
+    import json
+    from benchmarks.connector_bench import run_connector_benchmark, run_mock_benchmarks
+    siem_types = [name.strip() for name in siem.split(',') if name.strip()]
+    try:
+        if url:
+            if len(siem_types) != 1:
+                raise click.UsageError("--url requires exactly one --siem")
+            reports = [run_connector_benchmark(siem_types[0], url, fetches=fetches, page_size=page_size,
+                                               retry_delay=retry_delay, timeout=timeout, api_key=api_key)]
+        else:
+            reports = run_mock_benchmarks(siem_types, total_events=num_events, fetches=fetches, page_size=page_size,
+                                          latency_ms=latency_ms, jitter_ms=jitter_ms, rate_limit=rate_limit,
+                                          failure_rate=failure_rate, job_seconds=job_seconds,
+                                          retry_delay=retry_delay, timeout=timeout, seed=seed)
+    except (KeyError, ValueError) as e:
+        logger.error(f"Error running connector benchmark: {str(e)}")
+        sys.exit(1)
+    report = json.dumps(reports, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(report)
+        logger.info(f"Connector benchmark report written to {output}")
+    else:
+        click.echo(report)
+
+@cli.command('bench-e2e')
+@click.option('--mode', default='testing', help='Mode: development, production, testing')
+@click.option('--events', 'num_events', default=100000, type=int, help='Minimum number of seeded events')
+@click.option('--only', default=None, help='Comma-separated benchmark names (default: all)')
+@click.option('--rounds', default=5, type=int, help='Measured rounds per benchmark')
+@click.option('--warmup', default=1, type=int, help='Warmup rounds per benchmark')
+@click.option('--batch-size', default=1000, type=int, help='Events per ingestion, verification and ML batch')
+@click.option('--seed', default=42, type=int, help='Random seed')
+@click.option('--output', default=None, help='Write JSON results to this file')
+@click.option('--baseline', default=None, help='Compare with JSON results of a previous run')
+@click.option('--threshold', default=0.2, type=float, help='Allowed relative slowdown before a regression is reported')
+def bench_e2e(mode, num_events, only, rounds, warmup, batch_size, seed, output, baseline, threshold):
+    """Наскрізні бенчмарки на засіяній базі; код виходу 1 при помилці бенчмарку або регресії відносно --baseline."""
+    import json
+    from benchmarks.e2e import compare_results, failed_benchmarks, load_results, run_suite, save_results
+    app = create_app(mode)
+    names = [name.strip() for name in only.split(',') if name.strip()] if only else None
+    try:
+        results = run_suite(app, names=names, num_events=num_events, rounds=rounds, warmup=warmup,
+                            batch_size=batch_size, seed=seed)
+    except Exception as e:
+        logger.error(f"Error running benchmarks: {str(e)}")
+        sys.exit(1)
+    if output:
+        save_results(results, output)
+        logger.info(f"Benchmark results written to {output}")
+    else:
+        click.echo(json.dumps(results, indent=2))
+    if baseline:
+        regressions = compare_results(load_results(baseline), results, threshold=threshold)
+        for regression in regressions:
+            logger.error(f"Regression in {regression['benchmark']} ({regression['metric']}): "
+                         f"{regression['baseline']} -> {regression['current']}")
+        if regressions:
+            sys.exit(1)
+        logger.info(f"No regressions against {baseline} (threshold {threshold:.0%})")
+    failed = failed_benchmarks(results)
+    if failed:
+        for name in failed:
+            logger.error(f"Benchmark {name} failed: {results['benchmarks'][name]['error']}")
+        sys.exit(1)
+
 @cli.command('runserver')
 @click.option('--host', default='0.0.0.0', help='Host to bind to')
 @click.option('--port', default=5000, type=int, help='Port to bind to')
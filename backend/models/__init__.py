@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 
-# Initialize SQLAlchemy object
-db = SQLAlchemy()
+from services.database import RoutingSession
+
+# Initialize SQLAlchemy object (сесія віддає читання read_replica-ендпоінтів репліці)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # Import all models - after they have been created
 from .event import Event
@@ -12,3 +14,10 @@ from .settings import Settings
 from .configuration import Configuration 
 from .export_job import ExportJob
 from .ml import MLPerformanceMetrics
+from .event_features import EventFeatures
+from .reclassification_job import ReclassificationJob
+from .verification_queue import VerificationQueueEntry
+from .event_cluster import EventCluster, EventClusterMember, EventClusterBucket
+from .label_revision import LabelRevision
+from .event_chain_state import OpenEventChain
+from .label_snapshot import LabelSnapshot, LabelCompaction
@@ -7,6 +7,11 @@ class Configuration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     config_data = db.Column(PostgresJSON, default={})
+    # Налаштування розділів (general.*, mitre.*, ml.*, tagging.rules) - рядок на ключ,
+    # їх читає знімок конфігурації (services/config_snapshot.py)
+    config_type = db.Column(db.String(50), nullable=True, index=True)
+    config_value = db.Column(db.Text, nullable=True)
+    description = db.Column(db.String(200), nullable=True)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=db.func.now())
     updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
@@ -4,6 +4,14 @@ from models import db
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        # Частковий індекс: ланцюжок вибирається без повного сканування, keyset-пагінація за id
+        db.Index(
+            'ix_events_event_chain_id',
+            db.text("(labels_data->>'event_chain_id')"), 'id',
+            postgresql_where=db.text("labels_data->>'event_chain_id' IS NOT NULL")
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.String(255), nullable=False, index=True)
@@ -14,6 +22,8 @@ class Event(db.Model):
     manual_review = db.Column(db.Boolean, default=False)
     labels_data = db.Column(PostgresJSON, default={}, nullable=False)
     alert_id = db.Column(db.Integer, db.ForeignKey('alerts.id'), nullable=True)
+    # Час запису в базу (не час SIEM) - межа відтворюваного експорту as_of
+    ingested_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now(), index=True)
     
     # Additional fields 
     attack_type = db.Column(db.String(100), nullable=True)
@@ -0,0 +1,13 @@
+from models import db
+
+class OpenEventChain(db.Model):
+    """Відкритий ланцюжок корелятора подій (див. services/chain_correlation.py)"""
+    __tablename__ = 'open_event_chains'
+    
+    # Хеш назви правила та значень ключів кореляції
+    key_hash = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    rule = db.Column(db.String(100), nullable=False)
+    chain_id = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,29 @@
+from models import db
+
+class EventCluster(db.Model):
+    """Кластер майже однакових подій (див. services/near_duplicates.py)"""
+    __tablename__ = 'event_clusters'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Подія, що класифікується та перевіряється замість усіх членів кластера
+    representative_event_id = db.Column(db.Integer, nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False, default=1)
+    signature = db.Column(db.LargeBinary, nullable=False)  # MinHash представника
+    first_seen = db.Column(db.DateTime, default=db.func.now())
+    last_seen = db.Column(db.DateTime, default=db.func.now())
+
+class EventClusterMember(db.Model):
+    __tablename__ = 'event_cluster_members'
+
+    # Без зовнішнього ключа на events: таблиця може бути секціонованою
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cluster_id = db.Column(db.Integer, db.ForeignKey('event_clusters.id', ondelete='CASCADE'), nullable=False, index=True)
+    similarity = db.Column(db.Float, nullable=False, default=1.0)
+
+class EventClusterBucket(db.Model):
+    """LSH-індекс: хеш смуги MinHash -> кластер"""
+    __tablename__ = 'event_cluster_buckets'
+
+    band = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    cluster_id = db.Column(db.Integer, db.ForeignKey('event_clusters.id', ondelete='CASCADE'), nullable=False, index=True)
@@ -0,0 +1,11 @@
+from models import db
+
+class EventFeatures(db.Model):
+    """Попередньо обчислений хешований вектор ознак події (див. services/feature_store.py)"""
+    __tablename__ = 'event_features'
+    
+    # Без зовнішнього ключа: events може бути секціонованою таблицею з PK (id, timestamp)
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    feature_version = db.Column(db.Integer, nullable=False, index=True)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.now())
@@ -0,0 +1,32 @@
+from datetime import datetime
+from models import db
+
+class LabelRevision(db.Model):
+    __tablename__ = 'label_revisions'
+    __table_args__ = (
+        db.Index('ix_label_revisions_event_id_timestamp', 'event_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Без зовнішнього ключа: events може бути секціонованою таблицею з PK (id, timestamp)
+    event_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    user_id = db.Column(db.String(100), nullable=True)  # ID користувача, який зробив зміни
+    action = db.Column(db.String(20), nullable=False)  # 'create', 'update', 'verify', 'reject'
+    label_key = db.Column(db.String(100), nullable=False)  # Ключ мітки, яка змінилася
+    old_value = db.Column(db.JSON, nullable=True)  # Попереднє значення (якщо було)
+    new_value = db.Column(db.JSON, nullable=True)  # Нове значення
+    source = db.Column(db.String(20), nullable=False)  # 'manual', 'ml', 'rule'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'user_id': self.user_id,
+            'action': self.action,
+            'label_key': self.label_key,
+            'old_value': self.old_value,
+            'new_value': self.new_value,
+            'source': self.source
+        }
@@ -0,0 +1,41 @@
+from sqlalchemy.dialects.postgresql import JSON as PostgresJSON
+from models import db
+
+class LabelSnapshot(db.Model):
+    """Стиснений стан міток події на момент snapshot_at (див. services/label_history.py)"""
+    __tablename__ = 'label_snapshots'
+    __table_args__ = (
+        # Водяний знак ущільнення - max(snapshot_at)
+        db.Index('ix_label_snapshots_snapshot_at', 'snapshot_at'),
+    )
+    
+    # Без зовнішнього ключа: events може бути секціонованою таблицею з PK (id, timestamp)
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    snapshot_at = db.Column(db.DateTime, primary_key=True)
+    labels = db.Column(PostgresJSON, nullable=False)
+    # Кількість записів журналу, згорнутих у цей знімок
+    revisions = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LabelCompaction(db.Model):
+    """Прогін ущільнення журналу міток до cutoff (водяний знак - останній завершений cutoff)"""
+    __tablename__ = 'label_compactions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    events = db.Column(db.Integer, nullable=False, default=0)
+    revisions = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=db.func.now())
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cutoff': self.cutoff.isoformat() if self.cutoff else None,
+            'status': self.status,
+            'events': self.events,
+            'revisions': self.revisions,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,35 @@
+from models import db
+
+class ReclassificationJob(db.Model):
+    """Повторна класифікація корпусу подій новою версією моделі (див. services/reclassification_service.py)"""
+    __tablename__ = 'reclassification_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    model_version = db.Column(db.String(100), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, paused, cancelled, completed, failed
+    filters = db.Column(db.JSON, default={})
+    # Контрольна точка: події обробляються за зростанням events.id
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    completed_at = db.Column(db.DateTime, nullable=True)
+    message = db.Column(db.Text, nullable=True)  # For error messages
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'model_version': self.model_version,
+            'status': self.status,
+            'filters': self.filters or {},
+            'last_event_id': self.last_event_id,
+            'processed': self.processed,
+            'updated': self.updated,
+            'failed': self.failed,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'message': self.message,
+        }
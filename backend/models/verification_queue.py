@@ -0,0 +1,20 @@
+from models import db
+
+class VerificationQueueEntry(db.Model):
+    """Пріоритет неперевіреної події в черзі верифікації (див. services/active_learning.py)"""
+    __tablename__ = 'verification_queue'
+    __table_args__ = (
+        # Наступні N подій - це index scan за спаданням пріоритету
+        db.Index('ix_verification_queue_priority', db.text('priority DESC')),
+    )
+
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    priority = db.Column(db.Float, nullable=False)
+    uncertainty = db.Column(db.Float, nullable=False, default=0.0)
+    disagreement = db.Column(db.Float, nullable=False, default=0.0)
+    rarity = db.Column(db.Float, nullable=False, default=0.0)
+    cluster = db.Column(db.Integer, nullable=False, default=0)
+    predicted_class = db.Column(db.String(100), nullable=True)
+    # Подію видано аналітику; інші не отримують її до закінчення оренди
+    leased_until = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
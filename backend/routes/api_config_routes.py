@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from models import db, Settings
 from services.siem_service import SIEMService
+from services.config_snapshot import bump_config_version, invalidate_config_snapshot
 import traceback
 
 api_config_bp = Blueprint('api_config_bp', __name__)
@@ -40,7 +41,9 @@ def update_config():
         config.ml_api_key = data["ml_api_key"]
 
     db.session.add(config)
+    bump_config_version()
     db.session.commit()
+    invalidate_config_snapshot()
     return jsonify({"message": "Config updated successfully"})
 
 @api_config_bp.route('/api/config/test-connection', methods=['POST'])
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
 from sqlalchemy.exc import SQLAlchemyError
 from models import db, Event
+from services.label_history import event_labels, record_revisions
+from services.labeling_service import COLUMN_LABELS
 import logging
 from datetime import datetime  # Додаємо імпорт datetime для можливих майбутніх розширень
 
@@ -62,21 +64,26 @@ def batch_label_events():
         events = query.all()
         
         for event in events:
-            if not event.labels_data:
-                event.labels_data = {}
+            before = event_labels(event)
+            # Новий словник: зміни вкладеного JSON на місці ORM не відстежує
+            event_labels_data = dict(event.labels_data or {})
                 
             # Оновлюємо мітки
             for key, value in labels.items():
                 if key == 'manual_tags' and isinstance(value, list):
                     # Додаємо нові теги до існуючих
-                    current_tags = event.manual_tags
+                    current_tags = list(event_labels_data.get('manual_tags') or [])
                     for tag in value:
                         if tag not in current_tags:
                             current_tags.append(tag)
-                    event.manual_tags = current_tags
+                    event_labels_data['manual_tags'] = current_tags
                 else:
-                    event.labels_data[key] = value
+                    event_labels_data[key] = value
+                    if key in COLUMN_LABELS:
+                        setattr(event, key, value)
             
+            event.labels_data = event_labels_data
+            record_revisions(event.id, before, event_labels(event), 'update', 'manual', user_id=data.get('user_id'))
             event.manual_review = True
             db.session.add(event)
             updated_count += 1
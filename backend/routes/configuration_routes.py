@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app
 from models import db, Configuration
+from services.config_snapshot import bump_config_version, get_config_snapshot, invalidate_config_snapshot
+from services.rule_engine import CompiledRuleSet, RuleCompileError, load_rules
 import json
 import os
 
@@ -8,93 +10,8 @@ configuration_bp = Blueprint('configuration_bp', __name__)
 @configuration_bp.route('/api/system-config', methods=['GET'])
 def get_system_config():
     # Returns data from Configuration model
-    # Get all configuration items grouped by type
-    config_items = Configuration.query.all()
-    
-    result = {
-        "general": {},
-        "mitre": {},
-        "export": {}
-    }
-    
-    for item in config_items:
-        # Determine which section this config item belongs to
-        if item.config_type.startswith('general.'):
-            key = item.config_type.replace('general.', '')
-            try:
-                # Handle boolean values
-                if item.config_value.lower() == 'true':
-                    result["general"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["general"][key] = False
-                # Handle numeric values
-                elif item.config_value.isdigit():
-                    result["general"][key] = int(item.config_value)
-                # Handle JSON values
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["general"][key] = json.loads(item.config_value)
-                else:
-                    result["general"][key] = item.config_value
-            except:
-                result["general"][key] = item.config_value
-                
-        elif item.config_type.startswith('mitre.'):
-            key = item.config_type.replace('mitre.', '')
-            try:
-                if item.config_value.lower() == 'true':
-                    result["mitre"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["mitre"][key] = False
-                elif item.config_value.isdigit():
-                    result["mitre"][key] = int(item.config_value)
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["mitre"][key] = json.loads(item.config_value)
-                else:
-                    result["mitre"][key] = item.config_value
-            except:
-                result["mitre"][key] = item.config_value
-                
-        elif item.config_type.startswith('export.'):
-            key = item.config_type.replace('export.', '')
-            try:
-                if item.config_value.lower() == 'true':
-                    result["export"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["export"][key] = False
-                elif item.config_value.isdigit():
-                    result["export"][key] = int(item.config_value)
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["export"][key] = json.loads(item.config_value)
-                else:
-                    result["export"][key] = item.config_value
-            except:
-                result["export"][key] = item.config_value
-    
-    # Fill in defaults for any missing configuration
-    if 'data_retention_days' not in result["general"]:
-        result["general"]["data_retention_days"] = 90
-    if 'auto_tagging_enabled' not in result["general"]:
-        result["general"]["auto_tagging_enabled"] = True
-    if 'ml_classification_enabled' not in result["general"]:
-        result["general"]["ml_classification_enabled"] = True
-    if 'refresh_interval_minutes' not in result["general"]:
-        result["general"]["refresh_interval_minutes"] = 30
-        
-    if 'mitre_version' not in result["mitre"]:
-        result["mitre"]["mitre_version"] = 'v10'
-    if 'use_custom_mappings' not in result["mitre"]:
-        result["mitre"]["use_custom_mappings"] = False
-    if 'custom_mappings_path' not in result["mitre"]:
-        result["mitre"]["custom_mappings_path"] = ''
-        
-    if 'default_export_format' not in result["export"]:
-        result["export"]["default_export_format"] = 'csv'
-    if 'include_raw_logs' not in result["export"]:
-        result["export"]["include_raw_logs"] = False
-    if 'max_records_per_export' not in result["export"]:
-        result["export"]["max_records_per_export"] = 5000
-    
-    return jsonify(result)
+    # Значення розібрані й доповнені за замовчуванням один раз у знімку конфігурації
+    return jsonify(get_config_snapshot().system_config())
 
 @configuration_bp.route('/api/system-config', methods=['POST'])
 def update_system_config():
@@ -180,7 +97,10 @@ def update_system_config():
                     )
                     db.session.add(new_config)
         
+        # Лічильник версії та NOTIFY для інших процесів - у тій самій транзакції
+        bump_config_version()
         db.session.commit()
+        invalidate_config_snapshot()
         return jsonify({"message": "Configuration updated successfully"})
     
     except Exception as e:
@@ -190,97 +110,52 @@ def update_system_config():
 @configuration_bp.route('/config', methods=['GET'])
 def get_configuration():
     # Returns data from Configuration model
-    # Get all configuration items grouped by type
-    config_items = Configuration.query.all()
+    return jsonify(get_config_snapshot().system_config())
+
+@configuration_bp.route('/api/tagging-rules', methods=['GET'])
+def get_tagging_rules():
+    """Отримати правила автоматичного маркування"""
+    return jsonify({"rules": load_rules()})
+
+@configuration_bp.route('/api/tagging-rules', methods=['POST'])
+def update_tagging_rules():
+    """
+    Зберегти правила автоматичного маркування.
+    Правила компілюються перед збереженням, тому некоректні правила не потрапляють у конфігурацію.
+    """
+    data = request.json
     
-    result = {
-        "general": {},
-        "mitre": {},
-        "export": {}
-    }
+    if not data or not isinstance(data.get("rules"), list):
+        return jsonify({"error": "Field 'rules' must be a list"}), 400
     
-    for item in config_items:
-        # Determine which section this config item belongs to
-        if item.config_type.startswith('general.'):
-            key = item.config_type.replace('general.', '')
-            try:
-                # Handle boolean values
-                if item.config_value.lower() == 'true':
-                    result["general"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["general"][key] = False
-                # Handle numeric values
-                elif item.config_value.isdigit():
-                    result["general"][key] = int(item.config_value)
-                # Handle JSON values
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["general"][key] = json.loads(item.config_value)
-                else:
-                    result["general"][key] = item.config_value
-            except:
-                result["general"][key] = item.config_value
-                
-        elif item.config_type.startswith('mitre.'):
-            key = item.config_type.replace('mitre.', '')
-            try:
-                if item.config_value.lower() == 'true':
-                    result["mitre"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["mitre"][key] = False
-                elif item.config_value.isdigit():
-                    result["mitre"][key] = int(item.config_value)
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["mitre"][key] = json.loads(item.config_value)
-                else:
-                    result["mitre"][key] = item.config_value
-            except:
-                result["mitre"][key] = item.config_value
-                
-        elif item.config_type.startswith('export.'):
-            key = item.config_type.replace('export.', '')
-            try:
-                if item.config_value.lower() == 'true':
-                    result["export"][key] = True
-                elif item.config_value.lower() == 'false':
-                    result["export"][key] = False
-                elif item.config_value.isdigit():
-                    result["export"][key] = int(item.config_value)
-                elif item.config_value.startswith('{') or item.config_value.startswith('['):
-                    result["export"][key] = json.loads(item.config_value)
-                else:
-                    result["export"][key] = item.config_value
-            except:
-                result["export"][key] = item.config_value
+    try:
+        compiled = CompiledRuleSet(data["rules"])
+    except RuleCompileError as e:
+        return jsonify({"error": f"Invalid rules: {str(e)}"}), 400
     
-    # Fill in defaults for any missing configuration
-    if 'data_retention_days' not in result["general"]:
-        result["general"]["data_retention_days"] = 90
-    if 'auto_tagging_enabled' not in result["general"]:
-        result["general"]["auto_tagging_enabled"] = True
-    if 'ml_classification_enabled' not in result["general"]:
-        result["general"]["ml_classification_enabled"] = True
-    if 'refresh_interval_minutes' not in result["general"]:
-        result["general"]["refresh_interval_minutes"] = 30
+    try:
+        config_item = Configuration.query.filter_by(config_type='tagging.rules').first()
+        config_value = json.dumps(data["rules"])
         
-    if 'mitre_version' not in result["mitre"]:
-        result["mitre"]["mitre_version"] = 'v10'
-    if 'use_custom_mappings' not in result["mitre"]:
-        result["mitre"]["use_custom_mappings"] = False
-    if 'custom_mappings_path' not in result["mitre"]:
-        result["mitre"]["custom_mappings_path"] = ''
+        if config_item:
+            config_item.config_value = config_value
+        else:
+            new_config = Configuration(
+                name='tagging_rules',
+                config_type='tagging.rules',
+                config_value=config_value,
+                description="Auto-tagging rules"
+            )
+            db.session.add(new_config)
         
-    if 'default_export_format' not in result["export"]:
-        result["export"]["default_export_format"] = 'csv'
-    if 'include_raw_logs' not in result["export"]:
-        result["export"]["include_raw_logs"] = False
-    if 'max_records_per_export' not in result["export"]:
-        result["export"]["max_records_per_export"] = 5000
-    
-    # Переконатись, що demo_mode_enabled включено у відповідь
-    config_data = result
-    if 'general' not in config_data:
-        config_data['general'] = {}
-    if 'demo_mode_enabled' not in config_data['general']:
-        config_data['general']['demo_mode_enabled'] = False
-    
-    return jsonify(config_data)
+        bump_config_version()
+        db.session.commit()
+        invalidate_config_snapshot()
+        return jsonify({
+            "message": "Tagging rules updated successfully",
+            "rules_count": len(compiled.rules)
+        })
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error updating tagging rules: {str(e)}")
+        return jsonify({"error": f"Error updating tagging rules: {str(e)}"}), 500
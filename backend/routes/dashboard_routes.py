@@ -5,10 +5,12 @@ from datetime import datetime, timedelta
 import json
 from sqlalchemy.engine import Engine
 from sqlalchemy.dialects import postgresql
+from services.database import read_replica
 
 dashboard_bp = Blueprint('dashboard_bp', __name__)
 
 @dashboard_bp.route('/api/dashboard/stats', methods=['GET'])
+@read_replica
 def get_dashboard_stats():
     """Отримання загальної статистики для дашборду"""
     # Загальна кількість подій
@@ -22,9 +24,10 @@ def get_dashboard_stats():
     reviewed_events = Event.query.filter(Event.manual_review == True).count()
     unreviewed_events = total_events - reviewed_events
     
-    # Кількість true positive/negative подій
-    true_positives = Event.query.filter(Event.true_positive == True).count()
-    false_positives = Event.query.filter(Event.true_positive == False).count()
+    # Кількість true positive/negative подій (мітка зберігається в labels_data)
+    true_positive = Event.labels_data['true_positive'].as_boolean()
+    true_positives = Event.query.filter(true_positive == True).count()
+    false_positives = Event.query.filter(true_positive == False).count()
     
     # Кількість подій за різними SIEM-системами
     siem_stats = db.session.query(
@@ -44,6 +47,7 @@ def get_dashboard_stats():
     })
 
 @dashboard_bp.route('/api/dashboard/top-attacks', methods=['GET'])
+@read_replica
 def get_top_attacks():
     """Отримання топ типів атак"""
     limit = int(request.args.get('limit', 5))
@@ -60,6 +64,7 @@ def get_top_attacks():
     ])
 
 @dashboard_bp.route('/api/dashboard/timeline', methods=['GET'])
+@read_replica
 def get_event_timeline():
     """Отримання даних для часової шкали подій"""
     days = int(request.args.get('days', 30))
@@ -93,6 +98,7 @@ def get_event_timeline():
     ])
 
 @dashboard_bp.route('/api/dashboard/severity', methods=['GET'])
+@read_replica
 def get_severity_distribution():
     """Отримання розподілу подій за рівнем важливості"""
     # Отримуємо кількість подій для кожного рівня важливості
@@ -115,6 +121,7 @@ def get_severity_distribution():
 # Оновлена функція для обох маршрутів
 @dashboard_bp.route('/api/dashboard/mitre-distribution', methods=['GET'])
 @dashboard_bp.route('/mitre-distribution', methods=['GET'])
+@read_replica
 def get_mitre_distribution():
     """Отримання розподілу подій за MITRE тактиками та техніками"""
     try:
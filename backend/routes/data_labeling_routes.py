@@ -7,7 +7,17 @@ import pandas as pd
 import io
 import json
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from services.database import read_replica
+from services.label_history import labels_as_of, stable_horizon
+from services.labeling_service import LabelingError, assign_chain, chain_events, label_chain, label_cluster
+from services.metrics import observe_export
+from services.rule_engine import get_rule_engine
+
+# Кількість подій на один запит відновлення міток під час експорту "станом на"
+AS_OF_BATCH_SIZE = 5000
 
 # Створюємо Blueprint для маршрутів маркування даних
 data_labeling_bp = Blueprint('data_labeling_bp', __name__)
@@ -31,25 +41,18 @@ def auto_tag_alerts():
         if response.status_code == 200:
             logs = response.json().get("data", [])
             
+            # Авто-теги за скомпільованими правилами, одним пакетом для всіх логів
+            tagging_results = get_rule_engine().label_batch(logs)
+            
             # Почнемо транзакцію
             try:
-                for log_data in logs:
-                    severity = log_data.get("severity", "")
-                    rule_name = log_data.get("rule_name", "")
-
-                    # Авто-теги за умовою
-                    auto_tags_list = []
-                    if severity.lower() in ("medium", "high"):
-                        auto_tags_list.append("potential_threat")
-                    if "brute" in rule_name.lower():
-                        auto_tags_list.append("brute_force")
-
+                for log_data, tagging in zip(logs, tagging_results):
                     # Створити чи оновити запис
                     new_alert = Alert(
                         message = log_data.get("message", ""),
-                        severity = severity,
-                        rule_name = rule_name,
-                        auto_tags = ",".join(auto_tags_list)
+                        severity = log_data.get("severity", ""),
+                        rule_name = log_data.get("rule_name", ""),
+                        auto_tags = ",".join(tagging["tags"])
                     )
                     db.session.add(new_alert)
                 
@@ -191,17 +194,47 @@ def label_alert(alert_id):
 
 # 3. Експорт датасету
 @data_labeling_bp.route('/api/dataset/export', methods=['GET'])
+@read_replica
 def export_dataset():
     """
     Експортує датасет у форматі CSV.
     
+    Query:
+        limit: Максимальна кількість подій
+        as_of: Відтворюваний експорт - події, записані в базу до цього моменту, з мітками
+               станом на нього (ISO 8601, без зсуву - UTC; не пізніше stable_horizon())
+    
     Returns:
         File: CSV файл з даними подій
     """
     try:
+        started = time.perf_counter()
         # Додаємо можливість обмеження розміру вибірки
         limit = request.args.get('limit', type=int)
+        as_of = request.args.get('as_of')
+        try:
+            as_of = datetime.fromisoformat(as_of) if as_of else None
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid as_of, expected ISO 8601"}), 400
+        if as_of and as_of.tzinfo is not None:
+            # Журнал міток зберігає час у UTC без зсуву
+            as_of = as_of.astimezone(timezone.utc).replace(tzinfo=None)
+        if as_of:
+            horizon = stable_horizon()
+            if as_of > horizon:
+                # Записи ще відкритих транзакцій зі штампом до as_of змінили б повторний експорт
+                return jsonify({"status": "error",
+                                "message": f"as_of must not be later than {horizon.isoformat()}"}), 400
+        
+        if as_of:
+            # Один MVCC-знімок на весь експорт: читання не блокує інгестію та маркування
+            db.session.commit()
+            db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+        
         query = Event.query
+        if as_of:
+            # Час запису, а не час SIEM: пізно завантажені старі події не змінюють експорт
+            query = query.filter(Event.ingested_at <= as_of.replace(tzinfo=timezone.utc)).order_by(Event.id)
         
         if limit:
             query = query.limit(limit)
@@ -209,19 +242,24 @@ def export_dataset():
         events = query.all()
         if not events:
             return jsonify({"message": "No events found to export"}), 404
+        
+        historical = {}
+        if as_of:
+            for start in range(0, len(events), AS_OF_BATCH_SIZE):
+                historical.update(labels_as_of([event.id for event in events[start:start + AS_OF_BATCH_SIZE]], as_of))
             
         dataset = []
 
         for event in events:
             raw_log = RawLog.query.filter_by(event_id=event.id).first()
-            raw_log_data = raw_log.raw_log if raw_log else {}
+            raw_log_data = raw_log.log_data if raw_log else {}
             dataset.append({
                 "event_id": event.event_id,
                 "timestamp": event.timestamp.isoformat() if event.timestamp else None,
                 "source_ip": event.source_ip,
                 "severity": event.severity,
                 "siem_source": event.siem_source,
-                "labels": event.labels_data,  # Виправлено з event.labels на event.labels_data
+                "labels": historical.get(event.id, {}) if as_of else event.labels_data,
                 "raw_log": raw_log_data
             })
 
@@ -229,6 +267,7 @@ def export_dataset():
         buffer = io.BytesIO()
         df.to_csv(buffer, index=False)
         buffer.seek(0)
+        observe_export('csv', len(events), time.perf_counter() - started)
 
         return send_file(buffer, mimetype='text/csv', 
                          download_name=f'dataset_{len(events)}_events.csv', 
@@ -246,6 +285,8 @@ def create_event_chain():
     """
     Об'єднує кілька подій в один ланцюжок подій.
     
+    Усі події оновлюються однією SQL-інструкцією разом із записами LabelRevision.
+    
     Returns:
         JSON: Повідомлення про успіх або помилку
     """
@@ -262,29 +303,22 @@ def create_event_chain():
         if not event_chain_id:
             return jsonify({"message": "Event chain ID is required"}), 400
 
-        # Перевірка існування всіх подій перед оновленням
-        events = Event.query.filter(Event.id.in_(event_ids)).all()
-        
-        found_ids = [event.id for event in events]
-        missing_ids = [str(event_id) for event_id in event_ids if event_id not in found_ids]
-        
-        if missing_ids:
+        result = assign_chain(event_ids, event_chain_id, user_id=data.get('user_id'))
+        if result["missing_ids"]:
             return jsonify({
                 "message": "Some events were not found", 
-                "missing_ids": missing_ids
+                "missing_ids": [str(event_id) for event_id in result["missing_ids"]]
             }), 404
 
-        # Оновлення всіх подій в одній транзакції
-        for event in events:
-            event.event_chain_id = event_chain_id
-            
-        # Один commit для всіх оновлень
         db.session.commit()
         
         return jsonify({
             "message": "Event Chain created successfully",
-            "updated_events": len(events)
+            "updated_events": result["updated_events"],
+            "revisions": result["revisions"]
         })
+    except (LabelingError, ValueError, TypeError) as e:
+        return jsonify({"message": str(e)}), 400
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"Database error in create_event_chain: {str(e)}")
@@ -293,3 +327,72 @@ def create_event_chain():
         current_app.logger.error(f"Error creating event chain: {str(e)}")
         return jsonify({"message": "Error creating event chain", "detail": str(e)}), 500
 
+@data_labeling_bp.route('/api/event_chain/<chain_id>', methods=['GET'])
+def get_event_chain(chain_id):
+    """
+    Повертає події ланцюжка посторінково (курсор - id останньої події сторінки).
+    
+    Query params:
+        after: Курсор попередньої сторінки
+        limit: Розмір сторінки (до 5000)
+    
+    Returns:
+        JSON: Події ланцюжка та курсор наступної сторінки
+    """
+    try:
+        after = request.args.get('after', 0, type=int)
+        limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+        events, next_cursor = chain_events(chain_id, after_id=after, limit=limit)
+        return jsonify({"event_chain_id": chain_id, "events": events, "next_cursor": next_cursor})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in get_event_chain: {str(e)}")
+        return jsonify({"message": "Database error", "detail": str(e)}), 500
+
+def _apply_group_labels(label_group, group_id, **kwargs):
+    """Спільна обробка запитів групового маркування"""
+    data = request.json
+    if not data:
+        return jsonify({"message": "No data provided"}), 400
+    try:
+        result = label_group(
+            group_id,
+            data.get('labels'),
+            user_id=data.get('user_id'),
+            source=data.get('source', 'manual'),
+            verify=bool(data.get('verify', False)),
+            **kwargs
+        )
+        db.session.commit()
+        return jsonify(dict(result, message="Labels applied successfully"))
+    except LabelingError as e:
+        return jsonify({"message": str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error applying group labels: {str(e)}")
+        return jsonify({"message": "Database error", "detail": str(e)}), 500
+
+@data_labeling_bp.route('/api/event_chain/<chain_id>/labels', methods=['POST'])
+def label_event_chain(chain_id):
+    """
+    Застосовує мітки до всіх подій ланцюжка однією SQL-інструкцією.
+    
+    Тіло запиту: {"labels": {...}, "user_id": "...", "source": "manual", "verify": false,
+    "include_duplicates": false}
+    
+    Returns:
+        JSON: Кількість оновлених подій та записів журналу змін
+    """
+    include_duplicates = bool((request.get_json(silent=True) or {}).get('include_duplicates', False))
+    return _apply_group_labels(label_chain, chain_id, include_duplicates=include_duplicates)
+
+@data_labeling_bp.route('/api/event_clusters/<int:cluster_id>/labels', methods=['POST'])
+def label_event_cluster(cluster_id):
+    """
+    Застосовує мітки до всіх членів кластера майже однакових подій.
+    
+    Returns:
+        JSON: Кількість оновлених подій та записів журналу змін
+    """
+    return _apply_group_labels(label_cluster, cluster_id)
+
@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request, current_app
-from models import db, Event, RawLog
+from models import db, Event, RawLog, EventCluster, EventClusterMember
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
+from services.label_history import event_revisions, labels_as_of
 
 events_bp = Blueprint('events', __name__)
 
@@ -15,10 +16,42 @@ def get_events():
         # Query with basic filters
         query = Event.query
         
+        # Time range filters on the partition key allow partition pruning
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        try:
+            if date_from:
+                query = query.filter(Event.timestamp >= datetime.fromisoformat(date_from))
+            if date_to:
+                query = query.filter(Event.timestamp <= datetime.fromisoformat(date_to))
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid date format, expected ISO 8601"}), 400
+        
+        # Майже однакові події показуються одним представником кластера
+        collapse = request.args.get('collapse_duplicates', 'false').lower() == 'true'
+        if collapse:
+            duplicates = db.session.query(EventClusterMember.event_id).join(
+                EventCluster, EventCluster.id == EventClusterMember.cluster_id
+            ).filter(EventCluster.representative_event_id != EventClusterMember.event_id)
+            query = query.filter(~Event.id.in_(duplicates))
+        
+        query = query.order_by(Event.timestamp.desc())
+        
         # Apply pagination
         pagination = query.paginate(page=page, per_page=page_size)
         events = pagination.items
         
+        clusters = {}
+        if events:
+            clusters = {
+                row.event_id: (row.cluster_id, row.size)
+                for row in db.session.query(
+                    EventClusterMember.event_id, EventClusterMember.cluster_id, EventCluster.size
+                ).join(EventCluster, EventCluster.id == EventClusterMember.cluster_id).filter(
+                    EventClusterMember.event_id.in_([event.id for event in events])
+                )
+            }
+        
         # Format response
         events_data = []
         for event in events:
@@ -30,7 +63,9 @@ def get_events():
                 "severity": event.severity,
                 "siem_source": event.siem_source,
                 "manual_review": event.manual_review,
-                "labels": event.labels
+                "labels": event.labels,
+                "duplicate_cluster_id": clusters.get(event.id, (None, 1))[0],
+                "duplicate_count": clusters.get(event.id, (None, 1))[1]
             })
         
         response = {
@@ -45,3 +80,35 @@ def get_events():
     except Exception as e:
         current_app.logger.error(f"Error in get_events: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
+
+@events_bp.route('/api/events/<int:event_id>/labels', methods=['GET'])
+def get_event_labels(event_id):
+    """Мітки події зараз або станом на момент as_of (ISO 8601) з журналу змін"""
+    try:
+        as_of = request.args.get('as_of')
+        try:
+            as_of = datetime.fromisoformat(as_of) if as_of else datetime.utcnow()
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid as_of, expected ISO 8601"}), 400
+        
+        labels = labels_as_of([event_id], as_of).get(event_id)
+        if labels is None:
+            return jsonify({"status": "error", "message": "Event not found"}), 404
+        return jsonify({"event_id": event_id, "as_of": as_of.isoformat(), "labels": labels})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in get_event_labels: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@events_bp.route('/api/events/<int:event_id>/revisions', methods=['GET'])
+def get_event_revisions(event_id):
+    """Журнал змін міток події (keyset-пагінація за after_id)"""
+    try:
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        revisions, next_cursor = event_revisions(event_id, after_id=after_id, limit=limit)
+        return jsonify({"event_id": event_id, "revisions": revisions, "next_after_id": next_cursor})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in get_event_revisions: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
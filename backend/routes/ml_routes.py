@@ -1,8 +1,15 @@
 import json
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
-from models import db, Event, MLPerformanceMetrics, Settings, Configuration
-from services.ml_service import MLService
+from models import db, Event, MLPerformanceMetrics, ReclassificationJob
+from services.ml_registry import get_ml_service
+from services.config_snapshot import get_config_snapshot
+from services.database import read_replica
+from services.active_learning import dequeue_events, next_events, queue_size, rebuild_queue
+from services.label_history import event_labels, record_revisions
+from services.labeling_service import LabelingError, bulk_verify, parse_verdicts
+from services.near_duplicates import cluster_member_ids, propagate_labels
+from services.reclassification_service import create_job, model_version_of, run_job_async
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import joinedload
 import pandas as pd
@@ -21,15 +28,15 @@ def get_ml_status():
         JSON: Статус ML-сервісу
     """
     try:
-        # Отримуємо налаштування
-        settings = Settings.query.first()
+        # Налаштування беруться зі знімка конфігурації без запитів до БД
+        snapshot = get_config_snapshot()
+        settings = snapshot.settings
         
         if not settings:
             return jsonify({"status": "error", "message": "Settings not found"}), 404
         
         # Перевіряємо чи увімкнено ML-класифікацію
-        ml_config = Configuration.query.filter_by(config_type="general.ml_classification_enabled").first()
-        ml_enabled = ml_config.config_value.lower() == "true" if ml_config else False
+        ml_enabled = snapshot.get_bool("general.ml_classification_enabled", False)
         
         # Якщо ML вимкнено, повертаємо відповідний статус
         if not ml_enabled:
@@ -38,8 +45,8 @@ def get_ml_status():
                 "message": "ML classification is disabled in system settings"
             })
         
-        # Ініціалізуємо ML-сервіс
-        ml_service = MLService(settings.ml_api_url, settings.ml_api_key)
+        # Теплий ML-сервіс процесу (провайдер і модель вже ініціалізовані)
+        ml_service = get_ml_service()
         
         # Перевіряємо з'єднання
         connection_test = ml_service.test_connection()
@@ -88,21 +95,21 @@ def classify_event(event_id):
         # Отримуємо подію з використанням eager loading для оптимізації запитів
         event = Event.query.options(joinedload(Event.raw_logs)).get_or_404(event_id)
         
-        # Отримуємо налаштування
-        settings = Settings.query.first()
+        # Налаштування беруться зі знімка конфігурації без запитів до БД
+        snapshot = get_config_snapshot()
+        settings = snapshot.settings
         
         if not settings:
             return jsonify({"success": False, "message": "Settings not found"}), 404
         
         # Перевіряємо чи увімкнено ML-класифікацію
-        ml_config = Configuration.query.filter_by(config_type="general.ml_classification_enabled").first()
-        ml_enabled = ml_config and ml_config.config_value.lower() == "true"
+        ml_enabled = snapshot.get_bool("general.ml_classification_enabled", False)
         
         if not ml_enabled:
             return jsonify({"success": False, "message": "ML classification is disabled in system settings"}), 400
             
-        # Ініціалізуємо ML-сервіс
-        ml_service = MLService(settings.ml_api_url, settings.ml_api_key)
+        # Теплий ML-сервіс процесу (провайдер і модель вже ініціалізовані)
+        ml_service = get_ml_service()
         
         # Класифікуємо подію
         result = ml_service.classify_event(event)
@@ -141,20 +148,20 @@ def batch_classify_events():
         if not all(isinstance(id, int) for id in event_ids):
             return jsonify({"success": False, "message": "All event IDs must be integers"}), 400
         
-        # Отримуємо налаштування
-        settings = Settings.query.first()
+        # Налаштування беруться зі знімка конфігурації без запитів до БД
+        snapshot = get_config_snapshot()
+        settings = snapshot.settings
         
         if not settings:
             return jsonify({"success": False, "message": "Settings not found"}), 404
         
         # Перевіряємо налаштування ML
-        ml_config = Configuration.query.filter_by(config_type="general.ml_classification_enabled").first()
-        if not ml_config or ml_config.config_value.lower() != "true":
+        if not snapshot.get_bool("general.ml_classification_enabled", False):
             return jsonify({"success": False, "message": "ML classification is disabled in system settings"}), 400
         
-        # Ініціалізуємо ML-сервіс
+        # Теплий ML-сервіс процесу (провайдер і модель вже ініціалізовані)
         try:
-            ml_service = MLService(settings.ml_api_url, settings.ml_api_key)
+            ml_service = get_ml_service()
         except Exception as e:
             current_app.logger.error(f"Failed to initialize ML service: {str(e)}")
             return jsonify({"success": False, "message": f"Failed to initialize ML service: {str(e)}"}), 500
@@ -197,48 +204,51 @@ def verify_label(event_id):
         event = Event.query.get_or_404(event_id)
         
         # Перевіряємо, чи була подія оброблена ML
-        if not event.ml_processed or not hasattr(event, 'labels_data') or event.labels_data is None:
+        if not event.labels_data or not event.labels_data.get('ml_processed'):
             return jsonify({
                 "success": False,
                 "message": "Event was not properly processed by ML or lacks required data"
             }), 400
         
-        # Оновлюємо поле human_verified
-        event.human_verified = True
+        before = event_labels(event)
+        # Новий словник: зміни вкладеного JSON на місці ORM не відстежує
+        labels = dict(event.labels_data or {})
         
-        # Зберігаємо оригінальні ML-мітки для порівняння
-        if not event.labels_data:
-            event.labels_data = {}
+        # Оновлюємо поле human_verified
+        labels['human_verified'] = True
         
         # Зберігаємо оригінальні ML-мітки з префіксом ml_ для подальшого аналізу
-        event.labels_data['ml_true_positive'] = event.true_positive
-        event.labels_data['ml_attack_type'] = event.attack_type
-        event.labels_data['ml_mitre_tactic'] = event.mitre_tactic
-        event.labels_data['ml_mitre_technique'] = event.mitre_technique
+        labels['ml_true_positive'] = labels.get('true_positive')
+        labels['ml_attack_type'] = before.get('attack_type')
+        labels['ml_mitre_tactic'] = before.get('mitre_tactic')
+        labels['ml_mitre_technique'] = before.get('mitre_technique')
         
         # Оновлюємо мітки на основі вхідних даних
         if 'true_positive' in data:
-            event.true_positive = data['true_positive']
-        if 'attack_type' in data:
-            event.attack_type = data['attack_type']
-        if 'mitre_tactic' in data:
-            event.mitre_tactic = data['mitre_tactic']
-        if 'mitre_technique' in data:
-            event.mitre_technique = data['mitre_technique']
+            labels['true_positive'] = data['true_positive']
+        for field in ('attack_type', 'mitre_tactic', 'mitre_technique'):
+            if field in data:
+                labels[field] = data[field]
+                setattr(event, field, data[field])
         
         # Додаємо коментар верифікації
         if 'verification_comment' in data:
-            event.labels_data['verification_comment'] = data['verification_comment']
+            labels['verification_comment'] = data['verification_comment']
         
         # Оновлюємо час верифікації
-        event.labels_data['verification_timestamp'] = datetime.utcnow().isoformat()
+        labels['verification_timestamp'] = datetime.utcnow().isoformat()
+        event.labels_data = labels
+        record_revisions(event.id, before, event_labels(event), 'verify', 'manual', user_id=data.get('user_id'))
         
+        # Перевірка представника застосовується до всього кластера майже однакових подій
+        propagate_labels([event.id], verified=True, user_id=data.get('user_id'))
+        dequeue_events(cluster_member_ids([event.id]) or [event.id])
         db.session.commit()
         
         return jsonify({
             "success": True,
             "message": "Event label verified successfully",
-            "event": event.to_dict()
+            "event": {"id": event.id, "event_id": event.event_id, "labels": event_labels(event)}
         })
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -248,6 +258,42 @@ def verify_label(event_id):
         current_app.logger.error(f"Error in verify_label: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@ml_bp.route('/api/ml/verify-labels', methods=['POST'])
+def bulk_verify_labels():
+    """
+    Масова верифікація ML-міток за один запит
+    
+    Body:
+        {"verdicts": [{"event_id": 1, "true_positive": true, "attack_type": "...", ...}], "user_id": "..."}
+        або {"event_ids": [1, 2, ...], <спільні поля вердикту>}
+        
+    Returns:
+        JSON: Кількість перевірених подій і записів журналу, ID пропущених подій
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"success": False, "message": "No data provided"}), 400
+        verdicts = parse_verdicts(
+            {key: value for key, value in data.items() if key != 'user_id'},
+            max_events=current_app.config.get('BULK_VERIFY_MAX_EVENTS')
+        )
+        result = bulk_verify(verdicts, user_id=data.get('user_id'))
+        db.session.commit()
+        
+        return jsonify(dict(result, success=True,
+                            message=f"{result['verified_events']} events verified successfully"))
+    except LabelingError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in bulk_verify_labels: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in bulk_verify_labels: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @ml_bp.route('/api/ml/update-metrics', methods=['POST'])
 def update_metrics():
     """
@@ -264,13 +310,13 @@ def update_metrics():
         end_date = data.get('end_date')
         
         # Отримуємо налаштування
-        settings = Settings.query.first()
+        settings = get_config_snapshot().settings
         
         if not settings:
             return jsonify({"success": False, "message": "Settings not found"}), 404
         
-        # Ініціалізуємо ML-сервіс
-        ml_service = MLService(settings.ml_api_url, settings.ml_api_key)
+        # Теплий ML-сервіс процесу (провайдер і модель вже ініціалізовані)
+        ml_service = get_ml_service()
         
         # Оновлюємо метрики
         result = ml_service.update_performance_metrics(start_date, end_date)
@@ -285,6 +331,7 @@ def update_metrics():
         return jsonify({"success": False, "message": str(e)}), 500
 
 @ml_bp.route('/api/ml/metrics', methods=['GET'])
+@read_replica
 def get_metrics():
     """
     Отримати метрики продуктивності ML
@@ -342,6 +389,9 @@ def get_unverified_events():
     """
     Отримати список подій, класифікованих ML, але не перевірених людиною
     
+    Query params:
+        order: 'priority' (за замовчуванням, найінформативніші першими) або 'timestamp'
+    
     Returns:
         JSON: Список неперевірених подій
     """
@@ -349,6 +399,22 @@ def get_unverified_events():
         # Параметри пагінації
         page = request.args.get('page', 1, type=int)
         page_size = request.args.get('page_size', 50, type=int)
+        order = request.args.get('order', 'priority')
+        
+        # Черга активного навчання; якщо вона ще не побудована - звичайний порядок за часом
+        if order == 'priority':
+            total = queue_size()
+            if total:
+                events_data = next_events(limit=page_size, offset=(max(page, 1) - 1) * page_size)
+                return jsonify({
+                    "success": True,
+                    "events": events_data,
+                    "order": "priority",
+                    "page": page,
+                    "page_size": page_size,
+                    "total": total,
+                    "total_pages": (total + page_size - 1) // page_size
+                })
         
         # Базовий запит для подій, що були оброблені ML, але не перевірені людиною
         query = Event.query.filter(
@@ -365,6 +431,7 @@ def get_unverified_events():
         return jsonify({
             "success": True,
             "events": events_data,
+            "order": "timestamp",
             "page": pagination.page,
             "page_size": pagination.per_page,
             "total": pagination.total,
@@ -376,3 +443,143 @@ def get_unverified_events():
     except Exception as e:
         current_app.logger.error(f"Error in get_unverified_events: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
+
+@ml_bp.route('/api/ml/verification-queue/next', methods=['POST'])
+def lease_next_events():
+    """
+    Видати аналітику наступні найінформативніші події для верифікації
+    
+    Видані події не потрапляють іншим аналітикам протягом оренди.
+    
+    Тіло запиту: {"count": 20, "lease_seconds": 600}
+    
+    Returns:
+        JSON: Події за спаданням пріоритету
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        count = int(data.get('count', 20))
+        lease_seconds = int(data.get('lease_seconds', 600))
+        if not 0 < count <= 500:
+            return jsonify({"success": False, "message": "count must be between 1 and 500"}), 400
+        
+        events_data = next_events(limit=count, lease=True, lease_seconds=lease_seconds)
+        return jsonify({"success": True, "events": events_data, "count": len(events_data)})
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid input: {str(e)}"}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in lease_next_events: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@ml_bp.route('/api/ml/verification-queue/rebuild', methods=['POST'])
+def rebuild_verification_queue():
+    """
+    Перерахувати пріоритети всієї черги верифікації
+    
+    Returns:
+        JSON: Розмір черги
+    """
+    try:
+        size = rebuild_queue()
+        return jsonify({"success": True, "queue_size": size})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in rebuild_verification_queue: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@ml_bp.route('/api/ml/reclassify', methods=['POST'])
+def start_reclassification():
+    """
+    Запустити (або продовжити) повторну класифікацію корпусу поточною моделлю
+    
+    Тіло запиту: {"model_version": "...", "filters": {"date_from", "date_to", "siem_source",
+    "include_unprocessed", "include_verified", "include_duplicates"}, "resume": true, "max_events_per_second": 500}
+    
+    Returns:
+        JSON: Завдання повторної класифікації
+    """
+    try:
+        data = request.json or {}
+        filters = data.get('filters') or {}
+        if not isinstance(filters, dict):
+            return jsonify({"success": False, "message": "filters must be an object"}), 400
+        
+        snapshot = get_config_snapshot()
+        if not snapshot.get_bool("general.ml_classification_enabled", False):
+            return jsonify({"success": False, "message": "ML classification is disabled in system settings"}), 400
+        
+        ml_service = get_ml_service()
+        model_version = data.get('model_version') or model_version_of(ml_service)
+        job = create_job(model_version, filters, resume=data.get('resume', True))
+        if job.status == 'running':
+            return jsonify({"success": True, "job": job.to_dict(), "message": "Job is already running"})
+        
+        kwargs = {}
+        if data.get('max_events_per_second') is not None:
+            kwargs['max_events_per_second'] = float(data['max_events_per_second'])
+        run_job_async(current_app._get_current_object(), job.id, **kwargs)
+        return jsonify({"success": True, "job": job.to_dict()}), 202
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid input: {str(e)}"}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in start_reclassification: {str(e)}")
+        return jsonify({"success": False, "message": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        current_app.logger.error(f"Error in start_reclassification: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@ml_bp.route('/api/ml/reclassify', methods=['GET'])
+def list_reclassifications():
+    """
+    Отримати останні завдання повторної класифікації
+    
+    Returns:
+        JSON: Список завдань
+    """
+    try:
+        jobs = ReclassificationJob.query.order_by(ReclassificationJob.id.desc()).limit(20).all()
+        return jsonify({"success": True, "jobs": [job.to_dict() for job in jobs]})
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Database error in list_reclassifications: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@ml_bp.route('/api/ml/reclassify/<int:job_id>', methods=['GET'])
+def get_reclassification(job_id):
+    """
+    Отримати стан завдання повторної класифікації
+    
+    Returns:
+        JSON: Завдання з прогресом
+    """
+    job = db.session.get(ReclassificationJob, job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@ml_bp.route('/api/ml/reclassify/<int:job_id>/cancel', methods=['POST'])
+def cancel_reclassification(job_id):
+    """
+    Зупинити завдання: 'paused' (можна продовжити) або 'cancelled'
+    
+    Тіло запиту: {"pause": true}
+    
+    Returns:
+        JSON: Завдання
+    """
+    try:
+        job = db.session.get(ReclassificationJob, job_id)
+        if not job:
+            return jsonify({"success": False, "message": "Job not found"}), 404
+        if job.status == 'completed':
+            return jsonify({"success": False, "message": "Job is already completed"}), 400
+        
+        # Виконавець перевіряє статус перед кожним пакетом
+        job.status = 'paused' if (request.get_json(silent=True) or {}).get('pause') else 'cancelled'
+        db.session.commit()
+        return jsonify({"success": True, "job": job.to_dict()})
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error in cancel_reclassification: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
@@ -3,7 +3,7 @@ import requests
 from datetime import datetime
 import logging
 from ..services.siem_service import SIEMService
-from ..services.ml_service import MLService
+from ..services.ml_registry import get_ml_service
 from ..models import APISettings
 
 services_bp = Blueprint('services', __name__)
@@ -22,7 +22,7 @@ def get_services_status():
                 "splunk": check_siem_status(settings, "splunk"),
                 "elastic": check_siem_status(settings, "elastic")
             },
-            "ml": check_ml_status(settings)
+            "ml": check_ml_status()
         }
         
         return jsonify(status)
@@ -61,24 +61,21 @@ def check_siem_status(settings, siem_type):
     
     return status
 
-def check_ml_status(settings):
-    """Перевірка статусу ML API"""
+def check_ml_status():
+    """Перевірка статусу ML-провайдера теплого сервісу процесу"""
     status = {
         "status": "not_configured",
         "lastChecked": datetime.now().isoformat()
     }
     
-    if not settings.ml_api_url or not settings.ml_api_key:
-        return status
-    
     try:
-        ml_service = MLService(settings.ml_api_url, settings.ml_api_key)
-        tactics = ml_service.get_mitre_tactics()
+        result = get_ml_service().test_connection()
         
-        if tactics is not None:
+        if result.get("success", False):
             status["status"] = "online"
         else:
             status["status"] = "offline"
+            status["message"] = result.get("message", "Connection test failed")
     except Exception as e:
         logger.error(f"Error checking ML API status: {str(e)}")
         status["status"] = "offline"
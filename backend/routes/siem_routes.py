@@ -1,7 +1,15 @@
 import requests
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from models import db, Configuration, Event, RawLog
 from datetime import datetime
+from services.partition_service import ensure_partitions_for_events
+from services.active_learning import with_rule_labels
+from services.chain_correlation import correlate_events, correlation_input
+from services.feature_store import build_feature_input, store_features
+from services.mitre_kb import get_mitre_kb
+from services.near_duplicates import assign_clusters
+from services.mitre_mappings import MAPPING_SOURCE, get_custom_mappings
+from services.rule_engine import CompiledRuleSet, RuleCompileError, get_rule_engine, is_auto_tagging_enabled
 
 siem_bp = Blueprint('siem', __name__)
 
@@ -27,22 +35,19 @@ def get_alerts():
 
 @siem_bp.route('/api/siem/label_alerts', methods=['POST'])
 def label_alerts():
-    data = request.json
+    data = request.json or {}
     alerts = data.get('alerts', [])
-    config = Configuration.query.first()
-    if not config:
-        return jsonify({"status": "error", "message": "Configuration not found"}), 404
 
-    rules = config.rules
+    # Правила з запиту компілюються окремо; інакше використовується скомпільований набір з конфігурації
+    try:
+        engine = CompiledRuleSet(data['rules']) if 'rules' in data else get_rule_engine()
+    except RuleCompileError as e:
+        return jsonify({"status": "error", "message": f"Invalid rules: {str(e)}"}), 400
 
     labeled_alerts = []
-    for alert in alerts:
-        labels = {}
-        for rule in rules.get('rules', []):
-            conditions = rule.get('conditions', {})
-            if all(alert.get(key) == value for key, value in conditions.items()):
-                labels.update(rule.get('labels', {}))
-        alert['labels'] = labels
+    for alert, result in zip(alerts, engine.label_batch(alerts)):
+        alert['labels'] = result['labels']
+        alert['tags'] = result['tags']
         labeled_alerts.append(alert)
 
     return jsonify({"status": "success", "labeled_alerts": labeled_alerts})
@@ -60,28 +65,85 @@ def export_siem_logs():
         return jsonify({"error": "SIEM API error"}), 500
 
     alerts = response.json().get("data", [])
-    for alert in alerts:
-        event = Event.query.filter_by(event_id=str(alert["id"])).first()
-        if not event:
-            event = Event(
-                event_id=str(alert["id"]),
-                timestamp=datetime.strptime(alert["timestamp"], "%Y-%m-%dT%H:%M:%SZ"),
-                source_ip=alert.get("source", {}).get("ip", ""),
-                severity=alert.get("severity", ""),
-                siem_source=config.siem_source,
-                labels={"auto_tags": [config.siem_source]}
-            )
-            db.session.add(event)
-            db.session.flush()  # отримуємо event.id для FK
-
-            raw_log = RawLog(
-                event_id=event.id,
-                siem_source=config.siem_source,
-                raw_log=alert
-            )
-            db.session.add(raw_log)
-        else:
-            continue  # вже є такий event, пропускаємо
 
+    # Секції для подій пакета мають існувати до вставки
+    timestamps = {alert["id"]: datetime.strptime(alert["timestamp"], "%Y-%m-%dT%H:%M:%SZ") for alert in alerts}
+    ensure_partitions_for_events(timestamps.values())
+
+    # Авто-теги призначаються під час інгестії одним пакетом
+    engine = get_rule_engine() if is_auto_tagging_enabled() else None
+    tagging = {}
+    if engine:
+        tagging = {alert["id"]: result for alert, result in zip(alerts, engine.label_batch(alerts))}
+
+    # Тактика й техніка MITRE: користувацькі відповідності, далі ID правил та ключові слова
+    sourced_alerts = [dict(alert, siem_source=config.siem_source) for alert in alerts]
+    mappings = get_mitre_kb().map_events(sourced_alerts, custom=get_custom_mappings())
+    mitre = {alert["id"]: mapping for alert, mapping in zip(alerts, mappings)}
+
+    # Події, що вже є в базі, пропускаємо
+    existing = {event_id for (event_id,) in db.session.query(Event.event_id).filter(
+        Event.event_id.in_([str(alert["id"]) for alert in alerts])
+    )}
+    new_alerts = {}
+    for alert in alerts:
+        if str(alert["id"]) not in existing:
+            new_alerts.setdefault(str(alert["id"]), alert)
+
+    labels_by_alert = {}
+    for alert_id, alert in new_alerts.items():
+        result = tagging.get(alert["id"], {})
+        labels = dict(result.get("labels", {}))
+        labels["auto_tags"] = [config.siem_source] + result.get("tags", [])
+        if result.get("rules"):
+            labels["detected_rule"] = ",".join(result["rules"])
+        mapping = mitre.get(alert["id"])
+        if mapping:
+            labels["mitre_tactic"] = mapping["mitre_tactic"]
+            labels["mitre_technique"] = mapping["mitre_technique"]
+            if mapping["source"] == MAPPING_SOURCE:
+                labels["mitre_source"] = MAPPING_SOURCE
+        labels_by_alert[alert_id] = with_rule_labels(labels)
+
+    # Ланцюжки подій призначаються корелятором до вставки
+    chain_ids = correlate_events([
+        (correlation_input(alert, labels_by_alert[alert_id], source_ip=alert.get("source", {}).get("ip", ""),
+                           siem_source=config.siem_source, severity=alert.get("severity")),
+         timestamps[alert["id"]])
+        for alert_id, alert in new_alerts.items()
+    ])
+
+    features = []
+    for (alert_id, alert), chain_id in zip(new_alerts.items(), chain_ids):
+        labels = labels_by_alert[alert_id]
+        if chain_id:
+            labels["event_chain_id"] = chain_id
+        event = Event(
+            event_id=alert_id,
+            timestamp=timestamps[alert["id"]],
+            source_ip=alert.get("source", {}).get("ip", ""),
+            severity=alert.get("severity", ""),
+            siem_source=config.siem_source,
+            labels_data=labels,
+            mitre_tactic=labels.get("mitre_tactic"),
+            mitre_technique=labels.get("mitre_technique")
+        )
+        db.session.add(event)
+        db.session.flush()  # отримуємо event.id для FK
+
+        raw_log = RawLog(
+            event_id=event.id,
+            log_data=alert,
+            source=config.siem_source,
+            timestamp=event.timestamp
+        )
+        db.session.add(raw_log)
+        features.append((event.id, build_feature_input(alert, labels, severity=event.severity,
+                                                       siem_source=config.siem_source, source_ip=event.source_ip)))
+
+    # Вектори ознак обчислюються один раз під час інгестії
+    store_features(features)
+    # Майже однакові події об'єднуються в кластери з одним представником
+    assign_clusters((event_id, data["raw_log"]) for event_id, data in features)
     db.session.commit()
     return jsonify({"status": "success", "imported_events": len(alerts)})
\ No newline at end of file
@@ -0,0 +1,372 @@
+"""
+Черга верифікації з пріоритетом активного навчання.
+
+Для кожної неперевіреної події, обробленої ML, зберігається пріоритет (таблиця verification_queue
+з індексом за спаданням), тож наступні N найінформативніших подій - це index scan, O(log n + N).
+
+Пріоритет = (w_u * невизначеність + w_d * розбіжність + w_r * рідкісність) * DECAY^ранг_у_кластері
+  - невизначеність: 1 - ml_confidence;
+  - розбіжність: частка полів (attack_type, mitre_technique), де мітки правил/відповідностей,
+    збережені під час інгестії з префіксом rule_ (with_rule_labels), не збігаються з прогнозом ML;
+  - рідкісність: -log(частка прогнозованого класу серед неперевірених) / log(кількість класів);
+  - різноманітність: події групуються в кластери за SimHash хешованого вектора ознак
+    (services/feature_store.py), і кожна наступна подія того самого кластера отримує
+    знижку, тож верх черги не заповнюється майже однаковими подіями.
+
+Повна перебудова - `manage.py verification-queue-rebuild` або після повторної класифікації;
+щойно класифіковані події додаються інкрементально, перевірені - видаляються.
+"""
+import logging
+import math
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from .feature_store import load_vectors
+from .near_duplicates import NOT_DUPLICATE_SQL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {"uncertainty": 0.5, "disagreement": 0.3, "rarity": 0.2}
+DIVERSITY_DECAY = 0.85
+CLUSTER_BITS = 8
+LEASE_SECONDS = 600
+COMPARED_FIELDS = ('attack_type', 'mitre_technique')
+# ML та повторна класифікація перезаписують attack_type/mitre_technique у labels_data,
+# тож мітки інгестії для порівняння зберігаються окремо
+RULE_LABEL_PREFIX = 'rule_'
+
+# Непарні 64-бітні множники для випадкових гіперплощин SimHash
+_PROJECTIONS = np.array([
+    0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+    0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9,
+    0x2545F4914F6CDD1D, 0x9FB21C651E98DF25, 0x5851F42D4C957F2D, 0x14057B7EF767814F,
+], dtype=np.uint64)
+
+
+def feature_cluster(indices: np.ndarray, values: np.ndarray, bits: int = CLUSTER_BITS) -> int:
+    """SimHash розрідженого вектора: номер кластера з `bits` бітів"""
+    if len(indices) == 0:
+        return 0
+    idx = indices.astype(np.uint64)
+    cluster = 0
+    for bit in range(bits):
+        # Старший біт добутку задає знак проєкції індексу на випадкову гіперплощину
+        signs = ((idx * _PROJECTIONS[bit]) >> np.uint64(63)).astype(np.float32) * 2 - 1
+        if float(np.dot(signs, values)) >= 0:
+            cluster |= 1 << bit
+    return cluster
+
+
+def get_weights() -> Dict[str, float]:
+    """Ваги компонентів пріоритету (active_learning.<компонент>_weight у конфігурації)"""
+    from .config_snapshot import get_config_snapshot
+
+    weights = dict(DEFAULT_WEIGHTS)
+    try:
+        section = get_config_snapshot().section('active_learning')
+    except Exception as e:
+        logger.warning(f"Could not read active learning settings: {str(e)}")
+        return weights
+    for name in weights:
+        try:
+            weights[name] = float(section.get(f"{name}_weight", weights[name]))
+        except (TypeError, ValueError):
+            pass
+    return weights
+
+
+def with_rule_labels(labels: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Копія міток інгестії з незмінними rule_-копіями порівнюваних полів"""
+    labels = dict(labels or {})
+    for field in COMPARED_FIELDS:
+        if labels.get(field) and RULE_LABEL_PREFIX + field not in labels:
+            labels[RULE_LABEL_PREFIX + field] = labels[field]
+    return labels
+
+
+def _prediction(candidate: Dict[str, Any]) -> Dict[str, Any]:
+    labels = candidate.get("labels_data") or {}
+    prediction = labels.get("ml_prediction")
+    if isinstance(prediction, dict):
+        return prediction
+    return {field: candidate.get(field) for field in COMPARED_FIELDS}
+
+
+def score_candidate(candidate: Dict[str, Any], class_counts: Dict[Optional[str], int],
+                    weights: Dict[str, float]) -> Dict[str, Any]:
+    """Компоненти пріоритету однієї події без урахування різноманітності"""
+    labels = candidate.get("labels_data") or {}
+    prediction = _prediction(candidate)
+
+    try:
+        confidence = float(labels.get("ml_confidence", 0.0) or 0.0)
+    except (TypeError, ValueError):
+        confidence = 0.0
+    uncertainty = min(1.0, max(0.0, 1.0 - confidence))
+
+    compared = differing = 0
+    for field in COMPARED_FIELDS:
+        rule_value, ml_value = labels.get(RULE_LABEL_PREFIX + field), prediction.get(field)
+        if rule_value and ml_value:
+            compared += 1
+            differing += str(rule_value).strip().lower() != str(ml_value).strip().lower()
+    disagreement = differing / compared if compared else 0.0
+
+    predicted_class = prediction.get("attack_type")
+    total = sum(class_counts.values())
+    rarity = 0.0
+    if total and len(class_counts) > 1:
+        share = class_counts.get(predicted_class, 0) / total
+        rarity = min(1.0, -math.log(max(share, 1.0 / total)) / math.log(len(class_counts)))
+
+    base = (weights["uncertainty"] * uncertainty + weights["disagreement"] * disagreement
+            + weights["rarity"] * rarity)
+    return {
+        "event_id": candidate["id"],
+        "uncertainty": uncertainty,
+        "disagreement": disagreement,
+        "rarity": rarity,
+        "base": base,
+        "predicted_class": str(predicted_class)[:100] if predicted_class else None,
+    }
+
+
+def _candidate_cluster(candidate: Dict[str, Any], vector: Optional[Tuple[np.ndarray, np.ndarray]]) -> int:
+    if vector is not None:
+        return feature_cluster(*vector)
+    # Без вектора ознак групуємо за прогнозованим класом
+    predicted = _prediction(candidate).get("attack_type") or ''
+    return (zlib.crc32(str(predicted).encode('utf-8')) & 0xFFFF) | 0x10000
+
+
+def rank_candidates(candidates: Sequence[Dict[str, Any]], weights: Optional[Dict[str, float]] = None,
+                    class_counts: Optional[Dict[Optional[str], int]] = None,
+                    cluster_offsets: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Обчислити пріоритети пакета кандидатів
+
+    Args:
+        candidates: Події з ключами id, labels_data, attack_type, mitre_technique, cluster
+        weights: Ваги компонентів
+        class_counts: Частоти класів (за замовчуванням - серед самих кандидатів)
+        cluster_offsets: Кількість подій, що вже є в черзі для кластера (інкрементальне додавання)
+
+    Returns:
+        Записи черги з полем priority
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    if class_counts is None:
+        class_counts = {}
+        for candidate in candidates:
+            predicted = _prediction(candidate).get("attack_type")
+            class_counts[predicted] = class_counts.get(predicted, 0) + 1
+
+    entries = []
+    for candidate in candidates:
+        entry = score_candidate(candidate, class_counts, weights)
+        entry["cluster"] = candidate.get("cluster", 0)
+        entries.append(entry)
+
+    cluster_offsets = cluster_offsets or {}
+    ranks: Dict[int, int] = {}
+    for entry in sorted(entries, key=lambda e: (-e["base"], e["event_id"])):
+        rank = ranks.get(entry["cluster"], cluster_offsets.get(entry["cluster"], 0))
+        ranks[entry["cluster"]] = rank + 1
+        entry["priority"] = entry["base"] * DIVERSITY_DECAY ** rank
+    return entries
+
+
+def _load_candidates(event_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """Неперевірені події, оброблені ML, з кластером за вектором ознак"""
+    from models import db
+
+    sql = ("SELECT id, attack_type, mitre_technique, labels_data FROM events "
+           "WHERE labels_data->>'ml_processed' = 'true' "
+           "AND COALESCE(labels_data->>'human_verified', 'false') <> 'true' "
+           f"AND {NOT_DUPLICATE_SQL}")
+    params: Dict[str, Any] = {}
+    if event_ids is not None:
+        sql += " AND id = ANY(:ids)"
+        params["ids"] = list(event_ids)
+
+    result = db.session.execute(text(sql).execution_options(stream_results=True, yield_per=5000), params)
+    candidates = [dict(row._mapping) for row in result]
+
+    for start in range(0, len(candidates), 5000):
+        chunk = candidates[start:start + 5000]
+        vectors = load_vectors([c["id"] for c in chunk])
+        for candidate in chunk:
+            candidate["cluster"] = _candidate_cluster(candidate, vectors.get(candidate["id"]))
+    return candidates
+
+
+_INSERT_SQL = """
+INSERT INTO verification_queue
+    (event_id, priority, uncertainty, disagreement, rarity, cluster, predicted_class, updated_at)
+VALUES (:event_id, :priority, :uncertainty, :disagreement, :rarity, :cluster, :predicted_class, now())
+ON CONFLICT (event_id) DO UPDATE SET
+    priority = EXCLUDED.priority, uncertainty = EXCLUDED.uncertainty, disagreement = EXCLUDED.disagreement,
+    rarity = EXCLUDED.rarity, cluster = EXCLUDED.cluster, predicted_class = EXCLUDED.predicted_class,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def _write_entries(entries: List[Dict[str, Any]], batch_size: int = 5000):
+    from models import db
+
+    for start in range(0, len(entries), batch_size):
+        db.session.execute(text(_INSERT_SQL), entries[start:start + batch_size])
+
+
+def rebuild_queue() -> int:
+    """
+    Перерахувати пріоритети всіх неперевірених подій (одна транзакція)
+
+    Returns:
+        Кількість подій у черзі
+    """
+    from models import db
+
+    entries = rank_candidates(_load_candidates(), get_weights())
+    # Оренди, видані аналітикам, переживають перебудову
+    leases = dict(db.session.execute(text(
+        "SELECT event_id, leased_until FROM verification_queue WHERE leased_until > now()"
+    )).all())
+    db.session.execute(text("DELETE FROM verification_queue"))
+    _write_entries(entries)
+    if leases:
+        db.session.execute(text(
+            "UPDATE verification_queue SET leased_until = :leased_until WHERE event_id = :event_id"
+        ), [{"event_id": k, "leased_until": v} for k, v in leases.items()])
+    db.session.commit()
+    logger.info(f"Verification queue rebuilt: {len(entries)} events")
+    return len(entries)
+
+
+def enqueue_events(event_ids: Sequence[int]) -> int:
+    """
+    Додати або оновити події в черзі після класифікації (без перерахунку всієї черги)
+
+    Частоти класів і заповненість кластерів беруться з поточного вмісту черги.
+    Викликається до commit транзакції класифікації.
+    """
+    from models import db
+
+    if not event_ids:
+        return 0
+    candidates = _load_candidates(event_ids)
+    if not candidates:
+        return 0
+
+    class_counts = dict(db.session.execute(text(
+        "SELECT predicted_class, count(*) FROM verification_queue GROUP BY predicted_class"
+    )).all())
+    for candidate in candidates:
+        predicted = _prediction(candidate).get("attack_type")
+        predicted = str(predicted)[:100] if predicted else None
+        class_counts[predicted] = class_counts.get(predicted, 0) + 1
+
+    cluster_offsets = dict(db.session.execute(text(
+        "SELECT cluster, count(*) FROM verification_queue WHERE cluster = ANY(:clusters) "
+        "AND NOT (event_id = ANY(:ids)) GROUP BY cluster"
+    ), {"clusters": list({c["cluster"] for c in candidates}), "ids": list(event_ids)}).all())
+
+    entries = rank_candidates(candidates, get_weights(), class_counts, cluster_offsets)
+    _write_entries(entries)
+    return len(entries)
+
+
+def dequeue_events(event_ids: Iterable[int]):
+    """Прибрати перевірені події з черги (до commit транзакції верифікації)"""
+    from models import db
+
+    ids = list(event_ids)
+    if ids:
+        db.session.execute(text("DELETE FROM verification_queue WHERE event_id = ANY(:ids)"), {"ids": ids})
+
+
+def _event_rows(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from models import db
+
+    if not entries:
+        return []
+    result = db.session.execute(text(
+        "SELECT id, event_id, timestamp, source_ip, severity, siem_source, attack_type, "
+        "mitre_tactic, mitre_technique, labels_data FROM events WHERE id = ANY(:ids)"
+    ), {"ids": [entry["event_id"] for entry in entries]})
+    events = {row.id: row for row in result}
+
+    items = []
+    for entry in entries:
+        row = events.get(entry["event_id"])
+        if row is None:
+            continue
+        labels = row.labels_data or {}
+        items.append({
+            "id": row.id,
+            "event_id": row.event_id,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+            "source_ip": row.source_ip,
+            "severity": row.severity,
+            "siem_source": row.siem_source,
+            "attack_type": row.attack_type,
+            "mitre_tactic": row.mitre_tactic,
+            "mitre_technique": row.mitre_technique,
+            "labels": labels,
+            "ml_confidence": labels.get("ml_confidence"),
+            "priority": entry["priority"],
+            "priority_components": {
+                "uncertainty": entry["uncertainty"],
+                "disagreement": entry["disagreement"],
+                "rarity": entry["rarity"],
+                "cluster": entry["cluster"],
+            },
+        })
+    return items
+
+
+_ENTRY_COLUMNS = "event_id, priority, uncertainty, disagreement, rarity, cluster"
+
+
+def next_events(limit: int = 20, offset: int = 0, lease: bool = False,
+                lease_seconds: int = LEASE_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Наступні найінформативніші події для верифікації
+
+    Args:
+        limit: Кількість подій
+        offset: Зсув (для посторінкового перегляду без оренди)
+        lease: Видати події аналітику: інші не отримають їх протягом lease_seconds
+
+    Returns:
+        Події за спаданням пріоритету
+    """
+    from models import db
+
+    if lease:
+        result = db.session.execute(text(
+            f"UPDATE verification_queue SET leased_until = now() + make_interval(secs => :seconds) "
+            f"WHERE event_id IN (SELECT event_id FROM verification_queue "
+            f"WHERE leased_until IS NULL OR leased_until < now() "
+            f"ORDER BY priority DESC LIMIT :limit FOR UPDATE SKIP LOCKED) "
+            f"RETURNING {_ENTRY_COLUMNS}"
+        ), {"seconds": lease_seconds, "limit": limit})
+        entries = sorted((dict(row._mapping) for row in result), key=lambda e: -e["priority"])
+        db.session.commit()
+    else:
+        result = db.session.execute(text(
+            f"SELECT {_ENTRY_COLUMNS} FROM verification_queue "
+            f"WHERE leased_until IS NULL OR leased_until < now() "
+            f"ORDER BY priority DESC LIMIT :limit OFFSET :offset"
+        ), {"limit": limit, "offset": offset})
+        entries = [dict(row._mapping) for row in result]
+    return _event_rows(entries)
+
+
+def queue_size() -> int:
+    from models import db
+
+    return db.session.execute(text("SELECT count(*) FROM verification_queue")).scalar() or 0
@@ -0,0 +1,314 @@
+"""
+Масове завантаження подій через PostgreSQL COPY.
+
+copy_events - для інгестії: ID подій виділяються з послідовності events одним запитом, після
+чого events і raw_logs заповнюються двома потоками COPY FROM STDIN (CSV) у поточній транзакції -
+без ORM-об'єктів і без flush на кожну подію. Хуки інгестії (ланцюжки, вектори ознак, кластери
+майже однакових подій) виконуються пакетно, як у POST /api/siem/export.
+
+load_events - для backfill історичних даних (manage.py bulk-load): пакет подій одним COPY
+потрапляє в тимчасову staging-таблицю, а потім один set-based запит переносить у events і
+raw_logs лише ті події, event_id яких ще немає в базі (і лише перше входження в пакеті).
+Повторне завантаження того самого файлу нічого не дублює. Паралельні завантажувачі
+серіалізуються на етапі злиття advisory-блокуванням транзакції.
+"""
+import csv
+import io
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+COPY_NULL = '\\N'
+
+EVENT_COLUMNS = ('id', 'event_id', 'timestamp', 'source_ip', 'severity', 'siem_source', 'manual_review', 'labels_data')
+RAW_LOG_COLUMNS = ('event_id', 'log_data', 'source', 'timestamp')
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return value
+
+
+def csv_buffer(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    """CSV для COPY: None -> \\N, dict/list -> JSON"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """Завантажити рядки в таблицю одним COPY FROM STDIN у поточній транзакції сесії"""
+    from models import db
+
+    connection = db.session.connection().connection
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            csv_buffer(rows)
+        )
+
+
+def allocate_ids(table: str, count: int) -> List[int]:
+    """Виділити count значень послідовності id таблиці одним запитом"""
+    from models import db
+
+    if count <= 0:
+        return []
+    return db.session.execute(text(
+        "SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"
+    ), {"table": table, "count": count}).scalars().all()
+
+
+def copy_events(events: Sequence[Dict[str, Any]], enrich: bool = True) -> List[int]:
+    """
+    Вставити пакет нормалізованих подій через COPY (до commit поточної транзакції)
+
+    Args:
+        events: Словники з event_id, timestamp (datetime), source_ip, severity, siem_source,
+                raw_log та необов'язковими labels і rule_name
+        enrich: Виконати хуки інгестії - кореляцію ланцюжків, вектори ознак, кластери дублікатів
+
+    Returns:
+        ID вставлених подій у порядку events
+    """
+    from .active_learning import with_rule_labels
+    from .chain_correlation import correlate_events, correlation_input
+    from .feature_store import build_feature_input, store_features
+    from .near_duplicates import assign_clusters
+    from .partition_service import ensure_partitions_for_events
+
+    if not events:
+        return []
+    ensure_partitions_for_events(event["timestamp"] for event in events)
+
+    labels = [with_rule_labels(event.get("labels")) for event in events]
+    if enrich:
+        chain_ids = correlate_events([
+            (correlation_input(event.get("raw_log"), event_labels, source_ip=event.get("source_ip"),
+                               siem_source=event.get("siem_source"), severity=event.get("severity")),
+             event["timestamp"])
+            for event, event_labels in zip(events, labels)
+        ])
+        for event_labels, chain_id in zip(labels, chain_ids):
+            if chain_id:
+                event_labels["event_chain_id"] = chain_id
+
+    ids = allocate_ids('events', len(events))
+    copy_rows('events', EVENT_COLUMNS, (
+        (event_id, str(event["event_id"]), event["timestamp"], event.get("source_ip"), event.get("severity"),
+         event.get("siem_source"), False, event_labels)
+        for event_id, event, event_labels in zip(ids, events, labels)
+    ))
+    copy_rows('raw_logs', RAW_LOG_COLUMNS, (
+        (event_id, event.get("raw_log") or {}, event.get("siem_source"), event["timestamp"])
+        for event_id, event in zip(ids, events)
+    ))
+
+    if enrich:
+        features = [
+            (event_id, build_feature_input(event.get("raw_log") or {}, event_labels, severity=event.get("severity"),
+                                           siem_source=event.get("siem_source"), source_ip=event.get("source_ip")))
+            for event_id, event, event_labels in zip(ids, events, labels)
+        ]
+        store_features(features)
+        assign_clusters((event_id, data["raw_log"]) for event_id, data in features)
+    return ids
+
+
+STAGE_TABLE = 'bulk_events_stage'
+STAGE_COLUMNS = ('seq', 'event_id', 'timestamp', 'source_ip', 'severity', 'siem_source', 'labels_data', 'raw_log')
+
+# ON COMMIT DROP: таблиця живе в межах транзакції пакета, тож сумісна з PgBouncer
+_CREATE_STAGE_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+    seq integer NOT NULL,
+    event_id varchar(255) NOT NULL,
+    timestamp timestamp NOT NULL,
+    source_ip varchar(45),
+    severity varchar(20),
+    siem_source varchar(50),
+    labels_data json NOT NULL,
+    raw_log json NOT NULL
+) ON COMMIT DROP
+"""
+
+# Один запит: дедуплікація в пакеті (DISTINCT ON) і з уже збереженими подіями (NOT EXISTS),
+# вставка events і raw_logs; повертає (id, seq) вставлених подій
+_MERGE_SQL = f"""
+WITH staged AS (
+    SELECT DISTINCT ON (s.event_id) s.*
+    FROM {STAGE_TABLE} s
+    WHERE NOT EXISTS (SELECT 1 FROM events e WHERE e.event_id = s.event_id)
+    ORDER BY s.event_id, s.seq
+), inserted AS (
+    INSERT INTO events (event_id, timestamp, source_ip, severity, siem_source, manual_review, labels_data)
+    SELECT event_id, timestamp, source_ip, severity, siem_source, false, labels_data
+    FROM staged
+    ORDER BY timestamp
+    RETURNING id, event_id
+), raw AS (
+    INSERT INTO raw_logs (event_id, log_data, source, timestamp)
+    SELECT i.id, s.raw_log, s.siem_source, s.timestamp
+    FROM inserted i JOIN staged s ON s.event_id = i.event_id
+)
+SELECT i.id, s.seq FROM inserted i JOIN staged s ON s.event_id = i.event_id
+"""
+
+_MERGE_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('logtagger.bulk_load'))"
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """ISO-рядок або datetime -> naive UTC (як зберігається events.timestamp)"""
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        text_value = str(value).strip()
+        if text_value.endswith('Z'):
+            text_value = text_value[:-1] + '+00:00'
+        timestamp = datetime.fromisoformat(text_value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def alerts_from_response(siem_type: str, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Алерти з відповіді API SIEM (обернене до load_generator.api_response)"""
+    if siem_type == 'wazuh':
+        return response.get("data", {}).get("affected_items", [])
+    if siem_type == 'splunk':
+        return response.get("results", [])
+    if siem_type == 'elastic':
+        return response.get("hits", {}).get("hits", [])
+    raise ValueError(f"Unsupported SIEM type: {siem_type}")
+
+
+def read_events(lines: Iterable[str], siem_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Нормалізовані події з JSON Lines
+
+    Рядок - сторінка відповіді API ({"siem", "response"}, формат manage.py loadgen --output),
+    один алерт SIEM (якщо задано siem_type) або вже нормалізована подія з event_id і timestamp.
+    """
+    from .connectors.elastic import ElasticConnector
+    from .connectors.splunk import SplunkConnector
+    from .connectors.wazuh import WazuhConnector
+
+    connectors = {
+        'wazuh': WazuhConnector(None, None),
+        'splunk': SplunkConnector(None, None),
+        'elastic': ElasticConnector(None, None),
+    }
+    if siem_type and siem_type not in connectors:
+        raise ValueError(f"Unsupported SIEM type: {siem_type}")
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON: {str(e)}")
+        if "response" in record and "siem" in record:
+            connector = connectors[record["siem"]]
+            for alert in alerts_from_response(record["siem"], record["response"]):
+                yield connector.normalize_log(alert)
+        elif siem_type:
+            yield connectors[siem_type].normalize_log(record)
+        else:
+            yield record
+
+
+def merge_events(events: Sequence[Dict[str, Any]], enrich: bool = False) -> List[int]:
+    """
+    Завантажити пакет через staging-таблицю з дедуплікацією за event_id (до commit транзакції)
+
+    Args:
+        events: Нормалізовані події (формат copy_events, timestamp - datetime або ISO-рядок)
+        enrich: Обчислити вектори ознак і кластери майже однакових подій для вставлених подій.
+                Кореляція ланцюжків не виконується: історичні події надходять не в порядку
+                часу (manage.py chains-replay після завантаження)
+
+    Returns:
+        ID вставлених подій (дублікати пропускаються)
+    """
+    from models import db
+    from .active_learning import with_rule_labels
+    from .feature_store import build_feature_input, store_features
+    from .near_duplicates import assign_clusters
+    from .partition_service import ensure_partitions_for_events
+
+    if not events:
+        return []
+    timestamps = [parse_timestamp(event["timestamp"]) for event in events]
+    ensure_partitions_for_events(timestamps)
+
+    db.session.execute(text(_CREATE_STAGE_SQL))
+    db.session.execute(text(f"TRUNCATE {STAGE_TABLE}"))
+    copy_rows(STAGE_TABLE, STAGE_COLUMNS, (
+        (seq, str(event["event_id"]), timestamp, event.get("source_ip"), event.get("severity"),
+         event.get("siem_source"), with_rule_labels(event.get("labels")), event.get("raw_log") or {})
+        for seq, (event, timestamp) in enumerate(zip(events, timestamps))
+    ))
+    db.session.execute(text(f"ANALYZE {STAGE_TABLE}"))
+    db.session.execute(text(_MERGE_LOCK_SQL))
+    inserted = db.session.execute(text(_MERGE_SQL)).all()
+
+    if enrich and inserted:
+        features = []
+        for event_id, seq in inserted:
+            event = events[seq]
+            features.append((event_id, build_feature_input(
+                event.get("raw_log") or {}, event.get("labels"), severity=event.get("severity"),
+                siem_source=event.get("siem_source"), source_ip=event.get("source_ip"))))
+        store_features(features)
+        assign_clusters((event_id, data["raw_log"]) for event_id, data in features)
+    return [event_id for event_id, _ in inserted]
+
+
+def load_events(events: Iterable[Dict[str, Any]], batch_size: int = 50000, enrich: bool = False,
+                limit: Optional[int] = None) -> Dict[str, float]:
+    """
+    Потокове завантаження подій пакетами, по транзакції на пакет (merge_events)
+
+    Перерваний backfill можна просто запустити знову - вже завантажені події будуть пропущені.
+
+    Returns:
+        {"read", "inserted", "duplicates", "seconds", "events_per_second"}
+    """
+    from models import db
+
+    events = iter(events) if limit is None else itertools.islice(events, limit)
+    started = time.perf_counter()
+    read = inserted = 0
+    while True:
+        batch = list(itertools.islice(events, batch_size))
+        if not batch:
+            break
+        inserted += len(merge_events(batch, enrich=enrich))
+        db.session.commit()
+        read += len(batch)
+        logger.info(f"Bulk load: {read} events read, {inserted} inserted")
+    seconds = time.perf_counter() - started
+    return {"read": read, "inserted": inserted, "duplicates": read - inserted, "seconds": seconds,
+            "events_per_second": read / seconds if seconds else 0.0}
+
+
+def load_file(source: IO[str], siem_type: Optional[str] = None, **kwargs) -> Dict[str, float]:
+    """load_events для файлу JSON Lines (див. read_events)"""
+    return load_events(read_events(source, siem_type), **kwargs)
@@ -0,0 +1,510 @@
+"""
+Автоматична кореляція подій у ланцюжки (labels_data.event_chain_id).
+
+Правило кореляції - набір полів-ключів (source_ip, agent.name, user, rule_family, ...)
+та ковзне вікно: подія приєднується до відкритого ланцюжка з тим самим значенням ключа,
+якщо з останньої події ланцюжка минуло не більше window_minutes, а від його початку -
+не більше max_span_minutes. Правила задаються в конфігурації (correlation.rules).
+
+Стан корелятора обмежений у пам'яті: відкриті ланцюжки зберігаються в словнику за 64-бітним
+хешем ключа, а купа (heap) часу їх завершення дозволяє закривати прострочені ланцюжки
+за O(log n) без сканування; понад max_open_chains закриваються ланцюжки, що завершуються
+найраніше. ID ланцюжка детермінований (правило, ключ, час першої події), тож повторне
+програвання історії дає ті самі ID.
+
+Під час інгестії стан для ключів пакета читається з таблиці open_event_chains і
+записується назад одним upsert, тому ланцюжки продовжуються між пакетами та процесами.
+Режим replay_chains проходить історію за (timestamp, id) пакетами з пам'яттю лише
+для відкритих ланцюжків і оновлює змінені ID одним UPDATE на пакет.
+"""
+import hashlib
+import heapq
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CHAIN_PREFIX = 'corr-'
+DEFAULT_MAX_OPEN_CHAINS = 100000
+DEFAULT_REPLAY_BATCH_SIZE = 20000
+
+DEFAULT_RULES = [
+    {"name": "source_ip", "fields": ["source_ip"], "window_minutes": 15, "max_span_minutes": 240},
+    {"name": "agent_user", "fields": ["agent.name", "user"], "window_minutes": 30, "max_span_minutes": 480},
+]
+
+# Поля з кількома джерелами: береться перше непорожнє значення
+DERIVED_FIELDS = {
+    "user": ('data.srcuser', 'data.dstuser', 'user.name', 'user'),
+    "rule_family": ('rule.groups', 'labels.mitre_tactic', 'mitre_tactic', 'attack_type'),
+}
+
+# Поля, що читаються з колонок events під час програвання історії
+EVENT_COLUMNS = ('source_ip', 'siem_source', 'severity', 'attack_type', 'mitre_tactic', 'mitre_technique')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class CorrelationRule(NamedTuple):
+    name: str
+    fields: Tuple[str, ...]
+    window: float
+    max_span: float
+
+
+def parse_rules(raw: Iterable[Dict[str, Any]]) -> List[CorrelationRule]:
+    """Перетворити опис правил (JSON) на CorrelationRule; некоректні правила пропускаються"""
+    rules = []
+    for item in raw or []:
+        try:
+            fields = tuple(str(field) for field in item["fields"] if field)
+            window = float(item.get("window_minutes", 15)) * 60
+            max_span = float(item.get("max_span_minutes", 24 * 60)) * 60
+            if not fields or window <= 0:
+                raise ValueError("fields and a positive window are required")
+            rules.append(CorrelationRule(str(item.get("name") or "+".join(fields)), fields, window,
+                                         max(max_span, window)))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping invalid correlation rule {item!r}: {str(e)}")
+    return rules
+
+
+def load_rules() -> List[CorrelationRule]:
+    """Правила кореляції зі знімка конфігурації (correlation.rules) або типові"""
+    from .config_snapshot import get_config_snapshot
+
+    try:
+        config_value = get_config_snapshot().raw.get('correlation.rules')
+        if config_value:
+            rules = json.loads(config_value)
+            if isinstance(rules, dict):
+                rules = rules.get('rules', [])
+            return parse_rules(rules)
+    except Exception as e:
+        logger.error(f"Error loading correlation rules: {str(e)}")
+    return parse_rules(DEFAULT_RULES)
+
+
+def get_settings() -> Dict[str, Any]:
+    """Налаштування correlation.enabled та correlation.max_open_chains"""
+    from .config_snapshot import get_config_snapshot
+
+    settings = {"enabled": True, "max_open_chains": DEFAULT_MAX_OPEN_CHAINS}
+    try:
+        snapshot = get_config_snapshot()
+        settings["enabled"] = snapshot.get_bool('correlation.enabled', True)
+        settings["max_open_chains"] = int(snapshot.get('correlation.max_open_chains', DEFAULT_MAX_OPEN_CHAINS))
+    except Exception as e:
+        logger.warning(f"Could not read correlation settings: {str(e)}")
+    return settings
+
+
+def to_epoch(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+def from_epoch(value: float) -> datetime:
+    return _EPOCH + timedelta(seconds=value)
+
+
+def _scalar(value: Any) -> Optional[str]:
+    """Значення ключа: перший елемент списку, об'єкти ігноруються, рядки без регістру"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None or isinstance(value, dict):
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+
+def _lookup(event: Dict[str, Any], path: str) -> Optional[str]:
+    value = event
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return _scalar(value)
+
+
+def field_value(event: Dict[str, Any], field: str) -> Optional[str]:
+    """Значення поля кореляції з події (шлях з крапками або похідне поле)"""
+    for path in DERIVED_FIELDS.get(field, (field,)):
+        value = _lookup(event, path)
+        if value is not None:
+            return value
+    return None
+
+
+def correlation_input(raw_log: Optional[Dict[str, Any]], labels: Optional[Dict[str, Any]] = None,
+                      **columns: Any) -> Dict[str, Any]:
+    """Словник для extract_keys: поля raw_log, колонки events та labels"""
+    data = dict(raw_log) if isinstance(raw_log, dict) else {}
+    data.update({name: value for name, value in columns.items() if value is not None})
+    data["labels"] = labels or {}
+    return data
+
+
+def key_hash(rule_name: str, values: Sequence[str]) -> int:
+    """Стабільний між процесами знаковий 64-бітний хеш ключа (BIGINT)"""
+    digest = hashlib.blake2b('\x1f'.join((rule_name,) + tuple(values)).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def extract_keys(rules: Sequence[CorrelationRule], event: Dict[str, Any]) -> List[Optional[int]]:
+    """Хеші ключів події для кожного правила (None, якщо якогось поля немає)"""
+    keys = []
+    for rule in rules:
+        values = [field_value(event, field) for field in rule.fields]
+        keys.append(None if None in values else key_hash(rule.name, values))
+    return keys
+
+
+def make_chain_id(rule_name: str, key: int, started: float) -> str:
+    digest = hashlib.blake2b(f"{rule_name}|{key}|{started:.3f}".encode('utf-8'), digest_size=8).hexdigest()
+    return CHAIN_PREFIX + digest
+
+
+class _OpenChain:
+    __slots__ = ('rule', 'chain_id', 'started', 'last_seen', 'expires')
+
+    def __init__(self, rule: CorrelationRule, chain_id: str, started: float, last_seen: float):
+        self.rule = rule
+        self.chain_id = chain_id
+        self.started = started
+        self.last_seen = last_seen
+        self.expires = last_seen + rule.window
+
+
+class ChainCorrelator:
+    """
+    Потоковий корелятор з обмеженим станом
+
+    Події подаються в порядку часу (невелике запізнення допускається: подія до водяного знака
+    приєднується до ланцюжка, якщо ще потрапляє в його вікно). Подія з ключами кількох правил
+    приєднується до найстаршого з відкритих ланцюжків, і всі її ключі надалі вказують на нього.
+    """
+
+    def __init__(self, rules: Sequence[CorrelationRule], max_open_chains: int = DEFAULT_MAX_OPEN_CHAINS):
+        self.rules = list(rules)
+        self.max_open_chains = max(1, int(max_open_chains))
+        self.watermark = float('-inf')
+        self.evicted = 0
+        self.created = 0
+        self._open: Dict[int, _OpenChain] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._dirty = set()
+        self._rules_by_name = {rule.name: rule for rule in self.rules}
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def _push(self, key: int, chain: _OpenChain):
+        heapq.heappush(self._heap, (chain.expires, key))
+        # Застарілі записи купи видаляються ліниво; купа перебудовується, якщо їх забагато
+        if len(self._heap) > 2 * len(self._open) + 1024:
+            self._heap = [(chain.expires, key) for key, chain in self._open.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_live(self) -> Optional[int]:
+        while self._heap:
+            expires, key = heapq.heappop(self._heap)
+            chain = self._open.get(key)
+            if chain is not None and chain.expires == expires:
+                del self._open[key]
+                return key
+        return None
+
+    def expire(self, now: float) -> int:
+        """Закрити ланцюжки, вікно яких завершилося до now"""
+        closed = 0
+        while self._heap and self._heap[0][0] < now:
+            expires, key = heapq.heappop(self._heap)
+            chain = self._open.get(key)
+            if chain is not None and chain.expires == expires:
+                del self._open[key]
+                closed += 1
+        return closed
+
+    def seed(self, rule_name: str, key: int, chain_id: str, started: float, last_seen: float):
+        """Відновити відкритий ланцюжок зі збереженого стану"""
+        rule = self._rules_by_name.get(rule_name)
+        if rule is None:
+            return
+        chain = _OpenChain(rule, chain_id, started, last_seen)
+        self._open[key] = chain
+        self._push(key, chain)
+
+    def process(self, keys: Sequence[Optional[int]], ts: float) -> Optional[str]:
+        """
+        Віднести подію до ланцюжка
+
+        Args:
+            keys: Хеші ключів для кожного правила (extract_keys)
+            ts: Час події (секунди від епохи)
+
+        Returns:
+            ID ланцюжка або None, якщо подія не має жодного ключа
+        """
+        if ts > self.watermark:
+            self.watermark = ts
+            self.expire(ts)
+
+        best = None
+        first = None
+        for rule, key in zip(self.rules, keys):
+            if key is None:
+                continue
+            if first is None:
+                first = (rule, key)
+            chain = self._open.get(key)
+            if (chain is not None and chain.started - rule.window <= ts <= chain.expires
+                    and ts - chain.started <= rule.max_span):
+                if best is None or (chain.started, chain.chain_id) < (best.started, best.chain_id):
+                    best = chain
+        if first is None:
+            return None
+
+        if best is not None:
+            chain_id = best.chain_id
+        else:
+            chain_id = make_chain_id(first[0].name, first[1], ts)
+            self.created += 1
+        for rule, key in zip(self.rules, keys):
+            if key is None:
+                continue
+            chain = self._open.get(key)
+            if (chain is not None and chain.started - rule.window <= ts <= chain.expires
+                    and ts - chain.started <= rule.max_span):
+                chain.chain_id = chain_id
+                chain.started = min(chain.started, ts)
+                if ts > chain.last_seen:
+                    chain.last_seen = ts
+                    chain.expires = ts + rule.window
+                    self._push(key, chain)
+            else:
+                if chain is None and len(self._open) >= self.max_open_chains:
+                    self._pop_live()
+                    self.evicted += 1
+                chain = _OpenChain(rule, chain_id, ts, ts)
+                self._open[key] = chain
+                self._push(key, chain)
+            self._dirty.add(key)
+        return chain_id
+
+    def open_chains(self, dirty_only: bool = False) -> List[Dict[str, Any]]:
+        """Стан відкритих ланцюжків для збереження в open_event_chains"""
+        keys = self._dirty if dirty_only else self._open.keys()
+        return [{
+            "key_hash": key,
+            "rule": chain.rule.name,
+            "chain_id": chain.chain_id,
+            "started_at": from_epoch(chain.started),
+            "last_seen": from_epoch(chain.last_seen),
+            "expires_at": from_epoch(chain.expires),
+        } for key in sorted(keys) for chain in (self._open.get(key),) if chain is not None]
+
+
+_UPSERT_STATE_SQL = """
+INSERT INTO open_event_chains (key_hash, rule, chain_id, started_at, last_seen, expires_at)
+SELECT d.key_hash, d.rule, d.chain_id, d.started_at, d.last_seen, d.expires_at
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS d(
+    key_hash bigint, rule text, chain_id text, started_at timestamp, last_seen timestamp, expires_at timestamp
+)
+ON CONFLICT (key_hash) DO UPDATE SET
+    rule = EXCLUDED.rule, chain_id = EXCLUDED.chain_id, started_at = EXCLUDED.started_at,
+    last_seen = EXCLUDED.last_seen, expires_at = EXCLUDED.expires_at
+WHERE EXCLUDED.last_seen >= open_event_chains.last_seen
+"""
+
+_PRUNE_STATE_SQL = (
+    "DELETE FROM open_event_chains WHERE key_hash IN ("
+    "SELECT key_hash FROM open_event_chains WHERE expires_at < :cutoff LIMIT 1000)"
+)
+
+
+def _store_state(rows: List[Dict[str, Any]]):
+    from models import db
+
+    if rows:
+        db.session.execute(text(_UPSERT_STATE_SQL), {"rows": json.dumps(rows, default=str)})
+
+
+def correlate_events(events: Sequence[Tuple[Dict[str, Any], datetime]]) -> List[Optional[str]]:
+    """
+    Призначити ID ланцюжків пакету нових подій до вставки
+
+    Args:
+        events: Пари (correlation_input(...), timestamp)
+
+    Returns:
+        ID ланцюжків у порядку подій (None - подія без ключів або кореляцію вимкнено)
+    """
+    from models import db
+
+    if not events:
+        return []
+    settings = get_settings()
+    rules = load_rules()
+    if not settings["enabled"] or not rules:
+        return [None] * len(events)
+
+    keys = [extract_keys(rules, event) for event, _ in events]
+    hashes = sorted({key for event_keys in keys for key in event_keys if key is not None})
+    correlator = ChainCorrelator(rules, settings["max_open_chains"])
+    if hashes:
+        earliest = min(timestamp for _, timestamp in events)
+        for row in db.session.execute(text(
+            "SELECT key_hash, rule, chain_id, started_at, last_seen FROM open_event_chains "
+            "WHERE key_hash = ANY(:hashes) AND expires_at >= :earliest"
+        ), {"hashes": hashes, "earliest": earliest}):
+            correlator.seed(row.rule, row.key_hash, row.chain_id, to_epoch(row.started_at), to_epoch(row.last_seen))
+
+    chain_ids: List[Optional[str]] = [None] * len(events)
+    for index in sorted(range(len(events)), key=lambda i: events[i][1]):
+        chain_ids[index] = correlator.process(keys[index], to_epoch(events[index][1]))
+
+    _store_state(correlator.open_chains(dirty_only=True))
+    # Стан, потрібний для паралельних пакетів з трохи старішими подіями, не видаляється
+    horizon = max(rule.max_span for rule in rules)
+    db.session.execute(text(_PRUNE_STATE_SQL), {"cutoff": from_epoch(correlator.watermark - horizon)})
+    return chain_ids
+
+
+def _field_sql(field: str, index: int, params: Dict[str, Any]) -> Tuple[str, bool]:
+    """SQL-вираз значення поля (семантика як у field_value) та ознака потреби в raw_logs"""
+    expressions = []
+    needs_raw = False
+    for number, path in enumerate(DERIVED_FIELDS.get(field, (field,))):
+        parts = path.split('.')
+        if len(parts) == 1 and parts[0] in EVENT_COLUMNS:
+            expressions.append(f"NULLIF(lower(btrim(e.{parts[0]})), '')")
+            continue
+        if parts[0] == 'labels':
+            source, parts = "e.labels_data::jsonb", parts[1:]
+        else:
+            source, needs_raw = "r.log_data", True
+        name = f"p{index}_{number}"
+        params[name] = parts
+        value = f"{source} #> CAST(:{name} AS text[])"
+        expressions.append(
+            f"NULLIF(lower(btrim(CASE jsonb_typeof({value}) WHEN 'array' THEN ({value})->>0 "
+            f"WHEN 'object' THEN NULL ELSE {value} #>> '{{}}' END)), '')"
+        )
+    return (expressions[0] if len(expressions) == 1 else f"COALESCE({', '.join(expressions)})"), needs_raw
+
+
+def _replay_select(rules: Sequence[CorrelationRule]) -> Tuple[str, List[str], Dict[str, Any]]:
+    fields = sorted({field for rule in rules for field in rule.fields})
+    params: Dict[str, Any] = {}
+    columns = []
+    needs_raw = False
+    for index, field in enumerate(fields):
+        expression, raw = _field_sql(field, index, params)
+        needs_raw = needs_raw or raw
+        columns.append(f"{expression} AS f{index}")
+    raw_join = (
+        "LEFT JOIN LATERAL (SELECT log_data::jsonb AS log_data FROM raw_logs "
+        "WHERE raw_logs.event_id = e.id ORDER BY raw_logs.id LIMIT 1) r ON true "
+    ) if needs_raw else ""
+    sql = (
+        f"SELECT e.id, e.timestamp, e.labels_data->>'event_chain_id' AS current_chain, {', '.join(columns)} "
+        f"FROM events e {raw_join}"
+        "WHERE (e.timestamp, e.id) > (:after_ts, :after_id) {filters}"
+        "ORDER BY e.timestamp, e.id LIMIT :limit"
+    )
+    return sql, fields, params
+
+
+_REPLAY_UPDATE_SQL = """
+WITH data AS (
+    SELECT * FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS d(id integer, ts timestamp, chain_id text)
+), target AS (
+    SELECT e.id, e.labels_data::jsonb->'event_chain_id' AS old_value, d.chain_id
+    FROM events e JOIN data d ON e.id = d.id AND e.timestamp = d.ts
+    FOR UPDATE OF e
+), upd AS (
+    UPDATE events e SET labels_data = jsonb_set(COALESCE(e.labels_data::jsonb, '{}'::jsonb),
+                                                '{event_chain_id}', to_jsonb(t.chain_id))::json
+    FROM target t WHERE e.id = t.id
+    RETURNING e.id
+), rev AS (
+    INSERT INTO label_revisions (event_id, timestamp, user_id, action, label_key, old_value, new_value, source)
+    SELECT t.id, now() AT TIME ZONE 'utc', NULL, 'update', 'event_chain_id', t.old_value::json,
+           to_json(t.chain_id), 'rule'
+    FROM target t JOIN upd ON upd.id = t.id
+    RETURNING 1
+)
+SELECT count(*) FROM upd
+"""
+
+
+def replay_chains(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                  batch_size: int = DEFAULT_REPLAY_BATCH_SIZE, overwrite_manual: bool = False,
+                  max_open_chains: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Програти історію подій через корелятор і оновити event_chain_id
+
+    Події читаються keyset-пагінацією за (timestamp, id); кожен пакет - окрема транзакція
+    з одним UPDATE лише для подій, ID ланцюжка яких змінився. Ланцюжки, призначені вручну
+    (без префікса CHAIN_PREFIX), не змінюються й не впливають на кореляцію, якщо не вказано
+    overwrite_manual. Після програвання до кінця історії відкриті ланцюжки зберігаються
+    в open_event_chains, щоб інгестія їх продовжила.
+
+    Returns:
+        {"processed", "updated", "chains", "evicted"}
+    """
+    from models import db
+
+    settings = get_settings()
+    rules = load_rules()
+    if not rules:
+        raise ValueError("No correlation rules configured")
+    correlator = ChainCorrelator(rules, max_open_chains or settings["max_open_chains"])
+    sql, fields, field_params = _replay_select(rules)
+    field_index = [[fields.index(field) for field in rule.fields] for rule in rules]
+
+    filters = ""
+    params = dict(field_params, limit=batch_size)
+    if date_from:
+        filters += "AND e.timestamp >= :date_from "
+        params["date_from"] = date_from
+    if date_to:
+        filters += "AND e.timestamp < :date_to "
+        params["date_to"] = date_to
+    statement = text(sql.replace("{filters}", filters))
+
+    after_ts, after_id = datetime.min, 0
+    processed = updated = 0
+    while True:
+        rows = db.session.execute(statement, dict(params, after_ts=after_ts, after_id=after_id)).all()
+        if not rows:
+            break
+        changes = []
+        for row in rows:
+            current = row.current_chain
+            if current and not current.startswith(CHAIN_PREFIX) and not overwrite_manual:
+                continue
+            keys = []
+            for rule, indexes in zip(rules, field_index):
+                values = [row[3 + index] for index in indexes]
+                keys.append(None if None in values else key_hash(rule.name, values))
+            chain_id = correlator.process(keys, to_epoch(row.timestamp))
+            if chain_id is not None and chain_id != current:
+                changes.append({"id": row.id, "ts": row.timestamp.isoformat(), "chain_id": chain_id})
+        if changes:
+            updated += db.session.execute(text(_REPLAY_UPDATE_SQL), {"rows": json.dumps(changes)}).scalar()
+        db.session.commit()
+        processed += len(rows)
+        after_ts, after_id = rows[-1].timestamp, rows[-1].id
+        logger.info(f"Chain replay: {processed} events processed, {updated} updated, "
+                    f"{len(correlator)} chains open")
+
+    if date_to is None:
+        db.session.execute(text("DELETE FROM open_event_chains"))
+        _store_state(correlator.open_chains())
+        db.session.commit()
+    return {"processed": processed, "updated": updated, "chains": correlator.created, "evicted": correlator.evicted}
@@ -0,0 +1,331 @@
+"""
+Незмінний знімок конфігурації (Configuration + Settings), завантажений один раз на процес.
+
+Гарячі шляхи (класифікація, інгестія, GET /api/system-config) читають конфігурацію з пам'яті
+без запитів до БД. Знімок інвалідовується:
+  - локально - одразу після commit у маршрутах, що змінюють конфігурацію;
+  - в інших процесах - через PostgreSQL LISTEN/NOTIFY (канал CONFIG_NOTIFY_CHANNEL);
+  - запасний варіант - рядок-лічильник версії (config_type 'system.config_version'),
+    який перевіряється не частіше ніж раз на CONFIG_VERSION_CHECK_INTERVAL секунд,
+    якщо слухач NOTIFY не працює.
+"""
+import copy
+import json
+import logging
+import os
+import select
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CONFIG_NOTIFY_CHANNEL = 'logtagger_config'
+CONFIG_VERSION_TYPE = 'system.config_version'
+
+# Значення за замовчуванням для секцій, що повертаються в /api/system-config
+SECTION_DEFAULTS = {
+    "general": {
+        "data_retention_days": 90,
+        "auto_tagging_enabled": True,
+        "ml_classification_enabled": True,
+        "refresh_interval_minutes": 30,
+    },
+    "mitre": {
+        "mitre_version": 'v10',
+        "use_custom_mappings": False,
+        "custom_mappings_path": '',
+    },
+    "export": {
+        "default_export_format": 'csv',
+        "include_raw_logs": False,
+        "max_records_per_export": 5000,
+    },
+}
+
+
+def parse_config_value(value: Optional[str]) -> Any:
+    """Перетворити рядкове значення Configuration у bool/int/JSON або залишити рядком"""
+    if value is None:
+        return None
+    try:
+        if value.lower() == 'true':
+            return True
+        if value.lower() == 'false':
+            return False
+        if value.isdigit():
+            return int(value)
+        if value.startswith('{') or value.startswith('['):
+            return json.loads(value)
+    except Exception:
+        pass
+    return value
+
+
+def _freeze(value: Any) -> Any:
+    """Рекурсивно зробити значення незмінним (dict -> MappingProxyType, list -> tuple)"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ConfigSnapshot:
+    """Незмінний типізований знімок конфігурації"""
+
+    __slots__ = ('version', 'raw', 'values', 'settings', '_system_config', 'loaded_at')
+
+    def __init__(self, rows: Dict[str, Optional[str]], settings: Optional[Dict[str, Any]], version: int = 0):
+        self.version = version
+        self.raw: Mapping[str, Optional[str]] = MappingProxyType(dict(rows))
+        self.values: Mapping[str, Any] = _freeze({key: parse_config_value(value) for key, value in rows.items()})
+        self.settings: Optional[Mapping[str, Any]] = MappingProxyType(dict(settings)) if settings is not None else None
+        self.loaded_at = time.time()
+
+        system_config = copy.deepcopy(SECTION_DEFAULTS)
+        for key, value in rows.items():
+            section, _, name = key.partition('.')
+            if section in system_config and name:
+                system_config[section][name] = parse_config_value(value)
+        self._system_config = json.dumps(system_config)
+
+    def get(self, config_type: str, default: Any = None) -> Any:
+        """Розібране значення за повним ключем, наприклад 'general.ml_classification_enabled'"""
+        value = self.values.get(config_type)
+        return default if value is None else value
+
+    def get_bool(self, config_type: str, default: bool = False) -> bool:
+        value = self.get(config_type, default)
+        if isinstance(value, str):
+            return value.lower() == 'true'
+        return bool(value)
+
+    def section(self, prefix: str) -> Dict[str, Optional[str]]:
+        """Сирі рядкові значення секції без префікса (наприклад 'ml' -> {'model_type': ...})"""
+        prefix = prefix.rstrip('.') + '.'
+        return {key[len(prefix):]: value for key, value in self.raw.items() if key.startswith(prefix)}
+
+    def system_config(self) -> Dict[str, Any]:
+        """Секції general/mitre/export зі значеннями за замовчуванням (нова копія)"""
+        return json.loads(self._system_config)
+
+
+class _SnapshotState:
+    """Стан кешу в межах процесу"""
+
+    def __init__(self):
+        self.snapshot: Optional[ConfigSnapshot] = None
+        self.version_checked_at = 0.0
+        # Лічильник інвалідацій: знімок, під час завантаження якого прийшов NOTIFY, не кешується
+        self.generation = 0
+        # Після помилки завантаження знімок (попередній або порожній) перечитується не раніше цього часу
+        self.retry_at: Optional[float] = None
+        self.listener: Optional['ConfigChangeListener'] = None
+        self.pid: Optional[int] = None
+        self.lock = threading.Lock()
+
+
+_state = _SnapshotState()
+
+
+def _load_snapshot() -> ConfigSnapshot:
+    from models import Configuration, Settings
+
+    rows = {}
+    for item in Configuration.query.all():
+        config_type = getattr(item, 'config_type', None)
+        if config_type:
+            rows[config_type] = item.config_value
+
+    # Settings - рядки ключ/значення (ml_api_url, ml_api_key, ...)
+    settings_rows = Settings.query.all()
+    settings = {row.key: row.value for row in settings_rows} if settings_rows else None
+
+    version = parse_config_value(rows.pop(CONFIG_VERSION_TYPE, None)) or 0
+    return ConfigSnapshot(rows, settings, version if isinstance(version, int) else 0)
+
+
+def _read_version() -> int:
+    from models import db
+
+    value = db.session.execute(
+        text("SELECT config_value FROM configurations WHERE config_type = :config_type"),
+        {"config_type": CONFIG_VERSION_TYPE}
+    ).scalar()
+    version = parse_config_value(value)
+    return version if isinstance(version, int) else 0
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """
+    Отримати поточний знімок конфігурації
+
+    Returns:
+        ConfigSnapshot; при першому виклику в процесі завантажується з БД
+    """
+    state = _state
+    _ensure_listener()
+
+    interval = current_app.config.get('CONFIG_VERSION_CHECK_INTERVAL', 30)
+    snapshot = state.snapshot
+    if snapshot is not None:
+        if state.retry_at is not None:
+            if time.monotonic() < state.retry_at:
+                return snapshot
+        else:
+            listener = state.listener
+            if listener is not None and listener.healthy():
+                return snapshot
+            # Слухач недоступний - періодично порівнюємо лічильник версії
+            if time.monotonic() - state.version_checked_at < interval:
+                return snapshot
+            try:
+                state.version_checked_at = time.monotonic()
+                if _read_version() == snapshot.version:
+                    return snapshot
+            except Exception as e:
+                logger.warning(f"Could not check configuration version: {str(e)}")
+                return snapshot
+
+    with state.lock:
+        if state.snapshot is not None and state.snapshot is not snapshot:
+            return state.snapshot
+        generation = state.generation
+        try:
+            loaded = _load_snapshot()
+        except Exception as e:
+            logger.error(f"Error loading configuration snapshot: {str(e)}")
+            # Порожній знімок теж кешується, інакше кожне читання знову йшло б у БД
+            state.snapshot = snapshot or ConfigSnapshot({}, None)
+            state.retry_at = time.monotonic() + interval
+            return state.snapshot
+        state.retry_at = None
+        if state.generation != generation:
+            # Конфігурація змінилась під час завантаження - результат може бути застарілим
+            logger.info("Configuration changed while loading snapshot, will reload on next read")
+            state.snapshot = None
+            return loaded
+        state.snapshot = loaded
+        state.version_checked_at = time.monotonic()
+        logger.info(f"Configuration snapshot loaded (version {loaded.version})")
+        return loaded
+
+
+def invalidate_config_snapshot():
+    """Скинути знімок у поточному процесі; наступне читання завантажить його знову"""
+    _state.generation += 1
+    _state.snapshot = None
+    _state.retry_at = None
+
+
+def bump_config_version():
+    """
+    Збільшити лічильник версії та надіслати NOTIFY у поточній транзакції.
+    Викликається перед db.session.commit() у маршрутах, що змінюють конфігурацію;
+    PostgreSQL доставляє NOTIFY лише після успішного commit.
+    """
+    from models import db
+
+    updated = db.session.execute(
+        text("UPDATE configurations SET config_value = (COALESCE(NULLIF(config_value, ''), '0')::bigint + 1)::text "
+             "WHERE config_type = :config_type RETURNING config_value"),
+        {"config_type": CONFIG_VERSION_TYPE}
+    ).scalar()
+    if updated is None:
+        db.session.execute(
+            text("INSERT INTO configurations (name, config_type, config_value, description) "
+                 "VALUES ('config_version', :config_type, '1', 'Configuration change counter')"),
+            {"config_type": CONFIG_VERSION_TYPE}
+        )
+        updated = '1'
+    db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                       {"channel": CONFIG_NOTIFY_CHANNEL, "payload": str(updated)})
+
+
+class ConfigChangeListener(threading.Thread):
+    """Фоновий потік, що слухає канал NOTIFY і скидає знімок при змінах"""
+
+    def __init__(self, dsn: str, channel: str = CONFIG_NOTIFY_CHANNEL, reconnect_delay: float = 5.0):
+        super().__init__(name='config-listener', daemon=True)
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+        self.connected = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                self.connected.set()
+                # Зміни, пропущені до підписки, теж мають скинути знімок
+                invalidate_config_snapshot()
+
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        payload = conn.notifies[-1].payload
+                        del conn.notifies[:]
+                        logger.info(f"Configuration changed (version {payload}), invalidating snapshot")
+                        invalidate_config_snapshot()
+            except Exception as e:
+                logger.warning(f"Configuration listener error: {str(e)}")
+            finally:
+                self.connected.clear()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stopped.wait(self.reconnect_delay)
+
+    def healthy(self) -> bool:
+        """Потік працює і підписаний на канал"""
+        return self.is_alive() and self.connected.is_set()
+
+
+def _ensure_listener():
+    """Запустити слухача в поточному процесі (після fork потоки батьківського процесу не існують)"""
+    state = _state
+    pid = os.getpid()
+    if state.pid == pid:
+        return
+
+    with state.lock:
+        if state.pid == pid:
+            return
+        state.pid = pid
+        state.listener = None
+        state.snapshot = None
+
+        if not current_app.config.get('CONFIG_LISTEN_ENABLED', True):
+            return
+        from models import db
+        from sqlalchemy.engine import make_url
+        # LISTEN тримає стан сесії - через PgBouncer (пулінг транзакцій) лише напряму до PostgreSQL
+        direct_url = current_app.config.get('DB_DIRECT_URL')
+        if current_app.config.get('DB_PGBOUNCER_MODE') and not direct_url:
+            return
+        url = make_url(direct_url) if direct_url else db.engine.url
+        if not url.drivername.startswith('postgresql'):
+            return
+        dsn = url.set(drivername='postgresql').render_as_string(hide_password=False)
+        state.listener = ConfigChangeListener(dsn)
+        state.listener.start()
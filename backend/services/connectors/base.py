@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import time
 import logging
 from ..exceptions import SIEMConnectionError, SIEMAuthenticationError, SIEMResponseError, SIEMRateLimitError
+from ..metrics import CONNECTOR_REQUESTS, CONNECTOR_RETRIES
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +45,7 @@ class BaseSIEMConnector(ABC):
             raise SIEMConnectionError(self.get_siem_type(), "N/A", "API URL not configured")
         
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
+        siem = self.get_siem_type().lower()
         retries = 0
         last_exception = None
         
@@ -54,6 +56,7 @@ class BaseSIEMConnector(ABC):
         while retries < self.max_retries:
             try:
                 response = self.session.request(method, url, **kwargs)
+                CONNECTOR_REQUESTS.labels(siem, str(response.status_code)).inc()
                 
                 # Handle common error codes
                 if response.status_code == 401:
@@ -77,16 +80,22 @@ class BaseSIEMConnector(ABC):
                 
             except (requests.ConnectionError, requests.Timeout) as e:
                 last_exception = e
-                logger.warning(f"Connection error on {method} {url}: {str(e)}. Retry {retries+1}/{self.max_retries}")
-                time.sleep(self.retry_delay * (2 ** retries))  # Exponential backoff
+                CONNECTOR_REQUESTS.labels(siem, 'connection_error').inc()
+                # Повтор лише якщо буде ще одна спроба
+                if retries + 1 < self.max_retries:
+                    CONNECTOR_RETRIES.labels(siem).inc()
+                    logger.warning(f"Connection error on {method} {url}: {str(e)}. Retry {retries+1}/{self.max_retries}")
+                    time.sleep(self.retry_delay * (2 ** retries))  # Exponential backoff
                 retries += 1
             except (SIEMAuthenticationError, SIEMResponseError, SIEMRateLimitError):
                 # Don't retry auth errors or specific SIEM errors
                 raise
             except Exception as e:
                 last_exception = e
-                logger.warning(f"Unexpected error on {method} {url}: {str(e)}. Retry {retries+1}/{self.max_retries}")
-                time.sleep(self.retry_delay * (2 ** retries))
+                if retries + 1 < self.max_retries:
+                    CONNECTOR_RETRIES.labels(siem).inc()
+                    logger.warning(f"Unexpected error on {method} {url}: {str(e)}. Retry {retries+1}/{self.max_retries}")
+                    time.sleep(self.retry_delay * (2 ** retries))
                 retries += 1
         
         # If we got here, all retries failed
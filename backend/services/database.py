@@ -0,0 +1,307 @@
+"""
+Підключення до PostgreSQL: пул з'єднань, режим PgBouncer, statement_timeout, репліка для читання.
+
+Кожен воркер gunicorn має власний пул SQLAlchemy (DB_POOL_SIZE + DB_MAX_OVERFLOW з'єднань),
+тож сумарна кількість з'єднань - workers * (size + overflow). pre-ping перевіряє з'єднання
+перед видачею з пулу, а recycle закриває старі - після failover воркери не отримують мертві
+з'єднання і не відкривають їх усі одночасно.
+
+statement_timeout за замовчуванням задається параметром підключення (-c statement_timeout),
+а для окремих ендпоінтів (DB_ENDPOINT_STATEMENT_TIMEOUTS) - SET LOCAL на початку кожної
+транзакції запиту.
+
+Режим PgBouncer (DB_PGBOUNCER_MODE, пулінг транзакцій): з'єднання сервера змінюється між
+транзакціями, тож стан сесії недоступний. Параметри підключення не передаються (PgBouncer їх
+відхиляє), statement_timeout завжди ставиться через SET LOCAL, пул SQLAlchemy замінюється на
+NullPool (пулом керує PgBouncer), а LISTEN/NOTIFY знімка конфігурації йде напряму в PostgreSQL
+через DB_DIRECT_URL (без нього - опитування версії). psycopg2 не використовує серверні
+prepared statements, а серверні курсори stream_results живуть у межах транзакції.
+
+Аналітичні читання (дашборд, метрики ML, експорт датасету - декоратор read_replica або
+контекст replica_reads для фонових задач) йдуть на репліки DB_READ_REPLICA_URL, відставання
+яких не перевищує DB_REPLICA_MAX_LAG_SECONDS; інакше - на основну базу. flush завжди
+виконується на основній базі, тож інгестія та маркування не конкурують з аналітикою.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool
+
+from .metrics import DB_READ_ROUTES, DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+
+def parse_endpoint_timeouts(value: Optional[str]) -> Dict[str, int]:
+    """
+    "dashboard_bp=10000,data_labeling_bp.export_dataset=300000" -> {ендпоінт або blueprint: мс}
+    """
+    timeouts = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, ms = item.partition('=')
+        try:
+            timeouts[name.strip()] = int(ms)
+        except ValueError:
+            raise ValueError(f"Invalid statement timeout entry: {item.strip()!r}")
+    return timeouts
+
+
+def engine_options(config: Dict[str, Any], statement_timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Параметри create_engine для основної бази або репліки
+
+    Args:
+        config: Конфігурація застосунку
+        statement_timeout_ms: statement_timeout за замовчуванням (None - DB_STATEMENT_TIMEOUT_MS)
+    """
+    if statement_timeout_ms is None:
+        statement_timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    connect_args: Dict[str, Any] = {
+        "connect_timeout": config.get('DB_CONNECT_TIMEOUT', 5),
+        "application_name": config.get('DB_APPLICATION_NAME', 'logtagger'),
+        # Мертве з'єднання після failover виявляється за секунди, а не за хвилини TCP-тайм-аутів
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    }
+    if config.get('DB_PGBOUNCER_MODE'):
+        # Пулом серверних з'єднань керує PgBouncer; startup-параметри він не пропускає
+        connect_args.pop("application_name")
+        return {"poolclass": NullPool, "connect_args": connect_args}
+
+    if statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    return {
+        "pool_size": config.get('DB_POOL_SIZE', 5),
+        "max_overflow": config.get('DB_MAX_OVERFLOW', 10),
+        "pool_timeout": config.get('DB_POOL_TIMEOUT', 30),
+        "pool_recycle": config.get('DB_POOL_RECYCLE', 1800),
+        "pool_pre_ping": config.get('DB_POOL_PRE_PING', True),
+        "pool_use_lifo": True,
+        "connect_args": connect_args,
+    }
+
+
+def replica_urls(value: Optional[str]) -> List[str]:
+    """DB_READ_REPLICA_URL: одна або кілька DSN реплік через кому"""
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
+
+
+def replica_bind_key(index: int) -> str:
+    return REPLICA_BIND if index == 0 else f"{REPLICA_BIND}_{index + 1}"
+
+
+def configure_database(app):
+    """
+    Заповнити SQLALCHEMY_ENGINE_OPTIONS і SQLALCHEMY_BINDS до db.init_app
+
+    Явно задані в конфігурації значення не перезаписуються.
+    """
+    config = app.config
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(config))
+    urls = replica_urls(config.get('DB_READ_REPLICA_URL'))
+    if urls:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        for index, url in enumerate(urls):
+            binds.setdefault(replica_bind_key(index), dict(engine_options(config), url=url))
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+# Відставання репліки в секундах; NULL - невідоме (репліка ще нічого не відтворила)
+_REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+class ReplicaSelector:
+    """
+    Вибір репліки з відставанням у межах max_lag
+
+    Відставання кожної репліки перевіряється не частіше, ніж раз на check_interval секунд
+    (результат кешується в процесі), недоступна репліка або репліка з невідомим відставанням
+    вважається застарілою. Репліки обходяться по колу, щоб рівномірно розподіляти навантаження.
+    """
+
+    def __init__(self, max_lag: float = 30.0, check_interval: float = 5.0):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._checked: Dict[str, Tuple[float, Optional[float]]] = {}
+        self._fresh: Dict[str, bool] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def measure_lag(self, engine) -> Optional[float]:
+        if engine.dialect.name != 'postgresql':
+            # Відставання вимірюється лише для PostgreSQL (SQLite у тестах і локально - завжди свіжа)
+            return 0.0
+        with engine.connect() as conn:
+            lag = conn.execute(text(_REPLICA_LAG_SQL)).scalar()
+        return None if lag is None else float(lag)
+
+    def lag(self, key: str, engine) -> Optional[float]:
+        """Кешоване відставання репліки; None - недоступна або невідоме"""
+        now = time.monotonic()
+        checked = self._checked.get(key)
+        if checked and now - checked[0] < self.check_interval:
+            return checked[1]
+        try:
+            lag = self.measure_lag(engine)
+        except Exception as e:
+            logger.warning(f"Read replica {key} is unavailable: {str(e)}")
+            lag = None
+        self._checked[key] = (now, lag)
+        if lag is not None:
+            DB_REPLICA_LAG.labels(key).set(lag)
+        fresh = lag is not None and lag <= self.max_lag
+        if self._fresh.get(key, True) != fresh:
+            if fresh:
+                logger.info(f"Read replica {key} is back within {self.max_lag}s lag, routing reads to it")
+            else:
+                logger.warning(f"Read replica {key} lag is {lag if lag is None else round(lag, 1)}s "
+                               f"(limit {self.max_lag}s), reading from primary")
+        self._fresh[key] = fresh
+        return lag
+
+    def choose(self, engines: Dict[str, Any]) -> Tuple[Optional[Any], str]:
+        """
+        Returns:
+            (рушій репліки або None, причина: replica, primary_stale, primary_unavailable)
+        """
+        keys = sorted(engines)
+        with self._lock:
+            start = self._next
+            self._next += 1
+        stale = False
+        for offset in range(len(keys)):
+            key = keys[(start + offset) % len(keys)]
+            lag = self.lag(key, engines[key])
+            if lag is None:
+                continue
+            if lag <= self.max_lag:
+                return engines[key], 'replica'
+            stale = True
+        return None, 'primary_stale' if stale else 'primary_unavailable'
+
+
+# Область replica_reads: словник, у якому закріплюється вибраний рушій (ContextVar - працює і поза запитом)
+_read_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar('db_read_scope', default=None)
+
+
+def get_replica_selector() -> ReplicaSelector:
+    """Селектор реплік поточного застосунку"""
+    config = current_app.config
+    selector = current_app.extensions.get('replica_selector')
+    if selector is None:
+        selector = current_app.extensions['replica_selector'] = ReplicaSelector(
+            config.get('DB_REPLICA_MAX_LAG_SECONDS', 30), config.get('DB_REPLICA_CHECK_INTERVAL', 5))
+    return selector
+
+
+class RoutingSession(Session):
+    """
+    Сесія Flask-SQLAlchemy, що віддає читання в межах replica_reads репліці
+
+    Репліка вибирається один раз на область replica_reads, тож усі запити області бачать
+    одну й ту саму базу; якщо жодна репліка не вкладається в межу відставання - основна база.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        scope = _read_scope.get()
+        if bind is None and scope is not None and not self._flushing:
+            if 'engine' not in scope:
+                replicas = {key: engine for key, engine in self._db.engines.items()
+                            if key is not None and key.startswith(REPLICA_BIND)}
+                scope['engine'], target = get_replica_selector().choose(replicas) if replicas else (None, 'primary')
+                DB_READ_ROUTES.labels(target).inc()
+            if scope['engine'] is not None:
+                return scope['engine']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica() -> bool:
+    """Поточний код виконується в області читання з репліки"""
+    return _read_scope.get() is not None
+
+
+@contextmanager
+def replica_reads():
+    """
+    Область лише для читання: запити йдуть на репліку, якщо її налаштовано й вона свіжа
+
+    flush завжди йде на основну базу, тож ORM-записи в області безпечні; явні INSERT/UPDATE
+    через session.execute в області не виконуються.
+    """
+    token = _read_scope.set({})
+    try:
+        yield
+    finally:
+        _read_scope.reset(token)
+
+
+def read_replica(func):
+    """Декоратор ендпоінту або функції, що лише читає (див. replica_reads)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def statement_timeout_for(endpoint: Optional[str], timeouts: Dict[str, int]) -> Optional[int]:
+    """Тайм-аут ендпоінту: точний збіг "blueprint.view", далі blueprint"""
+    if not endpoint:
+        return None
+    if endpoint in timeouts:
+        return timeouts[endpoint]
+    blueprint = endpoint.rpartition('.')[0]
+    return timeouts.get(blueprint) if blueprint else None
+
+
+def _after_begin(session, transaction, connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    timeout = None
+    if has_request_context():
+        timeout = g.get('_statement_timeout')
+    if timeout is None and has_app_context() and current_app.config.get('DB_PGBOUNCER_MODE'):
+        timeout = current_app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    if timeout:
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout)}"))
+
+
+def init_database(app):
+    """
+    Тайм-аути запитів для ендпоінтів (викликається з create_app після db.init_app)
+
+    Args:
+        app: Flask-застосунок
+    """
+    timeouts = parse_endpoint_timeouts(app.config.get('DB_ENDPOINT_STATEMENT_TIMEOUTS'))
+    if not event.contains(Session, 'after_begin', _after_begin):
+        event.listen(Session, 'after_begin', _after_begin)
+
+    @app.before_request
+    def select_statement_timeout():
+        g._statement_timeout = statement_timeout_for(request.endpoint, timeouts)
+
+    if app.config.get('DB_PGBOUNCER_MODE'):
+        logger.info("Database configured for PgBouncer transaction pooling")
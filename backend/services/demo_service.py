@@ -6,6 +6,12 @@ import json
 from datetime import datetime, timedelta
 import ipaddress
 from models import Event, RawLog, db
+from services.partition_service import ensure_partitions_for_events
+from services.chain_correlation import correlate_events, correlation_input
+from services.feature_store import feature_input, store_features
+from services.near_duplicates import assign_clusters
+from services.mitre_kb import get_mitre_kb
+from services.active_learning import with_rule_labels
 import os
 import uuid
 
@@ -58,23 +64,9 @@ class DemoService:
         severities = ["low", "medium", "high", "critical"]
         severity_weights = [40, 30, 20, 10]  # Розподіл ваг для генерації
         
-        # Приклади тактик MITRE
-        mitre_tactics = [
-            "Initial Access", "Execution", "Persistence", "Privilege Escalation",
-            "Defense Evasion", "Credential Access", "Discovery", "Lateral Movement"
-        ]
-        
-        # Приклади технік MITRE відповідно до тактик
-        mitre_techniques = {
-            "Initial Access": ["Phishing", "Valid Accounts", "Supply Chain Compromise"],
-            "Execution": ["Command Line Interface", "PowerShell", "Scripting"],
-            "Persistence": ["Registry Run Keys", "Scheduled Task", "Create Account"],
-            "Privilege Escalation": ["Access Token Manipulation", "Bypass User Account Control"],
-            "Defense Evasion": ["Disable Security Tools", "Masquerading", "Rootkit"],
-            "Credential Access": ["Brute Force", "Credential Dumping", "Password Spraying"],
-            "Discovery": ["Account Discovery", "Network Service Scanning"],
-            "Lateral Movement": ["Remote Services", "Internal Spearphishing", "Pass the Hash"]
-        }
+        # Тактики та техніки MITRE з бази знань
+        mitre_techniques = get_mitre_kb().technique_names_by_tactic()
+        mitre_tactics = list(mitre_techniques.keys())
         
         # Генеруємо випадкові IP-адреси
         source_ips = [
@@ -242,6 +234,19 @@ class DemoService:
             "timestamp": event_time.isoformat()
         })
     
+    @staticmethod
+    def event_labels(event_data, chain_id=None):
+        """Мітки демо-події: true_positive, manual_tags і ланцюжок зберігаються в labels_data"""
+        labels = {"manual_tags": event_data.get("manual_tags", [])}
+        if event_data.get("true_positive") is not None:
+            labels["true_positive"] = event_data["true_positive"]
+        for field in ("attack_type", "mitre_tactic", "mitre_technique"):
+            if event_data.get(field):
+                labels[field] = event_data[field]
+        if chain_id:
+            labels["event_chain_id"] = chain_id
+        return with_rule_labels(labels)
+    
     @staticmethod
     def initialize_demo_database():
         """Ініціалізує базу даних демонстраційними даними"""
@@ -257,8 +262,24 @@ class DemoService:
                 print(f"Demo database already contains {existing_count} events. Skipping initialization.")
                 return
             
+            # Секції для діапазону демо-подій мають існувати до вставки
+            ensure_partitions_for_events(
+                datetime.fromisoformat(e["timestamp"]) for e in demo_data.get("events", [])
+            )
+            
+            # Ланцюжки демо-подій призначаються тим самим корелятором, що й під час інгестії
+            chain_ids = correlate_events([
+                (correlation_input(
+                    event_data["raw_logs"][0]["raw_log"] if event_data.get("raw_logs") else None,
+                    source_ip=event_data["source_ip"], severity=event_data["severity"], siem_source="demo",
+                    attack_type=event_data.get("attack_type"), mitre_tactic=event_data.get("mitre_tactic")
+                ), datetime.fromisoformat(event_data["timestamp"]))
+                for event_data in demo_data.get("events", [])
+            ])
+            
             # Додаємо події до бази
-            for event_data in demo_data.get("events", []):
+            features = []
+            for event_data, chain_id in zip(demo_data.get("events", []), chain_ids):
                 # Створюємо подію
                 event = Event(
                     event_id=event_data["event_id"],
@@ -270,8 +291,7 @@ class DemoService:
                     mitre_tactic=event_data.get("mitre_tactic"),
                     mitre_technique=event_data.get("mitre_technique"),
                     manual_review=event_data.get("manual_review", False),
-                    true_positive=event_data.get("true_positive"),
-                    manual_tags=event_data.get("manual_tags", [])
+                    labels_data=DemoService.event_labels(event_data, chain_id)
                 )
                 db.session.add(event)
                 db.session.flush()  # Отримуємо ID події
@@ -280,11 +300,17 @@ class DemoService:
                 for raw_log_data in event_data.get("raw_logs", []):
                     raw_log = RawLog(
                         event_id=event.id,
-                        siem_source="demo",
-                        raw_log=raw_log_data["raw_log"]
+                        log_data=raw_log_data["raw_log"],
+                        source="demo",
+                        timestamp=event.timestamp
                     )
                     db.session.add(raw_log)
+                
+                raw_logs = event_data.get("raw_logs", [])
+                features.append((event.id, feature_input(event, raw_logs[0]["raw_log"] if raw_logs else None)))
             
+            store_features(features)
+            assign_clusters((event_id, data.get("raw_log")) for event_id, data in features)
             db.session.commit()
             print(f"Added {len(demo_data.get('events', []))} demo events to database.")
         except Exception as e:
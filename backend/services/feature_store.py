@@ -0,0 +1,361 @@
+"""
+Сховище попередньо обчислених векторів ознак подій.
+
+Під час інгестії кожна подія отримує компактний розріджений вектор (feature hashing):
+токени назви правила та повідомлення, серйозність, джерело, ознаки IP-адрес і структуровані
+поля raw_log. Вектор зберігається в таблиці event_features (bytea) і завантажується пакетно
+як CSR-матриця, тож повторна оцінка всього корпусу новою моделлю - це матрична операція
+без повторного розбору сирого JSON.
+
+Формат bytea: заголовок '<HI' (версія ознак, кількість ненульових) + int32 індекси + float32 значення.
+"""
+import ipaddress
+import logging
+import math
+import re
+import struct
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+try:
+    import scipy.sparse
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# Версія схеми ознак; змінюється разом з будь-якою зміною екстрактора або розмірності
+FEATURE_VERSION = 2
+N_FEATURES = 2 ** 18
+
+TEXT_FIELDS = ('rule_name', 'rule.description', 'message', 'full_log', 'description', 'attack_type')
+# Поля raw_log, що токенізуються як текст, а не як пари ключ=значення
+RAW_TEXT_KEYS = {'full_log', 'message', 'description', 'log', 'raw'}
+MAX_RAW_DEPTH = 3
+MAX_VALUE_LENGTH = 64
+
+_TOKEN_RE = re.compile(r'[a-z0-9_]{2,40}')
+_HEADER = struct.Struct('<HI')
+
+
+def _hash(token: str) -> Tuple[int, float]:
+    h = zlib.crc32(token.encode('utf-8'))
+    return h % N_FEATURES, (1.0 if h & 0x80000000 else -1.0)
+
+
+def _nested(data: Dict[str, Any], path: str) -> Any:
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+class FeatureExtractor:
+    """Перетворення події на розріджений хешований вектор ознак"""
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.n_features = n_features
+
+    def _add(self, acc: Dict[int, float], token: str, value: float = 1.0):
+        index, sign = _hash(token)
+        index %= self.n_features
+        acc[index] = acc.get(index, 0.0) + sign * value
+
+    def _add_text(self, acc: Dict[int, float], prefix: str, value: Any):
+        counts: Dict[str, int] = {}
+        for token in _TOKEN_RE.findall(str(value).lower()):
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self._add(acc, f"{prefix}:{token}", 1.0 + math.log(count))
+
+    def _add_ip(self, acc: Dict[int, float], name: str, value: Any):
+        try:
+            ip = ipaddress.ip_address(str(value).strip())
+        except ValueError:
+            return
+        self._add(acc, f"{name}:v{ip.version}")
+        if ip.is_private:
+            self._add(acc, f"{name}:private")
+        if ip.is_loopback:
+            self._add(acc, f"{name}:loopback")
+        if ip.version == 4:
+            octets = str(ip).split('.')
+            self._add(acc, f"{name}:/16={octets[0]}.{octets[1]}")
+        else:
+            self._add(acc, f"{name}:/48={ipaddress.ip_network(f'{ip}/48', strict=False).network_address}")
+
+    def _add_raw(self, acc: Dict[int, float], data: Any, prefix: str = '', depth: int = 0):
+        if depth > MAX_RAW_DEPTH:
+            return
+        if isinstance(data, dict):
+            for key, value in data.items():
+                self._add_raw(acc, value, f"{prefix}.{key}" if prefix else str(key), depth + 1)
+        elif isinstance(data, list):
+            for value in data[:16]:
+                self._add_raw(acc, value, prefix, depth + 1)
+        elif isinstance(data, bool):
+            self._add(acc, f"f:{prefix}={str(data).lower()}")
+        elif isinstance(data, (int, float)):
+            if math.isfinite(data):
+                self._add(acc, f"n:{prefix}", math.copysign(math.log1p(abs(data)), data))
+        elif isinstance(data, str) and data:
+            if prefix.rsplit('.', 1)[-1] in RAW_TEXT_KEYS or len(data) > MAX_VALUE_LENGTH:
+                self._add_text(acc, f"t:{prefix}", data)
+            else:
+                self._add(acc, f"f:{prefix}={data.lower()}")
+
+    def transform_one(self, event: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Обчислити вектор для однієї події
+
+        Args:
+            event: Словник з полями події; raw_log - у ключі 'raw_log'
+
+        Returns:
+            (індекси int32 за зростанням, значення float32), L2-нормалізовані
+        """
+        acc: Dict[int, float] = {}
+
+        for field in TEXT_FIELDS:
+            value = _nested(event, field)
+            if value:
+                self._add_text(acc, "w", value)
+
+        # ID правил маркування LogTagger - окремі ознаки, не змішані з назвою правила SIEM
+        for rule_id in str(event.get("detected_rule") or '').split(','):
+            if rule_id.strip():
+                self._add(acc, f"rule={rule_id.strip().lower()}")
+
+        if event.get("severity"):
+            self._add(acc, f"sev={str(event['severity']).lower()}")
+        if event.get("siem_source"):
+            self._add(acc, f"src={str(event['siem_source']).lower()}")
+        for name in ('source_ip', 'destination_ip'):
+            if event.get(name):
+                self._add_ip(acc, name, event[name])
+
+        raw_log = event.get("raw_log")
+        if isinstance(raw_log, dict):
+            self._add_raw(acc, raw_log)
+
+        if not acc:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        indices = np.fromiter(sorted(acc), dtype=np.int32, count=len(acc))
+        values = np.fromiter((acc[i] for i in indices.tolist()), dtype=np.float32, count=len(acc))
+        norm = float(np.linalg.norm(values))
+        if norm > 0:
+            values /= norm
+        return indices, values
+
+    def transform(self, events: Iterable[Dict[str, Any]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [self.transform_one(event) for event in events]
+
+
+def pack_vector(indices: np.ndarray, values: np.ndarray, version: int = FEATURE_VERSION) -> bytes:
+    return (_HEADER.pack(version, len(indices))
+            + indices.astype('<i4', copy=False).tobytes()
+            + values.astype('<f4', copy=False).tobytes())
+
+
+def unpack_vector(data: bytes) -> Tuple[int, np.ndarray, np.ndarray]:
+    version, nnz = _HEADER.unpack_from(data)
+    offset = _HEADER.size
+    indices = np.frombuffer(data, dtype='<i4', count=nnz, offset=offset)
+    values = np.frombuffer(data, dtype='<f4', count=nnz, offset=offset + 4 * nnz)
+    return version, indices, values
+
+
+class FeatureMatrix:
+    """Розріджена матриця ознак у форматі CSR (рядок = подія)"""
+
+    def __init__(self, event_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 n_features: int = N_FEATURES):
+        self.event_ids = event_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    @classmethod
+    def from_vectors(cls, event_ids: Sequence[int], vectors: Sequence[Tuple[np.ndarray, np.ndarray]],
+                     n_features: int = N_FEATURES) -> 'FeatureMatrix':
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        if vectors:
+            np.cumsum([len(indices) for indices, _ in vectors], out=indptr[1:])
+        indices = np.concatenate([v[0] for v in vectors]) if vectors else np.zeros(0, dtype=np.int32)
+        data = np.concatenate([v[1] for v in vectors]) if vectors else np.zeros(0, dtype=np.float32)
+        return cls(np.asarray(event_ids, dtype=np.int64), indptr, indices, data, n_features)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.event_ids), self.n_features
+
+    def to_scipy(self):
+        """scipy.sparse.csr_matrix (потрібен scipy)"""
+        if not HAS_SCIPY:
+            raise RuntimeError("scipy is not installed")
+        return scipy.sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def dot(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Лінійна оцінка всіх рядків: X @ weights без scipy
+
+        Args:
+            weights: Вектор (n_features,) або матриця (n_features, k)
+
+        Returns:
+            Масив (n_rows,) або (n_rows, k)
+        """
+        weights = np.asarray(weights, dtype=np.float32)
+        products = self.data[:, None] * weights[self.indices] if weights.ndim == 2 else self.data * weights[self.indices]
+        rows = np.repeat(np.arange(len(self.event_ids)), np.diff(self.indptr))
+        out = np.zeros((len(self.event_ids),) + weights.shape[1:], dtype=np.float64)
+        np.add.at(out, rows, products)
+        return out
+
+
+def build_feature_input(raw_log: Optional[Dict[str, Any]], labels: Optional[Dict[str, Any]] = None,
+                        severity: Optional[str] = None, siem_source: Optional[str] = None,
+                        source_ip: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Словник для екстрактора; один і той самий для інгестії та дообчислення, тож вектори збігаються
+
+    rule_name - назва правила SIEM з raw_log (rule_name або rule.description), detected_rule -
+    ID правил маркування LogTagger з міток.
+    """
+    labels = labels or {}
+    data = {
+        "severity": severity,
+        "siem_source": siem_source,
+        "source_ip": source_ip,
+        "rule_name": labels.get("rule_name"),
+        "detected_rule": labels.get("detected_rule"),
+        "attack_type": labels.get("attack_type"),
+    }
+    if isinstance(raw_log, dict):
+        data["raw_log"] = raw_log
+        for field in ('rule_name', 'message', 'full_log'):
+            if not data.get(field) and raw_log.get(field):
+                data[field] = raw_log[field]
+        if not data.get("rule_name"):
+            data["rule_name"] = _nested(raw_log, "rule.description")
+    return data
+
+
+def feature_input(event, raw_log: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Словник для екстрактора з моделі Event (для дообчислення та класифікації)"""
+    if raw_log is None and getattr(event, 'raw_logs', None):
+        raw_log = event.raw_logs[0].log_data
+    return build_feature_input(raw_log, event.labels_data, severity=event.severity,
+                               siem_source=event.siem_source, source_ip=event.source_ip)
+
+
+def store_features(rows: Iterable[Tuple[int, Dict[str, Any]]], extractor: Optional[FeatureExtractor] = None) -> int:
+    """
+    Обчислити та зберегти вектори пакетом (INSERT ... ON CONFLICT DO UPDATE)
+
+    Args:
+        rows: Пари (events.id, словник події для екстрактора)
+
+    Returns:
+        Кількість збережених векторів
+    """
+    from models import db
+
+    extractor = extractor or FeatureExtractor()
+    params = []
+    for event_id, data in rows:
+        indices, values = extractor.transform_one(data)
+        params.append({"event_id": event_id, "version": FEATURE_VERSION, "vector": pack_vector(indices, values)})
+
+    if params:
+        db.session.execute(text(
+            "INSERT INTO event_features (event_id, feature_version, vector, created_at) "
+            "VALUES (:event_id, :version, :vector, now()) "
+            "ON CONFLICT (event_id) DO UPDATE SET feature_version = EXCLUDED.feature_version, "
+            "vector = EXCLUDED.vector, created_at = EXCLUDED.created_at"
+        ), params)
+    return len(params)
+
+
+def load_vectors(event_ids: Sequence[int], version: int = FEATURE_VERSION) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Вектори для конкретних подій одним запитом"""
+    from models import db
+
+    if not event_ids:
+        return {}
+    result = db.session.execute(
+        text("SELECT event_id, vector FROM event_features WHERE feature_version = :version "
+             "AND event_id = ANY(:ids)"),
+        {"version": version, "ids": list(event_ids)}
+    )
+    vectors = {}
+    for event_id, data in result:
+        _, indices, values = unpack_vector(bytes(data))
+        vectors[event_id] = (indices, values)
+    return vectors
+
+
+def load_feature_matrix(event_ids: Optional[Sequence[int]] = None, version: int = FEATURE_VERSION,
+                        batch_size: int = 10000) -> FeatureMatrix:
+    """
+    Завантажити вектори пакетно як CSR-матрицю (потоково, серверним курсором)
+
+    Args:
+        event_ids: Обмежити певними подіями (None - увесь корпус)
+        version: Версія ознак
+        batch_size: Розмір порції при читанні
+
+    Returns:
+        FeatureMatrix, рядки впорядковані за event_id
+    """
+    from models import db
+
+    sql = "SELECT event_id, vector FROM event_features WHERE feature_version = :version"
+    params: Dict[str, Any] = {"version": version}
+    if event_ids is not None:
+        sql += " AND event_id = ANY(:ids)"
+        params["ids"] = list(event_ids)
+    sql += " ORDER BY event_id"
+
+    result = db.session.execute(text(sql).execution_options(stream_results=True, yield_per=batch_size), params)
+    ids, vectors = [], []
+    for event_id, data in result:
+        _, indices, values = unpack_vector(bytes(data))
+        ids.append(event_id)
+        vectors.append((indices, values))
+    return FeatureMatrix.from_vectors(ids, vectors)
+
+
+def backfill_features(batch_size: int = 1000, limit: Optional[int] = None) -> int:
+    """
+    Дообчислити вектори для подій, що їх ще не мають або мають стару версію
+
+    Returns:
+        Кількість оброблених подій
+    """
+    from models import db, Event
+
+    extractor = FeatureExtractor()
+    processed = 0
+    while limit is None or processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        missing = db.session.execute(text(
+            "SELECT e.id FROM events e LEFT JOIN event_features f ON f.event_id = e.id "
+            "AND f.feature_version = :version WHERE f.event_id IS NULL ORDER BY e.id LIMIT :limit"
+        ), {"version": FEATURE_VERSION, "limit": size}).scalars().all()
+        if not missing:
+            break
+        events = Event.query.filter(Event.id.in_(missing)).all()
+        store_features(((event.id, feature_input(event)) for event in events), extractor)
+        db.session.commit()
+        processed += len(missing)
+        logger.info(f"Feature vectors computed for {processed} events")
+    return processed
@@ -0,0 +1,284 @@
+"""
+Окремий процес інференсу за Unix-сокетом з динамічним пакетуванням.
+
+Веб-воркери (провайдер 'inference_server') надсилають події серверу, а той об'єднує запити
+від усіх воркерів у пакети: пакет відправляється в модель, щойно набрано max_batch_size
+подій або минуло max_wait_ms від першої події в черзі. Одиночний запит чекає не довше
+max_wait_ms, тому затримка /api/ml/classify/<id> залишається низькою.
+
+Протокол: кадри `4 байти довжини (big-endian) + JSON`.
+  запит:   {"op": "classify" | "ping" | "info", "events": [...]}
+  відповідь: {"success": true, "results": [...]} або {"success": false, "error": "..."}
+
+Запуск: python manage.py inference-server --socket /tmp/logtagger-inference.sock
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.getenv('ML_INFERENCE_SOCKET', '/tmp/logtagger-inference.sock')
+
+_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+class InferenceError(Exception):
+    """Помилка обміну з сервером інференсу"""
+    pass
+
+
+def send_frame(sock: socket.socket, payload: Dict[str, Any]):
+    data = json.dumps(payload, default=str).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Dict[str, Any]:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise InferenceError(f"Frame too large: {size} bytes")
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+
+class DynamicBatcher:
+    """Черга подій від усіх з'єднань, що обробляється пакетами пулом потоків моделі"""
+
+    def __init__(self, provider, max_batch_size: int = 64, max_wait_ms: float = 5.0, workers: int = 1):
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._stopped = threading.Event()
+        self.stats = {"batches": 0, "events": 0, "max_batch": 0}
+        self._threads = [
+            threading.Thread(target=self._run, name=f'inference-batcher-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, events: List[Dict[str, Any]]) -> List[Future]:
+        futures = []
+        for event in events:
+            future = Future()
+            self._queue.put((event, future))
+            futures.append(future)
+        return futures
+
+    def stop(self):
+        self._stopped.set()
+
+    def _collect(self) -> List[tuple]:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Все, що вже в черзі, забираємо без очікування; далі чекаємо до дедлайну
+                batch.append(self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            events = [event for event, _ in batch]
+            try:
+                results = self.provider.batch_classify(events)
+                if len(results) != len(events):
+                    raise InferenceError("Provider returned a wrong number of results")
+            except Exception as e:
+                logger.error(f"Inference batch failed: {str(e)}")
+                results = [{"success": False, "error": str(e)} for _ in events]
+
+            self.stats["batches"] += 1
+            self.stats["events"] += len(events)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(events))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Обробник одного з'єднання веб-воркера (запити в ньому - послідовні)"""
+
+    def setup(self):
+        self.server.inference.connections.add(self.request)
+
+    def finish(self):
+        self.server.inference.connections.discard(self.request)
+
+    def handle(self):
+        server: InferenceServer = self.server.inference
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_frame(self.request, {"success": False, "error": f"Bad request: {str(e)}"})
+                return
+
+            op = request.get("op")
+            try:
+                if op == "classify":
+                    futures = server.batcher.submit(request.get("events") or [])
+                    response = {"success": True, "results": [future.result() for future in futures]}
+                elif op == "ping":
+                    response = {"success": True, "message": "pong"}
+                elif op == "info":
+                    response = {"success": True, "info": server.info()}
+                else:
+                    response = {"success": False, "error": f"Unknown op: {op}"}
+            except Exception as e:
+                logger.error(f"Inference request failed: {str(e)}")
+                response = {"success": False, "error": str(e)}
+
+            try:
+                send_frame(self.request, response)
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Для AF_UNIX переповнена черга очікування дає EAGAIN у connect()
+    request_queue_size = 128
+
+
+class InferenceServer:
+    """Сервер інференсу: модель завантажується один раз, запити пакетуються"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, provider=None, model_path: Optional[str] = None,
+                 load_mode: Optional[str] = None, max_batch_size: int = 64, max_wait_ms: float = 5.0,
+                 workers: int = 1):
+        from .ml_providers import DummyMLProvider, LocalMLProvider
+
+        if provider is None:
+            provider = LocalMLProvider(model_path, load_mode) if model_path else DummyMLProvider()
+        self.provider = provider
+        self.socket_path = socket_path
+        self.batcher = DynamicBatcher(provider, max_batch_size, max_wait_ms, workers)
+        self.started_at = time.time()
+        self.connections = set()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self._server = _UnixServer(socket_path, _RequestHandler)
+        self._server.inference = self
+        os.chmod(socket_path, 0o660)
+
+    def info(self) -> Dict[str, Any]:
+        model_info = self.provider.get_model_info().get("model_info", {})
+        return {
+            "provider": type(self.provider).__name__,
+            "model_info": model_info,
+            "max_batch_size": self.batcher.max_batch_size,
+            "max_wait_ms": self.batcher.max_wait * 1000,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "stats": dict(self.batcher.stats),
+        }
+
+    def serve_forever(self):
+        logger.info(f"Inference server listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._cleanup()
+
+    def start(self) -> threading.Thread:
+        """Запустити сервер у фоновому потоці (для тестів та вбудованого режиму)"""
+        thread = threading.Thread(target=self._server.serve_forever, name='inference-server', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Зупинити сервер, запущений через start()"""
+        self._server.shutdown()
+        self._cleanup()
+
+    def _cleanup(self):
+        self.batcher.stop()
+        self._server.server_close()
+        # Відкриті з'єднання воркерів закриваються, щоб клієнти отримали помилку замість очікування
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class InferenceClient:
+    """Клієнт сервера інференсу: одне постійне з'єднання на потік"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Надіслати запит; при розриві з'єднання - одна повторна спроба"""
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_frame(sock, payload)
+                return recv_frame(sock)
+            except (ConnectionError, BrokenPipeError) as e:
+                self._reset()
+                if attempt:
+                    raise InferenceError(str(e))
+            except OSError as e:
+                self._reset()
+                raise InferenceError(str(e))
+
+    def classify(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = self.request({"op": "classify", "events": events})
+        if not response.get("success"):
+            raise InferenceError(response.get("error", "Unknown error"))
+        return response["results"]
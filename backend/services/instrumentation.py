@@ -0,0 +1,234 @@
+"""
+Інструментування запитів: час обробки, запити до БД, час ML і серіалізації, профілювання.
+
+Для кожного HTTP-запиту накопичуються:
+  - кількість і сумарний час SQL-запитів (події before/after_cursor_execute рушія SQLAlchemy);
+  - час ML-провайдера (timed('ml') навколо викликів провайдера в MLService);
+  - час серіалізації JSON (JSON-провайдер застосунку).
+Підсумок віддається заголовком Server-Timing і гістограмами Prometheus (services/metrics.py,
+/metrics). Повторення одного й того самого SQL в межах запиту понад поріг журналюється як
+імовірний N+1.
+
+Семплювальний профайлер (INSTRUMENTATION_PROFILER_ENABLED) вмикається для частки запитів
+або заголовком X-Profile: 1 і зберігає "згорнуті" стеки (формат flamegraph.pl / speedscope)
+лише для запитів, повільніших за поріг.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import REQUEST_COMPONENT_SECONDS, REQUEST_QUERIES, REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TIMED_COMPONENTS = ('db', 'ml', 'serialize')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class RequestStats:
+    """Лічильники одного запиту"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = dict.fromkeys(TIMED_COMPONENTS, 0.0)
+        self.db_queries = 0
+        self.statements: Counter = Counter()
+        self.profiler: Optional['SamplingProfiler'] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Значення заголовка Server-Timing (тривалості в мс)"""
+        parts = [f"total;dur={self.elapsed * 1000:.1f}"]
+        for component in TIMED_COMPONENTS:
+            entry = f"{component};dur={self.seconds[component] * 1000:.1f}"
+            if component == 'db':
+                entry += f';desc="{self.db_queries} queries"'
+            parts.append(entry)
+        return ", ".join(parts)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Лічильники поточного запиту; None поза запитом або без інструментування"""
+    if not has_request_context():
+        return None
+    return g.get('_request_stats')
+
+
+@contextmanager
+def timed(component: str):
+    """Додати час блоку до компонента поточного запиту (поза запитом - нічого не робить)"""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.seconds[component] += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    started = conn.info.get('_query_started')
+    if stats is None or not started:
+        return
+    stats.seconds['db'] += time.perf_counter() - started.pop()
+    stats.db_queries += 1
+    stats.statements[statement] += 1
+
+
+def _handle_error(exception_context):
+    # Незавершений запит не повинен зсувати стек часу для наступних
+    started = exception_context.connection.info.get('_query_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON-провайдер Flask, що рахує час серіалізації відповіді"""
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+class SamplingProfiler:
+    """
+    Семплювальний профайлер одного потоку: фоновий потік періодично знімає стек
+    цільового потоку (sys._current_frames) і рахує однакові стеки
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Стеки у згорнутому форматі: "кадр;кадр;кадр кількість" на рядок"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _endpoint() -> str:
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _save_profile(app, stats: RequestStats, elapsed: float) -> Optional[str]:
+    directory = app.config.get('INSTRUMENTATION_PROFILE_DIR', 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', _endpoint()).strip('_') or 'root'
+    path = os.path.join(directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{request.method}_{name}_{elapsed * 1000:.0f}ms.folded")
+    with open(path, 'w') as f:
+        f.write(stats.profiler.folded())
+    return path
+
+
+def init_instrumentation(app):
+    """
+    Підключити інструментування до застосунку (викликається з create_app)
+
+    Args:
+        app: Flask-застосунок
+    """
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+
+    # Слухачі на класі Engine охоплюють усі рушії процесу, реєструються один раз
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.json = TimedJSONProvider(app)
+    server_timing = app.config.get('SERVER_TIMING_ENABLED', True)
+    repeated_threshold = app.config.get('INSTRUMENTATION_REPEATED_QUERY_THRESHOLD', 20)
+    profiler_enabled = app.config.get('INSTRUMENTATION_PROFILER_ENABLED', False)
+    sample_rate = app.config.get('INSTRUMENTATION_PROFILE_SAMPLE_RATE', 0.01)
+    slow_seconds = app.config.get('INSTRUMENTATION_PROFILE_SLOW_MS', 1000) / 1000.0
+
+    @app.before_request
+    def start_request_stats():
+        stats = g._request_stats = RequestStats()
+        if profiler_enabled and (request.headers.get('X-Profile') == '1' or random.random() < sample_rate):
+            stats.profiler = SamplingProfiler(
+                threading.get_ident(), app.config.get('INSTRUMENTATION_PROFILE_INTERVAL_MS', 5) / 1000.0
+            ).start()
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        elapsed = stats.elapsed
+        endpoint = _endpoint()
+        if server_timing:
+            response.headers['Server-Timing'] = stats.server_timing()
+        REQUEST_SECONDS.labels(request.method, endpoint, str(response.status_code)).observe(elapsed)
+        REQUEST_QUERIES.labels(endpoint).observe(stats.db_queries)
+        for component, seconds in stats.seconds.items():
+            REQUEST_COMPONENT_SECONDS.labels(endpoint, component).observe(seconds)
+        if stats.statements:
+            statement, count = stats.statements.most_common(1)[0]
+            if count >= repeated_threshold:
+                logger.warning(f"Possible N+1 in {request.method} {endpoint}: statement executed {count} times: "
+                               f"{_WHITESPACE.sub(' ', statement)[:200]}")
+        if stats.profiler:
+            stats.profiler.stop()
+            if elapsed >= slow_seconds or request.headers.get('X-Profile') == '1':
+                path = _save_profile(app, stats, elapsed)
+                logger.info(f"Profile of {request.method} {endpoint} ({elapsed * 1000:.0f} ms, "
+                            f"{stats.profiler.samples} samples) written to {path}")
+            stats.profiler = None
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        stats = current_stats()
+        if stats is not None and stats.profiler:
+            stats.profiler.stop()
+
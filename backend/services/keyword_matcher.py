@@ -0,0 +1,247 @@
+"""
+Багатошаблонний пошук ключових слів (Aho-Corasick) для маркування за rule_name та message.
+
+Автомат будується один раз з усіх ключових слів і проходить текст за один прохід,
+тому вартість пошуку не залежить від кількості правил. Якщо встановлено pyahocorasick,
+використовується його C-реалізація, інакше - чиста Python-реалізація.
+"""
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ahocorasick  # pyahocorasick
+    HAS_PYAHOCORASICK = True
+except ImportError:
+    ahocorasick = None
+    HAS_PYAHOCORASICK = False
+
+
+class _PythonAutomaton:
+    """Чиста Python-реалізація автомата Aho-Corasick"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Any]] = [[]]
+
+    def add(self, keyword: str, value: Any):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(value)
+
+    def build(self):
+        # Обхід у ширину: посилання невдачі та об'єднання виходів суфіксних станів
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_values(self, text: str) -> Iterable[Any]:
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield from output[state]
+
+
+class _NativeAutomaton:
+    """Обгортка над pyahocorasick.Automaton з тим самим інтерфейсом"""
+
+    def __init__(self):
+        self._automaton = ahocorasick.Automaton()
+        self._values: Dict[str, List[Any]] = {}
+
+    def add(self, keyword: str, value: Any):
+        self._values.setdefault(keyword, []).append(value)
+
+    def build(self):
+        for keyword, values in self._values.items():
+            self._automaton.add_word(keyword, values)
+        self._automaton.make_automaton()
+
+    def iter_values(self, text: str) -> Iterable[Any]:
+        for _, values in self._automaton.iter(text):
+            yield from values
+
+
+class KeywordMatcher:
+    """Пошук усіх ключових слів у тексті без урахування регістру"""
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]] = (), backend: Optional[str] = None):
+        """
+        Ініціалізація пошуковика
+
+        Args:
+            keywords: Пари (ключове слово, значення), наприклад (слово, індекс правила)
+            backend: 'native', 'python' або None (автовибір)
+        """
+        if backend is None:
+            backend = 'native' if HAS_PYAHOCORASICK else 'python'
+        if backend == 'native' and not HAS_PYAHOCORASICK:
+            raise ValueError("pyahocorasick is not installed")
+
+        self.backend = backend
+        self._automaton = _NativeAutomaton() if backend == 'native' else _PythonAutomaton()
+        self._built = False
+        self.size = 0
+
+        for keyword, value in keywords:
+            self.add(keyword, value)
+
+    def add(self, keyword: str, value: Any):
+        """
+        Додати ключове слово
+
+        Args:
+            keyword: Ключове слово (порожні рядки ігноруються)
+            value: Значення, що повертається при знаходженні
+        """
+        if self._built:
+            raise RuntimeError("Cannot add keywords after the automaton is built")
+        keyword = str(keyword).lower()
+        if keyword:
+            self._automaton.add(keyword, value)
+            self.size += 1
+
+    def build(self):
+        """Побудувати автомат; викликається один раз після додавання всіх слів"""
+        if not self._built:
+            self._automaton.build()
+            self._built = True
+
+    def find(self, text: str) -> List[Any]:
+        """
+        Знайти значення всіх ключових слів, що містяться в тексті
+
+        Args:
+            text: Текст для пошуку
+
+        Returns:
+            Список значень (без повторів, у порядку першої появи)
+        """
+        if not self.size or not text:
+            return []
+        self.build()
+        seen = set()
+        result = []
+        for value in self._automaton.iter_values(text.lower()):
+            if value not in seen:
+                seen.add(value)
+                result.append(value)
+        return result
+
+
+_REGEX_META = set('.^$*+?{}[]()|\\')
+_QUANTIFIERS = set('*?{')
+# \x41, \u0041, \N{...}, \101, \1 - коди символів і зворотні посилання, а не літерали
+_NUMERIC_ESCAPES = set('xuUN0123456789')
+_INLINE_FLAGS = set('aiLmsux-')
+
+
+def required_literal(pattern: str, min_length: int = 3) -> Optional[str]:
+    """
+    Виділити найдовший літеральний фрагмент, який обов'язково присутній у будь-якому збігу regex.
+    Використовується як префільтр: регулярний вираз перевіряється лише якщо фрагмент знайдено.
+
+    Args:
+        pattern: Регулярний вираз
+        min_length: Мінімальна довжина корисного фрагмента
+
+    Returns:
+        Фрагмент у нижньому регістрі або None, якщо безпечно виділити його неможливо
+    """
+    runs = []
+    current = []
+    depth = 0
+    i = 0
+    length = len(pattern)
+
+    while i < length:
+        char = pattern[i]
+
+        if char == '\\' and i + 1 < length:
+            escaped = pattern[i + 1]
+            if escaped in _NUMERIC_ESCAPES:
+                return None
+            if depth == 0 and not escaped.isalnum():
+                current.append(escaped)
+            else:
+                # Класи символів на кшталт \d, \w, \s - не літерали
+                if depth == 0:
+                    runs.append(''.join(current))
+                    current = []
+            i += 2
+            continue
+
+        if char == '[':
+            # Пропускаємо клас символів повністю
+            if depth == 0:
+                runs.append(''.join(current))
+                current = []
+            i += 1
+            if i < length and pattern[i] == ']':
+                i += 1
+            while i < length and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+
+        if char == '(':
+            if pattern[i + 1:i + 2] == '?' and pattern[i + 2:i + 3] in _INLINE_FLAGS:
+                # (?x), (?i:...) тощо змінюють розбір або регістр решти виразу
+                return None
+            if depth == 0:
+                runs.append(''.join(current))
+                current = []
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif char == '|':
+            if depth == 0:
+                # Альтернатива на верхньому рівні - жоден фрагмент не є обов'язковим
+                return None
+        elif depth == 0:
+            if char in _QUANTIFIERS:
+                # Символ перед ?, * або {0,..} може бути відсутнім
+                if current:
+                    current.pop()
+                runs.append(''.join(current))
+                current = []
+                if char == '{':
+                    while i < length and pattern[i] != '}':
+                        i += 1
+            elif char == '+':
+                runs.append(''.join(current))
+                current = []
+            elif char in _REGEX_META:
+                runs.append(''.join(current))
+                current = []
+            else:
+                current.append(char)
+        i += 1
+
+    runs.append(''.join(current))
+    best = max(runs, key=len) if runs else ''
+    return best.lower() if len(best) >= min_length else None
@@ -0,0 +1,362 @@
+"""
+Історія міток подій: журнал label_revisions лише для додавання та стиснені знімки.
+
+label_revisions секціонується за часом запису (partitions-init), а тригер забороняє
+UPDATE/DELETE/TRUNCATE поза обслуговуванням секцій. Ущільнення (compact_revisions, cron)
+для кожної події, що змінилася з попереднього прогону, записує в label_snapshots стан
+міток на момент cutoff, тож відновлення "станом на T" читає найближчий знімок і короткий
+хвіст журналу:
+  - є знімок <= T: знімок + останні значення ключів у (snapshot_at, T];
+  - є лише знімок > T: знімок з відкатом ключів до old_value найранішого запису в (T, snapshot_at];
+  - знімків немає: поточні мітки з таким самим відкатом записів після T.
+Старі секції журналу видаляються лише після того, як їх покрив завершений прогін ущільнення.
+
+Записи журналу мають час початку своєї транзакції (now() або час застосунку), а видимими
+стають лише після commit, тож запис зі штампом до cutoff може з'явитися вже після прогону.
+Тому cutoff ущільнення і as_of експорту не пізніші за stable_horizon(): now мінус
+LABEL_COMPACTION_LAG_SECONDS і не пізніше початку найстарішої відкритої транзакції бази.
+Лаг має перевищувати найдовшу транзакцію маркування та розбіжність годинників застосунку
+й PostgreSQL - він єдиний захист, якщо роль не бачить чужих сесій у pg_stat_activity
+або запит виконується на репліці.
+
+Експорт "станом на T" відбирає події за events.ingested_at <= T (час запису, а не час SIEM),
+тож подія з минулим timestamp, завантажена пізніше, не змінює вже зроблений експорт.
+
+Журнал пишуть усі шляхи, що змінюють мітки наявних подій: групове маркування та масова
+верифікація (labeling_service), поширення на кластери (near_duplicates.propagate_labels),
+повторна класифікація, ML-класифікація й верифікація окремої події (record_revisions)
+та програвання ланцюжків. Мітки, з якими подію створено під час інгестії, - її початковий
+стан і в журнал не потрапляють; архів labels_data["ml_history"] також не журналюється.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from .labeling_service import COLUMN_LABELS
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_SETTING = 'logtagger.maintenance'
+
+APPEND_ONLY_SQL = (
+    f"""
+    CREATE OR REPLACE FUNCTION label_revisions_append_only() RETURNS trigger AS $$
+    BEGIN
+        IF current_setting('{MAINTENANCE_SETTING}', true) = 'on' THEN
+            RETURN COALESCE(OLD, NEW);
+        END IF;
+        RAISE EXCEPTION 'label_revisions is append-only (% is not allowed)', TG_OP;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS label_revisions_append_only ON label_revisions",
+    "CREATE TRIGGER label_revisions_append_only BEFORE UPDATE OR DELETE ON label_revisions "
+    "FOR EACH ROW EXECUTE FUNCTION label_revisions_append_only()",
+    "DROP TRIGGER IF EXISTS label_revisions_no_truncate ON label_revisions",
+    "CREATE TRIGGER label_revisions_no_truncate BEFORE TRUNCATE ON label_revisions "
+    "FOR EACH STATEMENT EXECUTE FUNCTION label_revisions_append_only()",
+)
+
+# Для наявних баз: події, записані до оновлення, отримують час виконання ALTER TABLE
+INGESTED_AT_SQL = (
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS ingested_at timestamptz NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_events_ingested_at ON events (ingested_at)",
+)
+
+_FAR_FUTURE = datetime(9999, 12, 31)
+
+_SNAPSHOT_BEFORE_SQL = (
+    "SELECT DISTINCT ON (event_id) event_id, snapshot_at, labels FROM label_snapshots "
+    "WHERE event_id = ANY(:ids) AND snapshot_at <= :ts ORDER BY event_id, snapshot_at DESC"
+)
+_SNAPSHOT_AFTER_SQL = (
+    "SELECT DISTINCT ON (event_id) event_id, snapshot_at, labels FROM label_snapshots "
+    "WHERE event_id = ANY(:ids) AND snapshot_at > :ts ORDER BY event_id, snapshot_at"
+)
+_CURRENT_SQL = (
+    "SELECT id, labels_data, attack_type, mitre_tactic, mitre_technique FROM events WHERE id = ANY(:ids)"
+)
+
+# Останнє значення кожного ключа в (bound, ts] - для руху вперед від знімка
+_FORWARD_SQL = """
+SELECT DISTINCT ON (r.event_id, r.label_key) r.event_id, r.label_key, r.new_value AS value,
+       r.new_value IS NULL AS absent
+FROM label_revisions r
+JOIN unnest(CAST(:ids AS integer[]), CAST(:bounds AS timestamp[])) AS b(event_id, bound) ON b.event_id = r.event_id
+WHERE r.timestamp > b.bound AND r.timestamp <= :ts AND r.timestamp > :min_bound
+ORDER BY r.event_id, r.label_key, r.timestamp DESC, r.id DESC
+"""
+
+# Попереднє значення кожного ключа з найранішого запису в (ts, bound] - для відкату назад
+_UNDO_SQL = """
+SELECT DISTINCT ON (r.event_id, r.label_key) r.event_id, r.label_key, r.old_value AS value,
+       r.old_value IS NULL AS absent
+FROM label_revisions r
+JOIN unnest(CAST(:ids AS integer[]), CAST(:bounds AS timestamp[])) AS b(event_id, bound) ON b.event_id = r.event_id
+WHERE r.timestamp > :ts AND r.timestamp <= b.bound
+ORDER BY r.event_id, r.label_key, r.timestamp, r.id
+"""
+
+# Записи відкритих транзакцій матимуть штамп не раніше їх початку
+_OLDEST_TRANSACTION_SQL = (
+    "SELECT min(xact_start) AT TIME ZONE 'utc' FROM pg_stat_activity "
+    "WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid() AND datname = current_database()"
+)
+
+_CHANGED_SQL = (
+    "SELECT event_id, count(*) AS revisions FROM label_revisions "
+    "WHERE timestamp > :watermark AND timestamp <= :cutoff AND event_id > :after_id "
+    "GROUP BY event_id ORDER BY event_id LIMIT :limit"
+)
+
+_INSERT_SNAPSHOTS_SQL = """
+INSERT INTO label_snapshots (event_id, snapshot_at, labels, revisions)
+SELECT d.event_id, :cutoff, d.labels::json, d.revisions
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS d(event_id integer, labels jsonb, revisions integer)
+ON CONFLICT (event_id, snapshot_at) DO NOTHING
+"""
+
+
+def ensure_append_only():
+    """Створити тригер, що забороняє змінювати та видаляти записи журналу міток"""
+    from models import db
+
+    for statement in APPEND_ONLY_SQL:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def ensure_ingested_at():
+    """Додати колонку events.ingested_at та її індекс до наявної таблиці"""
+    from models import db
+
+    for statement in INGESTED_AT_SQL:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+
+def allow_log_maintenance():
+    """Дозволити DELETE з журналу до кінця поточної транзакції (обслуговування секцій)"""
+    from models import db
+
+    db.session.execute(text("SELECT set_config(:name, 'on', true)"), {"name": MAINTENANCE_SETTING})
+
+
+def current_labels(labels_data: Optional[Dict[str, Any]], columns: Dict[str, Any]) -> Dict[str, Any]:
+    """Поточні мітки події: labels_data з мітками-колонками, яких у ньому немає"""
+    labels = dict(labels_data or {})
+    for name in COLUMN_LABELS:
+        if name not in labels and columns.get(name) is not None:
+            labels[name] = columns[name]
+    return labels
+
+
+def event_labels(event) -> Dict[str, Any]:
+    """Поточні мітки ORM-об'єкта події (копія)"""
+    return current_labels(event.labels_data, {name: getattr(event, name, None) for name in COLUMN_LABELS})
+
+
+def record_revisions(event_id: int, before: Dict[str, Any], after: Dict[str, Any], action: str, source: str,
+                     user_id: Optional[str] = None) -> int:
+    """
+    Додати до сесії записи журналу для змінених міток однієї події (ORM-шляхи)
+
+    Args:
+        before: Мітки до зміни (current_labels)
+        after: Мітки після зміни
+
+    Returns:
+        Кількість записів
+    """
+    from models import db, LabelRevision
+
+    now = datetime.utcnow()
+    count = 0
+    for key in sorted(set(before) | set(after)):
+        if key in before and key in after and before[key] == after[key]:
+            continue
+        db.session.add(LabelRevision(
+            event_id=event_id, timestamp=now, user_id=user_id, action=action, label_key=key,
+            old_value=before.get(key), new_value=after.get(key), source=source
+        ))
+        count += 1
+    return count
+
+
+def apply_revisions(base: Dict[str, Any], rows: Iterable[Tuple[str, Any, bool]]) -> Dict[str, Any]:
+    """
+    Застосувати значення ключів до копії міток
+
+    Args:
+        base: Вихідні мітки
+        rows: (ключ, значення, ключа немає) - нове значення для руху вперед
+              або попереднє значення для відкату
+
+    Returns:
+        Нові мітки
+    """
+    labels = dict(base)
+    for key, value, absent in rows:
+        if absent:
+            labels.pop(key, None)
+        else:
+            labels[key] = value
+    return labels
+
+
+def _grouped(rows) -> Dict[int, List[Tuple[str, Any, bool]]]:
+    grouped: Dict[int, List[Tuple[str, Any, bool]]] = {}
+    for row in rows:
+        grouped.setdefault(row.event_id, []).append((row.label_key, row.value, row.absent))
+    return grouped
+
+
+def labels_as_of(event_ids: Sequence[int], as_of: datetime) -> Dict[int, Dict[str, Any]]:
+    """
+    Відновити мітки подій станом на момент as_of
+
+    Returns:
+        {id події: мітки}; відсутні в базі події пропускаються
+    """
+    from models import db
+
+    ids = sorted({int(event_id) for event_id in event_ids})
+    if not ids:
+        return {}
+
+    result: Dict[int, Dict[str, Any]] = {}
+    before = {row.event_id: row for row in db.session.execute(
+        text(_SNAPSHOT_BEFORE_SQL), {"ids": ids, "ts": as_of}
+    )}
+    if before:
+        forward_ids = sorted(before)
+        bounds = [before[event_id].snapshot_at for event_id in forward_ids]
+        deltas = _grouped(db.session.execute(text(_FORWARD_SQL), {
+            "ids": forward_ids, "bounds": bounds, "ts": as_of, "min_bound": min(bounds)
+        }))
+        for event_id in forward_ids:
+            result[event_id] = apply_revisions(before[event_id].labels or {}, deltas.get(event_id, ()))
+
+    rest = [event_id for event_id in ids if event_id not in before]
+    if not rest:
+        return result
+
+    # Відкат від найближчого наступного знімка або від поточного стану події
+    bases: Dict[int, Tuple[Dict[str, Any], datetime]] = {
+        row.event_id: (row.labels or {}, row.snapshot_at)
+        for row in db.session.execute(text(_SNAPSHOT_AFTER_SQL), {"ids": rest, "ts": as_of})
+    }
+    current = [event_id for event_id in rest if event_id not in bases]
+    if current:
+        for row in db.session.execute(text(_CURRENT_SQL), {"ids": current}):
+            bases[row.id] = (current_labels(row.labels_data, row._mapping), _FAR_FUTURE)
+    if not bases:
+        return result
+
+    undo_ids = sorted(bases)
+    undo = _grouped(db.session.execute(text(_UNDO_SQL), {
+        "ids": undo_ids, "bounds": [bases[event_id][1] for event_id in undo_ids], "ts": as_of
+    }))
+    for event_id in undo_ids:
+        result[event_id] = apply_revisions(bases[event_id][0], undo.get(event_id, ()))
+    return result
+
+
+def stable_horizon() -> datetime:
+    """Найпізніший момент, до якого журнал міток уже не поповниться записами з меншим часом"""
+    from flask import current_app
+    from models import db
+
+    lag = current_app.config.get('LABEL_COMPACTION_LAG_SECONDS', 300)
+    horizon = datetime.utcnow() - timedelta(seconds=lag)
+    oldest = db.session.execute(text(_OLDEST_TRANSACTION_SQL)).scalar()
+    return min(horizon, oldest) if oldest else horizon
+
+
+def compaction_watermark() -> Optional[datetime]:
+    """Cutoff останнього завершеного прогону ущільнення"""
+    from models import db
+
+    return db.session.execute(
+        text("SELECT max(cutoff) FROM label_compactions WHERE status = 'completed'")
+    ).scalar()
+
+
+def compact_revisions(cutoff: Optional[datetime] = None, batch_size: Optional[int] = None):
+    """
+    Ущільнити журнал: записати знімки міток на момент cutoff для подій, змінених з попереднього прогону
+
+    Незавершений прогін (наприклад, після збою) продовжується з тим самим cutoff з останньої
+    записаної події; кожен пакет - окрема транзакція. cutoff новий прогін обмежує stable_horizon().
+
+    Returns:
+        LabelCompaction
+    """
+    from flask import current_app
+    from models import db, LabelCompaction
+
+    batch_size = batch_size or current_app.config.get('LABEL_COMPACTION_BATCH_SIZE', 2000)
+    watermark = compaction_watermark() or datetime.min
+
+    run = LabelCompaction.query.filter_by(status='running').order_by(LabelCompaction.id).first()
+    if run is None:
+        horizon = stable_horizon()
+        if cutoff and cutoff > horizon:
+            logger.warning(f"Label compaction cutoff {cutoff.isoformat()} is past the stable horizon, "
+                           f"using {horizon.isoformat()}")
+        cutoff = min(cutoff, horizon) if cutoff else horizon
+        run = LabelCompaction(cutoff=cutoff, status='running')
+        db.session.add(run)
+        db.session.commit()
+    if run.cutoff <= watermark:
+        run.status = 'completed'
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+        return run
+
+    after_id = db.session.execute(
+        text("SELECT max(event_id) FROM label_snapshots WHERE snapshot_at = :cutoff"), {"cutoff": run.cutoff}
+    ).scalar() or 0
+    while True:
+        changed = db.session.execute(text(_CHANGED_SQL), {
+            "watermark": watermark, "cutoff": run.cutoff, "after_id": after_id, "limit": batch_size
+        }).all()
+        if not changed:
+            break
+        labels = labels_as_of([row.event_id for row in changed], run.cutoff)
+        rows = [{"event_id": row.event_id, "labels": labels[row.event_id], "revisions": row.revisions}
+                for row in changed if row.event_id in labels]
+        if rows:
+            db.session.execute(text(_INSERT_SNAPSHOTS_SQL), {
+                "rows": json.dumps(rows, default=str), "cutoff": run.cutoff
+            })
+        run.events += len(rows)
+        run.revisions += sum(row.revisions for row in changed)
+        db.session.commit()
+        after_id = changed[-1].event_id
+        logger.info(f"Label compaction to {run.cutoff.isoformat()}: {run.events} snapshots written")
+
+    run.status = 'completed'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+def event_revisions(event_id: int, after_id: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Сторінка журналу змін міток події в хронологічному порядку
+
+    Returns:
+        (записи, курсор наступної сторінки або None)
+    """
+    from models import LabelRevision
+
+    rows = LabelRevision.query.filter(
+        LabelRevision.event_id == event_id, LabelRevision.id > after_id
+    ).order_by(LabelRevision.id).limit(limit + 1).all()
+    revisions = [row.to_dict() for row in rows[:limit]]
+    next_cursor = revisions[-1]["id"] if len(rows) > limit else None
+    return revisions, next_cursor
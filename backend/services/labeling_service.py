@@ -0,0 +1,361 @@
+"""
+Групове маркування подій: ланцюжки (labels_data.event_chain_id) та кластери майже однакових подій.
+
+Кожна операція - одна SQL-інструкція: CTE блокує цільові події, оновлює їх і масово
+вставляє відповідні рядки label_revisions (лише для міток, значення яких змінилося).
+Ланцюжок вибирається за частковим індексом ix_events_event_chain_id без повного сканування,
+тож операції працюють і для ланцюжків із сотень тисяч подій.
+
+Масова верифікація (bulk_verify) застосовує власний вердикт до кожної події пакета
+тим самим способом - одним UPDATE та однією вставкою журналу на пакет.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Мітки, що зберігаються також в окремих колонках events
+COLUMN_LABELS = ('attack_type', 'mitre_tactic', 'mitre_technique')
+SOURCES = ('manual', 'ml', 'rule')
+
+CHAIN_INDEX_SQL = (
+    "CREATE INDEX {concurrently} IF NOT EXISTS ix_events_event_chain_id "
+    "ON events ((labels_data->>'event_chain_id'), id) "
+    "WHERE labels_data->>'event_chain_id' IS NOT NULL"
+)
+
+# Розширення цілі на всіх членів кластерів майже однакових подій
+_WITH_DUPLICATES = (
+    "SELECT id FROM ({base}) AS g "
+    "UNION SELECT em.event_id FROM event_cluster_members m "
+    "JOIN event_cluster_members em ON em.cluster_id = m.cluster_id "
+    "WHERE m.event_id IN ({base})"
+)
+
+_APPLY_SQL = """
+WITH target AS (
+    SELECT e.id, e.labels_data::jsonb AS labels, e.attack_type, e.mitre_tactic, e.mitre_technique
+    FROM events e WHERE e.id IN ({target}) FOR UPDATE
+), upd AS (
+    UPDATE events e SET labels_data = (e.labels_data::jsonb || CAST(:labels AS jsonb))::json{columns}
+    FROM target t WHERE e.id = t.id
+    RETURNING e.id
+), rev AS (
+    INSERT INTO label_revisions (event_id, timestamp, user_id, action, label_key, old_value, new_value, source)
+    SELECT t.id, now() AT TIME ZONE 'utc', :user_id, :action, kv.key, o.value::json, kv.value::json, :source
+    FROM target t
+    JOIN upd ON upd.id = t.id
+    CROSS JOIN jsonb_each(CAST(:labels AS jsonb)) AS kv
+    CROSS JOIN LATERAL ({old_value}) AS o
+    WHERE o.value IS DISTINCT FROM kv.value
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM upd) AS updated, (SELECT count(*) FROM rev) AS revisions
+"""
+
+# Попереднє значення мітки kv.key цільової події t (мітки-колонки можуть бути лише в колонці)
+OLD_VALUE_SQL = """SELECT CASE kv.key
+        WHEN 'attack_type' THEN COALESCE(t.labels->'attack_type', to_jsonb(t.attack_type))
+        WHEN 'mitre_tactic' THEN COALESCE(t.labels->'mitre_tactic', to_jsonb(t.mitre_tactic))
+        WHEN 'mitre_technique' THEN COALESCE(t.labels->'mitre_technique', to_jsonb(t.mitre_technique))
+        ELSE t.labels->kv.key
+    END AS value"""
+
+# Масова верифікація: кожна подія пакета отримує власний вердикт (jsonb_to_recordset),
+# поточні ML-мітки зберігаються з префіксом ml_, як у POST /api/ml/verify-label
+_VERIFY_SQL = """
+WITH data AS (
+    SELECT * FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS d(event_id integer, labels jsonb)
+), target AS (
+    SELECT e.id, e.labels_data::jsonb AS labels, e.attack_type, e.mitre_tactic, e.mitre_technique,
+           d.labels || jsonb_build_object('human_verified', true, 'verification_timestamp', CAST(:now AS text)) AS verdict
+    FROM events e JOIN data d ON d.event_id = e.id
+    WHERE (e.labels_data->>'ml_processed')::boolean IS TRUE
+    FOR UPDATE OF e
+), upd AS (
+    UPDATE events e SET
+        labels_data = (t.labels || jsonb_build_object(
+            'ml_true_positive', t.labels->'true_positive',
+            'ml_attack_type', COALESCE(t.labels->'attack_type', to_jsonb(t.attack_type)),
+            'ml_mitre_tactic', COALESCE(t.labels->'mitre_tactic', to_jsonb(t.mitre_tactic)),
+            'ml_mitre_technique', COALESCE(t.labels->'mitre_technique', to_jsonb(t.mitre_technique))
+        ) || t.verdict)::json,
+        attack_type = CASE WHEN t.verdict ? 'attack_type' THEN t.verdict->>'attack_type' ELSE e.attack_type END,
+        mitre_tactic = CASE WHEN t.verdict ? 'mitre_tactic' THEN t.verdict->>'mitre_tactic' ELSE e.mitre_tactic END,
+        mitre_technique = CASE WHEN t.verdict ? 'mitre_technique'
+                               THEN t.verdict->>'mitre_technique' ELSE e.mitre_technique END
+    FROM target t WHERE e.id = t.id
+    RETURNING e.id
+), rev AS (
+    INSERT INTO label_revisions (event_id, timestamp, user_id, action, label_key, old_value, new_value, source)
+    SELECT t.id, CAST(:now AS timestamp), :user_id, 'verify', kv.key, o.value::json, kv.value::json, 'manual'
+    FROM target t
+    JOIN upd ON upd.id = t.id
+    CROSS JOIN jsonb_each(t.verdict - 'verification_timestamp') AS kv
+    CROSS JOIN LATERAL ({old_value}) AS o
+    WHERE o.value IS DISTINCT FROM kv.value
+    RETURNING 1
+)
+SELECT (SELECT array_agg(id) FROM upd) AS updated_ids, (SELECT count(*) FROM rev) AS revisions
+"""
+
+# Поля вердикту верифікації та допустимі типи значень
+VERDICT_FIELDS = {
+    'true_positive': (bool, type(None)),
+    'attack_type': (str, type(None)),
+    'mitre_tactic': (str, type(None)),
+    'mitre_technique': (str, type(None)),
+    'verification_comment': (str, type(None)),
+    'verified_labels': (dict,),
+}
+VERIFY_CHUNK_SIZE = 1000
+
+
+class LabelingError(Exception):
+    """Некоректний запит групового маркування"""
+    pass
+
+
+def ensure_chain_index(concurrently: bool = True):
+    """
+    Створити індекс ланцюжків для наявної таблиці events
+
+    CONCURRENTLY не блокує інгестію, але не підтримується для секціонованої таблиці -
+    тоді індекс створюється звичайним способом (і поширюється на всі секції).
+    """
+    from models import db
+
+    partitioned = db.session.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass('events')"
+    )).scalar()
+    db.session.commit()
+
+    if concurrently and not partitioned:
+        # CREATE INDEX CONCURRENTLY не можна виконувати всередині транзакції
+        with db.engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(
+                text(CHAIN_INDEX_SQL.format(concurrently='CONCURRENTLY'))
+            )
+    else:
+        db.session.execute(text(CHAIN_INDEX_SQL.format(concurrently='')))
+        db.session.commit()
+
+
+def _validate_labels(labels: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(labels, dict) or not labels:
+        raise LabelingError("labels must be a non-empty object")
+    for key in labels:
+        if not isinstance(key, str) or not key or len(key) > 100:
+            raise LabelingError(f"Invalid label key: {key!r}")
+    return labels
+
+
+def _apply(target_sql: str, params: Dict[str, Any], labels: Dict[str, Any], user_id: Optional[str],
+           source: str, action: str) -> Dict[str, int]:
+    from models import db
+
+    if source not in SOURCES:
+        raise LabelingError(f"Unknown source: {source}")
+    columns = ''.join(
+        f",\n        {name} = CAST(:labels AS jsonb)->>'{name}'" for name in COLUMN_LABELS if name in labels
+    )
+    sql = _APPLY_SQL.format(target=target_sql, columns=columns, old_value=OLD_VALUE_SQL)
+    row = db.session.execute(text(sql), dict(
+        params, labels=json.dumps(labels, default=str), user_id=user_id, action=action, source=source
+    )).first()
+    if labels.get("human_verified"):
+        # Перевірені події більше не потребують уваги в черзі верифікації
+        db.session.execute(text(f"DELETE FROM verification_queue WHERE event_id IN ({target_sql})"), params)
+    return {"updated_events": row.updated, "revisions": row.revisions}
+
+
+def _target(base_sql: str, include_duplicates: bool) -> str:
+    return _WITH_DUPLICATES.format(base=base_sql) if include_duplicates else base_sql
+
+
+def assign_chain(event_ids: Sequence[int], chain_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Об'єднати події в ланцюжок одним UPDATE з журналом змін
+
+    Returns:
+        {"updated_events", "revisions", "missing_ids"}
+    """
+    from models import db
+
+    ids = sorted({int(event_id) for event_id in event_ids})
+    if not ids:
+        raise LabelingError("No event IDs provided")
+    if not chain_id:
+        raise LabelingError("Event chain ID is required")
+
+    found = set(db.session.execute(
+        text("SELECT id FROM events WHERE id = ANY(:ids)"), {"ids": ids}
+    ).scalars().all())
+    missing = [event_id for event_id in ids if event_id not in found]
+    if missing:
+        return {"updated_events": 0, "revisions": 0, "missing_ids": missing}
+
+    result = _apply("SELECT unnest(CAST(:ids AS integer[])) AS id", {"ids": ids},
+                    {"event_chain_id": str(chain_id)}, user_id, 'manual', 'update')
+    result["missing_ids"] = []
+    return result
+
+
+def label_chain(chain_id: str, labels: Dict[str, Any], user_id: Optional[str] = None, source: str = 'manual',
+                verify: bool = False, include_duplicates: bool = False) -> Dict[str, int]:
+    """
+    Застосувати мітки до всіх подій ланцюжка
+
+    Args:
+        chain_id: ID ланцюжка
+        labels: Мітки (attack_type, mitre_tactic, mitre_technique, true_positive, довільні ключі)
+        verify: Позначити події як перевірені аналітиком
+        include_duplicates: Також усі майже однакові події членів ланцюжка
+    """
+    labels = dict(_validate_labels(labels))
+    if verify:
+        labels["human_verified"] = True
+    base = "SELECT id FROM events WHERE labels_data->>'event_chain_id' = :chain_id"
+    return _apply(_target(base, include_duplicates), {"chain_id": str(chain_id)}, labels, user_id, source,
+                  'verify' if verify else 'update')
+
+
+def label_cluster(cluster_id: int, labels: Dict[str, Any], user_id: Optional[str] = None, source: str = 'manual',
+                  verify: bool = False) -> Dict[str, int]:
+    """Застосувати мітки до всіх членів кластера майже однакових подій"""
+    labels = dict(_validate_labels(labels))
+    if verify:
+        labels["human_verified"] = True
+    base = "SELECT event_id FROM event_cluster_members WHERE cluster_id = :cluster_id"
+    return _apply(base, {"cluster_id": int(cluster_id)}, labels, user_id, source, 'verify' if verify else 'update')
+
+
+def chain_events(chain_id: str, after_id: int = 0, limit: int = 500) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Сторінка подій ланцюжка (keyset за id по індексу ланцюжків)
+
+    Returns:
+        (події, курсор наступної сторінки або None)
+    """
+    from models import db
+
+    rows = db.session.execute(text(
+        "SELECT id, event_id, timestamp, source_ip, severity, siem_source, attack_type, "
+        "mitre_tactic, mitre_technique, labels_data FROM events "
+        "WHERE labels_data->>'event_chain_id' = :chain_id AND id > :after_id ORDER BY id LIMIT :limit"
+    ), {"chain_id": str(chain_id), "after_id": after_id, "limit": limit + 1}).all()
+
+    events = [{
+        "id": row.id,
+        "event_id": row.event_id,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "source_ip": row.source_ip,
+        "severity": row.severity,
+        "siem_source": row.siem_source,
+        "attack_type": row.attack_type,
+        "mitre_tactic": row.mitre_tactic,
+        "mitre_technique": row.mitre_technique,
+        "labels": row.labels_data or {},
+    } for row in rows[:limit]]
+    next_cursor = events[-1]["id"] if len(rows) > limit else None
+    return events, next_cursor
+
+
+def parse_verdicts(data: Dict[str, Any], max_events: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Вердикти масової верифікації з тіла запиту
+
+    Приймається {"verdicts": [{"event_id": 1, "true_positive": true, ...}, ...]} або
+    {"event_ids": [...], <спільні поля вердикту>}; для повторного event_id діє останній вердикт.
+
+    Returns:
+        {id події: поля вердикту}
+    """
+    if not isinstance(data, dict):
+        raise LabelingError("Request body must be an object")
+    if 'verdicts' in data:
+        items = data['verdicts']
+        if not isinstance(items, list):
+            raise LabelingError("verdicts must be a list")
+    else:
+        event_ids = data.get('event_ids')
+        if not isinstance(event_ids, list):
+            raise LabelingError("Either verdicts or event_ids must be provided")
+        common = {key: value for key, value in data.items() if key in VERDICT_FIELDS}
+        items = [dict(common, event_id=event_id) for event_id in event_ids]
+
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise LabelingError("Each verdict must be an object")
+        try:
+            event_id = int(item['event_id'])
+        except (KeyError, TypeError, ValueError):
+            raise LabelingError(f"Invalid event_id in verdict: {item!r}")
+        verdict = {}
+        for key, value in item.items():
+            if key == 'event_id':
+                continue
+            if key not in VERDICT_FIELDS:
+                raise LabelingError(f"Unknown verdict field: {key}")
+            if not isinstance(value, VERDICT_FIELDS[key]):
+                raise LabelingError(f"Invalid value for {key} (event {event_id})")
+            verdict[key] = value
+        verdicts[event_id] = verdict
+
+    if not verdicts:
+        raise LabelingError("No verdicts provided")
+    if max_events and len(verdicts) > max_events:
+        raise LabelingError(f"Too many events in one request: {len(verdicts)} > {max_events}")
+    return verdicts
+
+
+def bulk_verify(verdicts: Dict[int, Dict[str, Any]], user_id: Optional[str] = None,
+                chunk_size: int = VERIFY_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Верифікувати ML-мітки багатьох подій (до commit поточної транзакції)
+
+    Кожен пакет із chunk_size подій - один UPDATE з JSONB-злиттям і одна багаторядкова
+    вставка label_revisions зі значеннями до та після. Перевірка поширюється на кластери
+    майже однакових подій, а події прибираються з черги верифікації.
+
+    Returns:
+        {"verified_events", "revisions", "missing_ids", "unprocessed_ids"}
+    """
+    from models import db
+    from .active_learning import dequeue_events
+    from .near_duplicates import cluster_member_ids, propagate_labels
+
+    now = datetime.utcnow().isoformat()
+    statement = text(_VERIFY_SQL.format(old_value=OLD_VALUE_SQL))
+    ids = sorted(verdicts)
+    verified = []
+    revisions = 0
+    for start in range(0, len(ids), chunk_size):
+        rows = [{"event_id": event_id, "labels": verdicts[event_id]} for event_id in ids[start:start + chunk_size]]
+        row = db.session.execute(statement, {
+            "rows": json.dumps(rows, default=str), "now": now, "user_id": user_id
+        }).first()
+        verified.extend(row.updated_ids or [])
+        revisions += row.revisions
+
+    if verified:
+        propagate_labels(verified, verified=True, user_id=user_id)
+        dequeue_events(set(cluster_member_ids(verified)) | set(verified))
+
+    skipped = sorted(set(ids) - set(verified))
+    found = set()
+    if skipped:
+        found = set(db.session.execute(
+            text("SELECT id FROM events WHERE id = ANY(:ids)"), {"ids": skipped}
+        ).scalars().all())
+    return {
+        "verified_events": len(verified),
+        "revisions": revisions,
+        "missing_ids": [event_id for event_id in skipped if event_id not in found],
+        "unprocessed_ids": [event_id for event_id in skipped if event_id in found],
+    }
@@ -0,0 +1,250 @@
+"""
+Синтетичне навантаження для перевірки пропускної здатності.
+
+Генератор повторно використовує шаблони DemoService._generate_raw_log_for_attack: для кожного
+типу атаки один раз будується пул варіантів шаблону, а далі всі випадкові величини пакета
+(тип атаки, серйозність, IP, агент, користувач, варіант шаблону, час, дублікати) обираються
+векторно з numpy. На одну подію лишається лише збирання словника у форматі Wazuh, Splunk
+або Elastic.
+
+  - rate: середня кількість подій за секунду в часі подій (пуассонівський потік);
+  - skew: показник Zipf для IP, агентів і користувачів (0 - рівномірно, 1+ - "гарячі" ключі);
+  - duplicate_ratio: частка повторів раніших подій пакета з новими ID та часом.
+
+Події виводяться пакетами: як нормалізовані записи для COPY (services/bulk_loader.py) або
+як відповіді API SIEM (для локальних mock-серверів і тестів конекторів).
+"""
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SIEM_TYPES = ('wazuh', 'splunk', 'elastic')
+TEMPLATE_VARIANTS = 64
+
+# Тип атаки: (вага, ID правила Wazuh, рівень, групи правила, опис)
+ATTACK_PROFILES = {
+    "Brute Force": (30, "5712", 10, ["authentication_failures", "sshd"],
+                    "sshd: brute force trying to get access to the system"),
+    "SQL Injection": (12, "31103", 7, ["web", "attack", "sql_injection"], "SQL injection attempt"),
+    "Cross-Site Scripting": (8, "31105", 6, ["web", "attack", "xss"], "XSS (Cross Site Scripting) attempt"),
+    "Denial of Service": (6, "40601", 10, ["ids", "dos"], "Network flood detected"),
+    "Phishing": (10, "86601", 5, ["email", "phishing"], "Suspicious email with phishing content"),
+    "Malware": (9, "52502", 12, ["malware", "virus"], "Malware detected in file operation"),
+    "Command Injection": (5, "31104", 8, ["web", "attack", "command_injection"], "Command injection attempt"),
+    "Directory Traversal": (6, "31106", 6, ["web", "attack", "path_traversal"], "Directory traversal attempt"),
+}
+ATTACK_TYPES = list(ATTACK_PROFILES)
+
+SEVERITIES = ("low", "medium", "high", "critical")
+SEVERITY_WEIGHTS = (40, 30, 20, 10)
+_WAZUH_LEVEL = {"low": 3, "medium": 5, "high": 8, "critical": 12}
+_SPLUNK_SEVERITY = {"low": "info", "medium": "warning", "high": "error", "critical": "critical"}
+_ELASTIC_SEVERITY = {"low": 2, "medium": 5, "high": 7, "critical": 10}
+
+
+def zipf_weights(size: int, skew: float) -> np.ndarray:
+    """Ймовірності рангів 1..size, пропорційні 1 / rank^skew"""
+    weights = 1.0 / np.power(np.arange(1, size + 1, dtype=np.float64), max(skew, 0.0))
+    return weights / weights.sum()
+
+
+class SyntheticWorkload:
+    """Генератор синтетичних подій SIEM пакетами"""
+
+    def __init__(self, num_events: int, siem_type: str = 'wazuh', rate: float = 100.0, skew: float = 1.1,
+                 duplicate_ratio: float = 0.2, start: Optional[datetime] = None, seed: int = 42,
+                 chunk_size: int = 10000, num_ips: int = 5000, num_agents: int = 200, num_users: int = 1000):
+        if siem_type not in SIEM_TYPES + ('mixed',):
+            raise ValueError(f"Unsupported SIEM type: {siem_type}")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.num_events = int(num_events)
+        self.siem_type = siem_type
+        self.rate = float(rate)
+        self.duplicate_ratio = min(max(float(duplicate_ratio), 0.0), 1.0)
+        self.chunk_size = max(1, int(chunk_size))
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        # За замовчуванням потік закінчується "зараз"
+        self.start = start or datetime.utcnow() - timedelta(seconds=self.num_events / self.rate)
+
+        octets = self.rng.integers(1, 255, size=(num_ips, 4))
+        self.ips = [f"{a}.{b}.{c}.{d}" for a, b, c, d in octets.tolist()]
+        self.agents = [f"agent-{number:04d}" for number in range(num_agents)]
+        self.agent_ips = [f"10.0.{number // 250}.{number % 250 + 1}" for number in range(num_agents)]
+        self.users = [f"user_{number}" for number in range(num_users)]
+        self.ip_weights = zipf_weights(num_ips, skew)
+        self.agent_weights = zipf_weights(num_agents, skew)
+        self.user_weights = zipf_weights(num_users, skew)
+        weights = np.array([ATTACK_PROFILES[name][0] for name in ATTACK_TYPES], dtype=np.float64)
+        self.attack_weights = weights / weights.sum()
+        self.severity_weights = np.array(SEVERITY_WEIGHTS, dtype=np.float64) / sum(SEVERITY_WEIGHTS)
+        self.templates = self._build_templates()
+
+    def _build_templates(self) -> List[List[Dict[str, Any]]]:
+        """Пули варіантів шаблонів DemoService (детерміновано, без зміни глобального random)"""
+        from .demo_service import DemoService
+
+        state = random.getstate()
+        random.seed(self.seed)
+        try:
+            return [[DemoService._generate_raw_log_for_attack(attack_type, "0.0.0.0", self.start)
+                     for _ in range(TEMPLATE_VARIANTS)] for attack_type in ATTACK_TYPES]
+        finally:
+            random.setstate(state)
+
+    def _draw(self, size: int, offset: float) -> Dict[str, np.ndarray]:
+        """Усі випадкові величини пакета одним викликом numpy на поле"""
+        rng = self.rng
+        gaps = rng.exponential(1.0 / self.rate, size=size)
+        draw = {
+            "attack": rng.choice(len(ATTACK_TYPES), size=size, p=self.attack_weights),
+            "severity": rng.choice(len(SEVERITIES), size=size, p=self.severity_weights),
+            "ip": rng.choice(len(self.ips), size=size, p=self.ip_weights),
+            "agent": rng.choice(len(self.agents), size=size, p=self.agent_weights),
+            "user": rng.choice(len(self.users), size=size, p=self.user_weights),
+            "variant": rng.integers(0, TEMPLATE_VARIANTS, size=size),
+            "offset": offset + np.cumsum(gaps),
+        }
+        # Повтор копіює вміст випадкової попередньої події пакета
+        duplicate = rng.random(size) < self.duplicate_ratio
+        duplicate[0] = False
+        source = (rng.random(size) * np.arange(size)).astype(np.int64)
+        for field in ("attack", "severity", "ip", "agent", "user", "variant"):
+            draw[field] = np.where(duplicate, draw[field][source], draw[field])
+        draw["siem"] = (rng.integers(0, len(SIEM_TYPES), size=size) if self.siem_type == 'mixed'
+                        else np.full(size, SIEM_TYPES.index(self.siem_type)))
+        return draw
+
+    def chunks(self, realtime: bool = False) -> Iterator[List[Tuple[str, datetime, Dict[str, Any]]]]:
+        """
+        Пакети подій (тип SIEM, час, сирий алерт у форматі SIEM)
+
+        Args:
+            realtime: Видавати пакети не швидше за rate подій на секунду
+        """
+        started = time.monotonic()
+        offset = 0.0
+        produced = 0
+        base = np.datetime64(self.start.replace(microsecond=0), 'us')
+        while produced < self.num_events:
+            size = min(self.chunk_size, self.num_events - produced)
+            draw = self._draw(size, offset)
+            offset = float(draw["offset"][-1])
+            stamps = base + (draw["offset"] * 1e6).astype('timedelta64[us]')
+            iso = np.datetime_as_string(stamps, unit='s').tolist()
+            timestamps = stamps.tolist()
+            # Списки Python індексуються значно швидше за скаляри numpy
+            columns = {field: values.tolist() for field, values in draw.items()}
+            chunk = []
+            for i in range(size):
+                siem = SIEM_TYPES[columns["siem"][i]]
+                chunk.append((siem, timestamps[i], self._alert(siem, produced + i, iso[i], columns, i)))
+            produced += size
+            if realtime:
+                ahead = produced / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            yield chunk
+
+    def _alert(self, siem: str, number: int, iso: str, draw: Dict[str, List[Any]], i: int) -> Dict[str, Any]:
+        attack_type = ATTACK_TYPES[draw["attack"][i]]
+        _, rule_id, level, groups, description = ATTACK_PROFILES[attack_type]
+        severity = SEVERITIES[draw["severity"][i]]
+        source_ip = self.ips[draw["ip"][i]]
+        agent = self.agents[draw["agent"][i]]
+        agent_ip = self.agent_ips[draw["agent"][i]]
+        user = self.users[draw["user"][i]]
+        template = dict(self.templates[draw["attack"][i]][draw["variant"][i]],
+                        source_ip=source_ip, timestamp=iso + "Z")
+        event_id = f"synthetic-{self.seed}-{number}"
+
+        if siem == 'wazuh':
+            return {
+                "id": event_id,
+                "timestamp": iso + "Z",
+                "rule": {"id": rule_id, "level": max(level, _WAZUH_LEVEL[severity]),
+                         "description": description, "groups": groups},
+                "agent": {"id": agent[-4:], "name": agent, "ip": agent_ip},
+                "data": dict(template, srcip=source_ip, srcuser=user),
+                "source": {"ip": source_ip},
+                "severity": severity,
+                "full_log": f"{iso} {agent} {template.get('message', description)} from {source_ip} user {user}",
+            }
+        if siem == 'splunk':
+            return dict(template, _cd=event_id, _time=iso + "Z", src_ip=source_ip, user=user, host=agent,
+                        severity=_SPLUNK_SEVERITY[severity], signature=description, rule_name=description,
+                        attack_type=attack_type)
+        return {
+            "_id": event_id,
+            "_index": f"filebeat-{iso[:10].replace('-', '.')}",
+            "_source": {
+                "@timestamp": iso + ".000Z",
+                "source": {"ip": source_ip},
+                "host": {"name": agent, "ip": [agent_ip]},
+                "user": {"name": user},
+                "event": {"severity": _ELASTIC_SEVERITY[severity], "category": groups[0], "original": template},
+                "rule": {"id": rule_id, "name": attack_type, "description": description},
+                "message": template.get("message", description),
+            },
+        }
+
+    def normalized_chunks(self, realtime: bool = False) -> Iterator[List[Dict[str, Any]]]:
+        """Пакети подій, нормалізованих конекторами SIEM (формат для bulk_loader.copy_events)"""
+        from .connectors.elastic import ElasticConnector
+        from .connectors.splunk import SplunkConnector
+        from .connectors.wazuh import WazuhConnector
+
+        connectors = {
+            'wazuh': WazuhConnector(None, None),
+            'splunk': SplunkConnector(None, None),
+            'elastic': ElasticConnector(None, None),
+        }
+        for chunk in self.chunks(realtime=realtime):
+            events = []
+            for siem, timestamp, alert in chunk:
+                event = connectors[siem].normalize_log(alert)
+                event["timestamp"] = timestamp
+                events.append(event)
+            yield events
+
+
+def api_response(siem_type: str, alerts: List[Dict[str, Any]], total: Optional[int] = None) -> Dict[str, Any]:
+    """Тіло відповіді API SIEM для пакета алертів (формат, який очікують конектори)"""
+    total = len(alerts) if total is None else total
+    if siem_type == 'wazuh':
+        return {"data": {"affected_items": alerts, "total_affected_items": total, "failed_items": []},
+                "error": 0}
+    if siem_type == 'splunk':
+        return {"results": alerts, "init_offset": 0, "preview": False}
+    if siem_type == 'elastic':
+        return {"took": 1, "timed_out": False,
+                "hits": {"total": {"value": total, "relation": "eq"}, "hits": alerts}}
+    raise ValueError(f"Unsupported SIEM type: {siem_type}")
+
+
+def load_into_db(workload: SyntheticWorkload, enrich: bool = True, realtime: bool = False) -> Dict[str, float]:
+    """
+    Завантажити навантаження в БД через COPY, по транзакції на пакет
+
+    Returns:
+        {"events", "seconds", "events_per_second"}
+    """
+    from models import db
+    from .bulk_loader import copy_events
+
+    started = time.perf_counter()
+    loaded = 0
+    for events in workload.normalized_chunks(realtime=realtime):
+        copy_events(events, enrich=enrich)
+        db.session.commit()
+        loaded += len(events)
+        logger.info(f"Synthetic load: {loaded}/{workload.num_events} events")
+    seconds = time.perf_counter() - started
+    return {"events": loaded, "seconds": seconds, "events_per_second": loaded / seconds if seconds else 0.0}
@@ -0,0 +1,228 @@
+"""
+Метрики Prometheus для інгестії, класифікації, експорту та пулу з'єднань з БД.
+
+prometheus_client необов'язковий: без нього метрики - заглушки без накладних витрат, а
+/metrics відповідає 501. Під gunicorn задайте PROMETHEUS_MULTIPROC_DIR (порожній каталог,
+спільний для воркерів) до запуску master-процесу: кожен воркер пише значення у власні
+mmap-файли, /metrics агрегує їх по всіх процесах, а gunicorn.conf.py очищає каталог на
+старті та позначає завершені воркери. Gauge пулу агрегуються як livesum - сума по живих
+воркерах.
+"""
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from flask import Response, jsonify
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    HAS_PROMETHEUS = True
+except ImportError:
+    prometheus_client = None
+    multiprocess = None
+    HAS_PROMETHEUS = False
+
+MULTIPROC_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+
+class _NoopMetric:
+    """Заглушка метрики, коли prometheus_client не встановлено"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...], buckets):
+    if not HAS_PROMETHEUS:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...]):
+    if not HAS_PROMETHEUS:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labels)
+
+
+def _gauge(name: str, documentation: str, labels: Tuple[str, ...] = (), multiprocess_mode: str = 'livesum'):
+    if not HAS_PROMETHEUS:
+        return _NoopMetric()
+    return prometheus_client.Gauge(name, documentation, labels, multiprocess_mode=multiprocess_mode)
+
+
+# HTTP-запити (services/instrumentation.py)
+REQUEST_SECONDS = _histogram('logtagger_http_request_duration_seconds', 'HTTP request wall time',
+                             ('method', 'endpoint', 'status'), LATENCY_BUCKETS)
+REQUEST_QUERIES = _histogram('logtagger_http_request_db_queries', 'SQL statements per HTTP request',
+                             ('endpoint',), COUNT_BUCKETS)
+REQUEST_COMPONENT_SECONDS = _histogram('logtagger_http_request_component_seconds',
+                                       'Time spent per request in DB, ML provider and serialization',
+                                       ('endpoint', 'component'), LATENCY_BUCKETS)
+
+# Конектори SIEM
+CONNECTOR_FETCH_SECONDS = _histogram('logtagger_connector_fetch_duration_seconds', 'SIEM poll (fetch_logs) latency',
+                                     ('siem', 'outcome'), LATENCY_BUCKETS)
+CONNECTOR_EVENTS_PER_POLL = _histogram('logtagger_connector_events_per_poll', 'Events returned by one SIEM poll',
+                                       ('siem',), COUNT_BUCKETS)
+CONNECTOR_REQUESTS = _counter('logtagger_connector_requests_total', 'SIEM API requests by HTTP status',
+                              ('siem', 'status'))
+CONNECTOR_RETRIES = _counter('logtagger_connector_retries_total', 'SIEM API requests retried after errors',
+                             ('siem',))
+
+# ML-класифікація
+ML_BATCH_SIZE = _histogram('logtagger_ml_batch_size', 'Events per ML provider call', ('provider',), COUNT_BUCKETS)
+ML_INFERENCE_SECONDS = _histogram('logtagger_ml_inference_duration_seconds', 'ML provider call latency',
+                                  ('provider', 'mode'), LATENCY_BUCKETS)
+ML_CONFIDENCE = _histogram('logtagger_ml_confidence', 'Confidence of successful classifications',
+                           ('provider',), CONFIDENCE_BUCKETS)
+ML_FAILURES = _counter('logtagger_ml_failed_classifications_total', 'Classifications the provider failed',
+                       ('provider',))
+ML_CACHE_REQUESTS = _counter('logtagger_ml_cache_requests_total', 'MLService result cache lookups', ('result',))
+
+# Експорт датасетів
+EXPORT_ROWS = _counter('logtagger_export_rows_total', 'Rows written by dataset exports', ('format',))
+EXPORT_SECONDS = _histogram('logtagger_export_duration_seconds', 'Dataset export duration', ('format',),
+                            LATENCY_BUCKETS)
+
+# Пул з'єднань SQLAlchemy
+DB_POOL_SIZE = _gauge('logtagger_db_pool_size', 'Configured connection pool size (summed over live workers)')
+DB_POOL_MAX_OVERFLOW = _gauge('logtagger_db_pool_max_overflow', 'Connections allowed above pool size')
+DB_POOL_CHECKED_OUT = _gauge('logtagger_db_pool_checked_out', 'Connections currently checked out of the pool')
+
+# Маршрутизація читань на репліки (services/database.py)
+DB_READ_ROUTES = _counter('logtagger_db_read_routing_total', 'Read-only scopes by chosen database', ('target',))
+DB_REPLICA_LAG = _gauge('logtagger_db_replica_lag_seconds', 'Last measured replication lag', ('replica',),
+                        multiprocess_mode='max')
+
+
+def provider_name(provider: Any) -> str:
+    """Мітка провайдера: DummyMLProvider -> dummy, InferenceServerProvider -> inferenceserver"""
+    return type(provider).__name__.replace('MLProvider', '').replace('Provider', '').lower() or 'unknown'
+
+
+def observe_inference(provider: Any, mode: str, seconds: float, results: Iterable[Dict[str, Any]]):
+    """Латентність, розмір пакета та впевненість одного виклику ML-провайдера"""
+    name = provider_name(provider)
+    results = list(results)
+    ML_INFERENCE_SECONDS.labels(name, mode).observe(seconds)
+    ML_BATCH_SIZE.labels(name).observe(len(results))
+    confidence = ML_CONFIDENCE.labels(name)
+    failed = 0
+    for result in results:
+        if result.get("success"):
+            confidence.observe(result.get("confidence", 0.0))
+        else:
+            failed += 1
+    if failed:
+        ML_FAILURES.labels(name).inc(failed)
+
+
+def observe_fetch(siem: str, seconds: float, events: Optional[int]):
+    """Одне опитування SIEM: events=None, якщо воно завершилось помилкою"""
+    CONNECTOR_FETCH_SECONDS.labels(siem, 'error' if events is None else 'ok').observe(seconds)
+    if events is not None:
+        CONNECTOR_EVENTS_PER_POLL.labels(siem).observe(events)
+
+
+def observe_export(export_format: str, rows: int, seconds: float):
+    """Завершений експорт: rate(logtagger_export_rows_total) дає рядків/с"""
+    EXPORT_ROWS.labels(export_format).inc(rows)
+    EXPORT_SECONDS.labels(export_format).observe(seconds)
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def track_pool(engines: Iterable[Any]):
+    """
+    Сумарний розмір пулів усіх рушіїв (основна база та репліки) - у тих самих межах,
+    що й зайняті з'єднання, які рахуються подіями checkout/checkin усіх пулів
+    """
+    size = overflow = 0
+    for engine in engines:
+        pool = engine.pool
+        if hasattr(pool, 'size'):
+            size += pool.size()
+            overflow += max(getattr(pool, '_max_overflow', 0), 0)
+    DB_POOL_SIZE.set(size)
+    DB_POOL_MAX_OVERFLOW.set(overflow)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Текст метрик для скрейпу: агрегація по процесах у multiprocess-режимі"""
+    if os.environ.get(MULTIPROC_ENV):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Прибрати live-gauge завершеного воркера (хук child_exit gunicorn)"""
+    if HAS_PROMETHEUS and os.environ.get(MULTIPROC_ENV):
+        multiprocess.mark_process_dead(pid)
+
+
+def reset_multiprocess_dir():
+    """Очистити файли метрик попереднього запуску (хук on_starting gunicorn)"""
+    directory = os.environ.get(MULTIPROC_ENV)
+    if not HAS_PROMETHEUS or not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
+
+
+def init_metrics(app):
+    """
+    Зареєструвати /metrics і лічильники пулу з'єднань (викликається з create_app)
+
+    Args:
+        app: Flask-застосунок
+    """
+    from models import db
+
+    if not event.contains(Pool, 'checkout', _on_checkout):
+        event.listen(Pool, 'checkout', _on_checkout)
+        event.listen(Pool, 'checkin', _on_checkin)
+    if HAS_PROMETHEUS:
+        with app.app_context():
+            try:
+                track_pool(db.engines.values())
+            except Exception as e:
+                logger.warning(f"Connection pool metrics unavailable: {str(e)}")
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if not HAS_PROMETHEUS:
+            return jsonify({"status": "error", "message": "prometheus_client is not installed"}), 501
+        payload, content_type = metrics_payload()
+        return Response(payload, content_type=content_type)
@@ -0,0 +1,373 @@
+"""
+База знань MITRE ATT&CK з попередньо побудованими індексами.
+
+Файл data/mitre_attack.json читається один раз і перечитується лише при зміні mtime.
+Підтримується як спрощений формат {"tactics": [...], "techniques": [...]},
+так і STIX-бандл ATT&CK (enterprise-attack.json). Усі пошуки - O(1) за хеш-індексами.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .keyword_matcher import KeywordMatcher
+from .rule_engine import get_field
+
+logger = logging.getLogger(__name__)
+
+MITRE_DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'mitre_attack.json')
+
+# Як часто (у секундах) перевіряти mtime файлу
+RELOAD_CHECK_INTERVAL = 5.0
+
+# Базові дані, якщо файл відсутній
+FALLBACK_DATA = {
+    "tactics": [
+        {"id": "TA0001", "name": "Initial Access", "description": "Initial access techniques..."},
+        {"id": "TA0002", "name": "Execution", "description": "Execution techniques..."},
+        {"id": "TA0003", "name": "Persistence", "description": "Persistence techniques..."},
+        {"id": "TA0004", "name": "Privilege Escalation", "description": "Privilege Escalation techniques..."},
+        {"id": "TA0005", "name": "Defense Evasion", "description": "Defense Evasion techniques..."},
+        {"id": "TA0006", "name": "Credential Access", "description": "Credential Access techniques..."},
+        {"id": "TA0007", "name": "Discovery", "description": "Discovery techniques..."},
+        {"id": "TA0008", "name": "Lateral Movement", "description": "Lateral Movement techniques..."},
+        {"id": "TA0009", "name": "Collection", "description": "Collection techniques..."},
+        {"id": "TA0010", "name": "Exfiltration", "description": "Exfiltration techniques..."},
+        {"id": "TA0011", "name": "Command and Control", "description": "Command and Control techniques..."},
+        {"id": "TA0040", "name": "Impact", "description": "Impact techniques..."}
+    ],
+    "techniques": [
+        {"id": "T1566", "name": "Phishing", "tactic_ids": ["TA0001"], "description": "Phishing techniques..."},
+        {"id": "T1204", "name": "User Execution", "tactic_ids": ["TA0002"], "description": "User execution..."},
+        {"id": "T1078", "name": "Valid Accounts", "tactic_ids": ["TA0001"], "description": "Valid Accounts..."},
+        {"id": "T1059", "name": "Command Line Interface", "tactic_ids": ["TA0002"], "description": "Command Line..."},
+        {"id": "T1053", "name": "Scheduled Task", "tactic_ids": ["TA0003"], "description": "Scheduled Task..."},
+        {"id": "T1548", "name": "Bypass User Account Control", "tactic_ids": ["TA0004"], "description": "UAC Bypass..."},
+        {"id": "T1562", "name": "Disable Security Tools", "tactic_ids": ["TA0005"], "description": "Disable Security Tools..."},
+        {"id": "T1110", "name": "Brute Force", "tactic_ids": ["TA0006"], "description": "Brute Force..."},
+        {"id": "T1046", "name": "Network Service Scanning", "tactic_ids": ["TA0007"], "description": "Network Scanning..."},
+        {"id": "T1021", "name": "Remote Services", "tactic_ids": ["TA0008"], "description": "Remote Services..."},
+        {"id": "T1560", "name": "Data Transfer Size Limits", "tactic_ids": ["TA0010"], "description": "Size Limits..."},
+        {"id": "T1071", "name": "Web Service", "tactic_ids": ["TA0011"], "description": "Web Service..."},
+        {"id": "T1485", "name": "Data Destruction", "tactic_ids": ["TA0040"], "description": "Data Destruction..."}
+    ]
+}
+
+# Додаткові ключові слова для техніки (крім її назви), що трапляються в назвах правил SIEM
+KEYWORD_ALIASES = {
+    "T1110": ["brute", "password spray", "failed login", "authentication failure"],
+    "T1566": ["phish"],
+    "T1059": ["powershell", "cmd.exe", "bash -c"],
+    "T1003": ["mimikatz", "lsass"],
+    "T1046": ["port scan", "nmap"],
+    "T1021": ["remote desktop", "ssh login"],
+    "T1550": ["pass-the-hash"],
+    "T1498": ["ddos", "denial of service", "syn flood"],
+    "T1485": ["ransomware", "wiper"],
+    "T1070": ["log cleared", "clear event log"],
+}
+
+# Поля подій, з яких беруться ID правил та текст для зіставлення
+RULE_ID_FIELDS = ('mitre_technique', 'rule_id', 'rule.id', 'rule.mitre.id', 'detected_rule')
+KEYWORD_FIELDS = ('rule_name', 'rule.description', 'attack_type', 'message', 'description')
+
+_TECHNIQUE_ID_RE = re.compile(r'\bT\d{4}(?:\.\d{3})?\b', re.IGNORECASE)
+# Назви технік коротші за це ("At") збігаються з випадковими словами тексту
+MIN_KEYWORD_LENGTH = 4
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _tokenized(text: str) -> str:
+    """Слова тексту через один пробіл з пробілами по краях - межі слів для пошуку підрядка"""
+    return f" {' '.join(_TOKEN_RE.findall(str(text).lower()))} "
+
+
+def _parse_stix_bundle(bundle: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Перетворити STIX-бандл ATT&CK у спрощений формат"""
+    def external_id(obj):
+        for ref in obj.get("external_references", []):
+            if ref.get("source_name") == "mitre-attack":
+                return ref.get("external_id")
+        return None
+
+    tactics = []
+    shortname_to_id = {}
+    techniques = []
+
+    for obj in bundle.get("objects", []):
+        if obj.get("revoked") or obj.get("x_mitre_deprecated"):
+            continue
+        if obj.get("type") == "x-mitre-tactic":
+            tactic_id = external_id(obj)
+            if tactic_id:
+                shortname_to_id[obj.get("x_mitre_shortname")] = tactic_id
+                tactics.append({"id": tactic_id, "name": obj.get("name"), "description": obj.get("description", "")})
+
+    for obj in bundle.get("objects", []):
+        if obj.get("type") != "attack-pattern" or obj.get("revoked") or obj.get("x_mitre_deprecated"):
+            continue
+        technique_id = external_id(obj)
+        if not technique_id:
+            continue
+        tactic_ids = [
+            shortname_to_id[phase["phase_name"]]
+            for phase in obj.get("kill_chain_phases", [])
+            if phase.get("kill_chain_name") == "mitre-attack" and phase.get("phase_name") in shortname_to_id
+        ]
+        techniques.append({
+            "id": technique_id,
+            "name": obj.get("name"),
+            "tactic_ids": tactic_ids,
+            "data_sources": obj.get("x_mitre_data_sources", []),
+            "description": obj.get("description", "")
+        })
+
+    return {"tactics": tactics, "techniques": techniques}
+
+
+class MitreIndex:
+    """Незмінний знімок даних MITRE з хеш-індексами"""
+
+    def __init__(self, data: Dict[str, Any]):
+        if data.get("type") == "bundle":
+            data = _parse_stix_bundle(data)
+
+        self.tactics: List[Dict[str, Any]] = data.get("tactics", [])
+        self.techniques: List[Dict[str, Any]] = data.get("techniques", [])
+
+        self.tactics_by_id = {t["id"].upper(): t for t in self.tactics}
+        self.tactics_by_name = {t["name"].lower(): t for t in self.tactics}
+        self.techniques_by_id = {t["id"].upper(): t for t in self.techniques}
+        self.techniques_by_name = {t["name"].lower(): t for t in self.techniques}
+        self.techniques_by_tactic: Dict[str, List[Dict[str, Any]]] = {t["id"].upper(): [] for t in self.tactics}
+        self.techniques_by_data_source: Dict[str, List[Dict[str, Any]]] = {}
+
+        for technique in self.techniques:
+            for tactic_id in technique.get("tactic_ids", []):
+                self.techniques_by_tactic.setdefault(tactic_id.upper(), []).append(technique)
+            for source in technique.get("data_sources", []):
+                self.techniques_by_data_source.setdefault(source.lower(), []).append(technique)
+
+        # Назви технік та синоніми -> автомат Aho-Corasick над словами тексту; назва збігається
+        # лише цілими словами, однослівний синонім - з початку слова ("phish" -> "phishing");
+        # довші ключові слова пріоритетніші
+        self._keywords = KeywordMatcher()
+        for technique in self.techniques:
+            technique_id = technique["id"].upper()
+            keywords = [(_tokenized(technique["name"]), technique["name"])]
+            for alias in KEYWORD_ALIASES.get(technique_id, []):
+                keyword = _tokenized(alias)
+                keywords.append((keyword.rstrip() if len(keyword.split()) == 1 else keyword, alias))
+            for keyword, original in keywords:
+                if len(keyword.strip()) >= MIN_KEYWORD_LENGTH:
+                    self._keywords.add(keyword, (len(original), technique_id))
+        self._keywords.build()
+
+    def find_technique(self, value: Any) -> Optional[Dict[str, Any]]:
+        """Знайти техніку за ID (T1110, T1110.001) або точною назвою"""
+        if not value:
+            return None
+        key = str(value).strip()
+        technique = self.techniques_by_id.get(key.upper()) or self.techniques_by_name.get(key.lower())
+        if technique is None and '.' in key:
+            # Підтехніка, якої немає в базі -> батьківська техніка
+            technique = self.techniques_by_id.get(key.split('.', 1)[0].upper())
+        return technique
+
+    def find_tactic(self, value: Any) -> Optional[Dict[str, Any]]:
+        """Знайти тактику за ID (TA0006) або назвою"""
+        if not value:
+            return None
+        key = str(value).strip()
+        return self.tactics_by_id.get(key.upper()) or self.tactics_by_name.get(key.lower())
+
+    def match_keywords(self, text: str) -> Optional[Dict[str, Any]]:
+        """Техніка з найдовшим ключовим словом, знайденим у тексті"""
+        hits = self._keywords.find(_tokenized(text)) if text else []
+        if not hits:
+            return None
+        # Детермінований вибір: найдовше ключове слово, далі - менший ID
+        _, technique_id = min(hits, key=lambda hit: (-hit[0], hit[1]))
+        return self.techniques_by_id[technique_id]
+
+
+class MitreKnowledgeBase:
+    """Кешована база знань MITRE з перезавантаженням за mtime"""
+
+    def __init__(self, path: str = MITRE_DATA_FILE, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._index: Optional[MitreIndex] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> MitreIndex:
+        """Поточний знімок індексів (перечитує файл, якщо він змінився)"""
+        now = time.monotonic()
+        if self._index is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._index is None or now - self._checked_at >= self.check_interval:
+                    self._reload_if_changed()
+                    self._checked_at = now
+        return self._index
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+
+        if self._index is not None and mtime == self._mtime:
+            return
+
+        data = FALLBACK_DATA
+        if mtime is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading MITRE data from {self.path}: {e}")
+                if self._index is not None:
+                    # Залишаємо попередній знімок, якщо новий файл пошкоджений
+                    return
+                data = {"tactics": [], "techniques": []}
+
+        # Новий знімок будується повністю і лише потім підміняє попередній
+        self._index = MitreIndex(data)
+        self._mtime = mtime
+        logger.info(f"MITRE knowledge base loaded: {len(self._index.tactics)} tactics, "
+                    f"{len(self._index.techniques)} techniques")
+
+    @property
+    def tactics(self) -> List[Dict[str, Any]]:
+        return self.index.tactics
+
+    @property
+    def techniques(self) -> List[Dict[str, Any]]:
+        return self.index.techniques
+
+    def get_tactic(self, value: Any) -> Optional[Dict[str, Any]]:
+        return self.index.find_tactic(value)
+
+    def get_technique(self, value: Any) -> Optional[Dict[str, Any]]:
+        return self.index.find_technique(value)
+
+    def techniques_for_tactic(self, tactic: Any) -> List[Dict[str, Any]]:
+        """Техніки тактики за її ID або назвою"""
+        index = self.index
+        found = index.find_tactic(tactic)
+        if not found:
+            return []
+        return index.techniques_by_tactic.get(found["id"].upper(), [])
+
+    def techniques_for_data_source(self, data_source: str) -> List[Dict[str, Any]]:
+        return self.index.techniques_by_data_source.get(str(data_source).lower(), [])
+
+    def technique_names_by_tactic(self) -> Dict[str, List[str]]:
+        """Словник {назва тактики: [назви технік]} лише для тактик, що мають техніки"""
+        index = self.index
+        return {
+            tactic["name"]: [t["name"] for t in index.techniques_by_tactic.get(tactic["id"].upper(), [])]
+            for tactic in index.tactics
+            if index.techniques_by_tactic.get(tactic["id"].upper())
+        }
+
+    def map_event(self, event: Dict[str, Any], index: Optional[MitreIndex] = None,
+                  custom: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Визначити тактику та техніку для події
+
+        Порядок: користувацькі відповідності -> ID техніки в полях правила ->
+        ключові слова в назві правила/повідомленні.
+        Якщо подія вже має тактику, що належить знайденій техніці, вона зберігається.
+
+        Returns:
+            {"mitre_tactic", "mitre_tactic_id", "mitre_technique", "mitre_technique_id", "source"} або None
+        """
+        index = index or self.index
+        technique = None
+        source = 'rule_id'
+
+        if custom is not None:
+            found = custom.lookup_event(event)
+            if found:
+                technique_id, tactic_value = found
+                technique = index.find_technique(technique_id) or {"id": technique_id, "name": technique_id}
+                tactic = index.find_tactic(tactic_value)
+                if tactic is None and technique.get("tactic_ids"):
+                    tactic = index.tactics_by_id.get(technique["tactic_ids"][0].upper())
+                return {
+                    "mitre_tactic": tactic["name"] if tactic else tactic_value,
+                    "mitre_tactic_id": tactic["id"] if tactic else None,
+                    "mitre_technique": technique["name"],
+                    "mitre_technique_id": technique["id"],
+                    "source": 'custom_mapping'
+                }
+
+        for field in RULE_ID_FIELDS:
+            value = get_field(event, field)
+            if not value:
+                continue
+            for candidate in (value if isinstance(value, list) else [value]):
+                technique = index.find_technique(candidate)
+                if technique is None:
+                    match = _TECHNIQUE_ID_RE.search(str(candidate))
+                    technique = index.find_technique(match.group(0)) if match else None
+                if technique:
+                    break
+            if technique:
+                break
+
+        if technique is None:
+            text = " ".join(str(get_field(event, field)) for field in KEYWORD_FIELDS if get_field(event, field))
+            technique = index.match_keywords(text) if text else None
+            source = 'keywords'
+
+        if technique is None:
+            return None
+
+        tactic_ids = [t.upper() for t in technique.get("tactic_ids", [])]
+        tactic = index.find_tactic(event.get("mitre_tactic"))
+        if tactic is None or tactic["id"].upper() not in tactic_ids:
+            tactic = index.tactics_by_id.get(tactic_ids[0]) if tactic_ids else None
+
+        return {
+            "mitre_tactic": tactic["name"] if tactic else None,
+            "mitre_tactic_id": tactic["id"] if tactic else None,
+            "mitre_technique": technique["name"],
+            "mitre_technique_id": technique["id"],
+            "source": source
+        }
+
+    def map_events(self, events: Iterable[Dict[str, Any]], custom: Optional[Any] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Пакетне зіставлення подій з MITRE ATT&CK (один знімок індексів на весь пакет)
+
+        Args:
+            events: Список подій (словників)
+            custom: Таблиця користувацьких відповідностей (CustomMappingTable) або None
+
+        Returns:
+            Список результатів map_event у тому ж порядку
+        """
+        index = self.index
+        return [self.map_event(event, index, custom) for event in events]
+
+
+_knowledge_bases: Dict[str, MitreKnowledgeBase] = {}
+_knowledge_bases_lock = threading.Lock()
+
+
+def get_mitre_kb(path: Optional[str] = None) -> MitreKnowledgeBase:
+    """Отримати спільний екземпляр бази знань для процесу"""
+    path = path or MITRE_DATA_FILE
+    kb = _knowledge_bases.get(path)
+    if kb is None:
+        with _knowledge_bases_lock:
+            kb = _knowledge_bases.setdefault(path, MitreKnowledgeBase(path))
+    return kb
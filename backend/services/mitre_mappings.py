@@ -0,0 +1,194 @@
+"""
+Користувацькі відповідності правил SIEM техніками MITRE ATT&CK (mitre.custom_mappings_path).
+
+Файл (CSV/TSV або JSON) компілюється у компактну таблицю: відсортований масив 64-бітних
+хешів ключів (array('Q')) та паралельний масив індексів у невеликий словник технік.
+Пошук - бінарний (bisect), пам'ять - близько 10 байт на запис. Таблиця перебудовується
+лише при зміні mtime файлу.
+
+Формат CSV: `ключ,техніка[,тактика]`, рядки з `#` ігноруються. Ключ - ID або назва правила,
+опціонально з префіксом джерела: `wazuh:5710`, `splunk:Brute Force Detected`.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .rule_engine import get_field
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Як часто (у секундах) перевіряти mtime файлу відповідностей
+RELOAD_CHECK_INTERVAL = 5.0
+
+# Поля події, що використовуються як ключі пошуку (у порядку пріоритету)
+KEY_FIELDS = ('rule_id', 'rule.id', 'signature_id', 'rule_name', 'rule.description', 'search_name', 'signature')
+
+# Позначка в labels_data: MITRE-мітки встановлено з відповідностей, ML їх не перезаписує
+MAPPING_SOURCE = 'custom_mapping'
+
+
+def _key_hash(key: str) -> int:
+    """64-бітний хеш нормалізованого ключа"""
+    digest = hashlib.blake2b(key.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _iter_rows(path: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """Прочитати пари (ключ, техніка, тактика) з CSV/TSV або JSON файлу"""
+    if path.lower().endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        items = data.items() if isinstance(data, dict) else (
+            (item.get('key') or item.get('rule_id'), item) for item in data
+        )
+        for key, value in items:
+            if isinstance(value, dict):
+                yield key, value.get('technique') or value.get('technique_id'), value.get('tactic') or value.get('tactic_id')
+            else:
+                yield key, value, None
+        return
+
+    with open(path, 'r', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = '\t' if '\t' in sample else (';' if sample.count(';') > sample.count(',') else ',')
+        for row in csv.reader(f, delimiter=delimiter):
+            if not row or row[0].lstrip().startswith('#'):
+                continue
+            if len(row) < 2:
+                continue
+            yield row[0], row[1], row[2] if len(row) > 2 else None
+
+
+class CustomMappingTable:
+    """Незмінна таблиця відповідностей: ключ правила -> (техніка, тактика)"""
+
+    def __init__(self, rows: Iterable[Tuple[str, str, Optional[str]]]):
+        values: List[Tuple[str, Optional[str]]] = []
+        value_ids: Dict[Tuple[str, Optional[str]], int] = {}
+        entries: Dict[int, int] = {}
+
+        for key, technique, tactic in rows:
+            if not key or not technique:
+                continue
+            value = (str(technique).strip().upper(), str(tactic).strip() if tactic else None)
+            value_id = value_ids.get(value)
+            if value_id is None:
+                value_id = value_ids[value] = len(values)
+                values.append(value)
+            # Останній запис для ключа перемагає
+            entries[_key_hash(str(key))] = value_id
+
+        ordered = sorted(entries.items())
+        self._hashes = array('Q', (h for h, _ in ordered))
+        self._value_ids = array('I', (v for _, v in ordered))
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, key: Any) -> Optional[Tuple[str, Optional[str]]]:
+        """Знайти (техніка, тактика) за ключем правила"""
+        if key is None or key == '':
+            return None
+        h = _key_hash(str(key))
+        i = bisect_left(self._hashes, h)
+        if i < len(self._hashes) and self._hashes[i] == h:
+            return self._values[self._value_ids[i]]
+        return None
+
+    def lookup_event(self, event: Dict[str, Any]) -> Optional[Tuple[str, Optional[str]]]:
+        """Знайти відповідність для події: спочатку `джерело:ключ`, потім ключ без джерела"""
+        source = event.get('siem_source') or event.get('source_type')
+        for field in KEY_FIELDS:
+            value = get_field(event, field)
+            if value is None or value == '' or isinstance(value, (dict, list)):
+                continue
+            if source:
+                found = self.get(f"{source}:{value}")
+                if found:
+                    return found
+            found = self.get(value)
+            if found:
+                return found
+        return None
+
+
+class CustomMappingStore:
+    """Кеш скомпільованої таблиці з перезавантаженням за mtime"""
+
+    def __init__(self, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._path: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._table: Optional[CustomMappingTable] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_table(self, path: str) -> Optional[CustomMappingTable]:
+        """Таблиця для файлу; перекомпілюється, якщо змінився шлях або mtime"""
+        if not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+
+        now = time.monotonic()
+        if path == self._path and now - self._checked_at < self.check_interval:
+            return self._table
+
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                logger.warning(f"Custom MITRE mappings file not found: {path}")
+                self._path, self._mtime, self._table = path, None, None
+                self._checked_at = now
+                return None
+
+            if path != self._path or mtime != self._mtime:
+                started = time.perf_counter()
+                try:
+                    table = CustomMappingTable(_iter_rows(path))
+                except Exception as e:
+                    logger.error(f"Error loading custom MITRE mappings from {path}: {e}")
+                    if path != self._path:
+                        self._table = None
+                else:
+                    self._table = table
+                    logger.info(f"Loaded {len(table)} custom MITRE mappings from {path} "
+                                f"in {time.perf_counter() - started:.2f}s")
+                self._path, self._mtime = path, mtime
+            self._checked_at = now
+            return self._table
+
+
+_store = CustomMappingStore()
+
+
+def get_mapping_settings() -> Tuple[bool, str]:
+    """Прочитати mitre.use_custom_mappings та mitre.custom_mappings_path зі знімка конфігурації"""
+    from .config_snapshot import get_config_snapshot
+
+    try:
+        snapshot = get_config_snapshot()
+    except Exception as e:
+        logger.warning(f"Could not read custom MITRE mapping settings: {str(e)}")
+        return False, ''
+
+    enabled = snapshot.get_bool('mitre.use_custom_mappings', False)
+    return enabled, str(snapshot.get('mitre.custom_mappings_path', '')).strip()
+
+
+def get_custom_mappings() -> Optional[CustomMappingTable]:
+    """Поточна таблиця відповідностей або None, якщо їх вимкнено чи файл не задано"""
+    enabled, path = get_mapping_settings()
+    if not enabled or not path:
+        return None
+    return _store.get_table(path)
@@ -1,12 +1,15 @@
 import logging
 import requests
 import json
-import os
 import random
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from abc import ABC, abstractmethod
 
+from .mitre_kb import get_mitre_kb
+from .model_store import get_shared_model, process_memory
+from .inference_server import DEFAULT_SOCKET_PATH, InferenceClient, InferenceError
+
 # Налаштування логування
 logger = logging.getLogger(__name__)
 
@@ -294,29 +297,30 @@ class APIMLProvider(MLProvider):
 class LocalMLProvider(MLProvider):
     """Провайдер, що використовує локальну ML модель"""
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, load_mode: Optional[str] = None):
         """
         Ініціалізація провайдера
         
         Args:
             model_path: Шлях до файлу моделі
+            load_mode: Режим завантаження моделі ('private' або 'mmap')
         """
         self.model_path = model_path
+        self.load_mode = load_mode
         self.model = None
+        self.load_info = {}
         self._load_model()
         
     def _load_model(self):
         """
-        Завантажити модель з файлу
+        Завантажити модель з файлу (через спільний кеш процесу, див. services/model_store.py)
         """
         try:
-            # Для MVP просто перевіряємо, чи існує файл
-            if os.path.exists(self.model_path):
-                logger.info(f"Model file exists at {self.model_path}")
-                self.model = {"loaded": True, "path": self.model_path}
-            else:
-                logger.warning(f"Model file does not exist at {self.model_path}")
+            if not self.model_path:
+                logger.warning("Local model path is not configured")
                 self.model = None
+                return
+            self.model, self.load_info = get_shared_model(self.model_path, self.load_mode)
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             self.model = None
@@ -409,7 +413,11 @@ class LocalMLProvider(MLProvider):
             "model_info": {
                 "version": "local-1.0",
                 "type": "local",
-                "path": self.model_path
+                "path": self.model_path,
+                "load_mode": self.load_info.get("mode"),
+                "preloaded": self.load_info.get("preloaded", False),
+                # RSS проти спільних сторінок: при спільному завантаженні модель потрапляє в shared
+                "memory": process_memory()
             }
         }
 
@@ -458,6 +466,127 @@ class LocalMLProvider(MLProvider):
             
         return classified_events
 
+class InferenceServerProvider(MLProvider):
+    """Провайдер, що передає події окремому процесу інференсу через Unix-сокет"""
+    
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 30.0):
+        """
+        Ініціалізація провайдера
+        
+        Args:
+            socket_path: Шлях до Unix-сокета сервера інференсу
+            timeout: Таймаут відповіді в секундах
+        """
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.client = InferenceClient(self.socket_path, timeout)
+        
+    def test_connection(self) -> Dict[str, Any]:
+        """
+        Перевірити доступність сервера інференсу
+        
+        Returns:
+            Dictionary з результатами перевірки
+        """
+        try:
+            response = self.client.request({"op": "ping"})
+            return {
+                "success": bool(response.get("success")),
+                "message": "Inference server is reachable",
+                "details": {"socket_path": self.socket_path}
+            }
+        except InferenceError as e:
+            return {
+                "success": False,
+                "message": f"Error connecting to inference server: {str(e)}",
+                "details": {"socket_path": self.socket_path}
+            }
+            
+    def classify_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Класифікувати одну подію (сервер об'єднує її в пакет з подіями інших воркерів)
+        
+        Args:
+            event_data: Дані події
+            
+        Returns:
+            Dictionary з результатами класифікації
+        """
+        return self.batch_classify([event_data])[0]
+            
+    def batch_classify(self, events_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Класифікувати пакет подій
+        
+        Args:
+            events_data: Список даних подій
+            
+        Returns:
+            Список з результатами класифікації
+        """
+        try:
+            return self.client.classify(events_data)
+        except InferenceError as e:
+            logger.error(f"Error classifying events with inference server: {str(e)}")
+            return [{"success": False, "error": str(e)} for _ in events_data]
+            
+    def get_model_info(self) -> Dict[str, Any]:
+        """
+        Отримати інформацію про модель сервера інференсу
+        
+        Returns:
+            Dictionary з інформацією про модель
+        """
+        try:
+            response = self.client.request({"op": "info"})
+            info = response.get("info", {})
+            model_info = dict(info.get("model_info", {}))
+            model_info.update({
+                "type": "inference_server",
+                "socket_path": self.socket_path,
+                "server": {key: value for key, value in info.items() if key != "model_info"}
+            })
+            return {"success": True, "model_info": model_info}
+        except InferenceError as e:
+            return {
+                "model_info": {
+                    "version": "unknown",
+                    "error": str(e)
+                }
+            }
+
+    def classify_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Класифікувати список подій
+        
+        Args:
+            events: Список подій для класифікації
+            
+        Returns:
+            Список класифікованих подій
+        """
+        results = self.batch_classify(events)
+        
+        classified_events = []
+        for event, result in zip(events, results):
+            event_copy = event.copy()
+            if result.get("success"):
+                classification = result.get("classification", {})
+                confidence = result.get("confidence", 0.0)
+                
+                event_copy["ml_processed"] = True
+                event_copy["ml_confidence"] = confidence
+                event_copy["ml_timestamp"] = datetime.utcnow().isoformat()
+                event_copy["ml_labels"] = dict(classification, confidence=confidence,
+                                               classified_at=datetime.utcnow().isoformat())
+                
+                for key in ["true_positive", "attack_type", "mitre_tactic", "mitre_technique"]:
+                    if key in classification:
+                        event_copy[key] = classification[key]
+            
+            classified_events.append(event_copy)
+            
+        return classified_events
+
 class DummyMLProvider(MLProvider):
     """Тестовий провайдер, що генерує випадкові класифікації"""
     
@@ -471,26 +600,9 @@ class DummyMLProvider(MLProvider):
             "Reconnaissance", "Lateral Movement", "Command and Control"
         ]
         
-        self.mitre_tactics = [
-            "Initial Access", "Execution", "Persistence", "Privilege Escalation",
-            "Defense Evasion", "Credential Access", "Discovery", "Lateral Movement",
-            "Collection", "Command and Control", "Exfiltration", "Impact"
-        ]
-        
-        self.mitre_techniques = {
-            "Initial Access": ["Phishing", "Valid Accounts", "External Remote Services"],
-            "Execution": ["Command Line Interface", "Scripting", "Windows Management Instrumentation"],
-            "Persistence": ["Registry Run Keys", "Scheduled Task", "Create Account"],
-            "Privilege Escalation": ["Access Token Manipulation", "Bypass User Account Control", "Sudo and Sudo Caching"],
-            "Defense Evasion": ["Disable Security Tools", "Obfuscated Files", "Rootkit"],
-            "Credential Access": ["Brute Force", "Credential Dumping", "Keylogging"],
-            "Discovery": ["Account Discovery", "Network Service Scanning", "System Information Discovery"],
-            "Lateral Movement": ["Remote Services", "Internal Spearphishing", "Pass the Hash"],
-            "Collection": ["Data from Local System", "Email Collection", "Screen Capture"],
-            "Command and Control": ["Encrypted Channel", "Web Service", "Remote Access Tools"],
-            "Exfiltration": ["Data Transfer Size Limits", "Exfiltration Over C2", "Scheduled Transfer"],
-            "Impact": ["Data Destruction", "Service Stop", "Endpoint Denial of Service"]
-        }
+        # Тактики та техніки беруться з бази знань MITRE замість власних таблиць
+        self.mitre_techniques = get_mitre_kb().technique_names_by_tactic()
+        self.mitre_tactics = list(self.mitre_techniques.keys())
         
     def test_connection(self) -> Dict[str, Any]:
         """
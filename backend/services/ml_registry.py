@@ -0,0 +1,131 @@
+"""
+Реєстр ML-сервісів у межах процесу.
+
+Тримає "теплий" екземпляр MLService (з ініціалізованим провайдером та завантаженою моделлю),
+прив'язаний до ML-налаштувань знімка конфігурації. Коли вони змінюються, новий екземпляр
+будується у фоновому потоці, а запити до завершення побудови обслуговує попередній;
+після побудови посилання підміняється атомарно. Модель завантажується при старті воркера
+(gunicorn post_worker_init -> preload_ml_service), тому запити не платять за її завантаження.
+"""
+import logging
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from flask import current_app
+
+from .config_snapshot import get_config_snapshot
+from .ml_service import MLService
+
+logger = logging.getLogger(__name__)
+
+
+def _service_key(snapshot) -> Tuple[Any, ...]:
+    """
+    Ключ екземпляра: лише параметри, від яких залежить провайдер (розділ ml.* та ML-ключі Settings).
+    Зміна інших налаштувань підвищує версію знімка, але не перебудовує сервіс і не перезавантажує модель.
+    """
+    settings = snapshot.settings or {}
+    return (
+        settings.get("ml_api_url"),
+        settings.get("ml_api_key"),
+        tuple(sorted(snapshot.section('ml').items())),
+    )
+
+
+class MLProviderRegistry:
+    """Теплі екземпляри MLService з атомарною заміною при зміні конфігурації"""
+
+    def __init__(self):
+        # (ключ, сервіс) замінюється одним присвоєнням, тому читання не потребує блокування
+        self._entry: Optional[Tuple[Tuple[Any, ...], MLService]] = None
+        self._lock = threading.Lock()
+        self._building: Optional[Tuple[Any, ...]] = None
+
+    @staticmethod
+    def _build(key: Tuple[Any, ...]) -> MLService:
+        api_url, api_key, _ = key
+        started = time.perf_counter()
+        service = MLService(api_url, api_key)
+        # Завантаження конфігурації, ініціалізація провайдера та моделі - до підміни
+        service._ensure_config_loaded()
+        logger.info(f"ML service warmed up in {time.perf_counter() - started:.2f}s "
+                    f"(provider: {type(service.provider).__name__})")
+        return service
+
+    def get_service(self) -> MLService:
+        """
+        Отримати теплий MLService для поточної конфігурації
+
+        Returns:
+            Екземпляр MLService; якщо конфігурація змінилася, повертається попередній,
+            поки новий будується у фоні
+        """
+        key = _service_key(get_config_snapshot())
+        entry = self._entry
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        if entry is None:
+            # Перший запит у процесі без попереднього прогріву - будуємо синхронно
+            with self._lock:
+                if self._entry is None or self._entry[0] != key:
+                    self._entry = (key, self._build(key))
+                return self._entry[1]
+
+        self._rebuild_async(key)
+        return entry[1]
+
+    def _rebuild_async(self, key: Tuple[Any, ...]):
+        with self._lock:
+            if self._building == key:
+                return
+            self._building = key
+
+        app = current_app._get_current_object()
+
+        def build():
+            try:
+                with app.app_context():
+                    service = self._build(key)
+                self._entry = (key, service)
+            except Exception as e:
+                logger.error(f"Error rebuilding ML service: {str(e)}")
+            finally:
+                with self._lock:
+                    if self._building == key:
+                        self._building = None
+
+        threading.Thread(target=build, name='ml-provider-rebuild', daemon=True).start()
+
+    def preload(self):
+        """Побудувати сервіс для поточної конфігурації синхронно (старт воркера)"""
+        key = _service_key(get_config_snapshot())
+        with self._lock:
+            self._entry = (key, self._build(key))
+        return self._entry[1]
+
+    def clear(self):
+        self._entry = None
+
+
+registry = MLProviderRegistry()
+
+
+def get_ml_service() -> MLService:
+    """Теплий MLService процесу для поточної конфігурації"""
+    return registry.get_service()
+
+
+def preload_ml_service(app):
+    """
+    Прогріти ML-сервіс у щойно запущеному воркері
+
+    Args:
+        app: Flask-застосунок воркера
+    """
+    with app.app_context():
+        try:
+            registry.preload()
+        except Exception as e:
+            logger.error(f"ML service preload failed: {str(e)}")
@@ -6,19 +6,33 @@ import requests
 from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from flask import current_app
-from models import db, Event, Configuration
+from models import db, Event, RawLog
 
 # Додаємо відсутній імпорт для MLPerformanceMetrics
 from models.ml import MLPerformanceMetrics  # Припускаємо, що цей клас визначено в models/ml.py
 
 # Імпорт ML провайдерів
 # Якщо класи провайдерів ще не створені, їх треба буде реалізувати
-from .ml_providers import MLProvider, APIMLProvider, LocalMLProvider, DummyMLProvider  
+from .ml_providers import MLProvider, APIMLProvider, LocalMLProvider, DummyMLProvider, InferenceServerProvider
+from .mitre_mappings import MAPPING_SOURCE
+from .config_snapshot import get_config_snapshot
+from .feature_store import FEATURE_VERSION, load_vectors
+from .active_learning import enqueue_events
+from .near_duplicates import collapse_to_representatives, propagate_labels
+from .label_history import event_labels, record_revisions
+from .instrumentation import timed
+from .metrics import ML_CACHE_REQUESTS, observe_inference
+from .database import read_replica
 
 # Налаштування логування
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def is_rule_mapped(event: Event) -> bool:
+    """Тактика й техніка події взяті з користувацької відповідності правила (ML для неї не потрібен)"""
+    return (event.labels_data or {}).get("mitre_source") == MAPPING_SOURCE
+
+
 class MLServiceCache:
     """Клас для кешування відповідей ML API"""
     
@@ -29,13 +43,16 @@ class MLServiceCache:
     def get(self, key):
         """Отримати кешовані дані якщо вони дійсні"""
         if key not in self.cache:
+            ML_CACHE_REQUESTS.labels('miss').inc()
             return None
             
         entry = self.cache[key]
         if datetime.now() > entry['expires']:
             del self.cache[key]
+            ML_CACHE_REQUESTS.labels('miss').inc()
             return None
             
+        ML_CACHE_REQUESTS.labels('hit').inc()
         return entry['data']
     
     def set(self, key, data):
@@ -100,13 +117,12 @@ class MLService:
     def _load_config(self):
         """Завантажити конфігурацію з бази даних"""
         try:
-            ml_configs = Configuration.query.filter(
-                Configuration.config_type.like('ml.%')
-            ).all()
+            # Конфігурація береться зі знімка в пам'яті процесу, без запиту до БД
+            ml_configs = get_config_snapshot().section('ml')
             
-            for config in ml_configs:
-                key = config.config_type.split('.')[1]
-                value = config.config_value
+            for key, value in ml_configs.items():
+                if value is None:
+                    continue
                 
                 # Конвертуємо значення у відповідні типи
                 if key == 'min_confidence_threshold':
@@ -148,7 +164,11 @@ class MLService:
             elif model_type == 'local':
                 model_path = self.config.get('local_model_path')
                 logger.info(f"Initializing Local ML provider with model path: {model_path}")
-                self.provider = LocalMLProvider(model_path)
+                self.provider = LocalMLProvider(model_path, self.config.get('model_load_mode'))
+            elif model_type == 'inference_server':
+                socket_path = self.config.get('inference_socket')
+                logger.info(f"Initializing inference server ML provider with socket: {socket_path}")
+                self.provider = InferenceServerProvider(socket_path)
             else:
                 logger.info("Initializing Dummy ML provider for testing/demo")
                 self.provider = DummyMLProvider()
@@ -207,12 +227,19 @@ class MLService:
                     "error": "Event not found",
                     "event_id": None
                 }
+            
+            # Тактику й техніку події вже визначила користувацька відповідність правила
+            if is_rule_mapped(event):
+                return {"success": True, "event_id": event.id, "skipped": MAPPING_SOURCE, "applied": False}
                 
             # Підготовка даних події
-            event_data = self._prepare_event_data(event)
+            event_data = self._prepare_event_data(event, self._load_feature_vectors([event.id]).get(event.id))
             
             # Класифікація
-            result = self.provider.classify_event(event_data)
+            started = time.perf_counter()
+            with timed('ml'):
+                result = self.provider.classify_event(event_data)
+            observe_inference(self.provider, 'single', time.perf_counter() - started, [result])
             
             if result.get("success"):
                 # Оновлення події з результатами класифікації
@@ -224,6 +251,8 @@ class MLService:
                 
                 if confidence >= min_threshold and self.config.get("auto_apply_labels", True):
                     self._apply_classification(event, classification, confidence)
+                    propagate_labels([event.id])
+                    self._update_verification_queue([event.id])
                     # Додаємо збереження змін до бази даних
                     db.session.commit()
                 
@@ -264,11 +293,16 @@ class MLService:
             return {"success": False, "error": "ML provider not initialized"}
         
         try:
+            # Майже однакові події класифікуються один раз на кластер
+            represented = collapse_to_representatives(event_ids)
+            event_ids = list(represented)
+            
             # Оптимізуємо запит, вибираючи лише потрібні поля для класифікації
             events = Event.query.options(
                 db.load_only(
-                    Event.id, Event.source_ip, Event.destination_ip, 
-                    Event.event_type, Event.severity, Event.message
+                    Event.id, Event.event_id, Event.timestamp, Event.source_ip, Event.severity,
+                    Event.siem_source, Event.labels_data, Event.attack_type, Event.mitre_tactic,
+                    Event.mitre_technique
                 )
             ).filter(Event.id.in_(event_ids)).all()
             
@@ -278,13 +312,32 @@ class MLService:
                     "error": "No events found with provided IDs"
                 }
             
+            # Події з користувацькою відповідністю правила до провайдера не надсилаються
+            skipped = [event.id for event in events if is_rule_mapped(event)]
+            events = [event for event in events if not is_rule_mapped(event)]
+            if not events:
+                return {
+                    "success": True,
+                    "processed_events": 0,
+                    "skipped_events": skipped,
+                    "propagated_events": 0,
+                    "processing_time_seconds": 0.0,
+                    "results": []
+                }
+            
             # Підготовка даних для всіх подій
-            event_data_list = [self._prepare_event_data(event) for event in events]
+            vectors = self._load_feature_vectors([event.id for event in events])
+            raw_logs = self._load_raw_logs([event.id for event in events
+                                            if event.id not in vectors or self._include_raw_log()])
+            event_data_list = [self._prepare_event_data(event, vectors.get(event.id), raw_logs.get(event.id))
+                               for event in events]
             
             # Пакетна класифікація
             start_time = time.time()
-            results = self.provider.batch_classify(event_data_list)
+            with timed('ml'):
+                results = self.provider.batch_classify(event_data_list)
             processing_time = time.time() - start_time
+            observe_inference(self.provider, 'batch', processing_time, results)
             
             # Застосовуємо результати до подій
             processed_events = []
@@ -301,7 +354,8 @@ class MLService:
                         "event_id": event.id,
                         "success": True,
                         "confidence": confidence,
-                        "applied": confidence >= min_threshold
+                        "applied": confidence >= min_threshold,
+                        "represents": represented.get(event.id, 1)
                     })
                 else:
                     processed_events.append({
@@ -310,12 +364,18 @@ class MLService:
                         "error": result.get("error", "Unknown error")
                     })
             
+            # Мітки поширюються на всіх членів кластерів класифікованих подій
+            propagated = propagate_labels([event.id for event in events])
+            self._update_verification_queue([event.id for event in events])
+            
             # Зберігаємо зміни в базі даних
             db.session.commit()
             
             return {
                 "success": True,
                 "processed_events": len(processed_events),
+                "skipped_events": skipped,
+                "propagated_events": propagated,
                 "processing_time_seconds": processing_time,
                 "results": processed_events
             }
@@ -327,21 +387,74 @@ class MLService:
                 "error": str(e)
             }
     
-    def _prepare_event_data(self, event: Event) -> Dict[str, Any]:
+    def _update_verification_queue(self, event_ids: List[int]) -> None:
+        """Оновити пріоритети черги верифікації; помилка не скасовує класифікацію"""
+        try:
+            with db.session.begin_nested():
+                enqueue_events(event_ids)
+        except Exception as e:
+            logger.warning(f"Verification queue update failed: {str(e)}")
+    
+    def _load_feature_vectors(self, event_ids: List[int]) -> Dict[int, Any]:
+        """Попередньо обчислені вектори ознак подій (порожньо, якщо таблиці ще немає)"""
+        try:
+            return load_vectors(event_ids)
+        except Exception as e:
+            logger.warning(f"Feature vectors unavailable: {str(e)}")
+            db.session.rollback()
+            return {}
+    
+    def _load_raw_logs(self, event_ids: List[int]) -> Dict[int, Any]:
+        """Перший raw_log кожної події одним запитом"""
+        raw_logs: Dict[int, Any] = {}
+        if not event_ids:
+            return raw_logs
+        rows = db.session.query(RawLog.event_id, RawLog.log_data).filter(
+            RawLog.event_id.in_(event_ids)
+        ).order_by(RawLog.id).all()
+        for event_id, log_data in rows:
+            raw_logs.setdefault(event_id, log_data)
+        return raw_logs
+    
+    def _include_raw_log(self) -> bool:
+        return str(self.config.get("include_raw_log", "false")).lower() == "true"
+    
+    def _prepare_event_data(self, event: Event, vector=None, raw_log=None) -> Dict[str, Any]:
         """
         Підготувати дані події для класифікації
         
         Args:
             event: Об'єкт події
+            vector: Збережений вектор ознак (індекси, значення) або None
+            raw_log: Попередньо завантажений raw_log або None
             
         Returns:
             Dictionary з даними події для ML
         """
-        event_data = event.to_dict()
+        labels = event.labels_data or {}
+        event_data = {
+            "id": event.id,
+            "event_id": event.event_id,
+            "timestamp": event.timestamp.isoformat() if event.timestamp else None,
+            "source_ip": event.source_ip,
+            "severity": event.severity,
+            "siem_source": event.siem_source,
+            "labels": {key: value for key, value in labels.items() if key != "ml_history"},
+        }
         
-        # Додаємо raw_log, якщо доступний
-        if event.raw_logs:
-            event_data["raw_log"] = event.raw_logs[0].raw_log if event.raw_logs else {}
+        if vector is not None:
+            indices, values = vector
+            event_data["features"] = {
+                "version": FEATURE_VERSION,
+                "indices": indices.tolist(),
+                "values": values.tolist(),
+            }
+        
+        # raw_log потрібен лише без вектора ознак (або якщо явно ввімкнено ml.include_raw_log)
+        if vector is None or self._include_raw_log():
+            if raw_log is None:
+                raw_log = self._load_raw_logs([event.id]).get(event.id)
+            event_data["raw_log"] = raw_log or {}
         
         return event_data
     
@@ -354,29 +467,36 @@ class MLService:
             classification: Результати класифікації
             confidence: Рівень впевненості
         """
+        before = event_labels(event)
+        # Новий словник: зміни вкладеного JSON на місці ORM не відстежує
+        labels = dict(event.labels_data or {})
+        
         # Оновлюємо мітки події
         if "true_positive" in classification:
-            event.true_positive = classification["true_positive"]
-        
-        if "attack_type" in classification:
-            event.attack_type = classification["attack_type"]
+            labels["true_positive"] = classification["true_positive"]
         
-        if "mitre_tactic" in classification:
-            event.mitre_tactic = classification["mitre_tactic"]
-        
-        if "mitre_technique" in classification:
-            event.mitre_technique = classification["mitre_technique"]
+        # MITRE-мітки з користувацьких відповідностей не перезаписуються результатом ML
+        fields = ["attack_type"]
+        if not is_rule_mapped(event):
+            fields += ["mitre_tactic", "mitre_technique"]
+        for field in fields:
+            if classification.get(field):
+                labels[field] = classification[field]
+                setattr(event, field, classification[field])
         
         # Додаємо мітки ML
-        event.ml_processed = True
-        event.ml_confidence = confidence
-        
-        # Зберігаємо timestamp як нативний datetime об'єкт
-        event.ml_timestamp = datetime.utcnow()
+        labels["ml_processed"] = True
+        labels["ml_confidence"] = confidence
+        labels["ml_timestamp"] = datetime.utcnow().isoformat()
+        labels["ml_prediction"] = classification
         
         # Якщо потрібна верифікація
-        event.human_verified = not self.config.get("verification_required", True)
+        labels["human_verified"] = not self.config.get("verification_required", True)
+        
+        event.labels_data = labels
+        record_revisions(event.id, before, event_labels(event), 'update', 'ml')
     
+    @read_replica
     def update_performance_metrics(self, start_date=None, end_date=None) -> Dict[str, Any]:
         """
         Оновити метрики продуктивності ML на основі перевірених людиною подій
@@ -594,7 +714,10 @@ class MLService:
         
         try:
             # Класифікація через провайдер
-            result = self.provider.classify_event(event_data)
+            started = time.perf_counter()
+            with timed('ml'):
+                result = self.provider.classify_event(event_data)
+            observe_inference(self.provider, 'single', time.perf_counter() - started, [result])
             
             if not result.get("success"):
                 logger.error(f"Failed to analyze event: {result.get('error')}")
@@ -644,7 +767,10 @@ class MLService:
                 return cached_result
 
             # Пакетна класифікація через провайдер
-            results = self.provider.batch_classify(events)
+            started = time.perf_counter()
+            with timed('ml'):
+                results = self.provider.batch_classify(events)
+            observe_inference(self.provider, 'batch', time.perf_counter() - started, results)
             
             # Поєднуємо результати з вхідними даними
             classified_events = []
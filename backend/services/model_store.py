@@ -0,0 +1,182 @@
+"""
+Спільне завантаження ML-моделей для кількох воркерів gunicorn.
+
+Режими завантаження (ml.model_load_mode або ML_MODEL_LOAD_MODE):
+  - private - звичайне завантаження, кожен процес має власну копію;
+  - mmap    - numpy-масиви моделі відображаються з файлу (joblib mmap_mode='r'),
+              сторінки в кеші ОС спільні для всіх процесів.
+
+Незалежно від режиму модель можна завантажити в master-процесі gunicorn до fork
+(ML_PRELOAD_MODEL_PATH, див. gunicorn.conf.py): воркери отримують її через copy-on-write,
+а gc.freeze() не дає збирачу сміття "торкатися" цих сторінок. Master бази даних не читає,
+тому режим для нього задає лише ML_MODEL_LOAD_MODE; якщо ml.model_load_mode воркера інший,
+спільна копія не використовується, і воркер попереджає про це в журналі.
+"""
+import logging
+import os
+import pickle
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import joblib
+    HAS_JOBLIB = True
+except ImportError:
+    joblib = None
+    HAS_JOBLIB = False
+
+LOAD_MODES = ('private', 'mmap')
+PICKLE_EXTENSIONS = ('.joblib', '.pkl', '.pickle')
+
+# (абсолютний шлях, режим) -> запис моделі; заповнюється один раз на процес
+# або успадковується від master-процесу після fork
+_models: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_models_lock = threading.Lock()
+# Абсолютний шлях -> режим моделі, завантаженої в master-процесі
+_preloaded: Dict[str, str] = {}
+_mode_warnings = set()
+
+
+def default_load_mode() -> str:
+    mode = os.getenv('ML_MODEL_LOAD_MODE', 'private').lower()
+    return mode if mode in LOAD_MODES else 'private'
+
+
+def _load_file(path: str, mode: str) -> Any:
+    """Прочитати модель з диска"""
+    if not path.lower().endswith(PICKLE_EXTENSIONS):
+        # Формат без десеріалізації: фіксуємо лише наявність файлу (як і раніше для MVP)
+        return {"loaded": True, "path": path}
+
+    if HAS_JOBLIB:
+        # Для mmap масиви залишаються у файлі й не копіюються в пам'ять процесу
+        return joblib.load(path, mmap_mode='r' if mode == 'mmap' else None)
+
+    if mode == 'mmap':
+        logger.warning("joblib is not installed, mmap mode falls back to private loading")
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def get_shared_model(path: str, mode: Optional[str] = None) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    Отримати модель з кешу процесу або завантажити її
+
+    Args:
+        path: Шлях до файлу моделі
+        mode: Режим завантаження ('private' або 'mmap')
+
+    Returns:
+        (модель або None, метадані завантаження)
+    """
+    mode = mode if mode in LOAD_MODES else default_load_mode()
+    abs_path = os.path.abspath(path)
+    key = (abs_path, mode)
+
+    try:
+        mtime = os.path.getmtime(abs_path)
+    except OSError:
+        logger.warning(f"Model file does not exist at {path}")
+        return None, {"mode": mode, "error": "Model file not found"}
+
+    preloaded_mode = _preloaded.get(abs_path)
+    if preloaded_mode and preloaded_mode != mode and key not in _mode_warnings:
+        _mode_warnings.add(key)
+        logger.warning(f"Model {abs_path} was preloaded in the gunicorn master with ML_MODEL_LOAD_MODE="
+                       f"{preloaded_mode}, but this process requests mode {mode} (ml.model_load_mode): "
+                       f"loading a private copy; set both to the same value")
+
+    entry = _models.get(key)
+    if entry is None or entry["mtime"] != mtime:
+        with _models_lock:
+            entry = _models.get(key)
+            if entry is None or entry["mtime"] != mtime:
+                model = _load_file(abs_path, mode)
+                entry = {"model": model, "mtime": mtime, "mode": mode, "loaded_by_pid": os.getpid()}
+                _models[key] = entry
+                logger.info(f"Model loaded from {abs_path} (mode: {mode}, pid: {os.getpid()})")
+
+    return entry["model"], {
+        "mode": mode,
+        # Модель завантажена master-процесом до fork і спільна з іншими воркерами
+        "preloaded": entry["loaded_by_pid"] != os.getpid(),
+        "loaded_by_pid": entry["loaded_by_pid"],
+    }
+
+
+def preload_shared_model(path: str, mode: Optional[str] = None) -> bool:
+    """
+    Завантажити модель у master-процесі до fork воркерів
+
+    Returns:
+        True, якщо модель завантажено
+    """
+    try:
+        model, _ = get_shared_model(path, mode)
+    except Exception as e:
+        logger.error(f"Error preloading model {path}: {str(e)}")
+        return False
+    if model is None:
+        return False
+    _preloaded[os.path.abspath(path)] = mode if mode in LOAD_MODES else default_load_mode()
+
+    # Об'єкти, створені до fork, більше не скануються GC - сторінки залишаються спільними
+    import gc
+    gc.collect()
+    gc.freeze()
+    return True
+
+
+def process_memory() -> Dict[str, Any]:
+    """
+    Облік пам'яті поточного процесу: RSS проти спільних сторінок (у байтах)
+
+    На Linux використовується /proc/self/smaps_rollup (PSS - пропорційна частка спільних сторінок),
+    інакше /proc/self/statm або resource.getrusage.
+    """
+    fields = {
+        "Rss": "rss_bytes", "Pss": "pss_bytes",
+        "Shared_Clean": "shared_clean_bytes", "Shared_Dirty": "shared_dirty_bytes",
+        "Private_Clean": "private_clean_bytes", "Private_Dirty": "private_dirty_bytes",
+    }
+    result: Dict[str, Any] = {"pid": os.getpid()}
+
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in fields:
+                    result[fields[name]] = int(rest.split()[0]) * 1024
+        result["shared_bytes"] = result.get("shared_clean_bytes", 0) + result.get("shared_dirty_bytes", 0)
+        result["private_bytes"] = result.get("private_clean_bytes", 0) + result.get("private_dirty_bytes", 0)
+        result["source"] = "smaps_rollup"
+        return result
+    except OSError:
+        pass
+
+    try:
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        with open('/proc/self/statm') as f:
+            _, resident, shared = (int(x) for x in f.read().split()[:3])
+        result.update({
+            "rss_bytes": resident * page_size,
+            "shared_bytes": shared * page_size,
+            "private_bytes": (resident - shared) * page_size,
+            "source": "statm",
+        })
+        return result
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS повертає байти, Linux - кілобайти
+        result["max_rss_bytes"] = max_rss if sys.platform == 'darwin' else max_rss * 1024
+        result["source"] = "getrusage"
+    except Exception:
+        result["source"] = "unavailable"
+    return result
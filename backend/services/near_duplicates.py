@@ -0,0 +1,395 @@
+"""
+Виявлення майже однакових подій (MinHash + LSH).
+
+Під час інгестії raw_log нормалізується (мінливі поля на кшталт часу та ID відкидаються,
+числа, UUID та хеш-рядки маскуються), перетворюється на набір шинглів і стискається
+в MinHash-підпис з NUM_PERM значень. Підпис ділиться на BANDS смуг; хеш кожної смуги -
+ключ LSH-індексу (event_cluster_buckets), що вказує на кластер. Подія приєднується
+до кластера-кандидата, якщо оцінка подібності Жаккара з представником кластера
+не нижча за SIMILARITY_THRESHOLD, інакше стає представником нового кластера.
+
+ML-класифікація, черга верифікації та повторна класифікація працюють з представниками,
+а мітки поширюються на всіх членів кластера одним UPDATE (propagate_labels).
+"""
+import hashlib
+import json
+import logging
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from .labeling_service import OLD_VALUE_SQL
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 8
+ROWS_PER_BAND = NUM_PERM // BANDS
+# Поріг LSH для 8x8 смуг - близько (1/8)^(1/8) = 0.77, тож кандидати з подібністю >= 0.8
+# знаходяться з високою ймовірністю
+SIMILARITY_THRESHOLD = 0.8
+
+# Поля, що змінюються між повторами однієї події й не впливають на її зміст
+VOLATILE_KEYS = {
+    'timestamp', '@timestamp', 'time', 'date', 'id', '_id', 'event_id', 'eventid', 'uuid',
+    'received', 'ingest_time', 'sequence', 'seq', 'pid', 'message_id', 'offset', 'location',
+}
+MAX_DEPTH = 4
+
+# Ключі labels_data, що переносяться з події на інших членів її кластера
+PROPAGATED_KEYS = (
+    'ml_processed', 'ml_confidence', 'ml_timestamp', 'ml_model_version', 'ml_prediction',
+    'true_positive', 'attack_type', 'mitre_tactic', 'mitre_technique',
+)
+VERIFIED_KEYS = ('human_verified', 'verification_timestamp', 'verification_comment')
+# Ключі, що не перезаписуються у членів з користувацькою відповідністю правила
+MAPPED_KEYS = ('mitre_tactic', 'mitre_technique')
+
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240607)
+_A = _rng.randint(1, 2 ** 32 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_MASKS = (
+    (re.compile(r'\b\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:z|[+-]\d{2}:?\d{2})?\b'), '<ts>'),
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b'), '<uuid>'),
+    (re.compile(r'\b(?:0x)?[0-9a-f]{12,}\b'), '<hex>'),
+    (re.compile(r'(?<![\w-])\d+(?:\.\d+)?(?![\w-]|\.\d)'), '<n>'),
+)
+_IP_RE = re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b')
+_WORD_RE = re.compile(r'<\w+>|[\w.:/@-]+')
+
+
+def normalize_value(value: Any) -> str:
+    """Нормалізований текст значення: IP-адреси зберігаються, мінливі числа маскуються"""
+    value = str(value).lower()
+    ips = _IP_RE.findall(value)
+    value = _IP_RE.sub('\x00', value)
+    for pattern, placeholder in _MASKS:
+        value = pattern.sub(placeholder, value)
+    for ip in ips:
+        value = value.replace('\x00', ip, 1)
+    return value
+
+
+def shingles(raw_log: Any) -> Set[str]:
+    """Шинглі нормалізованого raw_log: `ключ=значення` та словесні 3-грами довгих текстів"""
+    result: Set[str] = set()
+
+    def walk(data: Any, prefix: str, depth: int):
+        if depth > MAX_DEPTH:
+            return
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if str(key).lower() in VOLATILE_KEYS:
+                    continue
+                walk(value, f"{prefix}.{key}" if prefix else str(key), depth + 1)
+        elif isinstance(data, list):
+            for value in data[:32]:
+                walk(value, prefix, depth + 1)
+        elif data is not None and data != '':
+            normalized = normalize_value(data)
+            words = _WORD_RE.findall(normalized)
+            if len(words) <= 3:
+                result.add(f"{prefix}={normalized}")
+            else:
+                for i in range(len(words) - 2):
+                    result.add(f"{prefix}:{words[i]} {words[i + 1]} {words[i + 2]}")
+
+    walk(raw_log, '', 0)
+    return result
+
+
+def minhash(shingle_set: Iterable[str]) -> Optional[np.ndarray]:
+    """MinHash-підпис (uint32[NUM_PERM]) або None для порожнього набору"""
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64)
+    if len(hashes) == 0:
+        return None
+    values = (np.outer(hashes, _A) % _PRIME + _B) % _PRIME
+    return (values.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def signature_of(raw_log: Any) -> Optional[np.ndarray]:
+    return minhash(shingles(raw_log))
+
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """Знакові 64-бітні хеші смуг підпису (ключі LSH-індексу)"""
+    result = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, 'little')).digest()
+        result.append(int.from_bytes(digest, 'little', signed=True))
+    return result
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оцінка подібності Жаккара за двома підписами"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class DuplicateIndex:
+    """LSH-індекс кластерів у пам'яті: смуга -> кластер, кластер -> підпис представника"""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.buckets: Dict[Tuple[int, int], Any] = {}
+        self.signatures: Dict[Any, np.ndarray] = {}
+
+    def add_cluster(self, cluster_id: Any, signature: np.ndarray, bands: Optional[List[int]] = None):
+        self.signatures[cluster_id] = signature
+        for band, bucket in enumerate(bands or band_hashes(signature)):
+            # Смуга, вже зайнята іншим кластером, не перезаписується
+            self.buckets.setdefault((band, bucket), cluster_id)
+
+    def match(self, signature: np.ndarray, bands: Optional[List[int]] = None) -> Tuple[Optional[Any], float]:
+        """Найподібніший кластер-кандидат з подібністю не нижче порогу"""
+        best, best_similarity = None, 0.0
+        seen = set()
+        for band, bucket in enumerate(bands or band_hashes(signature)):
+            cluster_id = self.buckets.get((band, bucket))
+            if cluster_id is None or cluster_id in seen:
+                continue
+            seen.add(cluster_id)
+            value = similarity(signature, self.signatures[cluster_id])
+            if value > best_similarity:
+                best, best_similarity = cluster_id, value
+        if best is not None and best_similarity >= self.threshold:
+            return best, best_similarity
+        return None, best_similarity
+
+
+def _load_index(band_lists: List[List[int]]) -> DuplicateIndex:
+    """Частина LSH-індексу з БД, потрібна для пакета підписів"""
+    from models import db
+
+    index = DuplicateIndex()
+    buckets = sorted({bucket for bands in band_lists for bucket in bands})
+    if not buckets:
+        return index
+    rows = db.session.execute(text(
+        "SELECT band, bucket, cluster_id FROM event_cluster_buckets WHERE bucket = ANY(:buckets)"
+    ), {"buckets": buckets}).all()
+    wanted = {(band, bucket) for bands in band_lists for band, bucket in enumerate(bands)}
+    for band, bucket, cluster_id in rows:
+        if (band, bucket) in wanted:
+            index.buckets[(band, bucket)] = cluster_id
+
+    cluster_ids = sorted(set(index.buckets.values()))
+    if cluster_ids:
+        for cluster_id, signature in db.session.execute(text(
+            "SELECT id, signature FROM event_clusters WHERE id = ANY(:ids)"
+        ), {"ids": cluster_ids}):
+            index.signatures[cluster_id] = np.frombuffer(bytes(signature), dtype=np.uint32)
+    # Смуги кластерів без підпису (видалених) ігноруються
+    index.buckets = {k: v for k, v in index.buckets.items() if v in index.signatures}
+    return index
+
+
+def assign_clusters(rows: Iterable[Tuple[int, Any]]) -> Dict[int, int]:
+    """
+    Призначити кластери новим подіям (виконується в транзакції інгестії)
+
+    Args:
+        rows: Пари (events.id, raw_log)
+
+    Returns:
+        events.id -> id кластера (події без змістовного raw_log не кластеризуються)
+    """
+    from models import db
+
+    prepared = []
+    for event_id, raw_log in rows:
+        signature = signature_of(raw_log)
+        if signature is not None:
+            prepared.append((event_id, signature, band_hashes(signature)))
+    if not prepared:
+        return {}
+
+    index = _load_index([bands for _, _, bands in prepared])
+    assigned: Dict[int, int] = {}
+    members = []
+    growth: Dict[int, int] = {}
+
+    for event_id, signature, bands in prepared:
+        cluster_id, value = index.match(signature, bands)
+        if cluster_id is None:
+            cluster_id = db.session.execute(text(
+                "INSERT INTO event_clusters (representative_event_id, size, signature, first_seen, last_seen) "
+                "VALUES (:event_id, 0, :signature, now(), now()) RETURNING id"
+            ), {"event_id": event_id, "signature": signature.tobytes()}).scalar()
+            db.session.execute(text(
+                "INSERT INTO event_cluster_buckets (band, bucket, cluster_id) VALUES (:band, :bucket, :cluster_id) "
+                "ON CONFLICT (band, bucket) DO NOTHING"
+            ), [{"band": band, "bucket": bucket, "cluster_id": cluster_id} for band, bucket in enumerate(bands)])
+            index.add_cluster(cluster_id, signature, bands)
+            value = 1.0
+        assigned[event_id] = cluster_id
+        members.append({"event_id": event_id, "cluster_id": cluster_id, "similarity": value})
+        growth[cluster_id] = growth.get(cluster_id, 0) + 1
+
+    db.session.execute(text(
+        "INSERT INTO event_cluster_members (event_id, cluster_id, similarity) "
+        "VALUES (:event_id, :cluster_id, :similarity) ON CONFLICT (event_id) DO NOTHING"
+    ), members)
+    db.session.execute(text(
+        "UPDATE event_clusters AS c SET size = c.size + g.added, last_seen = now() "
+        "FROM jsonb_to_recordset(CAST(:growth AS jsonb)) AS g(cluster_id integer, added integer) "
+        "WHERE c.id = g.cluster_id"
+    ), {"growth": json.dumps([{"cluster_id": k, "added": v} for k, v in growth.items()])})
+    return assigned
+
+
+def collapse_to_representatives(event_ids: Sequence[int]) -> Dict[int, int]:
+    """
+    Згорнути список подій до однієї події на кластер
+
+    Returns:
+        events.id події, яку слід обробити -> кількість поданих подій, які вона представляє
+    """
+    from models import db
+
+    if not event_ids:
+        return {}
+    clusters = dict(db.session.execute(text(
+        "SELECT event_id, cluster_id FROM event_cluster_members WHERE event_id = ANY(:ids)"
+    ), {"ids": list(event_ids)}).all())
+
+    chosen: Dict[Any, int] = {}
+    counts: Dict[int, int] = {}
+    for event_id in event_ids:
+        key = ('cluster', clusters[event_id]) if event_id in clusters else ('event', event_id)
+        target = chosen.setdefault(key, event_id)
+        counts[target] = counts.get(target, 0) + 1
+    return counts
+
+
+_PROPAGATE_SQL = """
+WITH src AS (
+    -- Член кількох змінених кластерів отримує мітки однієї (найменшої за id) події
+    SELECT DISTINCT ON (em.event_id) em.event_id AS member_id, ev.id, ev.attack_type, ev.mitre_tactic,
+           ev.mitre_technique, ev.labels_data::jsonb AS labels
+    FROM events ev
+    JOIN event_cluster_members m ON m.event_id = ev.id
+    JOIN event_cluster_members em ON em.cluster_id = m.cluster_id AND em.event_id <> ev.id
+    WHERE ev.id = ANY(:ids)
+    ORDER BY em.event_id, ev.id
+), target AS (
+    SELECT e.id, e.labels_data::jsonb AS labels, e.attack_type, e.mitre_tactic, e.mitre_technique,
+           s.attack_type AS source_attack_type, s.mitre_tactic AS source_mitre_tactic,
+           s.mitre_technique AS source_mitre_technique,
+           COALESCE(e.labels_data->>'mitre_source', '') = :mapping_source AS mapped,
+           COALESCE((SELECT jsonb_object_agg(key, value) FROM jsonb_each(s.labels)
+                     WHERE key = ANY(:keys)
+                       AND NOT (key = ANY(:mapped_keys)
+                                AND COALESCE(e.labels_data->>'mitre_source', '') = :mapping_source)), '{{}}'::jsonb)
+           || jsonb_build_object('propagated_from', s.id) AS patch
+    FROM events e JOIN src s ON s.member_id = e.id
+    WHERE :verified OR COALESCE(e.labels_data->>'human_verified', 'false') <> 'true'
+    FOR UPDATE OF e
+), upd AS (
+    UPDATE events AS e SET
+        attack_type = COALESCE(t.source_attack_type, e.attack_type),
+        mitre_tactic = CASE WHEN t.mapped THEN e.mitre_tactic ELSE COALESCE(t.source_mitre_tactic, e.mitre_tactic) END,
+        mitre_technique = CASE WHEN t.mapped
+                               THEN e.mitre_technique ELSE COALESCE(t.source_mitre_technique, e.mitre_technique) END,
+        labels_data = (t.labels || t.patch)::json
+    FROM target t WHERE e.id = t.id
+    RETURNING e.id
+), rev AS (
+    INSERT INTO label_revisions (event_id, timestamp, user_id, action, label_key, old_value, new_value, source)
+    SELECT t.id, now() AT TIME ZONE 'utc', :user_id, :action, kv.key, o.value::json, kv.value::json, :source
+    FROM target t
+    JOIN upd ON upd.id = t.id
+    CROSS JOIN jsonb_each(t.patch) AS kv
+    CROSS JOIN LATERAL ({old_value}) AS o
+    WHERE o.value IS DISTINCT FROM kv.value
+    RETURNING 1
+)
+SELECT count(*) FROM upd
+""".format(old_value=OLD_VALUE_SQL)
+
+
+def propagate_labels(source_event_ids: Sequence[int], verified: bool = False, user_id: Optional[str] = None) -> int:
+    """
+    Поширити мітки подій на інших членів їхніх кластерів (до commit поточної транзакції)
+
+    Змінені ключі записуються в label_revisions тією самою інструкцією.
+
+    Args:
+        source_event_ids: Події, мітки яких щойно змінено (класифіковані або перевірені)
+        verified: Поширити також позначку перевірки аналітиком
+        user_id: Аналітик, чия перевірка поширюється
+
+    Returns:
+        Кількість оновлених подій
+    """
+    from models import db
+    from .mitre_mappings import MAPPING_SOURCE
+
+    if not source_event_ids:
+        return 0
+    keys = list(PROPAGATED_KEYS) + (list(VERIFIED_KEYS) if verified else [])
+    # ORM-зміни джерел мають потрапити в БД до UPDATE
+    db.session.flush()
+    return db.session.execute(text(_PROPAGATE_SQL), {
+        "ids": list(source_event_ids),
+        "keys": keys,
+        "verified": verified,
+        "mapping_source": MAPPING_SOURCE,
+        "mapped_keys": list(MAPPED_KEYS),
+        "user_id": user_id,
+        "action": 'verify' if verified else 'update',
+        "source": 'manual' if verified else 'ml',
+    }).scalar()
+
+
+def cluster_member_ids(event_ids: Sequence[int]) -> List[int]:
+    """Усі члени кластерів, до яких належать події"""
+    from models import db
+
+    if not event_ids:
+        return []
+    return db.session.execute(text(
+        "SELECT em.event_id FROM event_cluster_members m "
+        "JOIN event_cluster_members em ON em.cluster_id = m.cluster_id WHERE m.event_id = ANY(:ids)"
+    ), {"ids": list(event_ids)}).scalars().all()
+
+
+# Умова SQL для таблиці events: подія не є дублікатом (представник кластера або без кластера)
+NOT_DUPLICATE_SQL = (
+    "NOT EXISTS (SELECT 1 FROM event_cluster_members dm JOIN event_clusters dc ON dc.id = dm.cluster_id "
+    "WHERE dm.event_id = events.id AND dc.representative_event_id <> events.id)"
+)
+
+
+def backfill_clusters(batch_size: int = 1000, limit: Optional[int] = None) -> int:
+    """
+    Кластеризувати наявні події без кластера (за зростанням id)
+
+    Returns:
+        Кількість оброблених подій
+    """
+    from models import db
+
+    processed = 0
+    last_id = 0
+    while limit is None or processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        rows = db.session.execute(text(
+            "SELECT DISTINCT ON (e.id) e.id, r.log_data FROM events e "
+            "JOIN raw_logs r ON r.event_id = e.id "
+            "LEFT JOIN event_cluster_members m ON m.event_id = e.id "
+            "WHERE m.event_id IS NULL AND e.id > :last_id ORDER BY e.id, r.id LIMIT :limit"
+        ), {"last_id": last_id, "limit": size}).all()
+        if not rows:
+            break
+        assign_clusters((event_id, log_data) for event_id, log_data in rows)
+        db.session.commit()
+        last_id = rows[-1][0]
+        processed += len(rows)
+        logger.info(f"Near-duplicate clustering: {processed} events processed")
+    return processed
@@ -0,0 +1,448 @@
+"""
+Сервіс для керування секціонуванням (range partitioning) таблиць events, raw_logs та label_revisions
+"""
+import logging
+import re
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db, Configuration
+
+logger = logging.getLogger(__name__)
+
+# Таблиці, які секціонуються за полем timestamp.
+# raw_logs обробляється першим під час очищення, бо залежить від events.
+PARTITIONED_TABLES = {
+    'events': {
+        'key': 'timestamp',
+        'indexes': [('event_id',), ('timestamp',), ('siem_source',), ('ingested_at',)],
+        'expression_indexes': {
+            'ix_events_event_chain_id': "((labels_data->>'event_chain_id'), id) "
+                                        "WHERE labels_data->>'event_chain_id' IS NOT NULL",
+        }
+    },
+    'raw_logs': {
+        'key': 'timestamp',
+        'indexes': [('event_id',)]
+    },
+    # Журнал міток секціонується за часом запису, а не за часом подій
+    'label_revisions': {
+        'key': 'timestamp',
+        'indexes': [('event_id', 'timestamp')],
+        'write_time': True
+    }
+}
+
+PRUNE_ORDER = ['raw_logs', 'events', 'label_revisions']
+
+DEFAULT_RETENTION_DAYS = 90
+
+_BOUND_RE = re.compile(r"FROM \('(?P<lower>[^']+)'\) TO \('(?P<upper>[^']+)'\)")
+
+
+class PartitionManager:
+    """Менеджер секцій для таблиць подій з автоматичним створенням та очищенням за терміном зберігання"""
+
+    # Кеш вже створених секцій у межах процесу, щоб не виконувати DDL на кожен пакет.
+    # Секція потрапляє сюди лише після commit транзакції, що її створила або побачила
+    # (до того - у _pending_partitions сесії), інакше після rollback кеш вказував би
+    # на секцію, якої немає, і рядки мовчки йшли б у секцію за замовчуванням.
+    _known_partitions = set()
+
+    def __init__(self, interval: str = None, premake: int = None):
+        """
+        Ініціалізація менеджера секцій
+
+        Args:
+            interval: Розмір секції - 'day' або 'week' (за замовчуванням з конфігурації)
+            premake: Кількість секцій, що створюються наперед
+        """
+        config = current_app.config if current_app else {}
+        self.interval = interval or config.get('PARTITION_INTERVAL', 'day')
+        self.premake = premake if premake is not None else config.get('PARTITION_PREMAKE', 7)
+
+        if self.interval not in ('day', 'week'):
+            raise ValueError(f"Unsupported partition interval: {self.interval}")
+
+    # ---- Допоміжні методи для меж секцій ----
+
+    def _period_start(self, value: datetime) -> date:
+        """Початок періоду (доби або тижня), до якого належить мітка часу"""
+        day = value.date() if isinstance(value, datetime) else value
+        if self.interval == 'week':
+            return day - timedelta(days=day.weekday())
+        return day
+
+    def _period_step(self) -> timedelta:
+        return timedelta(days=7 if self.interval == 'week' else 1)
+
+    @staticmethod
+    def _partition_name(table: str, start: date) -> str:
+        return f"{table}_p{start.strftime('%Y%m%d')}"
+
+    # ---- Перевірка стану ----
+
+    def is_partitioned(self, table: str) -> bool:
+        """
+        Перевірити, чи таблиця вже є секціонованою
+
+        Args:
+            table: Назва таблиці
+
+        Returns:
+            True, якщо таблиця секціонована
+        """
+        result = db.session.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+        ), {'table': table}).first()
+        return result is not None
+
+    def list_partitions(self, table: str) -> List[Dict[str, object]]:
+        """
+        Отримати список секцій таблиці з їх межами
+
+        Args:
+            table: Назва батьківської таблиці
+
+        Returns:
+            Список словників з назвою, нижньою та верхньою межею секції
+        """
+        rows = db.session.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table AND pg_table_is_visible(p.oid) "
+            "ORDER BY c.relname"
+        ), {'table': table}).fetchall()
+
+        partitions = []
+        for name, bound in rows:
+            match = _BOUND_RE.search(bound or '')
+            partitions.append({
+                'name': name,
+                'lower': datetime.fromisoformat(match.group('lower')) if match else None,
+                'upper': datetime.fromisoformat(match.group('upper')) if match else None,
+                'default': (bound or '').strip().upper() == 'DEFAULT'
+            })
+        return partitions
+
+    # ---- Перетворення існуючих таблиць ----
+
+    def convert_table(self, table: str) -> bool:
+        """
+        Перетворити звичайну таблицю на секціоновану за timestamp з перенесенням даних.
+        Виконується в поточній транзакції; commit робить викликач.
+
+        Args:
+            table: Назва таблиці з PARTITIONED_TABLES
+
+        Returns:
+            True, якщо перетворення виконано, False - якщо таблиця вже секціонована
+        """
+        if table not in PARTITIONED_TABLES:
+            raise ValueError(f"Table {table} is not managed by PartitionManager")
+
+        if self.is_partitioned(table):
+            logger.info(f"Table {table} is already partitioned")
+            return False
+
+        spec = PARTITIONED_TABLES[table]
+        key = spec['key']
+        legacy = f"{table}_legacy"
+
+        sequence = db.session.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}
+        ).scalar()
+
+        # Ключ секціонування має бути NOT NULL; для raw_logs беремо час батьківської події
+        if table == 'raw_logs':
+            db.session.execute(text(
+                "UPDATE raw_logs r SET timestamp = e.timestamp "
+                "FROM events e WHERE r.event_id = e.id AND r.timestamp IS NULL"
+            ))
+            db.session.execute(text(
+                "UPDATE raw_logs SET timestamp = now() WHERE timestamp IS NULL"
+            ))
+            # FK на events.id неможливий після секціонування events (унікальність лише з timestamp)
+            db.session.execute(text(
+                "ALTER TABLE raw_logs DROP CONSTRAINT IF EXISTS raw_logs_event_id_fkey"
+            ))
+
+        db.session.execute(text(f'ALTER TABLE {table} RENAME TO {legacy}'))
+        db.session.execute(text(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("{key}")'
+        ))
+        db.session.execute(text(f'ALTER TABLE {table} ALTER COLUMN "{key}" SET NOT NULL'))
+        db.session.execute(text(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "{key}")'))
+        for columns in spec['indexes']:
+            cols = ', '.join(f'"{c}"' for c in columns)
+            index_name = f"ix_{table}_{'_'.join(columns)}"
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+            db.session.execute(text(f'CREATE INDEX {index_name} ON {table} ({cols})'))
+        for index_name, definition in spec.get('expression_indexes', {}).items():
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+            db.session.execute(text(f'CREATE INDEX {index_name} ON {table} {definition}'))
+
+        # Створюємо секції для всього діапазону існуючих даних та наперед
+        bounds = db.session.execute(
+            text(f'SELECT min("{key}"), max("{key}") FROM {legacy}')
+        ).first()
+        now = datetime.utcnow()
+        start = bounds[0] or now
+        end = max(bounds[1] or now, now) + self._period_step() * self.premake
+        self._create_range(table, start, end)
+        db.session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT'
+        ))
+
+        db.session.execute(text(f'INSERT INTO {table} SELECT * FROM {legacy}'))
+
+        # Послідовність id має пережити видалення старої таблиці
+        if sequence:
+            db.session.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id'))
+        # Зовнішні ключі на стару таблицю знімаємо явно (з записом у журнал), а не через CASCADE:
+        # без унікального id секціонована таблиця не може бути їх ціллю
+        foreign_keys = db.session.execute(text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = to_regclass(:legacy) AND conrelid <> confrelid"
+        ), {'legacy': legacy}).fetchall()
+        for referencing, constraint in foreign_keys:
+            logger.warning(f"Dropping foreign key {constraint} on {referencing} referencing {table}: "
+                           f"partitioned {table} has no unique id to reference")
+            db.session.execute(text(f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint}"'))
+        db.session.execute(text(f'DROP TABLE {legacy}'))
+
+        logger.info(f"Table {table} converted to range partitioning by {key} ({self.interval})")
+        return True
+
+    def convert_all(self) -> Dict[str, bool]:
+        """Перетворити всі керовані таблиці на секціоновані"""
+        result = {}
+        for table in ('events', 'raw_logs', 'label_revisions'):
+            result[table] = self.convert_table(table)
+        db.session.commit()
+        return result
+
+    # ---- Створення секцій ----
+
+    def _create_partition(self, table: str, start: date) -> str:
+        """Створити одну секцію, переносячи відповідні рядки з секції за замовчуванням"""
+        name = self._partition_name(table, start)
+        if name in self._known_partitions:
+            return name
+
+        key = PARTITIONED_TABLES[table]['key']
+        lower = datetime.combine(start, datetime.min.time())
+        upper = lower + self._period_step()
+        params = {'lower': lower, 'upper': upper}
+        bounds = f"FOR VALUES FROM ('{lower.isoformat(sep=' ')}') TO ('{upper.isoformat(sep=' ')}')"
+
+        exists = db.session.execute(
+            text("SELECT to_regclass(:name)"), {'name': name}
+        ).scalar()
+        if exists:
+            _pending_partitions(db.session).add(name)
+            return name
+
+        default = f"{table}_default"
+        has_default = db.session.execute(
+            text("SELECT to_regclass(:name)"), {'name': default}
+        ).scalar()
+        stray_rows = has_default and db.session.execute(text(
+            f'SELECT 1 FROM {default} WHERE "{key}" >= :lower AND "{key}" < :upper LIMIT 1'
+        ), params).first()
+
+        if stray_rows:
+            # Рядки цього періоду потрапили в секцію за замовчуванням - переносимо їх
+            db.session.execute(text(f'ALTER TABLE {table} DETACH PARTITION {default}'))
+            db.session.execute(text(f'CREATE TABLE {name} PARTITION OF {table} {bounds}'))
+            if table == 'label_revisions':
+                _allow_log_maintenance()
+            db.session.execute(text(
+                f'INSERT INTO {name} SELECT * FROM {default} '
+                f'WHERE "{key}" >= :lower AND "{key}" < :upper'
+            ), params)
+            db.session.execute(text(
+                f'DELETE FROM {default} WHERE "{key}" >= :lower AND "{key}" < :upper'
+            ), params)
+            db.session.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT'))
+        else:
+            db.session.execute(text(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}'))
+
+        _pending_partitions(db.session).add(name)
+        return name
+
+    def _create_range(self, table: str, start: datetime, end: datetime) -> List[str]:
+        created = []
+        current = self._period_start(start)
+        last = self._period_start(end)
+        while current <= last:
+            created.append(self._create_partition(table, current))
+            current += self._period_step()
+        return created
+
+    def ensure_partitions(self, start: datetime = None, end: datetime = None) -> Dict[str, List[str]]:
+        """
+        Гарантувати наявність секцій для діапазону часу (за замовчуванням - від сьогодні на premake періодів)
+
+        Args:
+            start: Початок діапазону
+            end: Кінець діапазону
+
+        Returns:
+            Словник {таблиця: список секцій}
+        """
+        start = start or datetime.utcnow()
+        end = end or start + self._period_step() * self.premake
+        result = {}
+        for table in PARTITIONED_TABLES:
+            if not self.is_partitioned(table):
+                continue
+            result[table] = self._create_range(table, start, end)
+        return result
+
+    def ensure_for_timestamps(self, timestamps: Iterable[Optional[datetime]]) -> None:
+        """
+        Створити секції для міток часу пакета подій перед вставкою.
+        Для вже відомих секцій запит до БД не виконується.
+
+        Args:
+            timestamps: Мітки часу подій пакета
+        """
+        periods = {self._period_start(ts) for ts in timestamps if ts is not None}
+        missing = [
+            (table, period)
+            for period in sorted(periods)
+            for table in PARTITIONED_TABLES
+            if not PARTITIONED_TABLES[table].get('write_time')
+            and self._partition_name(table, period) not in self._known_partitions
+        ]
+        if not missing:
+            return
+
+        partitioned = {table: self.is_partitioned(table) for table in PARTITIONED_TABLES}
+        for table, period in missing:
+            if partitioned[table]:
+                self._create_partition(table, period)
+
+    # ---- Очищення за терміном зберігання ----
+
+    def prune(self, retention_days: int = None, dry_run: bool = False) -> Dict[str, List[str]]:
+        """
+        Видалити секції, старші за термін зберігання, через DETACH + DROP.
+        Рядки в секції за замовчуванням видаляються звичайним DELETE.
+        Журнал міток очищується лише в межах, уже покритих знімками ущільнення.
+
+        Args:
+            retention_days: Термін зберігання в днях (за замовчуванням з системної конфігурації)
+            dry_run: Лише повернути список секцій без видалення
+
+        Returns:
+            Словник {таблиця: список видалених секцій}
+        """
+        retention_days = retention_days or get_retention_days()
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        dropped = {}
+
+        for table in PRUNE_ORDER:
+            if not self.is_partitioned(table):
+                continue
+            key = PARTITIONED_TABLES[table]['key']
+            table_cutoff = cutoff
+            if table == 'label_revisions':
+                watermark = _compaction_watermark()
+                if watermark is None:
+                    continue
+                table_cutoff = min(cutoff, watermark)
+            dropped[table] = []
+            for partition in self.list_partitions(table):
+                if partition['default'] or partition['upper'] is None:
+                    continue
+                if partition['upper'] > table_cutoff:
+                    continue
+                dropped[table].append(partition['name'])
+                if dry_run:
+                    continue
+                db.session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition['name']}"))
+                db.session.execute(text(f"DROP TABLE {partition['name']}"))
+                self._known_partitions.discard(partition['name'])
+
+            if not dry_run:
+                if table == 'label_revisions':
+                    _allow_log_maintenance()
+                db.session.execute(text(
+                    f'DELETE FROM {table}_default WHERE "{key}" < :cutoff'
+                ), {'cutoff': table_cutoff})
+
+        if not dry_run:
+            db.session.commit()
+            logger.info(f"Pruned partitions older than {cutoff.isoformat()}: {dropped}")
+        return dropped
+
+
+def _pending_partitions(session) -> set:
+    """Секції, створені або знайдені в поточній транзакції сесії (ще не в кеші процесу)"""
+    return session.info.setdefault('pending_partitions', set())
+
+
+@event.listens_for(Session, 'after_commit')
+def _remember_committed_partitions(session):
+    # RELEASE SAVEPOINT теж викликає after_commit - чекаємо commit зовнішньої транзакції
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop('pending_partitions', None)
+    if pending:
+        PartitionManager._known_partitions.update(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_partitions(session):
+    # Також і після відкату savepoint: секції, створені до нього, просто перевіряться ще раз
+    session.info.pop('pending_partitions', None)
+
+
+def _compaction_watermark() -> Optional[datetime]:
+    from .label_history import compaction_watermark
+    return compaction_watermark()
+
+
+def _allow_log_maintenance():
+    from .label_history import allow_log_maintenance
+    allow_log_maintenance()
+
+
+def get_retention_days() -> int:
+    """Отримати термін зберігання даних з системної конфігурації"""
+    try:
+        item = Configuration.query.filter_by(config_type='general.data_retention_days').first()
+        if item and item.config_value and str(item.config_value).isdigit():
+            return int(item.config_value)
+    except Exception as e:
+        logger.warning(f"Could not read data_retention_days: {str(e)}")
+    return DEFAULT_RETENTION_DAYS
+
+
+def ensure_partitions_for_events(timestamps: Iterable[Optional[datetime]]) -> None:
+    """
+    Зручна обгортка для шляхів інгестії: створює секції лише якщо секціонування увімкнено
+
+    Args:
+        timestamps: Мітки часу подій, що будуть вставлені
+    """
+    if not current_app.config.get('PARTITIONING_ENABLED', False):
+        return
+    try:
+        # Savepoint, щоб помилка DDL не відкотила транзакцію інгестії
+        with db.session.begin_nested():
+            PartitionManager().ensure_for_timestamps(timestamps)
+    except Exception as e:
+        # Подія все одно потрапить у секцію за замовчуванням
+        logger.error(f"Error ensuring partitions: {str(e)}")
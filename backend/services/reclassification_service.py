@@ -0,0 +1,406 @@
+"""
+Повторна класифікація корпусу подій новою версією моделі.
+
+Завдання (ReclassificationJob) проходить події за зростанням events.id пакетами:
+  1. вибирає наступний пакет (keyset-пагінація від контрольної точки, без OFFSET);
+  2. класифікує його провайдером порціями з обмеженням подій/с;
+  3. записує результати одним UPDATE ... FROM jsonb_to_recordset, зберігаючи попередній
+     прогноз у labels_data["ml_history"][<попередня версія>], разом із записами label_revisions;
+  4. у тій самій транзакції оновлює контрольну точку завдання.
+
+Перерване завдання продовжується з останньої зафіксованої події. Між пакетами - пауза,
+а кожна транзакція має statement_timeout, тож інгестія не чекає на довгі блокування.
+Події, перевірені аналітиком (human_verified), за замовчуванням не змінюються.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from flask import current_app
+from sqlalchemy import text
+
+from .active_learning import rebuild_queue
+from .feature_store import FEATURE_VERSION, load_vectors
+from .labeling_service import OLD_VALUE_SQL
+from .mitre_mappings import MAPPING_SOURCE
+from .near_duplicates import NOT_DUPLICATE_SQL, propagate_labels
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running', 'paused', 'failed')
+DEFAULT_ML_BATCH_SIZE = 100
+
+_UPDATE_SQL = """
+WITH target AS (
+    SELECT e.id, e.labels_data::jsonb AS labels, e.attack_type, e.mitre_tactic, e.mitre_technique,
+           r.labels AS patch, r.attack_type AS new_attack_type, r.mitre_tactic AS new_mitre_tactic,
+           r.mitre_technique AS new_mitre_technique
+    FROM events e
+    JOIN jsonb_to_recordset(CAST(:rows AS jsonb))
+        AS r(id integer, labels jsonb, attack_type text, mitre_tactic text, mitre_technique text) ON r.id = e.id
+    FOR UPDATE OF e
+), upd AS (
+    UPDATE events AS e SET
+        labels_data = (
+            t.labels
+            || CASE
+                WHEN COALESCE(t.labels->>'ml_processed', 'false') <> 'true'
+                     OR COALESCE(t.labels->>'ml_model_version', '') = :version
+                THEN '{{}}'::jsonb
+                ELSE jsonb_build_object('ml_history',
+                    COALESCE(t.labels->'ml_history', '{{}}'::jsonb)
+                    || jsonb_build_object(
+                        COALESCE(t.labels->>'ml_model_version', 'unknown'),
+                        jsonb_strip_nulls(jsonb_build_object(
+                            'attack_type', t.attack_type,
+                            'mitre_tactic', t.mitre_tactic,
+                            'mitre_technique', t.mitre_technique,
+                            'true_positive', t.labels->'true_positive',
+                            'ml_confidence', t.labels->'ml_confidence',
+                            'ml_timestamp', t.labels->'ml_timestamp'
+                        ))
+                    ))
+            END
+            || t.patch
+        )::json,
+        attack_type = COALESCE(t.new_attack_type, e.attack_type),
+        mitre_tactic = COALESCE(t.new_mitre_tactic, e.mitre_tactic),
+        mitre_technique = COALESCE(t.new_mitre_technique, e.mitre_technique)
+    FROM target t WHERE e.id = t.id
+    RETURNING e.id
+), rev AS (
+    -- ml_history - архів попередніх прогнозів, у журнал не пишеться
+    INSERT INTO label_revisions (event_id, timestamp, user_id, action, label_key, old_value, new_value, source)
+    SELECT t.id, now() AT TIME ZONE 'utc', NULL, 'update', kv.key, o.value::json, kv.value::json, 'ml'
+    FROM target t
+    JOIN upd ON upd.id = t.id
+    CROSS JOIN jsonb_each(t.patch) AS kv
+    CROSS JOIN LATERAL ({old_value}) AS o
+    WHERE o.value IS DISTINCT FROM kv.value
+    RETURNING 1
+)
+SELECT count(*) FROM upd
+""".format(old_value=OLD_VALUE_SQL)
+
+
+class RateLimiter:
+    """Обмеження середньої пропускної здатності (одиниць за секунду)"""
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+
+    def acquire(self, amount: int = 1):
+        if not self.rate or self.rate <= 0:
+            return
+        now = self._clock()
+        if self._next > now:
+            self._sleep(self._next - now)
+            now = self._next
+        self._next = now + amount / self.rate
+
+
+def build_update_rows(events: Sequence[Dict[str, Any]], results: Sequence[Dict[str, Any]],
+                      model_version: str, min_threshold: float) -> List[Dict[str, Any]]:
+    """
+    Перетворити результати провайдера на рядки для пакетного UPDATE
+
+    Прогноз і впевненість записуються завжди; мітки (attack_type, MITRE, true_positive)
+    застосовуються лише при впевненості не нижче порогу. MITRE-мітки з користувацьких
+    відповідностей не перезаписуються.
+
+    Returns:
+        Рядки лише для успішно класифікованих подій
+    """
+    timestamp = datetime.utcnow().isoformat()
+    rows = []
+    for event, result in zip(events, results):
+        if not result or not result.get("success"):
+            continue
+        classification = result.get("classification", {}) or {}
+        confidence = float(result.get("confidence", 0.0) or 0.0)
+        labels = {
+            "ml_processed": True,
+            "ml_model_version": model_version,
+            "ml_confidence": confidence,
+            "ml_timestamp": timestamp,
+            "ml_prediction": classification,
+        }
+        row = {"id": event["id"], "labels": labels, "attack_type": None, "mitre_tactic": None, "mitre_technique": None}
+
+        if confidence >= min_threshold:
+            if "true_positive" in classification:
+                labels["true_positive"] = classification["true_positive"]
+            fields = ["attack_type"]
+            if (event.get("labels_data") or {}).get("mitre_source") != MAPPING_SOURCE:
+                fields += ["mitre_tactic", "mitre_technique"]
+            for field in fields:
+                if classification.get(field):
+                    labels[field] = classification[field]
+                    row[field] = classification[field]
+        rows.append(row)
+    return rows
+
+
+def _select_batch(job, batch_size: int) -> List[Dict[str, Any]]:
+    from models import db
+
+    filters = job.filters or {}
+    conditions = ["id > :last_id"]
+    params: Dict[str, Any] = {"last_id": job.last_event_id, "limit": batch_size}
+
+    if not filters.get("include_unprocessed"):
+        conditions.append("labels_data->>'ml_processed' = 'true'")
+    if not filters.get("include_verified"):
+        conditions.append("COALESCE(labels_data->>'human_verified', 'false') <> 'true'")
+    # Події з користувацькою відповідністю правила ML не класифікує
+    conditions.append("COALESCE(labels_data->>'mitre_source', '') <> :mapping_source")
+    params["mapping_source"] = MAPPING_SOURCE
+    if not filters.get("include_duplicates"):
+        # Члени кластерів отримують мітки від представника
+        conditions.append(NOT_DUPLICATE_SQL)
+    if filters.get("date_from"):
+        conditions.append("timestamp >= :date_from")
+        params["date_from"] = filters["date_from"]
+    if filters.get("date_to"):
+        conditions.append("timestamp < :date_to")
+        params["date_to"] = filters["date_to"]
+    if filters.get("siem_source"):
+        conditions.append("siem_source = :siem_source")
+        params["siem_source"] = filters["siem_source"]
+
+    result = db.session.execute(text(
+        "SELECT id, event_id, timestamp, source_ip, severity, siem_source, labels_data "
+        f"FROM events WHERE {' AND '.join(conditions)} ORDER BY id LIMIT :limit"
+    ), params)
+    return [dict(row._mapping) for row in result]
+
+
+def _prepare_inputs(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Дані для провайдера: збережений вектор ознак, а raw_log - лише для подій без нього"""
+    from models import db
+
+    ids = [event["id"] for event in events]
+    vectors = load_vectors(ids)
+    missing = [event_id for event_id in ids if event_id not in vectors]
+    raw_logs = {}
+    if missing:
+        result = db.session.execute(text(
+            "SELECT DISTINCT ON (event_id) event_id, log_data FROM raw_logs "
+            "WHERE event_id = ANY(:ids) ORDER BY event_id, id"
+        ), {"ids": missing})
+        raw_logs = {event_id: log_data for event_id, log_data in result}
+
+    inputs = []
+    for event in events:
+        labels = event.get("labels_data") or {}
+        data = {
+            "id": event["id"],
+            "event_id": event["event_id"],
+            "timestamp": event["timestamp"].isoformat() if event.get("timestamp") else None,
+            "source_ip": event.get("source_ip"),
+            "severity": event.get("severity"),
+            "siem_source": event.get("siem_source"),
+            "labels": {k: v for k, v in labels.items() if k != "ml_history"},
+        }
+        vector = vectors.get(event["id"])
+        if vector is not None:
+            data["features"] = {"version": FEATURE_VERSION, "indices": vector[0].tolist(), "values": vector[1].tolist()}
+        else:
+            data["raw_log"] = raw_logs.get(event["id"]) or {}
+        inputs.append(data)
+    return inputs
+
+
+def _classify(provider, inputs: List[Dict[str, Any]], ml_batch_size: int, limiter: RateLimiter) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for start in range(0, len(inputs), ml_batch_size):
+        chunk = inputs[start:start + ml_batch_size]
+        limiter.acquire(len(chunk))
+        try:
+            chunk_results = provider.batch_classify(chunk)
+        except Exception as e:
+            logger.error(f"Re-classification batch failed: {str(e)}")
+            chunk_results = []
+        if len(chunk_results) != len(chunk):
+            chunk_results = [{"success": False, "error": "Provider returned a wrong number of results"}] * len(chunk)
+        results.extend(chunk_results)
+    return results
+
+
+def create_job(model_version: str, filters: Optional[Dict[str, Any]] = None, resume: bool = True):
+    """
+    Створити завдання або повернути незавершене з тими самими версією та фільтрами
+
+    Returns:
+        ReclassificationJob
+    """
+    from models import db, ReclassificationJob
+
+    filters = filters or {}
+    if resume:
+        for job in ReclassificationJob.query.filter(
+            ReclassificationJob.model_version == model_version,
+            ReclassificationJob.status.in_(ACTIVE_STATUSES)
+        ).order_by(ReclassificationJob.id.desc()).all():
+            if (job.filters or {}) == filters:
+                return job
+
+    job = ReclassificationJob(model_version=model_version, filters=filters, status='pending')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _claim(job_id: int) -> bool:
+    """Позначити завдання як виконуване; False, якщо ним вже займається інший процес"""
+    from models import db
+
+    claimed = db.session.execute(text(
+        "UPDATE reclassification_jobs SET status = 'running', message = NULL, updated_at = now() "
+        "WHERE id = :id AND (status <> 'running' OR updated_at < now() - interval '10 minutes') "
+        "AND status NOT IN ('completed', 'cancelled')"
+    ), {"id": job_id}).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_job(job_id: int, ml_service, batch_size: Optional[int] = None, max_events_per_second: Optional[float] = None,
+            ml_batch_size: int = DEFAULT_ML_BATCH_SIZE, max_batches: Optional[int] = None):
+    """
+    Виконати (або продовжити) завдання повторної класифікації
+
+    Args:
+        job_id: ID завдання
+        ml_service: Ініціалізований MLService (провайдер і поріг впевненості)
+        batch_size: Подій на одну транзакцію БД
+        max_events_per_second: Обмеження навантаження на ML-провайдера (0 - без обмеження)
+        ml_batch_size: Подій на один виклик провайдера
+        max_batches: Зупинитися після N пакетів (статус 'paused')
+
+    Returns:
+        ReclassificationJob після завершення або зупинки
+    """
+    from models import db, ReclassificationJob
+
+    config = current_app.config
+    batch_size = batch_size or config.get('RECLASSIFY_BATCH_SIZE', 1000)
+    if max_events_per_second is None:
+        max_events_per_second = config.get('RECLASSIFY_MAX_EVENTS_PER_SECOND', 500)
+    pause = config.get('RECLASSIFY_BATCH_PAUSE', 0.2)
+    statement_timeout = int(config.get('RECLASSIFY_STATEMENT_TIMEOUT_MS', 30000))
+    max_failure_ratio = float(config.get('RECLASSIFY_MAX_FAILURE_RATIO', 0.5))
+
+    if not _claim(job_id):
+        job = db.session.get(ReclassificationJob, job_id)
+        logger.warning(f"Re-classification job {job_id} is not runnable (status: {getattr(job, 'status', None)})")
+        return job
+
+    ml_service._ensure_config_loaded()
+    provider = ml_service.provider
+    min_threshold = float(ml_service.config.get("min_confidence_threshold", 0.7))
+    limiter = RateLimiter(max_events_per_second)
+    job = db.session.get(ReclassificationJob, job_id)
+    batches = 0
+
+    try:
+        while True:
+            db.session.refresh(job)
+            if job.status != 'running':
+                logger.info(f"Re-classification job {job_id} stopped (status: {job.status})")
+                return job
+            if max_batches is not None and batches >= max_batches:
+                job.status = 'paused'
+                db.session.commit()
+                return job
+
+            events = _select_batch(job, batch_size)
+            if not events:
+                job.status = 'completed'
+                job.completed_at = datetime.utcnow()
+                db.session.commit()
+                _rebuild_verification_queue()
+                logger.info(f"Re-classification job {job_id} completed: {job.processed} events, "
+                            f"{job.updated} updated, {job.failed} failed")
+                return job
+
+            inputs = _prepare_inputs(events)
+            # Читальна транзакція не тримається відкритою під час звернення до моделі
+            db.session.commit()
+            results = _classify(provider, inputs, ml_batch_size, limiter)
+            rows = build_update_rows(events, results, job.model_version, min_threshold)
+            failures = len(events) - len(rows)
+            if not rows or failures / len(events) > max_failure_ratio:
+                # Провайдер недоступний або відповідає помилками: контрольна точка лишається
+                # на місці, щоб після відновлення пакет класифікувався повторно
+                error = next((r.get("error") for r in results if r and not r.get("success") and r.get("error")), None)
+                job.status = 'failed'
+                job.message = (f"{failures} of {len(events)} events failed after event {job.last_event_id}"
+                               + (f": {error}" if error else ""))
+                db.session.commit()
+                logger.error(f"Re-classification job {job_id} stopped: {job.message}")
+                return job
+
+            db.session.execute(text(f"SET LOCAL statement_timeout = {statement_timeout}"))
+            if rows:
+                db.session.execute(text(_UPDATE_SQL), {"version": job.model_version, "rows": json.dumps(rows, default=str)})
+                if not (job.filters or {}).get("include_duplicates"):
+                    propagate_labels([row["id"] for row in rows])
+            # Контрольна точка фіксується разом з оновленнями пакета
+            job.last_event_id = events[-1]["id"]
+            job.processed += len(events)
+            job.updated += len(rows)
+            job.failed += len(events) - len(rows)
+            db.session.commit()
+            batches += 1
+
+            if pause:
+                time.sleep(pause)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Re-classification job {job_id} failed: {str(e)}")
+        job = db.session.get(ReclassificationJob, job_id)
+        job.status = 'failed'
+        job.message = str(e)
+        db.session.commit()
+        return job
+
+
+def _rebuild_verification_queue():
+    """Нові прогнози змінюють пріоритети всієї черги верифікації"""
+    from models import db
+
+    try:
+        rebuild_queue()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Verification queue rebuild failed: {str(e)}")
+
+
+def run_job_async(app, job_id: int, **kwargs) -> threading.Thread:
+    """Запустити завдання у фоновому потоці веб-процесу"""
+    from .ml_registry import get_ml_service
+
+    def target():
+        with app.app_context():
+            run_job(job_id, get_ml_service(), **kwargs)
+
+    thread = threading.Thread(target=target, name=f'reclassify-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def model_version_of(ml_service) -> str:
+    """Версія моделі поточного провайдера"""
+    ml_service._ensure_config_loaded()
+    try:
+        return str(ml_service.provider.get_model_info().get("model_info", {}).get("version") or "unknown")
+    except Exception as e:
+        logger.warning(f"Could not get model info: {str(e)}")
+        return "unknown"
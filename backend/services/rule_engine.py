@@ -0,0 +1,526 @@
+"""
+Скомпільований рушій правил для автоматичного маркування подій.
+
+Правила компілюються один раз в індексовану структуру за найселективнішою умовою кожного правила:
+- рівність полів - хеш-таблиця значення -> правила;
+- підрядки (contains) - один автомат Aho-Corasick на поле;
+- регулярні вирази - відбір за обов'язковим літеральним фрагментом через автомат
+  та спільний префільтр для решти;
+- CIDR - хеш-таблиці за довжиною префікса для кожної версії IP;
+- решта умов правила перевіряються лише для правил-кандидатів.
+
+Формат правила:
+{
+    "id": "brute-force",
+    "conditions": {
+        "severity": ["medium", "high"],            # рівність (будь-яке значення зі списку)
+        "rule_name": {"contains": "brute"},        # підрядок (без урахування регістру)
+        "message": {"regex": "failed .* root"},    # регулярний вираз
+        "source_ip": {"cidr": "10.0.0.0/8"},       # належність до мережі
+        "raw_log.rule.level": {"gte": 7}           # порівняння
+    },
+    "labels": {"attack_type": "Brute Force"},
+    "tags": ["brute_force"]
+}
+"""
+import hashlib
+import ipaddress
+import json
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .keyword_matcher import KeywordMatcher, required_literal
+
+logger = logging.getLogger(__name__)
+
+# Правила за замовчуванням - відповідають попередній жорстко закодованій логіці auto_tag_alerts
+DEFAULT_RULES = [
+    {
+        "id": "potential_threat",
+        "conditions": {"severity": ["medium", "high"]},
+        "tags": ["potential_threat"]
+    },
+    {
+        "id": "brute_force",
+        "conditions": {"rule_name": {"contains": "brute"}},
+        "tags": ["brute_force"]
+    }
+]
+
+INDEXED_OPS = ('eq', 'in', 'contains', 'regex', 'cidr')
+RESIDUAL_OPS = ('ne', 'gt', 'gte', 'lt', 'lte', 'exists')
+
+_MISSING = object()
+
+
+class RuleCompileError(ValueError):
+    """Помилка компіляції правила"""
+    pass
+
+
+def get_field(event: Dict[str, Any], path: str) -> Any:
+    """
+    Отримати значення поля події за шляхом з крапками (наприклад, "raw_log.rule.level")
+
+    Args:
+        event: Дані події
+        path: Шлях до поля
+
+    Returns:
+        Значення поля або _MISSING
+    """
+    if path in event:
+        return event[path]
+    value = event
+    for part in path.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _normalize(value: Any) -> Any:
+    """Нормалізувати значення для хеш-пошуку: рядки без урахування регістру"""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        # 7 та "7" мають збігатися - значення з SIEM часто приходять рядками
+        return str(value)
+    return value
+
+
+def _as_list(value: Any) -> list:
+    return value if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _parse_ip(value: Any):
+    try:
+        return ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        return None
+
+
+class _CidrIndex:
+    """Індекс мереж: хеш-таблиця для кожної довжини префікса (сплющене префіксне дерево)"""
+
+    def __init__(self):
+        # {версія IP: {довжина префікса: {мережа як int: [правило]}}}
+        self.tables = {4: defaultdict(lambda: defaultdict(list)), 6: defaultdict(lambda: defaultdict(list))}
+
+    def add(self, cidr: str, rule_idx: int):
+        network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+        self.tables[network.version][network.prefixlen][int(network.network_address)].append(rule_idx)
+
+    def lookup(self, value: Any) -> List[int]:
+        ip = _parse_ip(value)
+        if ip is None:
+            return []
+        bits = ip.max_prefixlen
+        address = int(ip)
+        result = []
+        for prefixlen, table in self.tables[ip.version].items():
+            mask = ((1 << prefixlen) - 1) << (bits - prefixlen) if prefixlen else 0
+            result.extend(table.get(address & mask, ()))
+        return result
+
+
+class _SubstringIndex:
+    """Пошук підрядків у полі одним автоматом Aho-Corasick; повертає правила, чиї ключові слова знайдено"""
+
+    def __init__(self):
+        self.matcher = KeywordMatcher()
+
+    def add(self, keyword: str, rule_idx: int):
+        self.matcher.add(keyword, rule_idx)
+
+    def finalize(self):
+        self.matcher.build()
+
+    def lookup(self, text: str) -> List[int]:
+        return self.matcher.find(text)
+
+
+class _RegexIndex:
+    """
+    Набір регулярних виразів одного поля.
+    Вирази з обов'язковим літеральним фрагментом перевіряються лише тоді, коли автомат
+    знайшов цей фрагмент у тексті; решта - за спільним об'єднаним префільтром.
+    """
+
+    def __init__(self):
+        self.patterns: List[Tuple[int, re.Pattern]] = []
+        self.literals = KeywordMatcher()
+        self.unanchored: List[int] = []
+        self.prefilter: Optional[re.Pattern] = None
+
+    def add(self, pattern: str, rule_idx: int):
+        try:
+            compiled = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise RuleCompileError(f"Invalid regex '{pattern}': {str(e)}")
+
+        position = len(self.patterns)
+        self.patterns.append((rule_idx, compiled))
+        literal = required_literal(pattern)
+        if literal:
+            self.literals.add(literal, position)
+        else:
+            self.unanchored.append(position)
+
+    def finalize(self):
+        self.literals.build()
+        # Об'єднаний вираз відкидає текст за один прохід, якщо жоден вираз без літерала не збігається.
+        # Вирази з посиланнями на групи не можна об'єднати - тоді префільтр не використовується.
+        if not self.unanchored:
+            return
+        try:
+            combined = '|'.join(f'(?:{self.patterns[i][1].pattern})' for i in self.unanchored)
+            self.prefilter = re.compile(combined, re.IGNORECASE)
+        except re.error:
+            self.prefilter = None
+
+    def lookup(self, text: str) -> List[int]:
+        positions = self.literals.find(text)
+        if self.unanchored and (self.prefilter is None or self.prefilter.search(text)):
+            positions = positions + self.unanchored
+        result = []
+        for position in positions:
+            rule_idx, pattern = self.patterns[position]
+            if pattern.search(text):
+                result.append(rule_idx)
+        return result
+
+
+def _check_residual(op: str, expected: Any, value: Any) -> bool:
+    """Перевірити неіндексовану умову"""
+    if op == 'exists':
+        return (value is not _MISSING and value is not None) == bool(expected)
+    if value is _MISSING or value is None:
+        return op == 'ne'
+    if op == 'ne':
+        return _normalize(value) not in {_normalize(v) for v in _as_list(expected)}
+    try:
+        number = float(value)
+        threshold = float(expected)
+    except (TypeError, ValueError):
+        return False
+    if op == 'gt':
+        return number > threshold
+    if op == 'gte':
+        return number >= threshold
+    if op == 'lt':
+        return number < threshold
+    return number <= threshold
+
+
+def _field_text(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+class _Predicate:
+    """Одна умова правила в нормалізованому вигляді"""
+
+    __slots__ = ('field', 'op', 'values', '_networks', '_patterns')
+
+    def __init__(self, field: str, op: str, expected: Any):
+        self.field = field
+        self.op = 'eq' if op == 'in' else op
+        self._networks = []
+        self._patterns = []
+
+        if self.op == 'eq':
+            self.values = {_normalize(v) for v in _as_list(expected)}
+        elif self.op == 'contains':
+            self.values = [str(k).lower() for k in _as_list(expected) if str(k)]
+        elif self.op == 'regex':
+            self.values = [str(p) for p in _as_list(expected)]
+            for pattern in self.values:
+                try:
+                    self._patterns.append(re.compile(pattern, re.IGNORECASE))
+                except re.error as e:
+                    raise RuleCompileError(f"Invalid regex '{pattern}': {str(e)}")
+        elif self.op == 'cidr':
+            self.values = [str(c).strip() for c in _as_list(expected)]
+            for cidr in self.values:
+                try:
+                    self._networks.append(ipaddress.ip_network(cidr, strict=False))
+                except ValueError as e:
+                    raise RuleCompileError(f"Invalid CIDR '{cidr}': {str(e)}")
+        elif self.op in RESIDUAL_OPS:
+            self.values = expected
+        else:
+            raise RuleCompileError(f"Unsupported condition operator: {op}")
+        if self.indexable and not self.values:
+            # Порожній набір значень не збігається ні з чим і не має ключа для індексу
+            raise RuleCompileError(f"Condition '{op}' on field '{field}' has no values")
+
+    @property
+    def indexable(self) -> bool:
+        return self.op in INDEXED_OPS
+
+    def keys(self) -> list:
+        """Ключі індексу, під якими предикат реєструється (для оцінки селективності)"""
+        if not self.indexable:
+            return []
+        return [(self.field, self.op, v) for v in self.values]
+
+    def check(self, event: Dict[str, Any]) -> bool:
+        """Перевірити умову безпосередньо (для неякірних предикатів)"""
+        value = get_field(event, self.field)
+        if not self.indexable:
+            return _check_residual(self.op, self.values, value)
+        if value is _MISSING or value is None:
+            return False
+
+        if self.op == 'eq':
+            return any(_normalize(item) in self.values for item in _as_list(value))
+        if self.op == 'cidr':
+            for item in _as_list(value):
+                ip = _parse_ip(item)
+                if ip is not None and any(ip.version == n.version and ip in n for n in self._networks):
+                    return True
+            return False
+
+        text = _field_text(value)
+        if self.op == 'contains':
+            text = text.lower()
+            return any(keyword in text for keyword in self.values)
+        return any(pattern.search(text) for pattern in self._patterns)
+
+
+# Порядок переваги при однаковій селективності: дешевші індекси першими
+_ANCHOR_COST = {'eq': 0, 'cidr': 1, 'contains': 2, 'regex': 3}
+
+
+class CompiledRuleSet:
+    """Скомпільований набір правил з індексами для пакетного маркування подій"""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        """
+        Скомпілювати правила.
+
+        Кожне правило індексується лише за одним "якірним" предикатом - найселективнішим
+        (з найменшою кількістю правил під тим самим ключем). Решта умов перевіряються
+        тільки для правил, чий якір спрацював, тож часті значення (наприклад, severity=high)
+        не роблять кандидатами сотні правил на кожну подію.
+
+        Args:
+            rules: Список правил у форматі, описаному в документації модуля
+
+        Raises:
+            RuleCompileError: Якщо правило має некоректний формат
+        """
+        self.rules = []
+        self.fingerprint = rules_fingerprint(rules)
+
+        self._verify: List[List[_Predicate]] = []      # індекс правила -> умови для перевірки
+        self._unconditional = []                        # правила без індексованих умов
+
+        self._eq = defaultdict(lambda: defaultdict(list))   # поле -> значення -> [правило]
+        self._contains = defaultdict(_SubstringIndex)       # поле -> індекс підрядків
+        self._regex = defaultdict(_RegexIndex)              # поле -> набір виразів
+        self._cidr = defaultdict(_CidrIndex)                # поле -> індекс мереж
+
+        parsed = [self._parse_rule(rule) for rule in rules if not isinstance(rule, dict) or rule.get('enabled', True)]
+
+        # Селективність ключа - кількість правил, що на нього посилаються
+        fanout = defaultdict(int)
+        for predicates in parsed:
+            for predicate in predicates:
+                for key in predicate.keys():
+                    fanout[key] += 1
+
+        for rule_idx, predicates in enumerate(parsed):
+            indexable = [p for p in predicates if p.indexable]
+            if not indexable:
+                self._unconditional.append(rule_idx)
+                self._verify.append(predicates)
+                continue
+
+            anchor = min(indexable, key=lambda p: (max(fanout[k] for k in p.keys()), _ANCHOR_COST[p.op]))
+            self._add_anchor(anchor, rule_idx)
+            self._verify.append([p for p in predicates if p is not anchor])
+
+        for index in list(self._contains.values()) + list(self._regex.values()):
+            index.finalize()
+
+        logger.info(f"Compiled {len(self.rules)} tagging rules "
+                    f"({len(self.rules) - len(self._unconditional)} indexed)")
+
+    def _parse_rule(self, rule: Dict[str, Any]) -> List[_Predicate]:
+        if not isinstance(rule, dict):
+            raise RuleCompileError(f"Rule must be an object, got {type(rule).__name__}")
+
+        rule_idx = len(self.rules)
+        self.rules.append({
+            'id': str(rule.get('id', rule.get('name', rule_idx))),
+            'labels': rule.get('labels', {}) or {},
+            'tags': list(rule.get('tags', []) or [])
+        })
+
+        conditions = rule.get('conditions', {}) or {}
+        if not isinstance(conditions, dict):
+            raise RuleCompileError(f"Conditions of rule {self.rules[-1]['id']} must be an object")
+
+        predicates = []
+        for field, spec in conditions.items():
+            # Скорочений запис: скаляр або список означає рівність
+            if not isinstance(spec, dict):
+                spec = {'eq': spec}
+            for op, expected in spec.items():
+                predicates.append(_Predicate(field, op, expected))
+        return predicates
+
+    def _add_anchor(self, predicate: _Predicate, rule_idx: int):
+        field = predicate.field
+        for value in predicate.values:
+            if predicate.op == 'eq':
+                self._eq[field][value].append(rule_idx)
+            elif predicate.op == 'contains':
+                self._contains[field].add(value, rule_idx)
+            elif predicate.op == 'regex':
+                self._regex[field].add(value, rule_idx)
+            else:
+                self._cidr[field].add(value, rule_idx)
+
+    def _candidates(self, event: Dict[str, Any]) -> set:
+        candidates = set(self._unconditional)
+
+        for field, table in self._eq.items():
+            value = get_field(event, field)
+            if value is _MISSING:
+                continue
+            for item in _as_list(value):
+                candidates.update(table.get(_normalize(item), ()))
+
+        for field, index in self._cidr.items():
+            value = get_field(event, field)
+            if value is _MISSING or value is None:
+                continue
+            for item in _as_list(value):
+                candidates.update(index.lookup(item))
+
+        for indexes in (self._contains, self._regex):
+            for field, index in indexes.items():
+                value = get_field(event, field)
+                if value is _MISSING or value is None:
+                    continue
+                candidates.update(index.lookup(_field_text(value)))
+
+        return candidates
+
+    def match(self, event: Dict[str, Any]) -> List[int]:
+        """
+        Знайти правила, що спрацьовують для події
+
+        Args:
+            event: Дані події (нормалізований лог або Event.to_dict())
+
+        Returns:
+            Відсортований список індексів правил
+        """
+        matched = [
+            idx for idx in self._candidates(event)
+            if all(predicate.check(event) for predicate in self._verify[idx])
+        ]
+        matched.sort()
+        return matched
+
+    def label_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Отримати мітки та теги для однієї події
+
+        Args:
+            event: Дані події
+
+        Returns:
+            Dictionary з labels, tags та rules (ID правил, що спрацювали)
+        """
+        labels = {}
+        tags = []
+        rule_ids = []
+        # Пізніші правила перекривають мітки попередніх - як у попередній реалізації label_alerts
+        for idx in self.match(event):
+            rule = self.rules[idx]
+            labels.update(rule['labels'])
+            for tag in rule['tags']:
+                if tag not in tags:
+                    tags.append(tag)
+            rule_ids.append(rule['id'])
+        return {"labels": labels, "tags": tags, "rules": rule_ids}
+
+    def label_batch(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Пакетне маркування подій
+
+        Args:
+            events: Список даних подій
+
+        Returns:
+            Список результатів label_event у тому ж порядку
+        """
+        return [self.label_event(event) for event in events]
+
+
+def rules_fingerprint(rules: Any) -> str:
+    """Відбиток набору правил для виявлення змін конфігурації"""
+    payload = json.dumps(rules, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+# Скомпільований набір правил процесу; перекомпілюється лише при зміні правил
+_compiled_rules: Optional[CompiledRuleSet] = None
+
+
+def get_rule_engine(rules: List[Dict[str, Any]] = None) -> CompiledRuleSet:
+    """
+    Отримати скомпільований набір правил маркування.
+    Правила беруться з Configuration (config_type 'tagging.rules'), або DEFAULT_RULES, якщо їх немає.
+
+    Args:
+        rules: Явний список правил (опціонально, без читання конфігурації)
+
+    Returns:
+        Екземпляр CompiledRuleSet
+    """
+    global _compiled_rules
+
+    if rules is None:
+        rules = load_rules()
+
+    fingerprint = rules_fingerprint(rules)
+    if _compiled_rules is None or _compiled_rules.fingerprint != fingerprint:
+        _compiled_rules = CompiledRuleSet(rules)
+    return _compiled_rules
+
+
+def load_rules() -> List[Dict[str, Any]]:
+    """Завантажити правила маркування зі знімка системної конфігурації"""
+    from .config_snapshot import get_config_snapshot
+
+    try:
+        config_value = get_config_snapshot().raw.get('tagging.rules')
+        if config_value:
+            rules = json.loads(config_value)
+            if isinstance(rules, dict):
+                rules = rules.get('rules', [])
+            return rules
+    except Exception as e:
+        logger.error(f"Error loading tagging rules: {str(e)}")
+    return DEFAULT_RULES
+
+
+def is_auto_tagging_enabled() -> bool:
+    """Перевірити налаштування general.auto_tagging_enabled (за замовчуванням увімкнено)"""
+    from .config_snapshot import get_config_snapshot
+
+    try:
+        return get_config_snapshot().get_bool('general.auto_tagging_enabled', True)
+    except Exception as e:
+        logger.warning(f"Could not read auto_tagging_enabled: {str(e)}")
+    return True
@@ -2,6 +2,7 @@ import requests
 from requests.exceptions import RequestException
 import json
 import logging
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
 
@@ -10,6 +11,7 @@ from .connectors.wazuh import WazuhConnector
 from .connectors.splunk import SplunkConnector
 from .connectors.elastic import ElasticConnector
 from .exceptions import SIEMException
+from .metrics import observe_fetch
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -38,12 +40,18 @@ class SIEMService:
     
     def fetch_logs(self, params=None):
         """Fetch logs from SIEM system"""
+        siem = self.connector.get_siem_type().lower()
+        started = time.perf_counter()
         try:
-            return self.connector.fetch_logs(params)
+            logs = self.connector.fetch_logs(params)
+            observe_fetch(siem, time.perf_counter() - started, len(logs))
+            return logs
         except SIEMException as e:
+            observe_fetch(siem, time.perf_counter() - started, None)
             logger.error(f"SIEM exception: {str(e)}")
             return []
         except Exception as e:
+            observe_fetch(siem, time.perf_counter() - started, None)
             logger.error(f"Unexpected error fetching logs: {str(e)}")
             return []
     
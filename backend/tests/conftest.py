@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# Тести імпортують модулі backend (services, models) як пакети верхнього рівня
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pg_app():
+    """
+    Застосунок на PostgreSQL для SQL, який sqlite не виконає (JSONB, ANY, UPDATE у CTE)
+
+    DSN береться з TEST_DATABASE_URL, без нього тест пропускається. Схема створюється
+    для кожного тесту й видаляється після нього - використовуйте окрему тестову базу.
+    """
+    dsn = os.getenv('TEST_DATABASE_URL')
+    if not dsn:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=dsn)
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.rollback()
+            db.session.remove()
+            db.drop_all()
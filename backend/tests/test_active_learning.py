@@ -0,0 +1,50 @@
+import numpy as np
+
+from services.active_learning import DIVERSITY_DECAY, feature_cluster, rank_candidates, with_rule_labels
+
+
+def _candidate(event_id, confidence, attack_type="Brute Force", rule_attack_type=None, cluster=0):
+    labels = with_rule_labels({"attack_type": rule_attack_type} if rule_attack_type else {})
+    # ML перезаписує attack_type власним прогнозом, мітка правила лишається в rule_attack_type
+    labels.update({"ml_processed": True, "ml_confidence": confidence, "attack_type": attack_type,
+                   "ml_prediction": {"attack_type": attack_type, "mitre_technique": "T1110"}})
+    return {"id": event_id, "labels_data": labels, "cluster": cluster}
+
+
+def test_uncertain_disagreeing_and_rare_events_rank_first():
+    candidates = [
+        _candidate(1, 0.95),
+        _candidate(2, 0.55),
+        _candidate(3, 0.95, rule_attack_type="Malware"),
+        _candidate(4, 0.95, attack_type="Ransomware"),
+        _candidate(5, 0.95),
+        _candidate(6, 0.95),
+    ]
+    for i, candidate in enumerate(candidates):
+        candidate["cluster"] = i
+
+    entries = {e["event_id"]: e for e in rank_candidates(candidates)}
+    assert entries[2]["uncertainty"] > entries[1]["uncertainty"]
+    assert entries[3]["disagreement"] == 1.0
+    assert entries[4]["rarity"] > entries[1]["rarity"]
+    order = sorted(entries, key=lambda event_id: -entries[event_id]["priority"])
+    assert order[-1] in (1, 5, 6)
+    assert set(order[:3]) == {2, 3, 4}
+
+
+def test_near_duplicates_are_spread_by_cluster_discount():
+    candidates = [_candidate(1, 0.6, cluster=7), _candidate(2, 0.6, cluster=7), _candidate(3, 0.65, cluster=8)]
+    entries = {e["event_id"]: e for e in rank_candidates(candidates)}
+    assert entries[2]["priority"] == entries[1]["priority"] * DIVERSITY_DECAY
+    assert entries[3]["priority"] > entries[2]["priority"]
+
+    offset = {e["event_id"]: e for e in rank_candidates(candidates[:1], cluster_offsets={7: 2})}
+    assert offset[1]["priority"] < entries[1]["priority"]
+
+
+def test_feature_cluster_is_stable_for_similar_vectors():
+    indices = np.array([3, 17, 1000, 2048, 4096], dtype=np.int32)
+    values = np.array([0.5, 0.5, 0.4, 0.4, 0.4], dtype=np.float32)
+    assert feature_cluster(indices, values) == feature_cluster(indices, values * 2)
+    assert 0 <= feature_cluster(indices, values) < 256
+    assert feature_cluster(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)) == 0
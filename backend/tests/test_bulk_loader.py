@@ -0,0 +1,30 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from services.bulk_loader import alerts_from_response, parse_timestamp, read_events
+from services.load_generator import SyntheticWorkload, api_response
+
+
+def test_parse_timestamp_to_naive_utc():
+    assert parse_timestamp('2024-03-01T10:00:00Z') == datetime(2024, 3, 1, 10, 0)
+    assert parse_timestamp('2024-03-01T12:00:00.000+0200') == datetime(2024, 3, 1, 10, 0)
+    assert parse_timestamp(datetime(2024, 3, 1, 10, 0)) == datetime(2024, 3, 1, 10, 0)
+
+
+def test_read_events_accepts_pages_alerts_and_normalized_events():
+    alerts = [alert for _, _, alert in next(SyntheticWorkload(3, siem_type='splunk').chunks())]
+    assert alerts_from_response('splunk', api_response('splunk', alerts)) == alerts
+
+    page = json.dumps({"siem": "splunk", "response": api_response('splunk', alerts)})
+    normalized = json.dumps({"event_id": "x-1", "timestamp": "2024-03-01T10:00:00"})
+    events = list(read_events([page, "", normalized]))
+    assert [event["siem_source"] for event in events[:3]] == ['splunk'] * 3
+    assert events[3]["event_id"] == "x-1"
+
+    plain = list(read_events([json.dumps(alert) for alert in alerts], siem_type='splunk'))
+    assert [event["event_id"] for event in plain] == [event["event_id"] for event in events[:3]]
+
+    with pytest.raises(ValueError):
+        list(read_events(["{broken"]))
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+from services import chain_correlation
+from services.chain_correlation import (
+    CHAIN_PREFIX, ChainCorrelator, correlation_input, extract_keys, parse_rules
+)
+
+RULES = parse_rules([
+    {"name": "ip", "fields": ["source_ip"], "window_minutes": 10, "max_span_minutes": 60},
+    {"name": "agent_user", "fields": ["agent.name", "user"], "window_minutes": 10},
+])
+
+
+def _keys(ip=None, agent=None, user=None):
+    raw = {"agent": {"name": agent}} if agent else {}
+    if user:
+        raw["data"] = {"srcuser": user}
+    return extract_keys(RULES, correlation_input(raw, source_ip=ip))
+
+
+def test_events_within_window_share_a_chain_until_it_expires():
+    correlator = ChainCorrelator(RULES)
+    first = correlator.process(_keys(ip="10.0.0.5"), 0)
+    assert first.startswith(CHAIN_PREFIX)
+    assert correlator.process(_keys(ip="10.0.0.5"), 300) == first
+    assert correlator.process(_keys(ip="10.0.0.6"), 310) != first
+    # Через 10 хвилин тиші ланцюжок закривається
+    assert correlator.process(_keys(ip="10.0.0.5"), 300 + 601) != first
+    assert correlator.process(_keys(), 1000) is None
+
+
+def test_keys_of_different_rules_merge_into_the_oldest_chain():
+    correlator = ChainCorrelator(RULES)
+    by_ip = correlator.process(_keys(ip="10.0.0.5"), 0)
+    by_user = correlator.process(_keys(agent="web-01", user="Admin"), 10)
+    assert by_user != by_ip
+    assert correlator.process(_keys(ip="10.0.0.5", agent="WEB-01", user="admin"), 20) == by_ip
+    assert correlator.process(_keys(agent="web-01", user="admin"), 30) == by_ip
+
+
+def test_chain_span_and_open_chain_limit_are_bounded():
+    correlator = ChainCorrelator(RULES, max_open_chains=3)
+    chain = correlator.process(_keys(ip="10.0.0.5"), 0)
+    for ts in range(500, 3600, 500):
+        assert correlator.process(_keys(ip="10.0.0.5"), ts) == chain
+    assert correlator.process(_keys(ip="10.0.0.5"), ts + 500) != chain
+
+    for number in range(10):
+        correlator.process(_keys(ip=f"192.168.0.{number}"), ts + 600 + number)
+    assert len(correlator) == 3
+    assert correlator.evicted > 0
+
+
+def test_replay_is_deterministic():
+    events = [(_keys(ip=f"10.0.0.{n % 7}", agent="web-01", user=f"u{n % 3}"), n * 45.0) for n in range(500)]
+    first = [ChainCorrelator(RULES).process(keys, ts) for keys, ts in events]
+    second = [ChainCorrelator(RULES).process(keys, ts) for keys, ts in events]
+    assert first == second
+
+
+def test_chains_continue_across_batches_and_replay_on_postgres(pg_app, monkeypatch):
+    from models import db, Event, LabelRevision
+
+    monkeypatch.setattr(chain_correlation, 'load_rules', lambda: RULES)
+    monkeypatch.setattr(chain_correlation, 'get_settings', lambda: {"enabled": True, "max_open_chains": 100})
+    start = datetime(2024, 3, 1, 12, 0)
+
+    [first] = chain_correlation.correlate_events([(correlation_input({}, source_ip="10.0.0.5"), start)])
+    db.session.commit()
+    # Наступний пакет продовжує ланцюжок зі стану open_event_chains
+    same, other = chain_correlation.correlate_events([
+        (correlation_input({}, source_ip="10.0.0.5"), start + timedelta(minutes=5)),
+        (correlation_input({}, source_ip="10.0.0.6"), start + timedelta(minutes=6)),
+    ])
+    db.session.commit()
+    assert first.startswith(CHAIN_PREFIX) and same == first and other != first
+    assert db.session.execute(db.text("SELECT count(*) FROM open_event_chains")).scalar() == 2
+
+    events = [
+        Event(event_id='e-1', timestamp=start, source_ip='10.0.0.5', labels_data={}),
+        Event(event_id='e-2', timestamp=start + timedelta(minutes=5), source_ip='10.0.0.5', labels_data={}),
+        Event(event_id='e-3', timestamp=start + timedelta(hours=2), source_ip='10.0.0.5', labels_data={}),
+        Event(event_id='e-4', timestamp=start + timedelta(minutes=3), source_ip='10.0.0.5',
+              labels_data={"event_chain_id": "manual-1"}),
+    ]
+    db.session.add_all(events)
+    db.session.commit()
+    ids = [event.id for event in events]
+
+    result = chain_correlation.replay_chains(batch_size=2)
+    assert (result["processed"], result["updated"]) == (4, 3)
+    db.session.expire_all()
+    chains = [db.session.get(Event, event_id).labels_data.get("event_chain_id") for event_id in ids]
+    assert chains[0] == chains[1] and chains[0].startswith(CHAIN_PREFIX)
+    assert chains[2] != chains[0] and chains[3] == 'manual-1'
+    revisions = LabelRevision.query.filter_by(label_key='event_chain_id').all()
+    assert sorted(row.event_id for row in revisions) == sorted(ids[:3])
+    assert all(row.source == 'rule' and row.old_value is None for row in revisions)
@@ -0,0 +1,143 @@
+import pytest
+from flask import Flask
+
+from models import db, Settings
+from services import config_snapshot
+from services.config_snapshot import ConfigSnapshot, get_config_snapshot, invalidate_config_snapshot
+
+
+def test_snapshot_parses_values_once_and_fills_defaults():
+    snapshot = ConfigSnapshot({
+        'general.ml_classification_enabled': 'false',
+        'general.data_retention_days': '30',
+        'mitre.custom_mappings_path': 'data/mappings.csv',
+        'tagging.rules': '[{"id": "r1"}]',
+        'ml.min_confidence_threshold': '0.8',
+    }, {"ml_api_url": "http://ml", "ml_api_key": ""}, version=3)
+
+    assert snapshot.version == 3
+    assert snapshot.get_bool('general.ml_classification_enabled', True) is False
+    assert snapshot.get_bool('general.auto_tagging_enabled', True) is True
+    assert snapshot.get('general.data_retention_days') == 30
+    assert snapshot.section('ml') == {'min_confidence_threshold': '0.8'}
+    assert snapshot.settings["ml_api_url"] == "http://ml"
+
+    config = snapshot.system_config()
+    assert config["general"]["data_retention_days"] == 30
+    assert config["general"]["ml_classification_enabled"] is False
+    assert config["mitre"]["custom_mappings_path"] == 'data/mappings.csv'
+    assert config["export"]["max_records_per_export"] == 5000
+    assert "tagging" not in config
+
+
+def test_snapshot_is_immutable():
+    snapshot = ConfigSnapshot({'tagging.rules': '[{"id": "r1"}]'}, None)
+
+    with pytest.raises(TypeError):
+        snapshot.values['general.x'] = 1
+    with pytest.raises(TypeError):
+        snapshot.get('tagging.rules')[0]['id'] = 'r2'
+
+    # system_config() повертає нову копію, зміни не впливають на знімок
+    snapshot.system_config()["general"]["data_retention_days"] = 1
+    assert snapshot.system_config()["general"]["data_retention_days"] == 90
+
+
+@pytest.fixture
+def snapshot_app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', CONFIG_LISTEN_ENABLED=False,
+                      CONFIG_VERSION_CHECK_INTERVAL=3600)
+    db.init_app(app)
+    monkeypatch.setattr(config_snapshot, '_state', config_snapshot._SnapshotState())
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_settings_rows_become_the_settings_mapping(snapshot_app):
+    db.session.add_all([Settings(key='ml_api_url', value='http://ml'), Settings(key='ml_api_key', value='secret')])
+    db.session.commit()
+    snapshot = get_config_snapshot()
+    assert dict(snapshot.settings) == {'ml_api_url': 'http://ml', 'ml_api_key': 'secret'}
+
+
+def test_snapshot_is_cached_until_invalidated(snapshot_app, monkeypatch):
+    loads = []
+    monkeypatch.setattr(config_snapshot, '_load_snapshot',
+                        lambda: loads.append(1) or ConfigSnapshot({}, None, version=len(loads)))
+    first = get_config_snapshot()
+    assert get_config_snapshot() is first and len(loads) == 1
+
+    invalidate_config_snapshot()
+    assert get_config_snapshot().version == 2
+
+    # Лічильник версії перевіряється, коли слухача NOTIFY немає
+    snapshot_app.config['CONFIG_VERSION_CHECK_INTERVAL'] = 0
+    monkeypatch.setattr(config_snapshot, '_read_version', lambda: 2)
+    assert get_config_snapshot().version == 2 and len(loads) == 2
+    monkeypatch.setattr(config_snapshot, '_read_version', lambda: 5)
+    assert get_config_snapshot().version == 3
+
+
+def test_change_during_load_is_not_overwritten(snapshot_app, monkeypatch):
+    loads = []
+
+    def load():
+        loads.append(1)
+        if len(loads) == 1:
+            # NOTIFY прийшов, поки знімок читався з БД
+            invalidate_config_snapshot()
+        return ConfigSnapshot({}, None, version=len(loads))
+
+    monkeypatch.setattr(config_snapshot, '_load_snapshot', load)
+    assert get_config_snapshot().version == 1
+    assert get_config_snapshot().version == 2
+    assert get_config_snapshot().version == 2 and len(loads) == 2
+
+
+def test_load_error_is_cached_until_retry(snapshot_app, monkeypatch):
+    def fail():
+        raise RuntimeError("db is down")
+
+    monkeypatch.setattr(config_snapshot, '_load_snapshot', fail)
+    empty = get_config_snapshot()
+    assert empty.settings is None
+    monkeypatch.setattr(config_snapshot, '_load_snapshot', lambda: ConfigSnapshot({}, {}, version=1))
+    assert get_config_snapshot() is empty
+
+    config_snapshot._state.retry_at = 0
+    assert get_config_snapshot().version == 1
+
+
+def test_app_serves_configuration_siem_and_mitre_routes(monkeypatch, tmp_path):
+    import config
+    from app import create_app
+    from models import Configuration
+
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(config.TestingConfig, 'LOG_FILE', str(tmp_path / 'app.log'))
+    app = create_app('testing')
+    rules = list(app.url_map.iter_rules())
+    # /api/system-config обслуговує лише configuration_bp (GET і POST)
+    assert sorted(rule.endpoint for rule in rules if rule.rule == '/api/system-config') == [
+        'configuration_bp.get_system_config', 'configuration_bp.update_system_config'
+    ]
+    assert {'/api/config', '/api/siem/get_alerts', '/api/mitre/tactics', '/api/tagging-rules'} <= {
+        rule.rule for rule in rules
+    }
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Configuration(name='data_retention_days', config_type='general.data_retention_days',
+                                     config_value='30'))
+        db.session.commit()
+        invalidate_config_snapshot()
+
+        client = app.test_client()
+        response = client.get('/api/system-config')
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.get_json()["general"]["data_retention_days"] == 30
+        assert client.get('/api/mitre/tactics').status_code == 200
+        db.session.remove()
+    invalidate_config_snapshot()
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask, g, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+import config
+from app import create_app
+
+from services.database import (REPLICA_BIND, ReplicaSelector, RoutingSession, configure_database, engine_options,
+                               parse_endpoint_timeouts, read_replica, replica_reads, statement_timeout_for)
+
+
+def test_engine_options_pool_and_pgbouncer_modes():
+    options = engine_options({'DB_POOL_SIZE': 3, 'DB_STATEMENT_TIMEOUT_MS': 5000})
+    assert options["pool_size"] == 3 and options["pool_pre_ping"] is True
+    assert options["connect_args"]["options"] == "-c statement_timeout=5000"
+
+    bouncer = engine_options({'DB_PGBOUNCER_MODE': True, 'DB_STATEMENT_TIMEOUT_MS': 5000})
+    assert bouncer["poolclass"] is NullPool
+    assert "options" not in bouncer["connect_args"]
+    assert "application_name" not in bouncer["connect_args"]
+
+
+def test_replica_bind_is_configured_for_postgres_only():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='postgresql://db/primary', DB_READ_REPLICA_URL='postgresql://db/replica')
+    configure_database(app)
+    assert app.config['SQLALCHEMY_BINDS'][REPLICA_BIND]["url"] == 'postgresql://db/replica'
+    assert 'SQLALCHEMY_ENGINE_OPTIONS' in app.config
+
+    app.config.update(SQLALCHEMY_BINDS=None, DB_READ_REPLICA_URL='postgresql://db/r1, postgresql://db/r2')
+    configure_database(app)
+    assert sorted(app.config['SQLALCHEMY_BINDS']) == [REPLICA_BIND, f"{REPLICA_BIND}_2"]
+    assert 'SQLALCHEMY_ENGINE_OPTIONS' in app.config
+
+
+def test_endpoint_timeouts():
+    timeouts = parse_endpoint_timeouts("dashboard_bp=10000, data_labeling_bp.export_dataset=600000")
+    assert statement_timeout_for('dashboard_bp.get_dashboard_stats', timeouts) == 10000
+    assert statement_timeout_for('data_labeling_bp.export_dataset', timeouts) == 600000
+    assert statement_timeout_for('data_labeling_bp.get_alerts', timeouts) is None
+    with pytest.raises(ValueError):
+        parse_endpoint_timeouts("dashboard_bp=fast")
+
+
+def test_read_replica_views_read_from_replica(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                      SQLALCHEMY_BINDS={REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"})
+    db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+    with app.app_context():
+        for bind, name in ((None, 'primary'), (REPLICA_BIND, 'replica')):
+            with db.engines[bind].begin() as conn:
+                conn.execute(text("CREATE TABLE source (name TEXT)"))
+                conn.execute(text("INSERT INTO source VALUES (:name)"), {"name": name})
+
+    def source():
+        return jsonify(db.session.execute(text("SELECT name FROM source")).scalar())
+
+    app.add_url_rule('/primary', 'primary', source)
+    app.add_url_rule('/replica', 'replica', read_replica(source))
+    client = app.test_client()
+    assert client.get('/replica').get_json() == 'replica'
+    assert client.get('/primary').get_json() == 'primary'
+
+
+def test_replica_selector_falls_back_to_primary():
+    lags = {'replica': 5.0, 'replica_2': None}
+    selector = ReplicaSelector(max_lag=30, check_interval=60)
+    selector.measure_lag = lambda engine: lags[engine]
+    engines = {'replica': 'replica', 'replica_2': 'replica_2'}
+    assert selector.choose(engines) == ('replica', 'replica')
+    assert selector.choose(engines) == ('replica', 'replica')
+
+    lags['replica'] = 120.0
+    assert selector.choose(engines) == ('replica', 'replica')  # кешоване значення
+    selector.check_interval = 0
+    assert selector.choose(engines) == (None, 'primary_stale')
+    assert selector.choose({'replica_2': 'replica_2'}) == (None, 'primary_unavailable')
+
+
+def test_replica_reads_scope_outside_request(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                      SQLALCHEMY_BINDS={REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"})
+    db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+    with app.app_context():
+        for bind, name in ((None, 'primary'), (REPLICA_BIND, 'replica')):
+            with db.engines[bind].begin() as conn:
+                conn.execute(text("CREATE TABLE source (name TEXT)"))
+                conn.execute(text("INSERT INTO source VALUES (:name)"), {"name": name})
+        with replica_reads():
+            assert db.session.execute(text("SELECT name FROM source")).scalar() == 'replica'
+        assert db.session.execute(text("SELECT name FROM source")).scalar() == 'primary'
+
+
+def test_app_serves_read_replica_endpoints_with_endpoint_timeouts(monkeypatch, tmp_path):
+    from models import db, Event
+
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(config.TestingConfig, 'LOG_FILE', str(tmp_path / 'app.log'))
+    app = create_app('testing')
+    timeouts = []
+
+    @app.after_request
+    def record_timeout(response):
+        timeouts.append(g.get('_statement_timeout'))
+        return response
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Event(event_id='e-1', timestamp=datetime.utcnow(), siem_source='wazuh',
+                             labels_data={"true_positive": True}))
+        db.session.commit()
+
+        client = app.test_client()
+        stats = client.get('/api/dashboard/stats')
+        assert stats.status_code == 200, stats.get_data(as_text=True)
+        assert stats.get_json()["true_positives"] == 1
+        assert client.get('/api/dataset/export').status_code == 200
+        db.session.remove()
+
+    # Типові DB_ENDPOINT_STATEMENT_TIMEOUTS: blueprint дашборду та експорт датасету
+    assert timeouts == [10000, 600000]
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from flask import Flask
+
+from models import db, Event, RawLog
+from services import demo_service
+from services.demo_service import DemoService
+
+
+def test_demo_events_are_stored_with_ingestion_hooks(monkeypatch, tmp_path):
+    # Секції, ланцюжки, вектори ознак і кластери пишуться SQL PostgreSQL - тут лише фіксуємо виклики
+    calls = {}
+    monkeypatch.setattr(demo_service, 'ensure_partitions_for_events', lambda ts: calls.setdefault('partitions', list(ts)))
+    monkeypatch.setattr(demo_service, 'correlate_events', lambda items: ['chain-1'] * len(list(items)))
+    monkeypatch.setattr(demo_service, 'store_features', lambda items: calls.setdefault('features', list(items)))
+    monkeypatch.setattr(demo_service, 'assign_clusters', lambda items: calls.setdefault('clusters', list(items)))
+    data = DemoService.generate_demo_data(num_events=5)
+    data["events"][0].update(true_positive=True, manual_tags=["verified"])
+    monkeypatch.setattr(DemoService, 'load_demo_data', staticmethod(lambda: data))
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'demo.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        DemoService.initialize_demo_database()
+
+        events = Event.query.order_by(Event.id).all()
+        assert len(events) == 5 and RawLog.query.count() == 5
+        assert events[0].labels_data["true_positive"] is True
+        assert events[0].labels_data["manual_tags"] == ["verified"]
+        assert events[0].labels_data["event_chain_id"] == 'chain-1'
+        assert len(calls['partitions']) == len(calls['features']) == len(calls['clusters']) == 5
+        assert all(isinstance(ts, datetime) for ts in calls['partitions'])
@@ -0,0 +1,71 @@
+import pytest
+from flask import Flask
+
+import config
+from app import create_app
+from benchmarks.e2e import BENCHMARKS, Benchmark, BenchContext, compare_results, failed_benchmarks, run_benchmark, summarize
+from models import db
+
+
+def _results(**benchmarks):
+    return {"benchmarks": benchmarks}
+
+
+def test_summarize_reports_latency_and_throughput():
+    stats = summarize([0.1, 0.2, 0.3, 0.4], [100, 100, 100, 100])
+    assert stats["rounds"] == 4
+    assert stats["min_ms"] == 100.0
+    assert stats["median_ms"] == 250.0
+    assert stats["items"] == 400
+    assert stats["items_per_second"] == 400.0
+
+
+def test_compare_flags_slowdowns_throughput_drops_and_new_errors():
+    baseline = _results(
+        ingest={"median_ms": 100.0, "items_per_second": 1000.0},
+        event_list={"median_ms": 50.0, "items_per_second": 8000.0},
+        bulk_verify={"median_ms": 10.0, "items_per_second": 100.0},
+        dashboard_stats={"error": "broken before"},
+    )
+    current = _results(
+        ingest={"median_ms": 110.0, "items_per_second": 950.0},
+        event_list={"median_ms": 80.0, "items_per_second": 5000.0},
+        bulk_verify={"error": "boom"},
+        dashboard_stats={"error": "still broken"},
+    )
+    regressions = compare_results(baseline, current, threshold=0.2)
+    assert {(r["benchmark"], r["metric"]) for r in regressions} == {
+        ("event_list", "median_ms"), ("event_list", "items_per_second"), ("bulk_verify", "error"),
+    }
+
+
+def test_benchmark_names_are_unique():
+    names = [benchmark.name for benchmark in BENCHMARKS]
+    assert len(names) == len(set(names))
+
+
+def test_failed_benchmark_is_reported():
+    def broken(ctx):
+        raise RuntimeError("boom")
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        result = run_benchmark(Benchmark('broken', broken, "always fails"), BenchContext(app), rounds=1, warmup=0)
+    assert result["error"] == "boom"
+    assert failed_benchmarks(_results(broken=result, ok={"median_ms": 1.0})) == ["broken"]
+
+
+@pytest.mark.parametrize("method, url", [
+    ('POST', '/api/events/batch-label'),
+    ('POST', '/api/ml/verify-labels'),
+    ('GET', '/api/events'),
+    ('GET', '/api/dashboard/stats'),
+    ('GET', '/api/dataset/export'),
+])
+def test_http_benchmarks_hit_registered_endpoints(monkeypatch, tmp_path, method, url):
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', 'sqlite://')
+    monkeypatch.setattr(config.TestingConfig, 'LOG_FILE', str(tmp_path / 'app.log'))
+    app = create_app('testing')
+    assert app.url_map.bind('').match(url, method)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from services.feature_store import (FEATURE_VERSION, FeatureExtractor, FeatureMatrix, build_feature_input, feature_input,
+                                    pack_vector, unpack_vector)
+
+EVENT = {
+    "rule_name": "SSH brute force attempt",
+    "severity": "High",
+    "siem_source": "wazuh",
+    "source_ip": "10.1.2.3",
+    "raw_log": {"rule": {"id": "5710", "level": 10}, "full_log": "Failed password for root", "agent": {"name": "web-01"}},
+}
+
+
+def test_extractor_is_deterministic_and_normalized():
+    extractor = FeatureExtractor()
+    indices, values = extractor.transform_one(EVENT)
+    again, _ = extractor.transform_one(dict(EVENT))
+
+    assert len(indices) > 5
+    assert np.array_equal(indices, again)
+    assert np.all(np.diff(indices) > 0)
+    assert abs(float(np.linalg.norm(values)) - 1.0) < 1e-5
+
+    other, _ = extractor.transform_one(dict(EVENT, source_ip="8.8.8.8"))
+    assert not np.array_equal(indices, other)
+
+    empty_indices, empty_values = extractor.transform_one({})
+    assert len(empty_indices) == 0 and len(empty_values) == 0
+
+
+def test_pack_roundtrip():
+    indices, values = FeatureExtractor().transform_one(EVENT)
+    version, unpacked_indices, unpacked_values = unpack_vector(pack_vector(indices, values))
+    assert version == FEATURE_VERSION
+    assert np.array_equal(unpacked_indices, indices)
+    assert np.allclose(unpacked_values, values)
+
+
+def test_matrix_dot_matches_dense_product():
+    extractor = FeatureExtractor(n_features=64)
+    vectors = [extractor.transform_one(EVENT), extractor.transform_one({}), extractor.transform_one({"severity": "low"})]
+    matrix = FeatureMatrix.from_vectors([1, 2, 3], vectors, n_features=64)
+
+    dense = np.zeros((3, 64))
+    for row, (indices, values) in enumerate(vectors):
+        dense[row, indices] = values
+
+    weights = np.random.RandomState(0).rand(64, 2)
+    assert matrix.shape == (3, 64)
+    assert np.allclose(matrix.dot(weights), dense @ weights, atol=1e-5)
+    assert np.allclose(matrix.dot(weights[:, 0]), dense @ weights[:, 0], atol=1e-5)
+
+
+def test_ingested_and_backfilled_inputs_give_the_same_vector():
+    raw_log = EVENT["raw_log"] | {"rule": {"id": "5710", "level": 10, "description": "sshd: brute force"}}
+    labels = {"detected_rule": "ssh_bruteforce,root_login", "attack_type": "Brute Force"}
+    event = type('Event', (), {"labels_data": labels, "severity": "High", "siem_source": "wazuh",
+                               "source_ip": "10.1.2.3", "raw_logs": []})()
+
+    ingested = build_feature_input(raw_log, labels, severity="High", siem_source="wazuh", source_ip="10.1.2.3")
+    backfilled = feature_input(event, raw_log)
+    assert ingested == backfilled
+    # Назва правила SIEM лишається назвою правила, ID правил маркування - окреме поле
+    assert ingested["rule_name"] == "sshd: brute force"
+
+    extractor = FeatureExtractor()
+    with_rules, _ = extractor.transform_one(ingested)
+    without_rules, _ = extractor.transform_one(dict(ingested, detected_rule=None))
+    assert len(with_rules) == len(without_rules) + 2
@@ -0,0 +1,48 @@
+import threading
+
+from services.inference_server import InferenceServer
+from services.ml_providers import InferenceServerProvider
+
+
+class EchoProvider:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def batch_classify(self, events):
+        self.batch_sizes.append(len(events))
+        return [{"success": True, "classification": {"attack_type": e["name"]}, "confidence": 0.9} for e in events]
+
+    def get_model_info(self):
+        return {"model_info": {"version": "echo"}}
+
+
+def test_requests_from_many_clients_are_batched(tmp_path):
+    backend = EchoProvider()
+    server = InferenceServer(str(tmp_path / "inf.sock"), provider=backend, max_batch_size=32, max_wait_ms=50)
+    server.start()
+    try:
+        provider = InferenceServerProvider(str(tmp_path / "inf.sock"))
+        assert provider.test_connection()["success"]
+
+        results = {}
+
+        def classify(i):
+            results[i] = provider.classify_event({"name": f"event-{i}"})
+
+        threads = [threading.Thread(target=classify, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(results[i]["classification"]["attack_type"] == f"event-{i}" for i in range(16))
+        assert sum(backend.batch_sizes) == 16
+        assert max(backend.batch_sizes) > 1
+
+        batch = provider.batch_classify([{"name": "a"}, {"name": "b"}])
+        assert [r["classification"]["attack_type"] for r in batch] == ["a", "b"]
+        assert provider.get_model_info()["model_info"]["server"]["stats"]["events"] == 18
+    finally:
+        server.stop()
+
+    assert provider.batch_classify([{"name": "c"}])[0]["success"] is False
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+from services.instrumentation import SamplingProfiler, init_instrumentation, timed
+
+
+def _app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    engine = create_engine('sqlite://')
+    init_instrumentation(app)
+
+    @app.route('/items')
+    def items():
+        with engine.connect() as conn:
+            rows = [conn.execute(text("SELECT :n"), {"n": n}).scalar() for n in range(3)]
+        with timed('ml'):
+            time.sleep(0.01)
+        return jsonify({"items": rows})
+
+    return app
+
+
+def test_server_timing_counts_queries_and_components():
+    response = _app().test_client().get('/items')
+    assert response.get_json() == {"items": [0, 1, 2]}
+    timing = dict(part.split(';', 1) for part in response.headers['Server-Timing'].split(', '))
+    assert set(timing) == {'total', 'db', 'ml', 'serialize'}
+    assert 'desc="3 queries"' in timing['db']
+    assert float(timing['ml'].split('=')[1]) >= 10
+
+
+def test_repeated_statements_are_reported_as_n_plus_one(caplog):
+    _app(INSTRUMENTATION_REPEATED_QUERY_THRESHOLD=3).test_client().get('/items')
+    assert "Possible N+1 in GET /items" in caplog.text
+
+
+def test_timed_is_noop_outside_request():
+    with timed('ml'):
+        pass
+
+
+def test_slow_requests_are_profiled(tmp_path):
+    app = _app(INSTRUMENTATION_PROFILER_ENABLED=True, INSTRUMENTATION_PROFILE_SAMPLE_RATE=1.0,
+               INSTRUMENTATION_PROFILE_SLOW_MS=0, INSTRUMENTATION_PROFILE_INTERVAL_MS=1,
+               INSTRUMENTATION_PROFILE_DIR=str(tmp_path))
+    app.test_client().get('/items')
+    profiles = list(tmp_path.glob('*_GET_items_*.folded'))
+    assert len(profiles) == 1
+    assert 'test_instrumentation.py:items' in profiles[0].read_text()
+
+
+def test_sampling_profiler_folds_stacks():
+    done = threading.Event()
+    worker = threading.Thread(target=lambda: done.wait(1))
+    worker.start()
+    profiler = SamplingProfiler(worker.ident, interval=0.001).start()
+    time.sleep(0.05)
+    profiler.stop()
+    done.set()
+    worker.join()
+    assert profiler.samples > 0
+    stack, count = profiler.folded().splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0 and ';' in stack
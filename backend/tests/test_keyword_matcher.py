@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from services.keyword_matcher import KeywordMatcher, required_literal
+
+
+def test_finds_all_overlapping_keywords_case_insensitive():
+    matcher = KeywordMatcher([("he", "he"), ("she", "she"), ("his", "his"), ("hers", "hers"), ("Brute", "brute")])
+    assert sorted(matcher.find("uSHERS tried BRUTE force")) == ["brute", "he", "hers", "she"]
+    assert matcher.find("nothing here but h") == ["he"]
+    assert matcher.find("") == []
+
+
+def test_python_backend_matches_naive_substring_search():
+    rng = random.Random(0)
+    for _ in range(200):
+        keywords = ["".join(rng.choice("ab") for _ in range(rng.randint(1, 4))) for _ in range(8)]
+        text = "".join(rng.choice("abc") for _ in range(30))
+        matcher = KeywordMatcher([(k, i) for i, k in enumerate(keywords)], backend="python")
+        assert sorted(matcher.find(text)) == [i for i, k in enumerate(keywords) if k in text]
+
+
+def test_cannot_add_after_build():
+    matcher = KeywordMatcher([("a", 1)])
+    matcher.build()
+    with pytest.raises(RuntimeError):
+        matcher.add("b", 2)
+
+
+@pytest.mark.parametrize("pattern, literal", [
+    (r"failed password for \w+", "failed password for "),
+    (r"sshd(?:\[\d+\])?: Invalid user", ": invalid user"),
+    (r"colou?r scheme", "r scheme"),
+    (r"x{2,3}yyyy", "yyyy"),
+    (r"a\.b\.c", "a.b.c"),
+    (r"brute|spray", None),
+    (r"\d+", None),
+    (r"\x41dmin login", None),
+    (r"user \1 again", None),
+    (r"(?x) failed \s+ password", None),
+    (r"(?i:root) login", None),
+    (r"(?:root) login", " login"),
+])
+def test_required_literal(pattern, literal):
+    assert required_literal(pattern) == literal
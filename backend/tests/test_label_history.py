@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+import services.label_history as label_history
+from models import db, Event, LabelRevision
+from routes import ml_routes
+from services.label_history import apply_revisions, current_labels
+
+
+def test_forward_and_undo_reconstruct_labels():
+    snapshot = {"attack_type": "Brute Force", "true_positive": None}
+    # Вперед: останнє значення кожного ключа; відсутнє нове значення видаляє ключ
+    labels = apply_revisions(snapshot, [("attack_type", "Malware", False), ("human_verified", True, False),
+                                        ("true_positive", None, True)])
+    assert labels == {"attack_type": "Malware", "human_verified": True}
+    assert snapshot == {"attack_type": "Brute Force", "true_positive": None}
+
+    # Назад: попереднє значення найранішого запису; ключа не було - прибираємо
+    undone = apply_revisions(labels, [("attack_type", "Brute Force", False), ("human_verified", None, True)])
+    assert undone == {"attack_type": "Brute Force"}
+
+
+def test_current_labels_fall_back_to_label_columns():
+    labels = current_labels({"attack_type": "Malware", "ml_processed": True},
+                            {"attack_type": "ignored", "mitre_tactic": "Execution", "mitre_technique": None})
+    assert labels == {"attack_type": "Malware", "ml_processed": True, "mitre_tactic": "Execution"}
+
+
+def test_verify_label_records_revisions(tmp_path, monkeypatch):
+    # Поширення на кластери й черга верифікації - SQL PostgreSQL
+    propagated = []
+    monkeypatch.setattr(ml_routes, 'propagate_labels', lambda ids, **kwargs: propagated.append((ids, kwargs)))
+    monkeypatch.setattr(ml_routes, 'cluster_member_ids', lambda ids: [])
+    monkeypatch.setattr(ml_routes, 'dequeue_events', lambda ids: None)
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'labels.db'}")
+    db.init_app(app)
+    app.register_blueprint(ml_routes.ml_bp)
+    with app.app_context():
+        db.create_all()
+        event = Event(event_id='e-1', timestamp=datetime(2024, 3, 1), attack_type='Brute Force',
+                      labels_data={"ml_processed": True, "true_positive": True})
+        db.session.add(event)
+        db.session.commit()
+
+        response = app.test_client().post(f'/api/ml/verify-label/{event.id}', json={
+            "true_positive": False, "attack_type": "Benign", "user_id": "analyst"
+        })
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+        db.session.expire_all()
+        event = db.session.get(Event, event.id)
+        assert event.attack_type == 'Benign'
+        assert event.labels_data["human_verified"] is True and event.labels_data["ml_attack_type"] == 'Brute Force'
+
+        revisions = {row.label_key: row for row in LabelRevision.query.all()}
+        assert (revisions["attack_type"].old_value, revisions["attack_type"].new_value) == ('Brute Force', 'Benign')
+        assert (revisions["true_positive"].old_value, revisions["true_positive"].new_value) == (True, False)
+        assert revisions["human_verified"].action == 'verify' and revisions["human_verified"].user_id == 'analyst'
+        assert "ml_processed" not in revisions
+        assert propagated == [([event.id], {"verified": True, "user_id": "analyst"})]
+
+
+def test_compaction_cutoff_waits_for_open_transactions(tmp_path, monkeypatch):
+    # Початок найстарішої відкритої транзакції (pg_stat_activity) обмежує cutoff
+    horizon = datetime(2024, 3, 1, 12, 0)
+    monkeypatch.setattr(label_history, 'stable_horizon', lambda: horizon)
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'compact.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        run = label_history.compact_revisions(cutoff=horizon + timedelta(hours=1))
+        assert run.status == 'completed' and run.cutoff == horizon
+
+
+def test_labels_as_of_and_compaction_on_postgres(pg_app):
+    event = Event(event_id='e-1', timestamp=datetime(2023, 12, 1), attack_type='C', labels_data={"attack_type": "C"})
+    db.session.add(event)
+    db.session.flush()
+    for stamp, old, new in ((datetime(2024, 1, 1), None, 'A'), (datetime(2024, 2, 1), 'A', 'B'),
+                            (datetime(2024, 3, 1), 'B', 'C')):
+        db.session.add(LabelRevision(event_id=event.id, timestamp=stamp, action='update', label_key='attack_type',
+                                     old_value=old, new_value=new, source='manual'))
+    db.session.commit()
+
+    def attack_type_as_of(*args):
+        return label_history.labels_as_of([event.id], datetime(*args)).get(event.id, {}).get("attack_type")
+
+    expected = {(2023, 12, 15): None, (2024, 1, 15): 'A', (2024, 2, 20): 'B', (2024, 3, 2): 'C'}
+    assert {ts: attack_type_as_of(*ts) for ts in expected} == expected
+
+    run = label_history.compact_revisions(cutoff=datetime(2024, 2, 15))
+    assert (run.status, run.events, run.revisions) == ('completed', 1, 2)
+    snapshot = db.session.execute(text("SELECT snapshot_at, labels FROM label_snapshots")).one()
+    assert snapshot.snapshot_at == datetime(2024, 2, 15) and snapshot.labels["attack_type"] == 'B'
+    # Після ущільнення відновлення читає знімок і лише хвіст журналу
+    assert {ts: attack_type_as_of(*ts) for ts in expected} == expected
+
+    label_history.ensure_append_only()
+    with pytest.raises(DBAPIError):
+        db.session.execute(text("DELETE FROM label_revisions"))
+    db.session.rollback()
+    assert LabelRevision.query.count() == 3
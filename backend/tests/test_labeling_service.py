@@ -0,0 +1,137 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from models import db
+from services import labeling_service
+from services.labeling_service import LabelingError, label_chain
+
+
+class _Result:
+    def first(self):
+        return type('Row', (), {"updated": 3, "revisions": 5})()
+
+
+def test_chain_labels_are_one_statement_with_revisions(monkeypatch):
+    statements = []
+
+    class Session:
+        def execute(self, clause, params=None):
+            statements.append((str(clause), params))
+            return _Result()
+
+    monkeypatch.setattr(db, 'session', Session(), raising=False)
+    result = label_chain("chain-1", {"attack_type": "Brute Force", "true_positive": True}, user_id="analyst")
+
+    assert result == {"updated_events": 3, "revisions": 5}
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert "INSERT INTO label_revisions" in sql
+    assert "attack_type = CAST(:labels AS jsonb)->>'attack_type'" in sql
+    assert "mitre_technique = " not in sql
+    assert "labels_data->>'event_chain_id' = :chain_id" in sql
+    assert params["chain_id"] == "chain-1"
+    assert params["action"] == "update"
+
+    statements.clear()
+    label_chain("chain-1", {"attack_type": "Malware"}, verify=True, include_duplicates=True)
+    assert "event_cluster_members" in statements[0][0]
+    assert statements[0][1]["action"] == "verify"
+    assert statements[1][0].startswith("DELETE FROM verification_queue")
+
+
+def test_invalid_labels_are_rejected():
+    with pytest.raises(LabelingError):
+        label_chain("chain-1", {})
+    with pytest.raises(LabelingError):
+        labeling_service.label_cluster(1, {"attack_type": "x"}, source="unknown")
+
+
+def test_verdicts_are_validated_and_shorthand_is_expanded():
+    verdicts = labeling_service.parse_verdicts({"event_ids": [1, "2", 1], "true_positive": False})
+    assert verdicts == {1: {"true_positive": False}, 2: {"true_positive": False}}
+
+    with pytest.raises(LabelingError):
+        labeling_service.parse_verdicts({"verdicts": [{"event_id": 1, "severity": "high"}]})
+    with pytest.raises(LabelingError):
+        labeling_service.parse_verdicts({"verdicts": [{"event_id": 1, "true_positive": "yes"}]})
+    with pytest.raises(LabelingError):
+        labeling_service.parse_verdicts({"event_ids": [1, 2, 3]}, max_events=2)
+
+
+def test_bulk_verify_issues_one_statement_per_chunk(monkeypatch):
+    from services import active_learning, near_duplicates
+
+    statements = []
+
+    class Session:
+        def execute(self, clause, params=None):
+            statements.append((str(clause), params))
+            rows = json.loads(params["rows"]) if params and "rows" in params else []
+
+            class Result:
+                def first(self):
+                    ids = [row["event_id"] for row in rows if row["event_id"] != 4]
+                    return type('Row', (), {"updated_ids": ids, "revisions": len(ids)})()
+
+                def scalars(self):
+                    return type('Scalars', (), {"all": lambda self: []})()
+            return Result()
+
+    dequeued = []
+    monkeypatch.setattr(db, 'session', Session(), raising=False)
+    monkeypatch.setattr(near_duplicates, 'propagate_labels', lambda ids, verified=False, user_id=None: 0)
+    monkeypatch.setattr(near_duplicates, 'cluster_member_ids', lambda ids: [100])
+    monkeypatch.setattr(active_learning, 'dequeue_events', lambda ids: dequeued.extend(sorted(ids)))
+
+    verdicts = {event_id: {"attack_type": "Brute Force"} for event_id in range(1, 6)}
+    result = labeling_service.bulk_verify(verdicts, user_id="analyst", chunk_size=2)
+
+    verify_statements = [sql for sql, _ in statements if "INSERT INTO label_revisions" in sql]
+    assert len(verify_statements) == 3
+    assert result == {"verified_events": 4, "revisions": 4, "missing_ids": [4], "unprocessed_ids": []}
+    assert dequeued == [1, 2, 3, 5, 100]
+
+
+def test_chain_labels_and_bulk_verify_update_rows_and_revisions_on_postgres(pg_app):
+    from models import Event, LabelRevision
+
+    ts = datetime(2024, 3, 1)
+    events = [
+        Event(event_id='e-1', timestamp=ts, attack_type='Malware',
+              labels_data={"event_chain_id": "c-1", "ml_processed": True, "attack_type": "Malware"}),
+        Event(event_id='e-2', timestamp=ts, labels_data={"event_chain_id": "c-1"}),
+        Event(event_id='e-3', timestamp=ts, labels_data={"event_chain_id": "c-2", "ml_processed": True}),
+    ]
+    db.session.add_all(events)
+    db.session.commit()
+    first, second, other = (event.id for event in events)
+
+    result = label_chain('c-1', {"attack_type": "Brute Force", "true_positive": True}, user_id='analyst')
+    db.session.commit()
+    assert result == {"updated_events": 2, "revisions": 4}
+
+    db.session.expire_all()
+    rows = {event.id: event for event in Event.query.all()}
+    assert rows[first].attack_type == rows[second].attack_type == 'Brute Force'
+    assert rows[first].labels_data["true_positive"] is True and rows[first].labels_data["event_chain_id"] == 'c-1'
+    assert rows[other].attack_type is None and "true_positive" not in rows[other].labels_data
+    revision = LabelRevision.query.filter_by(event_id=first, label_key='attack_type').one()
+    assert (revision.old_value, revision.new_value, revision.user_id) == ('Malware', 'Brute Force', 'analyst')
+    assert LabelRevision.query.filter_by(event_id=second, label_key='attack_type').one().old_value is None
+
+    result = labeling_service.bulk_verify({first: {"true_positive": False}, second: {"true_positive": False},
+                                           other: {"attack_type": "Benign"}, 999999: {"true_positive": True}},
+                                          user_id='analyst')
+    db.session.commit()
+    assert result["verified_events"] == 2
+    assert result["unprocessed_ids"] == [second] and result["missing_ids"] == [999999]
+
+    db.session.expire_all()
+    verified = db.session.get(Event, first)
+    assert verified.labels_data["human_verified"] is True and verified.labels_data["true_positive"] is False
+    assert verified.labels_data["ml_true_positive"] is True and verified.labels_data["ml_attack_type"] == 'Brute Force'
+    assert db.session.get(Event, other).attack_type == 'Benign'
+    assert "human_verified" not in db.session.get(Event, second).labels_data
+    assert LabelRevision.query.filter_by(event_id=first, action='verify', label_key='true_positive').one().old_value is True
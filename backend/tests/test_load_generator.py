@@ -0,0 +1,36 @@
+from collections import Counter
+
+from services.bulk_loader import csv_buffer
+from services.load_generator import SyntheticWorkload, api_response
+
+
+def test_workload_is_deterministic_and_normalizable_for_every_siem():
+    first = [event for chunk in SyntheticWorkload(300, siem_type='mixed', chunk_size=100).normalized_chunks()
+             for event in chunk]
+    second = [event for chunk in SyntheticWorkload(300, siem_type='mixed', chunk_size=100).normalized_chunks()
+              for event in chunk]
+    assert len(first) == 300
+    assert [e["event_id"] for e in first] == [e["event_id"] for e in second]
+    assert {e["siem_source"] for e in first} == {"wazuh", "splunk", "elastic"}
+    assert len({e["event_id"] for e in first}) == 300
+    assert all(e["severity"] in ("low", "medium", "high", "critical") for e in first)
+    timestamps = [e["timestamp"] for e in first]
+    assert timestamps == sorted(timestamps)
+
+
+def test_skew_concentrates_source_ips():
+    events = [alert for chunk in SyntheticWorkload(5000, skew=1.5, duplicate_ratio=0).chunks() for _, _, alert in chunk]
+    top, count = Counter(alert["source"]["ip"] for alert in events).most_common(1)[0]
+    assert count > 5000 * 0.2
+
+
+def test_api_responses_match_connector_formats():
+    chunk = next(SyntheticWorkload(5, siem_type='wazuh').chunks())
+    response = api_response('wazuh', [alert for _, _, alert in chunk])
+    assert len(response["data"]["affected_items"]) == 5
+    assert api_response('elastic', [])["hits"]["hits"] == []
+
+
+def test_copy_buffer_encodes_nulls_and_json():
+    text = csv_buffer([(1, None, {"a": "x,y"}, True, "")]).getvalue()
+    assert text == '1,\\N,"{""a"": ""x,y""}",t,\n'
@@ -0,0 +1,85 @@
+import pytest
+import requests
+from flask import Flask
+
+from services import metrics
+from services.connectors import base
+from services.connectors.wazuh import WazuhConnector
+from services.exceptions import SIEMConnectionError
+from services.ml_providers import DummyMLProvider, InferenceServerProvider
+
+
+def test_provider_labels():
+    assert metrics.provider_name(DummyMLProvider()) == 'dummy'
+    assert metrics.provider_name(InferenceServerProvider('/tmp/missing.sock')) == 'inferenceserver'
+
+
+def test_metrics_endpoint():
+    app = Flask(__name__)
+    metrics.init_metrics(app)
+    metrics.observe_fetch('wazuh', 0.2, 150)
+    metrics.observe_inference(DummyMLProvider(), 'batch', 0.05,
+                              [{"success": True, "confidence": 0.9}, {"success": False}])
+    metrics.observe_export('csv', 1000, 0.5)
+
+    response = app.test_client().get('/metrics')
+    if not metrics.HAS_PROMETHEUS:
+        assert response.status_code == 501
+        return
+    body = response.get_data(as_text=True)
+    assert 'logtagger_connector_events_per_poll_sum{siem="wazuh"} 150.0' in body
+    assert 'logtagger_ml_failed_classifications_total{provider="dummy"} 1.0' in body
+    assert 'logtagger_export_rows_total{format="csv"}' in body
+
+
+def test_multiprocess_dir_is_reset(tmp_path, monkeypatch):
+    pytest.importorskip('prometheus_client')
+    monkeypatch.setenv(metrics.MULTIPROC_ENV, str(tmp_path))
+    (tmp_path / 'histogram_123.db').write_bytes(b'')
+    (tmp_path / 'keep.txt').write_text('x')
+    metrics.reset_multiprocess_dir()
+    assert [path.name for path in tmp_path.iterdir()] == ['keep.txt']
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def labels(self, *labels):
+        self.calls.append(labels)
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        self.calls.append(value)
+
+
+def test_retries_are_counted_only_before_another_attempt(monkeypatch):
+    retries = _Recorder()
+    monkeypatch.setattr(base, 'CONNECTOR_RETRIES', retries)
+    connector = WazuhConnector('http://wazuh.local', 'key')
+    connector.retry_delay = 0
+    attempts = []
+
+    def fail(*args, **kwargs):
+        attempts.append(args)
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(connector.session, 'request', fail)
+
+    with pytest.raises(SIEMConnectionError):
+        connector._request_with_retry('GET', '/alerts')
+    assert len(attempts) == connector.max_retries
+    assert len(retries.calls) == connector.max_retries - 1
+
+
+def test_pool_size_covers_every_engine(monkeypatch):
+    size, overflow = _Recorder(), _Recorder()
+    monkeypatch.setattr(metrics, 'DB_POOL_SIZE', size)
+    monkeypatch.setattr(metrics, 'DB_POOL_MAX_OVERFLOW', overflow)
+    pool = type('Pool', (), {"size": lambda self: 5, "_max_overflow": 10})
+    engines = {None: type('Engine', (), {"pool": pool()})(), 'replica': type('Engine', (), {"pool": pool()})()}
+
+    metrics.track_pool(engines.values())
+    assert size.calls == [10] and overflow.calls == [20]
@@ -0,0 +1,70 @@
+import json
+import os
+
+from services.mitre_kb import MitreKnowledgeBase
+
+
+def _write(path, data, mtime):
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+
+def test_indexes_and_map_events(tmp_path):
+    kb = MitreKnowledgeBase(os.path.join(os.path.dirname(__file__), '..', 'data', 'mitre_attack.json'))
+
+    assert kb.get_technique('t1110')['name'] == 'Brute Force'
+    assert kb.get_technique('T1110.003')['id'] == 'T1110'
+    assert kb.get_tactic('credential access')['id'] == 'TA0006'
+    assert [t['id'] for t in kb.techniques_for_tactic('TA0040')] == ['T1485', 'T1489', 'T1498']
+
+    mappings = kb.map_events([
+        {"rule": {"mitre": {"id": ["T1003"]}}, "rule_name": "SSH brute force"},
+        {"rule_name": "SSH brute force attempt"},
+        {"rule_name": "Valid Accounts used", "mitre_tactic": "Persistence"},
+        {"message": "nothing interesting"},
+    ])
+    assert mappings[0]["mitre_technique_id"] == "T1003"
+    assert mappings[1]["mitre_tactic"] == "Credential Access"
+    assert mappings[2]["mitre_tactic_id"] == "TA0003"
+    assert mappings[3] is None
+
+
+def test_reloads_on_mtime_change_and_parses_stix(tmp_path):
+    path = tmp_path / "attack.json"
+    _write(path, {"tactics": [{"id": "TA0006", "name": "Credential Access"}], "techniques": []}, 1000)
+    kb = MitreKnowledgeBase(str(path), check_interval=0)
+    assert kb.get_technique("T1110") is None
+
+    bundle = {"type": "bundle", "objects": [
+        {"type": "x-mitre-tactic", "name": "Credential Access", "x_mitre_shortname": "credential-access",
+         "external_references": [{"source_name": "mitre-attack", "external_id": "TA0006"}]},
+        {"type": "attack-pattern", "name": "Brute Force", "x_mitre_data_sources": ["User Account: User Account Authentication"],
+         "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": "credential-access"}],
+         "external_references": [{"source_name": "mitre-attack", "external_id": "T1110"}]},
+        {"type": "attack-pattern", "name": "Old", "revoked": True,
+         "external_references": [{"source_name": "mitre-attack", "external_id": "T9999"}]},
+    ]}
+    _write(path, bundle, 2000)
+    assert kb.get_technique("T1110")["tactic_ids"] == ["TA0006"]
+    assert kb.get_technique("T9999") is None
+    assert kb.techniques_for_data_source("user account: user account authentication")[0]["id"] == "T1110"
+
+
+def test_keywords_match_whole_words_only(tmp_path):
+    path = tmp_path / "attack.json"
+    _write(path, {"tactics": [{"id": "TA0002", "name": "Execution"}, {"id": "TA0001", "name": "Initial Access"}],
+                  "techniques": [{"id": "T1053.002", "name": "At", "tactic_ids": ["TA0002"]},
+                                 {"id": "T1566", "name": "Phishing", "tactic_ids": ["TA0001"]},
+                                 {"id": "T1059", "name": "Command and Scripting Interpreter",
+                                  "tactic_ids": ["TA0002"]}]}, 1000)
+    index = MitreKnowledgeBase(str(path)).index
+
+    # Коротка назва "At" не збігається ні окремо, ні всередині слів
+    assert index.match_keywords("Disk usage at 95%") is None
+    assert index.match_keywords("data export completed") is None
+    assert index.match_keywords("Command and Scripting Interpreters") is None
+    assert index.match_keywords("Suspicious command and scripting interpreter use")["id"] == "T1059"
+    # Однослівний синонім - основа слова
+    assert index.match_keywords("Phishing-like email reported")["id"] == "T1566"
+    assert index.match_keywords("user ran bash -c 'id'")["id"] == "T1059"
+    assert index.match_keywords("bash config reloaded") is None
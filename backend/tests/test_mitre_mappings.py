@@ -0,0 +1,41 @@
+import os
+
+from services.mitre_kb import MitreKnowledgeBase
+from services.mitre_mappings import CustomMappingStore, CustomMappingTable, _iter_rows
+
+KB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'mitre_attack.json')
+
+
+def test_lookup_prefers_source_specific_keys(tmp_path):
+    path = tmp_path / "mappings.csv"
+    path.write_text("# key,technique,tactic\n"
+                    "5710,T1110\n"
+                    "wazuh:5710,T1021,Lateral Movement\n"
+                    "Brute Force Detected,t1110.001\n")
+    table = CustomMappingTable(_iter_rows(str(path)))
+
+    assert len(table) == 3
+    assert table.get("5710") == ("T1110", None)
+    assert table.lookup_event({"siem_source": "wazuh", "rule": {"id": 5710}}) == ("T1021", "Lateral Movement")
+    assert table.lookup_event({"siem_source": "splunk", "rule_id": "5710"}) == ("T1110", None)
+    assert table.lookup_event({"search_name": "brute force detected"}) == ("T1110.001", None)
+    assert table.lookup_event({"rule_id": "1"}) is None
+
+    kb = MitreKnowledgeBase(KB_PATH)
+    mappings = kb.map_events([{"rule_id": "5710", "rule_name": "Phishing"}, {"rule_name": "Phishing"}], custom=table)
+    assert mappings[0]["mitre_technique"] == "Brute Force"
+    assert mappings[0]["source"] == "custom_mapping"
+    assert mappings[1]["source"] == "keywords"
+
+
+def test_store_reloads_on_mtime_change(tmp_path):
+    path = tmp_path / "mappings.json"
+    path.write_text('{"100": "T1110"}')
+    os.utime(path, (1000, 1000))
+    store = CustomMappingStore(check_interval=0)
+    assert store.get_table(str(path)).get("100") == ("T1110", None)
+
+    path.write_text('[{"key": "100", "technique": "T1003", "tactic": "TA0006"}]')
+    os.utime(path, (2000, 2000))
+    assert store.get_table(str(path)).get("100") == ("T1003", "TA0006")
+    assert store.get_table(str(tmp_path / "missing.csv")) is None
@@ -0,0 +1,97 @@
+import time
+from datetime import datetime
+
+from flask import Flask
+
+import services.ml_registry as ml_registry
+import services.ml_service as ml_service
+from models import db, Event, LabelRevision, RawLog
+from services.config_snapshot import ConfigSnapshot
+from services.ml_providers import DummyMLProvider
+
+
+def test_registry_reuses_warm_service_and_swaps_on_config_change(monkeypatch):
+    snapshots = [ConfigSnapshot({'ml.model_type': 'dummy'}, {"ml_api_url": "", "ml_api_key": ""}, version=1)]
+    monkeypatch.setattr(ml_registry, 'get_config_snapshot', lambda: snapshots[-1])
+    monkeypatch.setattr(ml_service, 'get_config_snapshot', lambda: snapshots[-1])
+
+    registry = ml_registry.MLProviderRegistry()
+    with Flask(__name__).app_context():
+        first = registry.get_service()
+        assert first._config_loaded
+        assert registry.get_service() is first
+
+        # Зміна налаштувань поза ML підвищує версію, але не перебудовує сервіс
+        snapshots.append(ConfigSnapshot({'ml.model_type': 'dummy', 'general.data_retention_days': '30'},
+                                        {"ml_api_url": "", "ml_api_key": ""}, version=2))
+        assert registry.get_service() is first
+
+        snapshots.append(ConfigSnapshot({'ml.model_type': 'dummy', 'ml.min_confidence_threshold': '0.9'},
+                                        {"ml_api_url": "", "ml_api_key": ""}, version=3))
+        # Поки новий екземпляр будується, запити обслуговує попередній
+        assert registry.get_service() is first
+
+        deadline = time.time() + 5
+        while registry.get_service() is first and time.time() < deadline:
+            time.sleep(0.01)
+        second = registry.get_service()
+        assert second is not first
+        assert registry.get_service() is second
+
+
+def test_rule_mapped_events_skip_the_provider():
+    class Provider:
+        def classify_event(self, event_data):
+            raise AssertionError("mapped events must not reach the provider")
+
+    service = ml_service.MLService()
+    service.provider = Provider()
+    service._config_loaded = True
+    event = type('Event', (), {"id": 7, "labels_data": {"mitre_source": ml_service.MAPPING_SOURCE}})()
+    result = service.classify_event(event)
+    assert result["success"] and result["skipped"] == ml_service.MAPPING_SOURCE and not result["applied"]
+
+
+def test_batch_classification_with_dummy_provider(monkeypatch, tmp_path):
+    # Кластери, вектори ознак і черга верифікації - SQL PostgreSQL
+    calls = {}
+    monkeypatch.setattr(ml_service, 'collapse_to_representatives', lambda ids: {event_id: 1 for event_id in ids})
+    monkeypatch.setattr(ml_service, 'load_vectors', lambda ids: {})
+    monkeypatch.setattr(ml_service, 'propagate_labels', lambda ids: calls.setdefault('propagated', list(ids)) and 0)
+    monkeypatch.setattr(ml_service, 'enqueue_events', lambda ids: calls.setdefault('queued', list(ids)))
+    provider = DummyMLProvider()
+    batch = provider.batch_classify
+    monkeypatch.setattr(provider, 'batch_classify', lambda items: calls.setdefault('inputs', items) and batch(items))
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'ml.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        events = [Event(event_id=f'e-{n}', timestamp=datetime(2024, 3, 1), severity='high', labels_data={})
+                  for n in range(3)]
+        db.session.add_all(events)
+        db.session.flush()
+        db.session.add(RawLog(event_id=events[0].id, log_data={"full_log": "sshd: failed"}, source='wazuh',
+                              timestamp=datetime(2024, 3, 1)))
+        db.session.commit()
+        ids = [event.id for event in events]
+
+        service = ml_service.MLService()
+        service.config = {"min_confidence_threshold": 0.0, "auto_apply_labels": True}
+        service.provider = provider
+        service._config_loaded = True
+        result = service.batch_classify_events(ids)
+
+        assert result["success"], result.get("error")
+        assert result["processed_events"] == 3
+        assert calls["inputs"][0]["raw_log"] == {"full_log": "sshd: failed"}
+        assert calls["inputs"][1]["raw_log"] == {} and calls["inputs"][1]["severity"] == 'high'
+        assert sorted(calls["propagated"]) == sorted(ids) and sorted(calls["queued"]) == sorted(ids)
+
+        db.session.expire_all()
+        for event in Event.query.all():
+            labels = event.labels_data
+            assert labels["ml_processed"] is True and labels["attack_type"] == event.attack_type
+            assert labels["ml_prediction"]["attack_type"] == event.attack_type
+        assert LabelRevision.query.filter_by(label_key='attack_type', source='ml').count() == 3
@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.connector_bench import run_connector_benchmark, run_mock_benchmarks
+from benchmarks.mock_siem import FaultInjector, MockSIEMServer, create_mock_siem_app
+
+
+@pytest.mark.parametrize("siem_type", ["wazuh", "splunk", "elastic"])
+def test_connectors_page_through_mock_alerts(siem_type):
+    app = create_mock_siem_app(siem_type, total_events=300)
+    with MockSIEMServer(app) as server:
+        report = run_connector_benchmark(siem_type, server.url, fetches=4, page_size=100)
+    assert report["events"] == 400
+    assert report["errors"] == {}
+    assert report["fetch_latency_ms"]["p50"] is not None
+
+
+def test_unauthenticated_requests_are_rejected():
+    client = create_mock_siem_app('wazuh', total_events=10).test_client()
+    assert client.get('/alerts').status_code == 401
+    assert client.get('/alerts', headers={"Authorization": "Bearer t"}).status_code == 200
+
+
+def test_rate_limit_and_failures_are_reported():
+    report = run_mock_benchmarks(('elastic',), total_events=100, fetches=20, page_size=10,
+                                 rate_limit=5, failure_rate=0.2)[0]
+    assert report["errors"].get("SIEMRateLimitError", 0) == report["server"]["rate_limited"] > 0
+    assert report["errors"].get("SIEMResponseError", 0) == report["server"]["failed"]
+    assert report["successful_fetches"] * 10 == report["events"]
+
+
+def test_timeouts_are_retried_by_connector():
+    faults = FaultInjector(latency_ms=200)
+    with MockSIEMServer(create_mock_siem_app('elastic', total_events=10, faults=faults)) as server:
+        report = run_connector_benchmark('elastic', server.url, fetches=1, page_size=5, retry_delay=0.01, timeout=0.05)
+    assert report["retries"] == 3
+    assert report["errors"] == {"SIEMConnectionError": 1}
@@ -0,0 +1,50 @@
+import gc
+import logging
+import os
+import pickle
+
+from services import model_store
+
+
+def test_model_is_loaded_once_per_process_and_reloaded_on_change(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps({"weights": [1, 2, 3]}))
+
+    model, info = model_store.get_shared_model(str(path), 'private')
+    again, _ = model_store.get_shared_model(str(path), 'private')
+    assert model == {"weights": [1, 2, 3]}
+    assert again is model
+    assert info["mode"] == 'private'
+    assert info["preloaded"] is False
+
+    path.write_bytes(pickle.dumps({"weights": [4]}))
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    reloaded, _ = model_store.get_shared_model(str(path), 'private')
+    assert reloaded == {"weights": [4]}
+
+
+def test_missing_model_and_memory_accounting(tmp_path):
+    model, info = model_store.get_shared_model(str(tmp_path / "missing.pkl"), 'mmap')
+    assert model is None
+    assert info["error"] == "Model file not found"
+
+    memory = model_store.process_memory()
+    assert memory["pid"] > 0
+    assert memory["source"] in ("smaps_rollup", "statm", "getrusage", "unavailable")
+
+
+def test_worker_warns_when_load_mode_differs_from_master(tmp_path, caplog):
+    path = tmp_path / "shared.pkl"
+    path.write_bytes(pickle.dumps({"weights": [1]}))
+    try:
+        assert model_store.preload_shared_model(str(path), 'private')
+    finally:
+        gc.unfreeze()
+
+    with caplog.at_level(logging.WARNING, logger='services.model_store'):
+        model_store.get_shared_model(str(path), 'private')
+        assert not caplog.records
+        model_store.get_shared_model(str(path), 'mmap')
+        model_store.get_shared_model(str(path), 'mmap')
+    warnings = [record.getMessage() for record in caplog.records if "preloaded" in record.getMessage()]
+    assert len(warnings) == 1 and "ML_MODEL_LOAD_MODE=private" in warnings[0]
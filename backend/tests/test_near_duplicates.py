@@ -0,0 +1,36 @@
+from services.near_duplicates import SIMILARITY_THRESHOLD, DuplicateIndex, normalize_value, signature_of, similarity
+
+
+def _alert(ts, pid, port, rule="5710", text="Invalid user admin from 10.0.0.5"):
+    return {
+        "timestamp": ts,
+        "id": f"{ts}-{pid}",
+        "rule": {"id": rule, "description": "sshd: Attempt to login using a non-existent user"},
+        "agent": {"name": "web-01"},
+        "full_log": f"Jan 1 {ts[-9:-1]} web-01 sshd[{pid}]: {text} port {port}",
+    }
+
+
+def test_normalization_masks_volatile_numbers_but_keeps_hosts_and_ips():
+    value = normalize_value("web-01 sshd[1234]: from 10.0.0.5 port 51234 id 7f3a9c2e1b4d5f6a")
+    assert value == "web-01 sshd[<n>]: from 10.0.0.5 port <n> id <hex>"
+
+
+def test_repeated_alerts_share_a_cluster_and_different_ones_do_not():
+    first = signature_of(_alert("2024-01-01T00:00:01Z", 1234, 51234))
+    repeat = signature_of(_alert("2024-01-02T13:45:09Z", 9876, 40000))
+    other = signature_of(_alert("2024-01-01T00:00:01Z", 1, 80, rule="31101",
+                                text="GET /wp-login.php 404 from 8.8.8.8 user-agent curl"))
+    assert similarity(first, repeat) == 1.0
+    assert similarity(first, other) < SIMILARITY_THRESHOLD
+
+    index = DuplicateIndex()
+    assert index.match(first) == (None, 0.0)
+    index.add_cluster("a", first)
+    assert index.match(repeat)[0] == "a"
+    assert index.match(other)[0] is None
+
+
+def test_empty_raw_log_is_not_clustered():
+    assert signature_of({}) is None
+    assert signature_of({"timestamp": "2024-01-01T00:00:00Z", "id": 5}) is None
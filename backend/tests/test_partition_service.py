@@ -0,0 +1,25 @@
+from flask import Flask
+
+from models import db
+from services.partition_service import PartitionManager, _pending_partitions
+
+
+def test_partition_cache_is_updated_only_after_commit():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    known = PartitionManager._known_partitions
+    with app.app_context():
+        db.session.execute(db.text("SELECT 1"))
+        _pending_partitions(db.session).add('events_p20240101')
+        db.session.rollback()
+        assert 'events_p20240101' not in known
+
+        db.session.execute(db.text("SELECT 1"))
+        _pending_partitions(db.session).add('events_p20240102')
+        with db.session.begin_nested():
+            _pending_partitions(db.session).add('events_p20240103')
+        assert 'events_p20240103' not in known
+        db.session.commit()
+        assert {'events_p20240102', 'events_p20240103'} <= known
+    known.difference_update({'events_p20240102', 'events_p20240103'})
@@ -0,0 +1,89 @@
+from flask import Flask
+
+from models import db, ReclassificationJob
+from services import reclassification_service
+from services.mitre_mappings import MAPPING_SOURCE
+from services.reclassification_service import RateLimiter, build_update_rows, run_job
+
+
+def test_rate_limiter_spaces_batches():
+    clock = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    limiter = RateLimiter(100, clock=lambda: clock[0], sleep=sleep)
+    limiter.acquire(50)
+    limiter.acquire(50)
+    limiter.acquire(10)
+    assert sleeps == [0.5, 0.5]
+
+    unlimited = RateLimiter(0, sleep=sleep)
+    unlimited.acquire(1000)
+    assert len(sleeps) == 2
+
+
+def test_build_update_rows_applies_threshold_and_keeps_custom_mitre():
+    events = [
+        {"id": 1, "labels_data": {}},
+        {"id": 2, "labels_data": {"mitre_source": MAPPING_SOURCE}},
+        {"id": 3, "labels_data": {}},
+        {"id": 4, "labels_data": {}},
+    ]
+    classification = {"attack_type": "Brute Force", "mitre_tactic": "TA0006", "mitre_technique": "T1110",
+                      "true_positive": True}
+    results = [
+        {"success": True, "classification": classification, "confidence": 0.9},
+        {"success": True, "classification": classification, "confidence": 0.9},
+        {"success": True, "classification": classification, "confidence": 0.5},
+        {"success": False, "error": "timeout"},
+    ]
+
+    rows = build_update_rows(events, results, "v2", 0.7)
+    assert [row["id"] for row in rows] == [1, 2, 3]
+
+    assert rows[0]["mitre_technique"] == "T1110"
+    assert rows[0]["labels"]["true_positive"] is True
+    assert rows[0]["labels"]["ml_model_version"] == "v2"
+
+    assert rows[1]["attack_type"] == "Brute Force"
+    assert rows[1]["mitre_technique"] is None
+    assert "mitre_technique" not in rows[1]["labels"]
+
+    assert rows[2]["attack_type"] is None
+    assert rows[2]["labels"]["ml_confidence"] == 0.5
+    assert rows[2]["labels"]["ml_prediction"] == classification
+
+
+def test_failing_provider_keeps_the_checkpoint(monkeypatch):
+    class Provider:
+        calls = 0
+
+        def batch_classify(self, items):
+            Provider.calls += 1
+            return [{"success": False, "error": "ML API unavailable"} for _ in items]
+
+    ml_service = type('MLService', (), {"provider": Provider(), "config": {},
+                                        "_ensure_config_loaded": lambda self: None})()
+    events = [{"id": event_id, "labels_data": {}} for event_id in (11, 12, 13)]
+    monkeypatch.setattr(reclassification_service, '_claim', lambda job_id: True)
+    monkeypatch.setattr(reclassification_service, '_select_batch', lambda job, size: events)
+    monkeypatch.setattr(reclassification_service, '_prepare_inputs', lambda batch: batch)
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', RECLASSIFY_BATCH_PAUSE=0)
+    db.init_app(app)
+    with app.app_context():
+        ReclassificationJob.__table__.create(db.engine)
+        job = ReclassificationJob(model_version='v2', filters={}, status='running', last_event_id=10)
+        db.session.add(job)
+        db.session.commit()
+
+        job = run_job(job.id, ml_service, max_events_per_second=0)
+
+        assert Provider.calls == 1
+        assert job.status == 'failed'
+        assert "ML API unavailable" in job.message
+        assert (job.last_event_id, job.processed, job.updated, job.failed) == (10, 0, 0, 0)
@@ -0,0 +1,69 @@
+import pytest
+
+from services.rule_engine import CompiledRuleSet, DEFAULT_RULES, RuleCompileError
+
+
+def test_default_rules_match_previous_auto_tagging():
+    engine = CompiledRuleSet(DEFAULT_RULES)
+
+    assert engine.label_event({"severity": "High", "rule_name": "SSH brute force"})["tags"] == [
+        "potential_threat", "brute_force"
+    ]
+    assert engine.label_event({"severity": "low", "rule_name": "Login"})["tags"] == []
+
+
+def test_all_conditions_of_rule_must_match():
+    engine = CompiledRuleSet([{
+        "id": "ssh-brute",
+        "conditions": {
+            "severity": "high",
+            "rule_name": {"contains": ["brute", "password guess"]},
+            "source_ip": {"cidr": "10.0.0.0/8"},
+            "raw_log.rule.level": {"gte": 7}
+        },
+        "labels": {"attack_type": "Brute Force"}
+    }])
+
+    event = {"severity": "high", "rule_name": "sshd: brute force", "source_ip": "10.1.2.3",
+             "raw_log": {"rule": {"level": "10"}}}
+    assert engine.label_event(event)["labels"] == {"attack_type": "Brute Force"}
+
+    assert engine.label_event(dict(event, source_ip="192.168.1.1"))["rules"] == []
+    assert engine.label_event(dict(event, raw_log={"rule": {"level": 3}}))["rules"] == []
+
+
+def test_later_rules_override_labels_and_tags_are_merged():
+    engine = CompiledRuleSet([
+        {"id": "a", "conditions": {"siem_source": "wazuh"}, "labels": {"attack_type": "Generic"}, "tags": ["x"]},
+        {"id": "b", "conditions": {"message": {"regex": r"failed password for \w+"}},
+         "labels": {"attack_type": "Brute Force"}, "tags": ["x", "y"]},
+        {"id": "c", "conditions": {}, "tags": ["all"]},
+    ])
+
+    result = engine.label_event({"siem_source": "wazuh", "message": "Failed password for root"})
+    assert result["rules"] == ["a", "b", "c"]
+    assert result["labels"] == {"attack_type": "Brute Force"}
+    assert result["tags"] == ["x", "y", "all"]
+
+
+def test_ipv6_cidr_and_disabled_rules():
+    engine = CompiledRuleSet([
+        {"id": "v6", "conditions": {"source_ip": {"cidr": ["2001:db8::/32"]}}},
+        {"id": "off", "enabled": False, "conditions": {}},
+    ])
+    assert engine.label_event({"source_ip": "2001:db8::1"})["rules"] == ["v6"]
+    assert engine.label_event({"source_ip": "not-an-ip"})["rules"] == []
+
+
+@pytest.mark.parametrize("rule", [
+    {"conditions": {"message": {"regex": "("}}},
+    {"conditions": {"source_ip": {"cidr": "10.0.0.300/8"}}},
+    {"conditions": {"severity": {"unknown_op": 1}}},
+    {"conditions": {"severity": []}},
+    {"conditions": {"message": {"contains": ""}}},
+    {"conditions": {"source_ip": {"cidr": []}}},
+    "not a rule",
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(RuleCompileError):
+        CompiledRuleSet([rule])
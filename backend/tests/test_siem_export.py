@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from models import db, Event, RawLog
+from routes import siem_routes
+from services.mitre_mappings import MAPPING_SOURCE, CustomMappingTable, _iter_rows
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+ALERTS = [
+    {"id": "a-1", "timestamp": "2024-03-01T10:00:00Z", "severity": "high", "source": {"ip": "10.0.0.5"},
+     "rule": {"id": "5712", "description": "sshd: brute force trying to get access to the system"},
+     "full_log": "sshd[1]: Failed password for root from 10.0.0.5 port 5022"},
+    {"id": "a-2", "timestamp": "2024-03-01T10:00:05Z", "severity": "low", "source": {"ip": "10.0.0.6"},
+     "rule": {"id": "31101", "description": "Web server 400 error code"},
+     "full_log": "GET /index.php 404"},
+]
+
+
+@pytest.fixture
+def hooks(monkeypatch):
+    """Ланцюжки, вектори ознак і кластери пишуться SQL PostgreSQL - тут лише фіксуємо виклики"""
+    calls = {}
+
+    def correlate_events(items):
+        calls['chains'] = list(items)
+        return ['chain-1'] + [None] * (len(calls['chains']) - 1)
+
+    monkeypatch.setattr(siem_routes, 'correlate_events', correlate_events)
+    monkeypatch.setattr(siem_routes, 'store_features', lambda items: calls.setdefault('features', list(items)))
+    monkeypatch.setattr(siem_routes, 'assign_clusters', lambda items: calls.setdefault('clusters', list(items)))
+    return calls
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, hooks):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'siem.db'}")
+    db.init_app(app)
+    app.register_blueprint(siem_routes.siem_bp)
+    config = SimpleNamespace(siem_api_url='http://siem', siem_api_token='token', siem_source='wazuh')
+    monkeypatch.setattr(siem_routes, 'Configuration', SimpleNamespace(query=SimpleNamespace(first=lambda: config)))
+    monkeypatch.setattr(siem_routes.requests, 'get', lambda url, headers=None: _Response({"data": ALERTS}))
+    mappings = tmp_path / 'mappings.csv'
+    mappings.write_text("wazuh:5712,T1110,Credential Access\n")
+    monkeypatch.setattr(siem_routes, 'get_custom_mappings', lambda: CustomMappingTable(_iter_rows(str(mappings))))
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def test_export_stores_events_raw_logs_and_features(app, hooks):
+    client = app.test_client()
+    response = client.post('/api/siem/export')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()["imported_events"] == 2
+
+    events = {event.event_id: event for event in Event.query.all()}
+    assert set(events) == {"a-1", "a-2"}
+    raw_logs = {raw.event_id: raw for raw in RawLog.query.all()}
+    raw = raw_logs[events["a-1"].id]
+    assert raw.log_data["rule"]["id"] == "5712" and raw.source == 'wazuh'
+    assert events["a-1"].labels_data["auto_tags"][0] == 'wazuh'
+    assert events["a-1"].labels_data["event_chain_id"] == 'chain-1'
+    # Відповідність правила потрапляє і в мітки, і в колонки, які читають ML та дашборди
+    assert events["a-1"].labels_data["mitre_source"] == MAPPING_SOURCE
+    assert (events["a-1"].mitre_tactic, events["a-1"].mitre_technique) == ("Credential Access", "Brute Force")
+
+    assert len(hooks['chains']) == 2
+    assert [event_id for event_id, _ in hooks['features']] == [events["a-1"].id, events["a-2"].id]
+    assert [event_id for event_id, _ in hooks['clusters']] == [events["a-1"].id, events["a-2"].id]
+
+    # Повторний експорт не дублює подій
+    client.post('/api/siem/export')
+    assert Event.query.count() == 2
@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { verifyEventLabels } from '../services/api';
+import { bulkVerifyEventLabels } from '../services/api';
 import './BulkVerification.css';
 
 function BulkVerification({ events, onComplete }) {
@@ -61,14 +61,23 @@ function BulkVerification({ events, onComplete }) {
         verifiedLabels[key] = isAccepted;
       });
 
-      // Верифікуємо кожну вибрану подію
-      const promises = selectedEvents.map(eventId => 
-        verifyEventLabels(eventId, verifiedLabels)
-      );
-
-      await Promise.all(promises);
+      // Верифікуємо всі вибрані події одним запитом
+      const response = await bulkVerifyEventLabels(selectedEvents, { verified_labels: verifiedLabels });
+      const { verified_events = 0, unprocessed_ids = [], missing_ids = [] } = response.data;
+      
+      setSuccess(`Успішно ${isAccepted ? 'підтверджено' : 'відхилено'} ${labelsToVerify.length} міток для ${verified_events} з ${selectedEvents.length} подій`);
       
-      setSuccess(`Успішно ${isAccepted ? 'підтверджено' : 'відхилено'} ${labelsToVerify.length} міток для ${selectedEvents.length} подій`);
+      // Події без ML-обробки та відсутні події сервер пропускає
+      const skipped = [];
+      if (unprocessed_ids.length > 0) {
+        skipped.push(`${unprocessed_ids.length} ще не оброблено ML (ID: ${unprocessed_ids.join(', ')})`);
+      }
+      if (missing_ids.length > 0) {
+        skipped.push(`${missing_ids.length} не знайдено (ID: ${missing_ids.join(', ')})`);
+      }
+      if (skipped.length > 0) {
+        setError(`Пропущено подій: ${skipped.join('; ')}`);
+      }
       
       // Скидаємо вибір
       setSelectedEvents([]);
@@ -343,6 +343,11 @@ export const verifyEventLabel = (eventId, verificationData) => {
   return apiClient.post(`/api/ml/verify-label/${eventId}`, verificationData);
 };
 
+// Масова верифікація: один запит для всіх вибраних подій
+export const bulkVerifyEventLabels = (eventIds, verdict) => {
+  return apiClient.post('/api/ml/verify-labels', { event_ids: eventIds, ...verdict });
+};
+
 export const getMLMetrics = (limit = 10) => {
   return apiClient.get('/api/ml/metrics', { params: { limit } });
 };
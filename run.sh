@@ -26,7 +26,7 @@ python manage.py check-env
 case "$MODE" in
     "production")
         echo ">>> Запуск сервера в production режимі..."
-        python -m gunicorn -b 0.0.0.0:5000 -w 4 "app:create_app('production')"
+        python -m gunicorn -c gunicorn.conf.py -b 0.0.0.0:5000 -w 4 "app:create_app('production')"
         ;;
     *)
         echo ">>> Запуск сервера в режимі розробки..."